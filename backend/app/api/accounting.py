@@ -4,8 +4,7 @@
 from datetime import datetime
 from typing import Optional, List
 import base64
-import os
-import uuid
+import mimetypes
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy import select, func, and_, or_, desc, cast, String
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,10 +12,9 @@ from sqlalchemy.orm import selectinload
 
 from app.core.database import get_db
 from app.core.security import get_current_user
-from app.core.config import UPLOAD_DIR
 from app.models.models import (
     User, Family, FamilyMember, AccountingEntry, AccountingCategory,
-    AccountingEntrySource, Transaction, TransactionType
+    AccountingEntrySource, TransactionType
 )
 from app.schemas.accounting import (
     AccountingEntryCreate, AccountingEntryPhotoCreate, AccountingEntryVoiceCreate,
@@ -26,7 +24,11 @@ from app.schemas.accounting import (
     DuplicateCheckRequest, DuplicateCheckResponse, DuplicateCheckResult, DuplicateMatch, DuplicateMatchLevel,
     PhotoRecognizeResponse, PhotoRecognizeItem, PhotoCreateRequest,
 )
-from app.services.ai_accounting import parse_receipt_images, transcribe_voice, categorize_entry, check_duplicate_with_ai, transcribe_audio_file, parse_voice_text, parse_import_file
+from app.services.balance import post_transaction
+from app.services.accounting_list import list_accounting_entries
+from app.services.blob_store import store_bytes
+from app.services.ai_accounting import parse_receipt_images, transcribe_voice, categorize_entry, check_duplicate_with_ai, transcribe_audio_file, parse_voice_text, parse_import_file, resolve_categories
+from app.services.ai_governor import set_ai_call_owner
 
 router = APIRouter()
 
@@ -81,6 +83,8 @@ async def get_user_family(current_user: User, db: AsyncSession) -> tuple[Family,
             detail="您还未加入任何家庭"
         )
 
+    # 本请求中的 AI 调用按家庭公平排队
+    set_ai_call_owner(f"family:{membership.family_id}")
     return membership.family, membership
 
 
@@ -189,14 +193,10 @@ async def recognize_photos(
     for file in files:
         img_bytes = await file.read()
 
-        # 保存图片到文件
-        ext = (file.filename or "").rsplit(".", 1)[-1] if file.filename and "." in file.filename else "jpg"
-        filename = f"{uuid.uuid4().hex}.{ext}"
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        with open(filepath, "wb") as f:
-            f.write(img_bytes)
-        image_paths.append(f"/uploads/receipts/{filename}")
+        # 保存图片到内容寻址存储（相同图片只存一份）
+        mime_type = file.content_type if (file.content_type or "").startswith("image/") else None
+        mime_type = mime_type or mimetypes.guess_type(file.filename or "")[0] or "image/jpeg"
+        image_paths.append(store_bytes(img_bytes, mime_type))
 
         # 转为base64供AI识别
         img_b64 = f"data:image/jpeg;base64,{base64.b64encode(img_bytes).decode()}"
@@ -330,6 +330,7 @@ async def voice_recognize(
         raise HTTPException(status_code=400, detail="音频文件过大，请控制在25MB以内")
 
     filename = file.filename or "audio.webm"
+    set_ai_call_owner(f"user:{current_user.id}")
 
     try:
         # 1. Whisper 转录
@@ -433,17 +434,29 @@ async def import_entries(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """批量导入记账条目"""
+    """批量导入记账条目（分类为空的条目跳过；不是有效代码时先按名称映射，仍无法识别的合并为少量 AI 调用判断）"""
     family, _ = await get_user_family(current_user, db)
 
+    valid_categories = {c.value for c in AccountingCategory}
+    unresolved = [
+        i for i, entry_data in enumerate(import_data.entries)
+        if entry_data.category.strip() and entry_data.category not in valid_categories
+    ]
+    resolved = await resolve_categories([
+        (import_data.entries[i].category, import_data.entries[i].description, import_data.entries[i].amount)
+        for i in unresolved
+    ]) if unresolved else []
+    categories = [entry_data.category for entry_data in import_data.entries]
+    for i, category in zip(unresolved, resolved):
+        categories[i] = category
+
     created_entries = []
 
-    for entry_data in import_data.entries:
-        # 验证分类
-        try:
-            category_enum = AccountingCategory(entry_data.category)
-        except ValueError:
-            continue  # 跳过无效分类的条目
+    for entry_data, category in zip(import_data.entries, categories):
+        if not category.strip():
+            continue  # 跳过未填写分类的条目
+
+        category_enum = AccountingCategory(category)
 
         # 验证消费人（如果指定）
         if entry_data.consumer_id:
@@ -526,6 +539,7 @@ async def import_file_parse(
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="文件名不能为空")
+    set_ai_call_owner(f"user:{current_user.id}")
 
     # 检查文件大小（最大 20MB）
     file_bytes = await file.read()
@@ -568,10 +582,15 @@ async def list_entries(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取记账条目列表（支持筛选和模糊搜索）"""
+    """获取记账条目列表（支持筛选和模糊搜索）
+
+    传入上一页返回的 next_cursor 时按游标翻页（忽略 page，total 为空），
+    否则按 page 分页。
+    """
     family, _ = await get_user_family(current_user, db)
 
     # 构建查询条件
@@ -609,66 +628,28 @@ async def list_entries(
             )
         )
 
-    # 查询总数
-    count_result = await db.execute(
-        select(func.count(AccountingEntry.id)).where(and_(*conditions))
-    )
-    total = count_result.scalar() or 0
-
-    # 查询列表
-    offset = (page - 1) * page_size
-    result = await db.execute(
-        select(AccountingEntry)
-        .where(and_(*conditions))
-        .order_by(desc(AccountingEntry.entry_date), desc(AccountingEntry.created_at))
-        .limit(page_size)
-        .offset(offset)
-    )
-    entries = result.scalars().all()
-
-    # 构造响应
-    response_entries = []
-    for entry in entries:
-        # 获取记账人昵称
-        user_result = await db.execute(
-            select(User).where(User.id == entry.user_id)
+    # 键集分页（cursor）或兼容的页码分页；游标翻页时不再重复统计总数
+    try:
+        result = await list_accounting_entries(
+            db,
+            conditions,
+            page_size=page_size,
+            cursor=cursor,
+            page=page,
+            with_total=cursor is None,
         )
-        user = user_result.scalar_one_or_none()
-
-        entry_response = AccountingEntryResponse(
-            id=entry.id,
-            family_id=entry.family_id,
-            user_id=entry.user_id,
-            consumer_id=entry.consumer_id,
-            amount=entry.amount,
-            category=entry.category.value,
-            description=entry.description,
-            entry_date=entry.entry_date,
-            source=entry.source.value,
-            image_data=None,  # 列表不返回图片数据，减少传输
-            has_image=bool(entry.image_data),
-            is_accounted=entry.is_accounted,
-            expense_request_id=entry.expense_request_id,
-            created_at=entry.created_at,
-            user_nickname=user.nickname if user else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
         )
 
-        # 获取消费人昵称
-        if entry.consumer_id:
-            consumer_result = await db.execute(
-                select(User).where(User.id == entry.consumer_id)
-            )
-            consumer = consumer_result.scalar_one_or_none()
-            if consumer:
-                entry_response.consumer_nickname = consumer.nickname
-
-        response_entries.append(entry_response)
-
     return AccountingEntryListResponse(
-        total=total,
+        total=result["total"],
         page=page,
         page_size=page_size,
-        entries=response_entries
+        entries=[AccountingEntryResponse(**entry) for entry in result["entries"]],
+        next_cursor=result["next_cursor"]
     )
 
 
@@ -911,16 +892,6 @@ async def batch_create_expense(
     # 计算总金额
     total_amount = sum(entry.amount for entry in entries)
 
-    # 获取当前余额（仅用于记录，不扣减）
-    last_txn_result = await db.execute(
-        select(Transaction)
-        .where(Transaction.family_id == family.id)
-        .order_by(Transaction.created_at.desc())
-        .limit(1)
-    )
-    last_transaction = last_txn_result.scalar_one_or_none()
-    current_balance = last_transaction.balance_after if last_transaction else 0
-
     # 构建描述（含时间范围）
     description = batch_data.description or "批量记账入账"
     entry_descs = [f"{e.description}(¥{e.amount})" for e in entries]
@@ -937,20 +908,17 @@ async def batch_create_expense(
     full_description = f"{description}{date_range_str}: {', '.join(entry_descs)}"
 
     # 创建日常消费流水记录（不影响家庭自由资金余额）
-    transaction = Transaction(
+    transaction = await post_transaction(
+        db,
         family_id=family.id,
         user_id=current_user.id,
         transaction_type=TransactionType.DAILY_EXPENSE,
         amount=-total_amount,
-        balance_after=current_balance,  # 余额不变
+        balance_delta=0,  # 余额不变
         description=full_description,
         reference_type="accounting_batch"
     )
 
-    db.add(transaction)
-    await db.flush()
-    await db.refresh(transaction)
-
     # 更新记账条目状态
     for entry in entries:
         entry.is_accounted = True
@@ -8,6 +8,8 @@ from sqlalchemy import select
 
 from app.core.database import get_db
 from app.api.auth import get_current_user
+from app.core.principal import Principal
+from app.core.security import get_current_principal
 from app.models.models import User, Achievement, UserAchievement, FamilyMember
 from app.schemas.achievement import (
     AchievementDefinition,
@@ -28,7 +30,7 @@ router = APIRouter(prefix="/api/achievement", tags=["成就系统"])
 async def get_achievement_definitions(
     include_hidden: bool = False,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     获取所有成就定义（带用户解锁状态）
@@ -71,7 +73,7 @@ async def get_achievement_definitions(
 @router.get("/my", response_model=List[UserAchievementResponse])
 async def get_my_achievements(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """获取我已解锁的成就列表"""
     service = AchievementService(db)
@@ -104,7 +106,7 @@ async def get_my_achievements(
 @router.get("/progress", response_model=AchievementProgress)
 async def get_achievement_progress(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """获取成就进度统计"""
     service = AchievementService(db)
@@ -210,7 +212,7 @@ async def check_achievements(
 @router.get("/unshown", response_model=AchievementCheckResponse)
 async def get_unshown_achievements(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     获取未展示过的成就并标记为已展示
@@ -274,7 +276,7 @@ async def get_unshown_achievements(
 async def get_recent_family_unlocks(
     limit: int = 10,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     获取家庭成员最近解锁的成就
@@ -5,10 +5,12 @@
 采用两阶段 Tool-Calling 模式：
   Phase 1: AI 分析用户意图，判断需要调用哪些数据查询工具
   Phase 2: 执行查询，将结果注入上下文后生成最终回复
+另提供 SSE 流式版本（/stream），回复文本边生成边推送。
 """
 import logging
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -16,11 +18,12 @@ from sqlalchemy import select
 from app.core.database import get_db
 from app.api.auth import get_current_user
 from app.models.models import User, FamilyMember
-from app.services.ai_service import ai_service
+from app.services.ai_service import ai_service, format_sse, SSE_HEADERS
 from app.services.ai_tools import (
     build_tool_selection_prompt, execute_tools, TOOL_LIST_TEXT,
 )
 from app.services.ai_accounting import transcribe_audio_file
+from app.services.ai_governor import set_ai_call_owner
 from app.services.ai_service import resolve_skill, _skill_cache_loaded, load_skill_cache
 
 logger = logging.getLogger(__name__)
@@ -47,73 +50,64 @@ class ChatResponse(BaseModel):
     suggestions: list[str] = []
 
 
-@router.post("", response_model=ChatResponse)
-async def chat_with_ai(
-    request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
+async def _build_reply_request(request: ChatRequest, current_user: User, db: AsyncSession) -> dict:
     """
-    与 AI 助手对话。
-    AI 会根据对话内容自主判断是否需要查询数据，按需调用查询接口。
+    Phase 1/2：判断并执行数据查询，返回生成最终回复所用的 ai_service 调用参数。
     """
-    if not ai_service.is_configured:
-        raise HTTPException(status_code=503, detail="AI 服务暂未配置，请联系管理员")
-
-    try:
-        # 获取用户家庭 ID
-        fm_result = await db.execute(
-            select(FamilyMember)
-            .where(FamilyMember.user_id == current_user.id)
-            .limit(1)
+    # 获取用户家庭 ID
+    fm_result = await db.execute(
+        select(FamilyMember)
+        .where(FamilyMember.user_id == current_user.id)
+        .limit(1)
+    )
+    family_member = fm_result.scalar_one_or_none()
+    family_id = family_member.family_id if family_member else None
+    set_ai_call_owner(f"family:{family_id}" if family_id else f"user:{current_user.id}")
+
+    # 构建历史对话
+    history = [{"role": h.role, "content": h.content} for h in request.history[-20:]]
+
+    # ===== Phase 1: AI 判断需要调用哪些工具 =====
+    tool_data = ""
+    if family_id:
+        tool_prompt = build_tool_selection_prompt(request.message)
+        # 把最近几轮对话也给工具选择器看，便于理解上下文
+        recent_history = history[-6:] if history else None
+        tool_decision = await ai_service.chat_json(
+            user_prompt=f"用户的问题是：{request.message}",
+            system_prompt=tool_prompt,
+            history=recent_history,
+            function_key="chat_tool_call",
+            prompt_vars={"tool_list_text": TOOL_LIST_TEXT, "message": request.message},
+            temperature=0.1,
         )
-        family_member = fm_result.scalar_one_or_none()
-        family_id = family_member.family_id if family_member else None
-
-        # 构建历史对话
-        history = [{"role": h.role, "content": h.content} for h in request.history[-20:]]
-
-        # ===== Phase 1: AI 判断需要调用哪些工具 =====
-        tool_data = ""
-        if family_id:
-            tool_prompt = build_tool_selection_prompt(request.message)
-            # 把最近几轮对话也给工具选择器看，便于理解上下文
-            recent_history = history[-6:] if history else None
-            tool_decision = await ai_service.chat_json(
-                user_prompt=f"用户的问题是：{request.message}",
-                system_prompt=tool_prompt,
-                history=recent_history,
-                function_key="chat_tool_call",
-                prompt_vars={"tool_list_text": TOOL_LIST_TEXT, "message": request.message},
-                temperature=0.1,
-            )
-
-            logger.info(f"AI tool decision: {tool_decision}")
-
-            if tool_decision and tool_decision.get("needs_data") and tool_decision.get("tools"):
-                selected_tools = tool_decision["tools"]
-                # 过滤非法工具名
-                valid_tools = [t for t in selected_tools if isinstance(t, str)][:5]
-
-                if valid_tools:
-                    # ===== Phase 2: 执行查询 =====
-                    tool_data = await execute_tools(valid_tools, db, current_user, family_id)
-                    logger.info(f"Tools executed: {valid_tools}, data length: {len(tool_data)}")
-
-        # ===== Phase 3: 带数据生成最终回复 =====
-        data_section = ""
-        if tool_data:
-            data_section = f"""
+
+        logger.info(f"AI tool decision: {tool_decision}")
+
+        if tool_decision and tool_decision.get("needs_data") and tool_decision.get("tools"):
+            selected_tools = tool_decision["tools"]
+            # 过滤非法工具名
+            valid_tools = [t for t in selected_tools if isinstance(t, str)][:5]
+
+            if valid_tools:
+                # ===== Phase 2: 执行查询 =====
+                tool_data = await execute_tools(valid_tools, db, current_user, family_id)
+                logger.info(f"Tools executed: {valid_tools}, data length: {len(tool_data)}")
+
+    # ===== Phase 3: 带数据生成最终回复 =====
+    data_section = ""
+    if tool_data:
+        data_section = f"""
 
 以下是根据用户问题实时查询到的数据，请基于这些数据准确回答：
 {tool_data}
 """
 
-        persona_prefix = ""
-        if request.persona:
-            persona_prefix = f"【角色扮演】{request.persona}\n请在保持这个角色特色的同时，作为家庭财务助手帮助用户。\n\n"
+    persona_prefix = ""
+    if request.persona:
+        persona_prefix = f"【角色扮演】{request.persona}\n请在保持这个角色特色的同时，作为家庭财务助手帮助用户。\n\n"
 
-        system_prompt = f"""{persona_prefix}你是小金库（Golden Nest）的智能财务助手，专门帮助用户管理家庭财务。
+    system_prompt = f"""{persona_prefix}你是小金库（Golden Nest）的智能财务助手，专门帮助用户管理家庭财务。
 用户昵称：{current_user.nickname}
 
 你的能力：
@@ -130,18 +124,35 @@ async def chat_with_ai(
 - 不要提供具体的股票、基金推荐
 """
 
-        reply = await ai_service.chat(
-            user_prompt=request.message,
-            system_prompt=system_prompt,
-            history=history,
-            function_key="chat_reply",
-            prompt_vars={
-                "persona_prefix": persona_prefix,
-                "nickname": current_user.nickname,
-                "data_section": data_section,
-            },
-            temperature=0.7,
-        )
+    return dict(
+        user_prompt=request.message,
+        system_prompt=system_prompt,
+        history=history,
+        function_key="chat_reply",
+        prompt_vars={
+            "persona_prefix": persona_prefix,
+            "nickname": current_user.nickname,
+            "data_section": data_section,
+        },
+        temperature=0.7,
+    )
+
+
+@router.post("", response_model=ChatResponse)
+async def chat_with_ai(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    与 AI 助手对话。
+    AI 会根据对话内容自主判断是否需要查询数据，按需调用查询接口。
+    """
+    if not ai_service.is_configured:
+        raise HTTPException(status_code=503, detail="AI 服务暂未配置，请联系管理员")
+
+    try:
+        reply = await ai_service.chat(**await _build_reply_request(request, current_user, db))
 
         # 生成建议问题
         suggestions = _get_suggestions(request.context_type)
@@ -155,6 +166,54 @@ async def chat_with_ai(
         raise HTTPException(status_code=500, detail="AI 服务暂时不可用，请稍后再试")
 
 
+@router.post("/stream")
+async def chat_with_ai_stream(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    与 AI 助手对话（SSE 流式）。
+
+    数据查询与 chat_with_ai 相同；上游开始返回后立即响应，X-AI-* 响应头照常附带。事件：
+    - meta: {function_key, function_name, model, source}
+    - delta: {text} 增量文本
+    - done: {reply, suggestions, ttfb_ms, total_ms}
+    - error: {detail} 生成过程中出错
+    """
+    if not ai_service.is_configured:
+        raise HTTPException(status_code=503, detail="AI 服务暂未配置，请联系管理员")
+
+    try:
+        stream = await ai_service.chat_stream(**await _build_reply_request(request, current_user, db))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"AI chat stream error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="AI 服务暂时不可用，请稍后再试")
+
+    suggestions = _get_suggestions(request.context_type)
+
+    async def events():
+        yield format_sse("meta", stream.metadata)
+        try:
+            async for delta in stream:
+                yield format_sse("delta", {"text": delta})
+        except ValueError as e:
+            yield format_sse("error", {"detail": str(e)})
+            return
+        finally:
+            await stream.aclose()
+        yield format_sse("done", {
+            "reply": stream.text.strip(),
+            "suggestions": suggestions,
+            "ttfb_ms": stream.ttfb_ms,
+            "total_ms": stream.total_ms,
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 def _get_suggestions(context_type: Optional[str]) -> List[str]:
     """根据上下文类型返回建议问题"""
     mapping = {
@@ -4,7 +4,7 @@
 """
 import logging
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from pydantic import BaseModel, Field
@@ -15,6 +15,9 @@ from app.core.database import get_db
 from app.core.config import set_active_ai_provider, settings
 from app.models.models import AIProvider, AIFunctionModelConfig, FamilyMember, User
 from app.api.auth import get_current_user
+from app.services.ai_cache import ai_response_cache
+from app.services.ai_governor import ai_governor, load_provider_limits
+from app.services.ai_telemetry import ai_telemetry, summarize_telemetry
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +79,8 @@ class AIProviderCreate(BaseModel):
     api_key: str = Field("", description="API Key")
     base_url: str = Field("", max_length=500, description="API Base URL")
     default_model: str = Field("", max_length=100, description="默认模型")
+    rate_limit_rpm: int = Field(0, ge=0, description="每个模型每分钟请求数上限（0 不限）")
+    max_concurrency: int = Field(8, ge=0, description="每个模型同时进行的请求数上限（0 不限）")
 
 
 class AIProviderUpdate(BaseModel):
@@ -85,6 +90,8 @@ class AIProviderUpdate(BaseModel):
     base_url: Optional[str] = Field(None, max_length=500)
     default_model: Optional[str] = Field(None, max_length=100)
     is_enabled: Optional[bool] = None
+    rate_limit_rpm: Optional[int] = Field(None, ge=0)
+    max_concurrency: Optional[int] = Field(None, ge=0)
 
 
 class AIProviderResponse(BaseModel):
@@ -97,6 +104,8 @@ class AIProviderResponse(BaseModel):
     default_model: str
     is_active: bool
     is_enabled: bool
+    rate_limit_rpm: int = 0
+    max_concurrency: int = 0
     created_at: str
     updated_at: str
 
@@ -161,6 +170,8 @@ def provider_to_response(p: AIProvider) -> AIProviderResponse:
         default_model=p.default_model,
         is_active=p.is_active,
         is_enabled=p.is_enabled,
+        rate_limit_rpm=p.rate_limit_rpm or 0,
+        max_concurrency=p.max_concurrency or 0,
         created_at=p.created_at.isoformat() if p.created_at else "",
         updated_at=p.updated_at.isoformat() if p.updated_at else "",
     )
@@ -234,6 +245,8 @@ async def create_provider(
         api_key=data.api_key,
         base_url=data.base_url,
         default_model=data.default_model,
+        rate_limit_rpm=data.rate_limit_rpm,
+        max_concurrency=data.max_concurrency,
         is_active=False,
         is_enabled=True,
         created_by=admin.id,
@@ -241,6 +254,7 @@ async def create_provider(
     db.add(provider)
     await db.commit()
     await db.refresh(provider)
+    await load_provider_limits()
     
     return provider_to_response(provider)
 
@@ -276,13 +290,19 @@ async def update_provider(
         # 如果禁用的是当前活跃服务商，取消活跃
         if not data.is_enabled and provider.is_active:
             provider.is_active = False
+    if data.rate_limit_rpm is not None:
+        provider.rate_limit_rpm = data.rate_limit_rpm
+    if data.max_concurrency is not None:
+        provider.max_concurrency = data.max_concurrency
     
     await db.commit()
     await db.refresh(provider)
+    await load_provider_limits()
     
     # 如果更新的是活跃服务商，同步内存
     if provider.is_active:
         await sync_active_provider_to_config(db)
+        await ai_response_cache.invalidate()
     
     return provider_to_response(provider)
 
@@ -302,11 +322,13 @@ async def delete_provider(
     was_active = provider.is_active
     await db.delete(provider)
     await db.commit()
+    await load_provider_limits()
     
     # 如果删除的是活跃服务商，清空内存配置
     if was_active:
         from app.core.config import clear_active_ai_provider
         clear_active_ai_provider()
+        await ai_response_cache.invalidate()
     
     return {"message": f"已删除服务商: {provider.name}"}
 
@@ -341,6 +363,7 @@ async def activate_provider(
     
     # 同步到内存
     await sync_active_provider_to_config(db)
+    await ai_response_cache.invalidate()
     
     return provider_to_response(provider)
 
@@ -364,6 +387,7 @@ async def deactivate_provider(
     # 清空内存缓存，回退到 .env
     from app.core.config import clear_active_ai_provider
     clear_active_ai_provider()
+    await ai_response_cache.invalidate()
     
     return provider_to_response(provider)
 
@@ -391,6 +415,7 @@ async def set_provider_model(
     # 如果是活跃服务商，同步到内存
     if provider.is_active:
         await sync_active_provider_to_config(db)
+        await ai_response_cache.invalidate()
     
     return {"message": f"已切换模型为: {model}"}
 
@@ -650,3 +675,50 @@ async def reset_function_config(
 
     func_def = AI_FUNCTION_REGISTRY[function_key]
     return {"message": f"已重置「{func_def.name}」为跟随全局配置"}
+
+
+# ==================== AI 回复缓存 ====================
+
+@router.get("/cache/stats")
+async def get_ai_cache_stats(
+    _: User = Depends(require_admin),
+):
+    """AI 回复缓存的按功能命中率（自进程启动起）"""
+    return ai_response_cache.stats()
+
+
+@router.delete("/cache")
+async def clear_ai_cache(
+    _: User = Depends(require_admin),
+):
+    """清空 AI 回复缓存"""
+    await ai_response_cache.invalidate()
+    return {"message": "AI 回复缓存已清空"}
+
+
+# ==================== AI 调用调度 ====================
+
+@router.get("/governor/stats")
+async def get_ai_governor_stats(
+    _: User = Depends(require_admin),
+):
+    """各服务商/模型通道的限额、并发数、排队深度与等待时间（自进程启动起）"""
+    return ai_governor.stats()
+
+
+# ==================== AI 调用遥测 ====================
+
+@router.get("/telemetry")
+async def get_ai_telemetry(
+    days: int = Query(7, ge=1, le=90, description="统计最近几天（UTC，含今天）"),
+    function_key: Optional[str] = Query(None, description="只看某个功能"),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(require_admin),
+):
+    """按日期、功能、模型汇总上游调用次数、失败与重试次数、p50/p95 耗时（毫秒）和 token 用量"""
+    # 先写入缓冲中的记录，使统计包含刚结束的调用
+    try:
+        await ai_telemetry.flush()
+    except Exception as e:
+        logger.warning(f"AI 调用遥测写入失败: {e}")
+    return {"days": days, "items": await summarize_telemetry(db, days, function_key)}
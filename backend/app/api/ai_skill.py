@@ -15,6 +15,8 @@ from sqlalchemy.orm import selectinload
 
 from app.core.database import get_db
 from app.api.auth import get_current_user
+from app.core.principal import Principal
+from app.core.security import get_current_principal
 from app.models.models import User, FamilyMember, AISkill, AISkillAttachment
 from app.core.ai_functions import AI_FUNCTION_REGISTRY
 from app.services.ai_service import refresh_skill_cache, resolve_skill, _skill_cache, _skill_cache_loaded, load_skill_cache
@@ -75,7 +77,7 @@ async def _require_admin(
 @router.get("")
 async def list_skills(
     function_key: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """列出所有技能（可按 function_key 过滤）"""
@@ -129,7 +131,7 @@ async def list_skills(
 
 @router.get("/summary")
 async def get_skills_summary(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取技能概要（每个 function_key 有几套技能、哪套激活）"""
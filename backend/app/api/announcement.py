@@ -6,7 +6,7 @@ from typing import List, Optional
 import json
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, func
 from pydantic import BaseModel
 
 from app.core.database import get_db
@@ -14,9 +14,15 @@ from app.core.constants import ContentLimits
 from app.core.limiter import limiter
 from app.schemas.common import TimeRange, get_time_range_filter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.models.models import (
     User, FamilyMember, Announcement, AnnouncementLike, AnnouncementComment
 )
+from app.services.announcement_feed import (
+    FEED_COMMENTS_LIMIT, adjust_counters, build_feed, comment_dict, list_announcement_feed
+)
+from app.services.blob_store import externalize
 
 router = APIRouter(prefix="/announcements", tags=["announcements"])
 
@@ -54,14 +60,11 @@ class AnnouncementResponse(BaseModel):
 # ==================== Helper ====================
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户所属家庭ID"""
-    result = await db.execute(
-        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-    )
-    family_id = result.scalar_one_or_none()
-    if not family_id:
+    """获取用户所属家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=400, detail="您还没有加入家庭")
-    return family_id
+    return principal.family_id
 
 
 async def build_announcement_response(
@@ -70,79 +73,12 @@ async def build_announcement_response(
     current_user_id: int,
     include_comments: bool = True
 ) -> dict:
-    """构建公告响应"""
-    # 获取作者信息
-    result = await db.execute(select(User).where(User.id == announcement.user_id))
-    author = result.scalar_one_or_none()
-    
-    # 获取点赞数
-    result = await db.execute(
-        select(func.count(AnnouncementLike.id)).where(
-            AnnouncementLike.announcement_id == announcement.id
-        )
+    """构建单条公告响应（include_comments 时附带全部评论）"""
+    items = await build_feed(
+        db, [announcement], current_user_id,
+        comments_limit=None if include_comments else 0
     )
-    likes_count = result.scalar() or 0
-    
-    # 检查当前用户是否点赞
-    result = await db.execute(
-        select(AnnouncementLike).where(
-            AnnouncementLike.announcement_id == announcement.id,
-            AnnouncementLike.user_id == current_user_id
-        )
-    )
-    is_liked = result.scalar_one_or_none() is not None
-    
-    # 获取评论
-    comments = []
-    comments_count = 0
-    if include_comments:
-        result = await db.execute(
-            select(AnnouncementComment, User)
-            .join(User, AnnouncementComment.user_id == User.id)
-            .where(AnnouncementComment.announcement_id == announcement.id)
-            .order_by(AnnouncementComment.created_at.asc())
-        )
-        comment_rows = result.fetchall()
-        comments_count = len(comment_rows)
-        
-        for comment, user in comment_rows:
-            comments.append({
-                "id": comment.id,
-                "content": comment.content,
-                "created_at": comment.created_at.isoformat(),
-                "author_id": user.id,
-                "author_name": user.nickname
-            })
-    else:
-        result = await db.execute(
-            select(func.count(AnnouncementComment.id)).where(
-                AnnouncementComment.announcement_id == announcement.id
-            )
-        )
-        comments_count = result.scalar() or 0
-    
-    # 解析图片
-    images = []
-    if announcement.images:
-        try:
-            images = json.loads(announcement.images)
-        except:
-            images = []
-    
-    return {
-        "id": announcement.id,
-        "content": announcement.content,
-        "images": images,
-        "is_pinned": announcement.is_pinned,
-        "created_at": announcement.created_at.isoformat(),
-        "author_id": author.id if author else 0,
-        "author_name": author.nickname if author else "未知用户",
-        "author_avatar_version": author.avatar_version if author else 0,
-        "likes_count": likes_count,
-        "comments_count": comments_count,
-        "is_liked": is_liked,
-        "comments": comments
-    }
+    return items[0]
 
 
 # ==================== API ====================
@@ -164,7 +100,8 @@ async def create_announcement(
     if len(data.content) > ContentLimits.ANNOUNCEMENT_MAX_LENGTH:
         raise HTTPException(status_code=400, detail=f"公告内容不能超过{ContentLimits.ANNOUNCEMENT_MAX_LENGTH}字")
     
-    images_json = json.dumps(data.images, ensure_ascii=False) if data.images else None
+    # Base64 图片转存为文件，只保存 URL
+    images_json = json.dumps([externalize(img) for img in data.images], ensure_ascii=False) if data.images else None
     
     announcement = Announcement(
         family_id=family_id,
@@ -190,10 +127,16 @@ async def list_announcements(
     page: int = 1,
     page_size: int = 20,
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    comments_limit: int = Query(FEED_COMMENTS_LIMIT, ge=0, le=20, description="每条公告附带的最近评论数"),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取公告列表（支持时间范围筛选，默认最近一个月）"""
+    """获取公告列表（支持时间范围筛选，默认最近一个月）
+
+    传入上一页返回的 next_cursor 时按游标翻页（忽略 page，total 为空），
+    否则按 page 分页。
+    """
     family_id = await get_user_family_id(current_user.id, db)
     
     # 时间范围筛选
@@ -204,38 +147,33 @@ async def list_announcements(
     if start_time:
         base_conditions.append(Announcement.created_at >= start_time)
     
-    # 获取总数
-    count_query = select(func.count(Announcement.id)).where(*base_conditions)
-    result = await db.execute(count_query)
-    total = result.scalar() or 0
-    
-    # 获取公告列表（置顶优先，然后按时间倒序）
-    offset = (page - 1) * page_size
-    result = await db.execute(
-        select(Announcement)
-        .where(*base_conditions)
-        .order_by(desc(Announcement.is_pinned), desc(Announcement.created_at))
-        .offset(offset)
-        .limit(page_size)
-    )
-    announcements = result.scalars().all()
-    
-    items = []
-    for a in announcements:
-        items.append(await build_announcement_response(db, a, current_user.id, include_comments=False))
+    # 置顶优先，然后按时间倒序；作者、点赞状态、最近评论批量查询
+    try:
+        result = await list_announcement_feed(
+            db,
+            base_conditions,
+            current_user.id,
+            page_size=page_size,
+            cursor=cursor,
+            page=page,
+            comments_limit=comments_limit,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
     
     return {
-        "total": total,
+        "total": result["total"],
         "page": page,
         "page_size": page_size,
-        "items": items
+        "items": result["items"],
+        "next_cursor": result["next_cursor"]
     }
 
 
 @router.get("/{announcement_id}", response_model=dict)
 async def get_announcement_detail(
     announcement_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取公告详情"""
@@ -282,7 +220,7 @@ async def update_announcement(
     if data.content is not None:
         announcement.content = data.content.strip()
     if data.images is not None:
-        announcement.images = json.dumps(data.images, ensure_ascii=False)
+        announcement.images = json.dumps([externalize(img) for img in data.images], ensure_ascii=False)
     if data.is_pinned is not None:
         announcement.is_pinned = data.is_pinned
     
@@ -361,11 +299,13 @@ async def toggle_like(
     if existing_like:
         # 取消点赞
         await db.delete(existing_like)
+        await adjust_counters(db, announcement_id, likes=-1)
         await db.commit()
         return {
             "success": True,
             "action": "unliked",
-            "message": "已取消点赞"
+            "message": "已取消点赞",
+            "likes_count": announcement.like_count
         }
     else:
         # 点赞
@@ -374,18 +314,20 @@ async def toggle_like(
             user_id=current_user.id
         )
         db.add(like)
+        await adjust_counters(db, announcement_id, likes=1)
         await db.commit()
         return {
             "success": True,
             "action": "liked",
-            "message": "点赞成功"
+            "message": "点赞成功",
+            "likes_count": announcement.like_count
         }
 
 
 @router.get("/{announcement_id}/comments", response_model=list)
 async def get_comments(
     announcement_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取评论列表"""
@@ -403,26 +345,8 @@ async def get_comments(
     if not announcement:
         raise HTTPException(status_code=404, detail="公告不存在")
     
-    # 获取评论
-    result = await db.execute(
-        select(AnnouncementComment, User)
-        .join(User, AnnouncementComment.user_id == User.id)
-        .where(AnnouncementComment.announcement_id == announcement_id)
-        .order_by(AnnouncementComment.created_at.asc())
-    )
-    comment_rows = result.fetchall()
-    
-    comments = []
-    for comment, user in comment_rows:
-        comments.append({
-            "id": comment.id,
-            "content": comment.content,
-            "created_at": comment.created_at.isoformat(),
-            "author_id": user.id,
-            "author_name": user.nickname
-        })
-    
-    return comments
+    feed = await build_feed(db, [announcement], current_user.id, comments_limit=None)
+    return feed[0]["comments"]
 
 
 @router.post("/{announcement_id}/comments", response_model=dict)
@@ -459,19 +383,15 @@ async def add_comment(
     )
     
     db.add(comment)
+    await adjust_counters(db, announcement_id, comments=1)
     await db.commit()
     await db.refresh(comment)
     
     return {
         "success": True,
         "message": "评论成功",
-        "comment": {
-            "id": comment.id,
-            "content": comment.content,
-            "created_at": comment.created_at.isoformat(),
-            "author_id": current_user.id,
-            "author_name": current_user.nickname
-        }
+        "comment": comment_dict(comment, current_user.nickname),
+        "comments_count": announcement.comment_count
     }
 
 
@@ -500,6 +420,7 @@ async def delete_comment(
         raise HTTPException(status_code=403, detail="只能删除自己的评论")
     
     await db.delete(comment)
+    await adjust_counters(db, announcement_id, comments=-1)
     await db.commit()
     
     return {
@@ -510,7 +431,7 @@ async def delete_comment(
 
 @router.get("/stats/summary", response_model=dict)
 async def get_announcement_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取公告统计（用于成就系统）"""
@@ -538,14 +459,12 @@ async def get_announcement_stats(
     
     # 用户收到的点赞数
     result = await db.execute(
-        select(func.count(AnnouncementLike.id))
-        .join(Announcement, AnnouncementLike.announcement_id == Announcement.id)
-        .where(
+        select(func.sum(Announcement.like_count)).where(
             Announcement.user_id == current_user.id,
             Announcement.family_id == family_id
         )
     )
-    total_likes_received = result.scalar() or 0
+    total_likes_received = int(result.scalar() or 0)
     
     return {
         "total_announcements": total_announcements,
@@ -4,6 +4,7 @@
 import json
 import logging
 import traceback
+from datetime import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel
@@ -14,8 +15,7 @@ from app.core.database import get_db
 from app.core.limiter import limiter
 from app.models.models import (
     ApprovalRequest, ApprovalRecord, ApprovalRequestType, ApprovalRequestStatus,
-    FamilyMember, User, Investment, Family, ExpenseRequest, ExpenseStatus,
-    Transaction
+    FamilyMember, User, Investment, Family, ExpenseRequest, ExpenseStatus
 )
 from app.schemas.approval import (
     ApprovalRequestResponse, ApprovalRecordCreate, ApprovalRequestListResponse,
@@ -28,21 +28,21 @@ from app.schemas.approval import (
 )
 from app.schemas.common import TimeRange, get_time_range_filter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.services.approval import ApprovalService
+from app.services.balance import get_balance
 from app.services.notification import NotificationType, send_approval_notification, send_approval_notification_if_needed
 
 router = APIRouter()
 
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户的家庭ID"""
-    result = await db.execute(
-        select(FamilyMember).where(FamilyMember.user_id == user_id)
-    )
-    membership = result.scalar_one_or_none()
-    if not membership:
+    """获取用户的家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=404, detail="您还没有加入任何家庭")
-    return membership.family_id
+    return principal.family_id
 
 
 # ==================== 资金注入申请 ====================
@@ -73,10 +73,10 @@ async def create_deposit_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
     
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -162,10 +162,10 @@ async def create_asset_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
     
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -235,10 +235,10 @@ async def create_expense_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
     
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -293,10 +293,10 @@ async def create_investment_create_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
     
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -350,10 +350,10 @@ async def create_investment_update_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
         
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -410,10 +410,10 @@ async def create_investment_income_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
         
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -460,14 +460,7 @@ async def create_investment_increase_approval(
     
     # 只有从自由资金扣除时才需要验证余额
     if data.deduct_from_cash:
-        result = await db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
+        current_balance = await get_balance(db, family_id)
         
         if current_balance < amount_cny:
             raise HTTPException(
@@ -498,10 +491,10 @@ async def create_investment_increase_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
         
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -598,10 +591,10 @@ async def create_investment_decrease_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
         
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -643,10 +636,10 @@ async def create_investment_delete_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
         
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -685,8 +678,6 @@ async def approve_request(
         )
         requester = result.scalar_one()
         
-        await db.commit()
-        
         # 发送通知
         if request.status == ApprovalRequestStatus.APPROVED and pre_status == ApprovalRequestStatus.PENDING:
             # 申请已完成（全员同意）
@@ -694,6 +685,8 @@ async def approve_request(
         else:
             # 有人投了同意票
             await send_approval_notification(db, NotificationType.APPROVAL_APPROVED, request, approver=current_user)
+
+        await db.commit()
         
         return await service.get_request_response(request, requester.nickname, requester.avatar_version or 0)
     except ValueError as e:
@@ -727,10 +720,10 @@ async def reject_request(
         )
         requester = result.scalar_one()
         
-        await db.commit()
-        
         # 发送拒绝通知
         await send_approval_notification(db, NotificationType.APPROVAL_REJECTED, request, approver=current_user)
+
+        await db.commit()
         
         return await service.get_request_response(request, requester.nickname, requester.avatar_version or 0)
     except ValueError as e:
@@ -748,10 +741,10 @@ async def cancel_request(
         service = ApprovalService(db)
         request = await service.cancel_request(request_id, current_user.id)
         
-        await db.commit()
-        
         # 发送取消通知
         await send_approval_notification(db, NotificationType.APPROVAL_CANCELLED, request)
+
+        await db.commit()
         
         return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
     except ValueError as e:
@@ -812,6 +805,7 @@ async def remind_approval(
     try:
         service = NotificationService(db)
         await service.notify_approval_reminder(request, family, requester, current_user)
+        request.reminded_at = datetime.utcnow()
         return ReminderResponse(success=True, message="催促通知已发送")
     except Exception as e:
         return ReminderResponse(success=False, message=f"发送失败: {str(e)}")
@@ -824,7 +818,7 @@ async def list_approval_requests(
     request_type: Optional[ApprovalRequestType] = Query(None, description="申请类型"),
     status: Optional[ApprovalRequestStatus] = Query(None, description="申请状态"),
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取申请列表（支持时间范围筛选，默认最近一个月）"""
@@ -922,7 +916,7 @@ async def list_approval_requests(
 
 @router.get("/pending", response_model=List[ApprovalRequestResponse])
 async def list_pending_approvals(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取待我审批的申请"""
@@ -986,7 +980,7 @@ async def list_pending_approvals(
 @router.get("/{request_id}", response_model=ApprovalRequestResponse)
 async def get_approval_request(
     request_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取申请详情"""
@@ -1069,10 +1063,10 @@ async def create_member_join_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
     
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
@@ -1148,10 +1142,10 @@ async def create_member_remove_approval(
         }
     )
     
-    await db.commit()
-    
     # 发送通知
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
         
     return await service.get_request_response(request, current_user.nickname, current_user.avatar_version or 0)
 
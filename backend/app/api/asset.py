@@ -12,6 +12,8 @@ from sqlalchemy import select, and_, func
 from app.core.database import get_db
 from app.models.models import Asset, AssetType, CurrencyType, FamilyMember, User
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.services.asset_helper import get_cash_balance, get_asset_summary, get_user_assets
 from app.services.exchange_rate import exchange_rate_service
 from app.services.image_parser import image_parser_service
@@ -30,19 +32,16 @@ class AssetInfoUpdate(BaseModel):
 
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户的家庭ID"""
-    result = await db.execute(
-        select(FamilyMember).where(FamilyMember.user_id == user_id)
-    )
-    member = result.scalar_one_or_none()
-    if not member:
+    """获取用户的家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=404, detail="您还没有加入家庭")
-    return member.family_id
+    return principal.family_id
 
 
 @router.get("/cash-balance")
 async def get_cash_balance_api(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -59,7 +58,7 @@ async def get_cash_balance_api(
 
 @router.get("/summary")
 async def get_summary(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -75,7 +74,7 @@ async def list_assets(
     asset_type: Optional[AssetType] = None,
     currency: Optional[CurrencyType] = None,
     user_id: Optional[int] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -135,7 +134,7 @@ async def list_assets(
 @router.get("/exchange-rate/{currency}")
 async def get_exchange_rate(
     currency: CurrencyType,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     获取实时汇率（外币 → CNY）
@@ -236,7 +235,7 @@ async def parse_asset_image(
 async def get_my_assets(
     asset_type: str = None,
     currency: str = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -1,10 +1,10 @@
 """
 小金库 (Golden Nest) - 认证路由
 """
-import base64
 import hashlib
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from fastapi.responses import FileResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -22,6 +22,7 @@ from app.core.security import (
 )
 from app.core.limiter import limiter
 from app.models.models import User, FamilyMember
+from app.services.blob_store import store_data_uri, decode_data_uri, is_blob_url, blob_path, blob_digest
 from app.schemas.auth import UserCreate, UserResponse, Token, UserLogin, UserProfileUpdate, PasswordChange
 
 router = APIRouter()
@@ -226,8 +227,14 @@ async def update_avatar(
     if len(avatar) > max_length:
         raise HTTPException(status_code=400, detail="图片过大，请上传小于 2MB 的图片")
     
+    # 图片转存到内容寻址存储，数据库只保存 URL
+    try:
+        avatar_url = store_data_uri(avatar)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的图片格式，请上传 JPG/PNG/GIF 格式的图片")
+    
     # 更新头像和版本号
-    current_user.avatar = avatar
+    current_user.avatar = avatar_url
     current_user.avatar_version = (current_user.avatar_version or 0) + 1
     await db.commit()
     await db.refresh(current_user)
@@ -252,9 +259,9 @@ async def get_user_avatar(
     - 使用 ETag 和 Cache-Control 头优化缓存
     - 无头像时返回 404
     """
-    # 查询用户
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    # 只查询头像列
+    result = await db.execute(select(User.id, User.avatar).where(User.id == user_id))
+    user = result.first()
     
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
@@ -262,30 +269,28 @@ async def get_user_avatar(
     if not user.avatar:
         raise HTTPException(status_code=404, detail="用户未设置头像")
     
+    headers = {'Cache-Control': 'public, max-age=3600'}  # 缓存1小时
+    client_etag = request.headers.get('if-none-match')
+    
+    # 已迁移到文件存储：ETag 即内容哈希，直接返回文件
+    path = blob_path(user.avatar)
+    if path:
+        etag = blob_digest(path)
+        if client_etag and client_etag.strip('"') == etag:
+            return Response(status_code=304, headers={'ETag': f'"{etag}"', **headers})
+        return FileResponse(path, headers={'ETag': f'"{etag}"', **headers})
+    if is_blob_url(user.avatar):
+        raise HTTPException(status_code=404, detail="头像文件不存在")
+    
     try:
-        # 解析 Base64 数据
-        # 格式: data:image/jpeg;base64,/9j/4AAQ...
-        avatar_data = user.avatar
-        
-        # 提取 MIME 类型和 Base64 数据
-        if avatar_data.startswith('data:'):
-            # 分离 header 和 data
-            header, encoded = avatar_data.split(',', 1)
-            # 提取 MIME 类型 (如 image/jpeg)
-            mime_type = header.split(':')[1].split(';')[0]
-        else:
-            # 如果没有 data URI 前缀，假设是纯 Base64 JPEG
-            encoded = avatar_data
-            mime_type = 'image/jpeg'
-        
-        # 解码 Base64
-        image_bytes = base64.b64decode(encoded)
+        # 兼容尚未迁移的 Base64 数据
+        # 格式: data:image/jpeg;base64,/9j/4AAQ...（无前缀时视为纯 Base64 JPEG）
+        image_bytes, mime_type = decode_data_uri(user.avatar)
         
-        # 生成 ETag (基于内容的哈希)
-        etag = hashlib.md5(image_bytes).hexdigest()
+        # 生成 ETag（与文件存储一致，使用内容的 SHA-256）
+        etag = hashlib.sha256(image_bytes).hexdigest()
         
         # 检查客户端缓存 (If-None-Match)
-        client_etag = request.headers.get('if-none-match')
         if client_etag and client_etag.strip('"') == etag:
             return Response(status_code=304)
         
@@ -293,10 +298,7 @@ async def get_user_avatar(
         return Response(
             content=image_bytes,
             media_type=mime_type,
-            headers={
-                'Cache-Control': 'public, max-age=3600',  # 缓存1小时
-                'ETag': f'"{etag}"',
-            }
+            headers={'ETag': f'"{etag}"', **headers}
         )
         
     except Exception as e:
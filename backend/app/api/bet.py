@@ -12,7 +12,7 @@ from sqlalchemy.orm import selectinload
 from app.core.database import get_db
 from app.models.models import (
     Bet, BetParticipant, BetOption, BetStatus,
-    FamilyMember, User, Deposit, Transaction, TransactionType, Family
+    FamilyMember, User, Deposit, TransactionType, Family
 )
 from app.schemas.bet import (
     BetCreate, BetUpdate, BetResponse, BetListResponse,
@@ -21,6 +21,9 @@ from app.schemas.bet import (
 )
 from sqlalchemy import func as sa_func
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
+from app.services.balance import post_transaction
 from app.services.notification import (
     NotificationService, NotificationType, send_bet_notification
 )
@@ -29,14 +32,11 @@ router = APIRouter()
 
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户的家庭ID"""
-    result = await db.execute(
-        select(FamilyMember).where(FamilyMember.user_id == user_id)
-    )
-    membership = result.scalar_one_or_none()
-    if not membership:
+    """获取用户的家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=404, detail="您还没有加入任何家庭")
-    return membership.family_id
+    return principal.family_id
 
 
 async def check_family_admin(user_id: int, family_id: int, db: AsyncSession) -> bool:
@@ -53,21 +53,22 @@ async def check_family_admin(user_id: int, family_id: int, db: AsyncSession) ->
     return result.scalar_one_or_none() is not None
 
 
-async def auto_transition_bet(bet: Bet, participants: List[BetParticipant], db: AsyncSession) -> None:
-    """自动转换赌注状态：截止后自动取消（投票不足）或进入等待结果阶段"""
+def effective_bet_status(bet: Bet, participants: List[BetParticipant]) -> BetStatus:
+    """有效状态：已截止但尚未由后台任务转换的 ACTIVE 赌注，投票不足视为已取消，否则视为等待结果"""
     if bet.status != BetStatus.ACTIVE:
-        return
+        return bet.status
     if not bet.end_date or bet.end_date > datetime.utcnow():
-        return  # 未截止
+        return bet.status  # 未截止
 
     voted_count = sum(1 for p in participants if p.selected_option_id is not None)
-    if voted_count <= 1:
-        # 投票人数不足，自动取消
-        bet.status = BetStatus.CANCELLED
-        await db.commit()
-    else:
-        # 投票人数足够，进入等待结果登记阶段
-        bet.status = BetStatus.AWAITING_RESULT
+    return BetStatus.CANCELLED if voted_count <= 1 else BetStatus.AWAITING_RESULT
+
+
+async def auto_transition_bet(bet: Bet, participants: List[BetParticipant], db: AsyncSession) -> None:
+    """自动转换赌注状态（写操作前调用；定期转换由后台任务 bet_deadlines 完成）"""
+    status = effective_bet_status(bet, participants)
+    if status != bet.status:
+        bet.status = status
         await db.commit()
 
 
@@ -80,7 +81,8 @@ def build_bet_response(bet: Bet, participants: List[BetParticipant], options: Li
     voted_count = sum(1 for p in participants if p.selected_option_id is not None)
 
     # 检查是否可以结算（已过期且状态为active/awaiting_result）
-    can_settle = is_expired and bet.status in (BetStatus.ACTIVE, BetStatus.AWAITING_RESULT)
+    status = effective_bet_status(bet, participants)
+    can_settle = is_expired and status in (BetStatus.ACTIVE, BetStatus.AWAITING_RESULT)
 
     # 构建选项响应
     options_response = [
@@ -122,7 +124,7 @@ def build_bet_response(bet: Bet, participants: List[BetParticipant], options: Li
         creator_id=bet.creator_id,
         title=bet.title,
         description=bet.description,
-        status=bet.status.value,
+        status=status.value,
         start_date=bet.start_date,
         end_date=bet.end_date,
         settlement_date=bet.settlement_date,
@@ -242,7 +244,7 @@ async def list_bets(
     status: str = Query(None, description="状态筛选：pending/active/settled/cancelled"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取家庭赌注列表"""
@@ -320,8 +322,6 @@ async def list_bets(
     for bet in bets:
         participants = participants_by_bet.get(bet.id, [])
         options = options_by_bet.get(bet.id, [])
-        # 自动转换截止的 ACTIVE 赌注
-        await auto_transition_bet(bet, participants, db)
         items.append(build_bet_response(bet, participants, options, users_dict))
 
     return BetListResponse(
@@ -335,7 +335,7 @@ async def list_bets(
 @router.get("/{bet_id}", response_model=BetResponse)
 async def get_bet(
     bet_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取赌注详情"""
@@ -369,9 +369,6 @@ async def get_bet(
     users = users_result.scalars().all()
     users_dict = {u.id: u.nickname for u in users}
 
-    # 自动转换截止的 ACTIVE 赌注
-    await auto_transition_bet(bet, participants, db)
-
     return build_bet_response(bet, participants, options, users_dict)
 
 
@@ -429,7 +426,6 @@ async def vote_bet(
 
     # 更新投票
     participant.selected_option_id = vote_data.option_id
-    await db.commit()
 
     # 发送投票通知
     try:
@@ -440,6 +436,8 @@ async def vote_bet(
     except Exception as e:
         logging.error(f"Failed to send bet vote notification: {e}", exc_info=True)
 
+    await db.commit()
+
     # 重新获取数据返回
     return await get_bet(bet_id, current_user, db)
 
@@ -519,8 +517,6 @@ async def settle_bet(
     # 更新状态为等待确认
     bet.status = BetStatus.RESULT_PENDING
 
-    await db.commit()
-
     # 发送结果登记通知
     try:
         winning_opt = await db.execute(
@@ -536,6 +532,8 @@ async def settle_bet(
     except Exception as e:
         logging.error(f"Failed to send bet result declared notification: {e}", exc_info=True)
 
+    await db.commit()
+
     # 返回更新后的赌注
     return await get_bet(bet_id, current_user, db)
 
@@ -649,49 +647,39 @@ async def approve_bet_result(
                                 deposit_date=datetime.utcnow()
                             ))
 
-                    # 记录资金流水
-                    # 获取当前余额
-                    last_tx_result = await db.execute(
-                        select(Transaction)
-                        .where(Transaction.family_id == bet.family_id)
-                        .order_by(Transaction.created_at.desc())
-                        .limit(1)
-                    )
-                    last_tx = last_tx_result.scalar_one_or_none()
-                    current_balance = last_tx.balance_after if last_tx else 0
-
+                    # 记录资金流水（股份转移不影响活期余额）
                     # 输家流水
                     for loser in losers:
                         if loser.stake_amount > 0:
                             loss_amount = family_total * (loser.stake_amount / 100)
                             loser_name = users_dict.get(loser.user_id, "Unknown")
-                            db.add(Transaction(
+                            await post_transaction(
+                                db,
                                 family_id=bet.family_id,
                                 user_id=loser.user_id,
                                 transaction_type=TransactionType.BET_LOSE,
                                 amount=-loss_amount,
-                                balance_after=current_balance,
+                                balance_delta=0,
                                 description=f"赌注失败扣除：{bet.title}（{loser_name} 负 {loser.stake_amount}% 股份）",
                                 reference_id=bet.id,
                                 reference_type="bet_settle"
-                            ))
+                            )
 
                     # 赢家流水
                     if total_pool > 0 and winners:
                         for winner in winners:
                             winner_name = users_dict.get(winner.user_id, "Unknown")
-                            db.add(Transaction(
+                            await post_transaction(
+                                db,
                                 family_id=bet.family_id,
                                 user_id=winner.user_id,
                                 transaction_type=TransactionType.BET_WIN,
                                 amount=per_winner,
-                                balance_after=current_balance,
+                                balance_delta=0,
                                 description=f"赌注获胜获得：{bet.title}（{winner_name} 获得 ¥{per_winner:,.2f}）",
                                 reference_id=bet.id,
                                 reference_type="bet_settle"
-                            ))
-
-            await db.commit()
+                            )
 
             # 发送结算通知
             try:
@@ -707,6 +695,8 @@ async def approve_bet_result(
                 )
             except Exception as e:
                 logging.error(f"Failed to send bet settled notification: {e}", exc_info=True)
+
+            await db.commit()
     else:
         # 拒绝结果 → 退回给创建者重新登记
         # 重置所有审批状态
@@ -768,7 +758,6 @@ async def close_voting(
         raise HTTPException(status_code=400, detail="尚有参与者未完成投票")
 
     bet.status = BetStatus.AWAITING_RESULT
-    await db.commit()
 
     # 发送截止投票通知
     try:
@@ -780,6 +769,8 @@ async def close_voting(
     except Exception as e:
         logging.error(f"Failed to send close voting notification: {e}", exc_info=True)
 
+    await db.commit()
+
     return await get_bet(bet_id, current_user, db)
 
 
@@ -813,7 +804,6 @@ async def cancel_bet(
 
     # 更新状态
     bet.status = BetStatus.CANCELLED
-    await db.commit()
 
     # 发送取消通知
     try:
@@ -825,13 +815,15 @@ async def cancel_bet(
     except Exception as e:
         logging.error(f"Failed to send bet cancel notification: {e}", exc_info=True)
 
+    await db.commit()
+
     # 返回更新后的赌注
     return await get_bet(bet_id, current_user, db)
 
 
 @router.get("/my-pending/count")
 async def get_my_pending_bet_count(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取当前用户待处理的赌注数量（待投票 + 待确认结果 + 待登记结果）"""
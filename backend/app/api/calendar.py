@@ -3,23 +3,25 @@
 支持多视图、重复事件、模块联动等功能
 """
 from datetime import datetime, timedelta, date
+from itertools import islice
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func, delete
 from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
-from dateutil.relativedelta import relativedelta
 
 from app.core.database import get_db
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.models.models import (
     User, FamilyMember, CalendarEvent, CalendarEventParticipant,
-    CalendarEventCategory, CalendarRepeatType,
-    Investment, TodoItem, TodoList, EquityGift, EquityGiftStatus,
-    FamilyPet
+    CalendarEventCategory, CalendarRepeatType, FamilyPet
 )
 from app.services.achievement import AchievementService
+from app.services.calendar import sync_family_system_events
+from app.services.recurrence import iter_instances
 
 router = APIRouter(prefix="/calendar", tags=["calendar"])
 
@@ -78,14 +80,11 @@ class EventResponse(BaseModel):
 # ==================== Helper ====================
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户所属家庭ID"""
-    result = await db.execute(
-        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-    )
-    family_id = result.scalar_one_or_none()
-    if not family_id:
+    """获取用户所属家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=400, detail="您还没有加入家庭")
-    return family_id
+    return principal.family_id
 
 
 async def get_family_members_map(family_id: int, db: AsyncSession) -> dict:
@@ -111,73 +110,8 @@ def expand_recurring_events(
     end_date: datetime,
     members_map: dict
 ) -> List[dict]:
-    """展开重复事件到指定日期范围"""
-    expanded = []
-    
-    for event in events:
-        # 获取参与者信息
-        participants = []
-        if hasattr(event, 'participants'):
-            for p in event.participants:
-                if p.user_id in members_map:
-                    participants.append(members_map[p.user_id])
-        
-        # 创建者信息
-        creator_name = members_map.get(event.created_by, {}).get("nickname", "未知")
-        
-        base_event = {
-            "id": event.id,
-            "title": event.title,
-            "description": event.description,
-            "category": event.category.value if hasattr(event.category, 'value') else event.category,
-            "is_all_day": event.is_all_day,
-            "repeat_type": event.repeat_type.value if hasattr(event.repeat_type, 'value') else event.repeat_type,
-            "repeat_until": event.repeat_until,
-            "color": event.color,
-            "location": event.location,
-            "is_system": event.is_system,
-            "source_type": event.source_type,
-            "source_id": event.source_id,
-            "created_by": event.created_by,
-            "created_by_name": creator_name,
-            "created_at": event.created_at,
-            "participants": participants
-        }
-        
-        # 非重复事件
-        if event.repeat_type == CalendarRepeatType.NONE:
-            base_event["start_time"] = event.start_time
-            base_event["end_time"] = event.end_time
-            expanded.append(base_event)
-            continue
-        
-        # 重复事件 - 展开到指定日期范围
-        current_start = event.start_time
-        event_duration = (event.end_time - event.start_time) if event.end_time else timedelta(hours=1)
-        repeat_end = event.repeat_until or end_date
-        
-        while current_start <= end_date and current_start <= repeat_end:
-            if current_start >= start_date:
-                instance = base_event.copy()
-                instance["start_time"] = current_start
-                instance["end_time"] = current_start + event_duration if event.end_time else None
-                instance["is_recurring_instance"] = True
-                instance["original_id"] = event.id
-                expanded.append(instance)
-            
-            # 计算下一个重复时间
-            if event.repeat_type == CalendarRepeatType.DAILY:
-                current_start += timedelta(days=1)
-            elif event.repeat_type == CalendarRepeatType.WEEKLY:
-                current_start += timedelta(weeks=1)
-            elif event.repeat_type == CalendarRepeatType.MONTHLY:
-                current_start += relativedelta(months=1)
-            elif event.repeat_type == CalendarRepeatType.YEARLY:
-                current_start += relativedelta(years=1)
-            else:
-                break
-    
-    return expanded
+    """展开重复事件到指定日期范围（按开始时间排序）"""
+    return list(iter_instances(events, start_date, end_date, members_map))
 
 
 # ==================== 事件 CRUD API ====================
@@ -187,7 +121,7 @@ async def get_events(
     start: datetime = Query(..., description="开始日期"),
     end: datetime = Query(..., description="结束日期"),
     category: Optional[str] = Query(None, description="事件分类筛选"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取指定日期范围内的日历事件"""
@@ -214,10 +148,11 @@ async def get_events(
                 CalendarEvent.start_time >= start,
                 CalendarEvent.start_time <= end
             ),
-            # 重复事件开始于范围之前
+            # 重复事件开始于范围之前，且未在范围开始前截止
             and_(
                 CalendarEvent.repeat_type != CalendarRepeatType.NONE,
-                CalendarEvent.start_time <= end
+                CalendarEvent.start_time <= end,
+                or_(CalendarEvent.repeat_until.is_(None), CalendarEvent.repeat_until >= start)
             )
         )
     )
@@ -225,13 +160,8 @@ async def get_events(
     result = await db.execute(query.order_by(CalendarEvent.start_time))
     events = result.scalars().all()
     
-    # 展开重复事件
-    expanded_events = expand_recurring_events(events, start, end, members_map)
-    
-    # 按开始时间排序
-    expanded_events.sort(key=lambda x: x["start_time"])
-    
-    return expanded_events
+    # 展开重复事件（已按开始时间排序）
+    return expand_recurring_events(events, start, end, members_map)
 
 
 @router.post("/events", response_model=dict)
@@ -287,7 +217,7 @@ async def create_event(
     try:
         # 检测成就
         achievement_service = AchievementService(db)
-        new_achievements = await achievement_service.check_and_unlock(current_user.id)
+        new_achievements = await achievement_service.check_and_unlock(current_user.id, events={"calendar"})
         
         # 获取宠物并增加经验
         pet_result = await db.execute(
@@ -443,7 +373,7 @@ async def delete_event(
 async def get_upcoming_events(
     days: int = Query(7, description="未来多少天"),
     limit: int = Query(10, description="最大返回数量"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取即将到来的事件"""
@@ -467,20 +397,18 @@ async def get_upcoming_events(
                     CalendarEvent.start_time <= end_date
                 ),
                 # 重复事件
-                CalendarEvent.repeat_type != CalendarRepeatType.NONE
+                and_(
+                    CalendarEvent.repeat_type != CalendarRepeatType.NONE,
+                    CalendarEvent.start_time <= end_date,
+                    or_(CalendarEvent.repeat_until.is_(None), CalendarEvent.repeat_until >= now)
+                )
             )
         ).order_by(CalendarEvent.start_time)
     )
     events = result.scalars().all()
     
-    # 展开重复事件
-    expanded = expand_recurring_events(events, now, end_date, members_map)
-    
-    # 只返回未来的事件
-    future_events = [e for e in expanded if e["start_time"] >= now]
-    future_events.sort(key=lambda x: x["start_time"])
-    
-    return future_events[:limit]
+    # 按开始时间惰性展开，取到 limit 个即停止
+    return list(islice(iter_instances(events, now, end_date, members_map), limit))
 
 
 # ==================== 模块联动 - 同步系统事件 ====================
@@ -490,130 +418,11 @@ async def sync_system_events(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """同步系统事件（理财到期、待办截止等）"""
+    """同步系统事件（理财到期、待办截止、股权赠与），按集合比对批量新增/更新/删除"""
     family_id = await get_user_family_id(current_user.id, db)
     
-    synced_count = 0
-    
-    # 1. 同步理财产品到期提醒
-    result = await db.execute(
-        select(Investment).where(
-            Investment.family_id == family_id,
-            Investment.is_active == True,
-            Investment.end_date != None
-        )
-    )
-    investments = result.scalars().all()
-    
-    for inv in investments:
-        # 检查是否已存在
-        existing = await db.execute(
-            select(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "investment",
-                CalendarEvent.source_id == inv.id
-            )
-        )
-        if existing.scalar_one_or_none():
-            continue
-        
-        # 创建到期提醒（提前7天）
-        remind_date = inv.end_date - timedelta(days=7)
-        if remind_date > datetime.utcnow():
-            event = CalendarEvent(
-                family_id=family_id,
-                title=f"💰 理财到期提醒：{inv.name}",
-                description=f"理财产品「{inv.name}」将于 {inv.end_date.strftime('%Y-%m-%d')} 到期，本金 ¥{inv.principal:,.2f}",
-                category=CalendarEventCategory.FINANCE,
-                start_time=remind_date,
-                is_all_day=True,
-                repeat_type=CalendarRepeatType.NONE,
-                color="#f59e0b",
-                is_system=True,
-                source_type="investment",
-                source_id=inv.id,
-                created_by=current_user.id
-            )
-            db.add(event)
-            synced_count += 1
-    
-    # 2. 同步待办任务截止提醒
-    result = await db.execute(
-        select(TodoItem).join(TodoList).where(
-            TodoList.family_id == family_id,
-            TodoItem.is_completed == False,
-            TodoItem.due_date != None,
-            TodoItem.due_date >= datetime.utcnow()
-        )
-    )
-    todos = result.scalars().all()
-    
-    for todo in todos:
-        # 检查是否已存在
-        existing = await db.execute(
-            select(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "todo",
-                CalendarEvent.source_id == todo.id
-            )
-        )
-        if existing.scalar_one_or_none():
-            continue
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"📋 待办截止：{todo.title}",
-            description=todo.description,
-            category=CalendarEventCategory.SYSTEM,
-            start_time=todo.due_date,
-            is_all_day=False,
-            repeat_type=CalendarRepeatType.NONE,
-            color="#ef4444",
-            is_system=True,
-            source_type="todo",
-            source_id=todo.id,
-            created_by=current_user.id
-        )
-        db.add(event)
-        synced_count += 1
-    
-    # 3. 同步股权赠与待处理提醒
-    result = await db.execute(
-        select(EquityGift).where(
-            EquityGift.family_id == family_id,
-            EquityGift.status == EquityGiftStatus.PENDING
-        )
-    )
-    gifts = result.scalars().all()
-    
-    for gift in gifts:
-        # 检查是否已存在
-        existing = await db.execute(
-            select(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "gift",
-                CalendarEvent.source_id == gift.id
-            )
-        )
-        if existing.scalar_one_or_none():
-            continue
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"🎁 股权赠与待处理",
-            description=f"您收到一笔股权赠与，赠与比例 {gift.amount * 100:.2f}%",
-            category=CalendarEventCategory.SYSTEM,
-            start_time=gift.created_at,
-            is_all_day=True,
-            repeat_type=CalendarRepeatType.NONE,
-            color="#8b5cf6",
-            is_system=True,
-            source_type="gift",
-            source_id=gift.id,
-            created_by=current_user.id
-        )
-        db.add(event)
-        synced_count += 1
+    stats = await sync_family_system_events(db, family_id, current_user.id)
+    synced_count = stats["created"]
     
     # ========== 成就检测和宠物经验增长 ==========
     if synced_count > 0:
@@ -648,8 +457,10 @@ async def sync_system_events(
     
     return {
         "success": True,
-        "message": f"同步完成，新增 {synced_count} 个系统事件",
-        "synced_count": synced_count
+        "message": f"同步完成，新增 {synced_count} 个、更新 {stats['updated']} 个、移除 {stats['deleted']} 个系统事件",
+        "synced_count": synced_count,
+        "updated_count": stats["updated"],
+        "deleted_count": stats["deleted"]
     }
 
 
@@ -671,7 +482,7 @@ async def get_categories():
 
 @router.get("/members", response_model=List[dict])
 async def get_family_members(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取家庭成员列表（用于选择参与者）"""
@@ -16,6 +16,8 @@ from app.models.models import Deposit, FamilyMember, User, Transaction, Transact
 from app.schemas.deposit import DepositCreate, DepositResponse
 from app.schemas.common import TimeRange, get_time_range_filter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.services.equity import calculate_weighted_amount
 from app.services.achievement import AchievementService
 
@@ -23,14 +25,11 @@ router = APIRouter()
 
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户的家庭ID"""
-    result = await db.execute(
-        select(FamilyMember).where(FamilyMember.user_id == user_id)
-    )
-    membership = result.scalar_one_or_none()
-    if not membership:
+    """获取用户的家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=404, detail="您还没有加入任何家庭")
-    return membership.family_id
+    return principal.family_id
 
 
 # ==================== 查询接口 ====================
@@ -39,7 +38,7 @@ async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
 @router.get("/list", response_model=List[DepositResponse])
 async def list_deposits(
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取家庭所有存款记录（支持时间范围筛选，默认最近一个月）"""
@@ -77,7 +76,7 @@ async def list_deposits(
 @router.get("/my", response_model=List[DepositResponse])
 async def list_my_deposits(
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取我的存款记录（支持时间范围筛选，默认最近一个月）"""
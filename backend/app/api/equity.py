@@ -9,6 +9,8 @@ from app.core.database import get_db
 from app.models.models import FamilyMember, User
 from app.schemas.equity import EquitySummary
 from app.api.auth import get_current_user
+from app.core.principal import Principal
+from app.core.security import get_current_principal
 from app.services.equity import calculate_family_equity
 
 router = APIRouter()
@@ -16,7 +18,7 @@ router = APIRouter()
 
 @router.get("/summary", response_model=EquitySummary)
 async def get_equity_summary(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取股权汇总信息"""
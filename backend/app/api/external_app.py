@@ -16,6 +16,8 @@ from app.core.config import BASE_DIR
 from app.core.database import get_db
 from app.models.models import User, FamilyMember, ExternalApp
 from app.api.auth import get_current_user
+from app.core.principal import Principal
+from app.core.security import get_current_principal
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -104,7 +106,7 @@ def _app_to_dict(app: ExternalApp) -> dict:
 
 @router.get("/")
 async def list_active_apps(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """获取所有激活的应用列表（所有登录用户可访问），按 sort_order 排序"""
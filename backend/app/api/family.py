@@ -17,7 +17,10 @@ from app.schemas.family import (
     NotificationConfigResponse, NotificationConfigUpdate, NotificationTestRequest
 )
 from app.api.auth import get_current_user
+from app.core.principal import Principal
+from app.core.security import get_current_principal
 from app.services.achievement import AchievementService
+from app.services.notification import invalidate_family_notification_config
 
 router = APIRouter()
 
@@ -155,11 +158,11 @@ async def join_family(
         }
     )
     
-    await db.commit()
-    
     # 发送通知给已有成员
     from app.services.notification import send_approval_notification_if_needed, NotificationType
     await send_approval_notification_if_needed(db, NotificationType.APPROVAL_CREATED, request)
+
+    await db.commit()
     
     # 检查申请是否已经自动通过（单人家庭的情况）
     if request.status == ApprovalRequestStatus.APPROVED:
@@ -178,7 +181,7 @@ async def join_family(
 
 @router.get("/my", response_model=FamilyResponse)
 async def get_my_family(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取我的家庭信息"""
@@ -304,7 +307,7 @@ def mask_webhook_url(url: str) -> str:
 
 @router.get("/notification/config", response_model=NotificationConfigResponse)
 async def get_notification_config(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取通知配置"""
@@ -394,6 +397,7 @@ async def update_notification_config(
             family.external_base_url = None
     
     await db.commit()
+    invalidate_family_notification_config(family.id)
     
     # 解密 webhook URL 用于返回（如果存在）
     decrypted_webhook = None
@@ -521,5 +525,6 @@ async def delete_webhook(
     family.wechat_webhook_url = None
     
     await db.commit()
+    invalidate_family_notification_config(family.id)
     
     return {"success": True, "message": "Webhook 配置已删除"}
@@ -10,6 +10,8 @@ from sqlalchemy import select, or_, and_, func
 
 from app.core.database import get_db
 from app.api.auth import get_current_user
+from app.core.principal import Principal
+from app.core.security import get_current_principal
 from app.models.models import User, FamilyMember, EquityGift, EquityGiftStatus, Deposit
 from app.schemas.gift import (
     GiftCreate,
@@ -171,14 +173,14 @@ async def send_gift(
     except Exception as e:
         logging.warning(f"Calendar reminder creation failed after gift send: {e}")
     
-    await db.commit()
-    
     # 发送企业微信通知：通知接收者有新的股权赠送
     try:
         await send_gift_notification(db, NotificationType.GIFT_SENT, new_gift)
         logging.info(f"Gift notification sent for gift {new_gift.id}")
     except Exception as e:
         logging.warning(f"Gift notification failed after gift send: {e}")
+
+    await db.commit()
     
     return await build_gift_response(db, new_gift)
 
@@ -187,7 +189,7 @@ async def send_gift(
 async def list_gifts(
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """获取我的赠与列表（发送和接收的，支持时间范围筛选，默认最近一个月）"""
     # 时间范围筛选
@@ -322,9 +324,6 @@ async def respond_to_gift(
     except Exception as e:
         logging.warning(f"Calendar event update failed after gift response: {e}")
     
-    await db.commit()
-    await db.refresh(gift)
-    
     # 发送企业微信通知：通知发送者赠送被接受或拒绝
     try:
         notification_type = NotificationType.GIFT_ACCEPTED if response_data.accept else NotificationType.GIFT_REJECTED
@@ -332,6 +331,9 @@ async def respond_to_gift(
         logging.info(f"Gift response notification sent for gift {gift.id}, accepted={response_data.accept}")
     except Exception as e:
         logging.warning(f"Gift response notification failed: {e}")
+
+    await db.commit()
+    await db.refresh(gift)
     
     return await build_gift_response(db, gift)
 
@@ -387,7 +389,7 @@ async def cancel_gift(
 @router.get("/stats", response_model=GiftStats)
 async def get_gift_stats(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """获取赠与统计"""
     # 发送统计
@@ -435,7 +437,7 @@ async def get_gift_stats(
 @router.get("/pending-count")
 async def get_pending_count(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """获取待处理的赠与数量（用于显示红点提示）"""
     result = await db.execute(
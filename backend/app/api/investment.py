@@ -19,19 +19,18 @@ from app.schemas.investment import (
 )
 from app.schemas.common import TimeRange, get_time_range_filter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 
 router = APIRouter()
 
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户的家庭ID"""
-    result = await db.execute(
-        select(FamilyMember).where(FamilyMember.user_id == user_id)
-    )
-    membership = result.scalar_one_or_none()
-    if not membership:
+    """获取用户的家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=404, detail="您还没有加入任何家庭")
-    return membership.family_id
+    return principal.family_id
 
 
 @router.post("/create")
@@ -56,7 +55,7 @@ async def create_investment(
 async def list_investments(
     time_range: TimeRange = Query(TimeRange.ALL, description="时间范围：day/week/month/year/all"),
     include_deleted: bool = Query(False, description="是否包含已删除的投资"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取理财列表（支持时间范围筛选，默认全部）"""
@@ -307,7 +306,7 @@ async def add_investment_income(
 
 @router.get("/summary", response_model=InvestmentSummary)
 async def get_investment_summary(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取理财汇总"""
@@ -509,7 +508,7 @@ async def get_investment_summary(
 @router.get("/{investment_id}/history")
 async def get_investment_history(
     investment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取投资的操作历史"""
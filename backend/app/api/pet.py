@@ -13,6 +13,7 @@ from typing import Optional
 import json
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from pydantic import BaseModel
@@ -20,7 +21,10 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.schemas.common import TimeRange, get_time_range_filter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.models.models import User, FamilyMember, FamilyPet, PetExpLog
+from app.services.game_sessions import game_sessions, session_timeout
 
 # ---- 游戏模块导入 ----
 from app.games.memory import (
@@ -290,14 +294,11 @@ class PetResponse(BaseModel):
 # ==================== Helper ====================
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户所属家庭ID"""
-    result = await db.execute(
-        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-    )
-    family_id = result.scalar_one_or_none()
-    if not family_id:
+    """获取用户所属家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=400, detail="您还没有加入家庭")
-    return family_id
+    return principal.family_id
 
 
 async def get_or_create_pet(db: AsyncSession, family_id: int) -> FamilyPet:
@@ -325,7 +326,7 @@ async def get_or_create_pet(db: AsyncSession, family_id: int) -> FamilyPet:
     return pet
 
 
-def build_pet_response(pet: FamilyPet, user: User = None) -> dict:
+def build_pet_response(pet: FamilyPet, user: User = None, active_games: set = frozenset()) -> dict:
     """构建宠物响应（含心情衰减、喂食/游戏状态、里程碑）"""
     pet_config = PET_EVOLUTION.get(pet.pet_type, PET_EVOLUTION["golden_egg"])
     exp_to_next = get_level_exp(pet.level)
@@ -410,7 +411,7 @@ def build_pet_response(pet: FamilyPet, user: User = None) -> dict:
     game_status = {}
     for game_type, cfg in GAME_CONFIG.items():
         used = game_counts.get(game_type, 0)
-        has_active = get_active_session(pet, game_type) is not None
+        has_active = game_type in active_games
         game_status[game_type] = {
             "name": cfg["name"],
             "icon": cfg["icon"],
@@ -465,7 +466,7 @@ def build_pet_response(pet: FamilyPet, user: User = None) -> dict:
         "total_games_used": total_games_used,
         "available_milestones": available_milestones,
         "created_at": pet.created_at.isoformat() if pet.created_at else None,
-        "game_records": get_game_sessions(pet).get("_records", {}),
+        "game_records": get_game_records(pet),
     }
 
 
@@ -598,48 +599,68 @@ async def add_exp(db: AsyncSession, pet: FamilyPet, exp_amount: int, source: str
 
 # ==================== 游戏会话管理 ====================
 
-def get_game_sessions(pet: FamilyPet) -> dict:
-    """获取所有游戏会话"""
+def get_game_records(pet: FamilyPet) -> dict:
+    """获取家庭游戏记录（如无尽模式最高层数）"""
     if pet.game_sessions:
         try:
-            return json.loads(pet.game_sessions)
-        except (json.JSONDecodeError, TypeError):
+            return json.loads(pet.game_sessions).get("_records", {})
+        except (json.JSONDecodeError, TypeError, AttributeError):
             pass
     return {}
 
 
-def get_active_session(pet: FamilyPet, game_type: str) -> dict | None:
-    """获取指定游戏的活跃会话（基于最后活跃时间超时）"""
-    sessions = get_game_sessions(pet)
-    session = sessions.get(game_type)
-    if not session:
+def save_game_records(pet: FamilyPet, records: dict):
+    """保存家庭游戏记录"""
+    try:
+        data = json.loads(pet.game_sessions) if pet.game_sessions else {}
+    except (json.JSONDecodeError, TypeError):
+        data = {}
+    data["_records"] = records
+    pet.game_sessions = json.dumps(data, ensure_ascii=False)
+
+
+def _take_legacy_session(pet: FamilyPet, game_type: str) -> dict | None:
+    """取出旧版存放在 family_pets.game_sessions 中的会话（迁移到会话表后从 JSON 中删除）"""
+    if not pet.game_sessions or f'"{game_type}"' not in pet.game_sessions:
         return None
-    # 优先使用 last_active_at，兼容旧会话回退到 started_at
-    ts = session.get("last_active_at") or session.get("started_at")
-    if not ts:
+    try:
+        sessions = json.loads(pet.game_sessions)
+    except (json.JSONDecodeError, TypeError):
         return None
-    last_active = datetime.fromisoformat(ts)
-    # 冒险模式(尤其是无尽)允许更长的空闲时间
-    timeout = 14400 if game_type == "adventure" else 1800  # 4小时 / 30分钟
-    if (datetime.utcnow() - last_active).total_seconds() > timeout:
-        del sessions[game_type]
-        pet.game_sessions = json.dumps(sessions) if sessions else None
+    session = sessions.pop(game_type, None)
+    pet.game_sessions = json.dumps(sessions, ensure_ascii=False) if sessions else None
+    if not isinstance(session, dict):
+        return None
+    ts = session.get("last_active_at") or session.get("started_at")
+    if not ts or (datetime.utcnow() - datetime.fromisoformat(ts)).total_seconds() > session_timeout(game_type):
         return None
     return session
 
 
-def save_game_session(pet: FamilyPet, game_type: str, session: dict):
-    """保存游戏会话"""
-    sessions = get_game_sessions(pet)
-    sessions[game_type] = _strip_surrogates(session)
-    pet.game_sessions = json.dumps(sessions, ensure_ascii=False)
-
-
-def clear_game_session(pet: FamilyPet, game_type: str):
-    """清除游戏会话"""
-    sessions = get_game_sessions(pet)
-    sessions.pop(game_type, None)
-    pet.game_sessions = json.dumps(sessions) if sessions else None
+async def get_active_games(db: AsyncSession, pet: FamilyPet, user_id: int) -> set:
+    """当前成员有活跃会话的游戏类型（含尚未迁移的旧版会话）"""
+    active = await game_sessions.active_games(db, pet.family_id, user_id, GAME_CONFIG)
+    if pet.game_sessions:
+        try:
+            legacy = json.loads(pet.game_sessions)
+        except (json.JSONDecodeError, TypeError):
+            legacy = {}
+        for game_type, session in legacy.items():
+            if game_type in GAME_CONFIG and isinstance(session, dict):
+                ts = session.get("last_active_at") or session.get("started_at")
+                if ts and (datetime.utcnow() - datetime.fromisoformat(ts)).total_seconds() <= session_timeout(game_type):
+                    active.add(game_type)
+    return active
+
+
+async def get_active_session(db: AsyncSession, pet: FamilyPet, user_id: int, game_type: str) -> dict | None:
+    """获取当前成员指定游戏的活跃会话（基于最后活跃时间超时）"""
+    session = await game_sessions.get(db, pet.family_id, user_id, game_type)
+    if session is None:
+        session = _take_legacy_session(pet, game_type)
+        if session is not None:
+            game_sessions.put(db, pet.family_id, user_id, game_type, session)
+    return session
 
 
 # ==================== 状态脱敏 ====================
@@ -680,7 +701,7 @@ async def get_pet(
     """获取家庭宠物信息"""
     family_id = await get_user_family_id(current_user.id, db)
     pet = await get_or_create_pet(db, family_id)
-    return build_pet_response(pet, current_user)
+    return build_pet_response(pet, current_user, await get_active_games(db, pet, current_user.id))
 
 
 @router.put("", response_model=dict)
@@ -705,7 +726,7 @@ async def update_pet(
         "message": f"宠物已改名为「{data.name}」",
         "old_name": old_name,
         "new_name": data.name,
-        "pet": build_pet_response(pet, current_user)
+        "pet": build_pet_response(pet, current_user, await get_active_games(db, pet, current_user.id))
     }
 
 
@@ -785,7 +806,7 @@ async def daily_checkin(
         "streak_bonus": streak_bonus,
         "total_exp": total_exp,
         **exp_result,
-        "pet": build_pet_response(pet, current_user)
+        "pet": build_pet_response(pet, current_user, await get_active_games(db, pet, current_user.id))
     }
 
 
@@ -853,7 +874,7 @@ async def feed_pet(
         "happiness_after": new_happiness,
         "happiness_gained": new_happiness - old_happiness,
         **exp_result,
-        "pet": build_pet_response(pet, current_user)
+        "pet": build_pet_response(pet, current_user, await get_active_games(db, pet, current_user.id))
     }
 
 
@@ -874,7 +895,7 @@ async def start_game(
     cfg = GAME_CONFIG[data.game_type]
 
     # 检查是否有正在进行的会话（可恢复）
-    existing = get_active_session(pet, data.game_type)
+    existing = await get_active_session(db, pet, current_user.id, data.game_type)
     if existing:
         return {
             "success": True,
@@ -910,7 +931,7 @@ async def start_game(
     else:
         raise HTTPException(status_code=400, detail="无效的游戏类型")
 
-    save_game_session(pet, data.game_type, session)
+    game_sessions.put(db, family_id, current_user.id, data.game_type, session)
     pet.last_interaction_at = datetime.utcnow()
     await db.commit()
 
@@ -936,7 +957,7 @@ async def game_action(
     family_id = await get_user_family_id(current_user.id, db)
     pet = await get_or_create_pet(db, family_id)
 
-    session = get_active_session(pet, data.game_type)
+    session = await get_active_session(db, pet, current_user.id, data.game_type)
     if not session:
         raise HTTPException(status_code=400, detail="没有进行中的游戏会话，请先开始游戏")
 
@@ -970,22 +991,20 @@ async def game_action(
         # 更新游戏记录（例如无尽模式最高层数）
         if data.game_type == "adventure" and session.get("endless"):
             reached_floor = session.get("floor", 1)
-            all_sessions = get_game_sessions(pet)
-            records = all_sessions.get("_records", {})
+            records = get_game_records(pet)
             if reached_floor > records.get("endless_best_floor", 0):
                 records["endless_best_floor"] = reached_floor
-                all_sessions["_records"] = records
-                pet.game_sessions = json.dumps(all_sessions, ensure_ascii=False)
+                save_game_records(pet, records)
 
         # 清除会话
-        clear_game_session(pet, data.game_type)
+        game_sessions.discard(db, family_id, current_user.id, data.game_type)
 
         # 增加心情
         current_happiness = calculate_current_happiness(pet)
         pet.happiness = min(100, current_happiness + 3)
     else:
         session["last_active_at"] = datetime.utcnow().isoformat()
-        save_game_session(pet, data.game_type, session)
+        game_sessions.put(db, family_id, current_user.id, data.game_type, session)
 
     pet.last_interaction_at = datetime.utcnow()
     await db.commit()
@@ -1018,7 +1037,7 @@ async def game_action(
         **exp_result,
     }
     if result.get("completed"):
-        response["pet"] = build_pet_response(pet, current_user)
+        response["pet"] = build_pet_response(pet, current_user, await get_active_games(db, pet, current_user.id))
     return response
 
 
@@ -1089,7 +1108,7 @@ async def claim_milestone(
         "label": label,
         "message": f"恭喜达成里程碑「{label}」！",
         **exp_result,
-        "pet": build_pet_response(pet, current_user)
+        "pet": build_pet_response(pet, current_user, await get_active_games(db, pet, current_user.id))
     }
 
 
@@ -1097,7 +1116,7 @@ async def claim_milestone(
 
 @router.get("/evolution-preview", response_model=dict)
 async def get_evolution_preview(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取所有进化形态预览"""
@@ -1174,7 +1193,7 @@ async def get_exp_logs(
     limit: int = 50,
     offset: int = 0,
     time_range: TimeRange = Query(TimeRange.DAY, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取宠物经验获取记录（支持时间范围筛选，默认最近一天）"""
@@ -1271,24 +1290,16 @@ class PetChatResponse(BaseModel):
     action: Optional[str] = None  # 宠物动作描述
 
 
-@router.post("/chat", response_model=PetChatResponse)
-async def chat_with_pet(
-    request: PetChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
+async def _build_pet_chat_request(request: PetChatRequest, current_user: User, db: AsyncSession):
     """
-    与宠物对话 - AI 赋予宠物独特的个性和语言风格
-    宠物会根据当前状态、进化阶段、心情等做出不同反应
-    宠物根据对话内容自主判断是否需要查询主人的财务数据
+    构建宠物人格并按需查询数据，返回 (ai_service 调用参数, 宠物, 形态配置)
     """
     from app.services.ai_service import ai_service
     from app.services.ai_tools import build_tool_selection_prompt, execute_tools, TOOL_LIST_TEXT
-    
-    if not ai_service.is_configured:
-        raise HTTPException(status_code=503, detail="AI 服务暂未配置")
-    
+    from app.services.ai_governor import set_ai_call_owner
+
     family_id = await get_user_family_id(current_user.id, db)
+    set_ai_call_owner(f"family:{family_id}")
     pet = await get_or_create_pet(db, family_id)
     
     # 获取宠物当前状态
@@ -1382,47 +1393,126 @@ async def chat_with_pet(
 """
     
     user_prompt = f"用户对你说：{request.message}\n\n请以宠物的身份回复。"
-    
-    try:
-        result_json = await ai_service.chat_json(
-            user_prompt=user_prompt,
-            system_prompt=system_prompt,
-            history=history,
-            function_key="pet_chat",
-            prompt_vars={
-                "pet_name": pet.name,
-                "pet_config_name": pet_config['name'],
-                "pet_emoji": pet_config['emoji'],
-                "level": str(pet.level),
-                "total_exp": str(pet.total_exp),
-                "age_days": str(pet_age_days),
-                "mood": mood,
-                "happiness": str(current_happiness),
-                "checkin_streak": str(checkin_streak),
-                "personality_text": _get_pet_personality(pet.pet_type, pet.level),
-                "nickname": current_user.nickname,
-                "data_section": data_section,
-            },
-            temperature=0.9
-        )
-        
-        if not result_json:
-            return PetChatResponse(
-                reply=f"咕咕~ 我是{pet.name}，很高兴和你聊天！{pet_config['emoji']}",
-                emotion="happy"
-            )
-        
+
+    chat_kwargs = dict(
+        user_prompt=user_prompt,
+        system_prompt=system_prompt,
+        history=history,
+        function_key="pet_chat",
+        prompt_vars={
+            "pet_name": pet.name,
+            "pet_config_name": pet_config['name'],
+            "pet_emoji": pet_config['emoji'],
+            "level": str(pet.level),
+            "total_exp": str(pet.total_exp),
+            "age_days": str(pet_age_days),
+            "mood": mood,
+            "happiness": str(current_happiness),
+            "checkin_streak": str(checkin_streak),
+            "personality_text": _get_pet_personality(pet.pet_type, pet.level),
+            "nickname": current_user.nickname,
+            "data_section": data_section,
+        },
+        temperature=0.9
+    )
+    return chat_kwargs, pet, pet_config
+
+
+def _pet_chat_response(result_json: Optional[dict], pet: FamilyPet, pet_config: dict) -> PetChatResponse:
+    """由模型输出的 JSON 构建宠物回复"""
+    if not result_json:
         return PetChatResponse(
-            reply=result_json.get("reply", "咕咕~"),
-            emotion=result_json.get("emotion", "neutral"),
-            action=result_json.get("action")
+            reply=f"咕咕~ 我是{pet.name}，很高兴和你聊天！{pet_config['emoji']}",
+            emotion="happy"
         )
+    
+    return PetChatResponse(
+        reply=result_json.get("reply", "咕咕~"),
+        emotion=result_json.get("emotion", "neutral"),
+        action=result_json.get("action")
+    )
+
+
+def _pet_tired_response(pet_config: dict) -> PetChatResponse:
+    return PetChatResponse(
+        reply=f"{pet_config['emoji']} 我有点累了，待会再聊好吗？",
+        emotion="neutral"
+    )
+
+
+@router.post("/chat", response_model=PetChatResponse)
+async def chat_with_pet(
+    request: PetChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    与宠物对话 - AI 赋予宠物独特的个性和语言风格
+    宠物会根据当前状态、进化阶段、心情等做出不同反应
+    宠物根据对话内容自主判断是否需要查询主人的财务数据
+    """
+    from app.services.ai_service import ai_service
+    
+    if not ai_service.is_configured:
+        raise HTTPException(status_code=503, detail="AI 服务暂未配置")
+    
+    chat_kwargs, pet, pet_config = await _build_pet_chat_request(request, current_user, db)
+    
+    try:
+        result_json = await ai_service.chat_json(**chat_kwargs)
+        return _pet_chat_response(result_json, pet, pet_config)
     except Exception as e:
         logger.error(f"Pet chat AI error: {e}", exc_info=True)
-        return PetChatResponse(
-            reply=f"{pet_config['emoji']} 我有点累了，待会再聊好吗？",
-            emotion="neutral"
-        )
+        return _pet_tired_response(pet_config)
+
+
+@router.post("/chat/stream")
+async def chat_with_pet_stream(
+    request: PetChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    与宠物对话（SSE 流式）
+
+    模型仍按 JSON 格式输出，reply 字段的内容边生成边推送。事件：
+    - meta: {function_key, function_name, model, source}
+    - delta: {text} 回复的增量文本
+    - done: {reply, emotion, action, ttfb_ms, total_ms} 最终回复（以此为准）
+    """
+    from app.services.ai_service import ai_service, format_sse, JSONFieldStreamer, SSE_HEADERS
+    
+    if not ai_service.is_configured:
+        raise HTTPException(status_code=503, detail="AI 服务暂未配置")
+    
+    chat_kwargs, pet, pet_config = await _build_pet_chat_request(request, current_user, db)
+    
+    try:
+        stream = await ai_service.chat_stream(**chat_kwargs)
+    except Exception as e:
+        logger.error(f"Pet chat AI error: {e}", exc_info=True)
+        stream = None
+
+    async def events():
+        if stream is None:
+            yield format_sse("done", _pet_tired_response(pet_config).model_dump())
+            return
+        yield format_sse("meta", stream.metadata)
+        reply = JSONFieldStreamer("reply")
+        try:
+            async for chunk in stream:
+                text = reply.feed(chunk)
+                if text:
+                    yield format_sse("delta", {"text": text})
+            final = _pet_chat_response(ai_service.extract_json(stream.text), pet, pet_config)
+        except Exception as e:
+            logger.error(f"Pet chat AI stream error: {e}", exc_info=True)
+            final = _pet_tired_response(pet_config)
+        finally:
+            await stream.aclose()
+        yield format_sse("done", {**final.model_dump(), "ttfb_ms": stream.ttfb_ms, "total_ms": stream.total_ms})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 def _get_pet_personality(pet_type: str, level: int) -> str:
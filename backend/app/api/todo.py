@@ -8,18 +8,21 @@ import json
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, Integer
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
 from app.core.database import get_db
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.models.models import (
     User, FamilyMember, TodoList, TodoItem,
     TodoPriority, TodoRepeatType
 )
 from app.services.calendar import calendar_service
 from app.services.achievement import AchievementService
+from app.services.todo import get_todo_stats
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/todo", tags=["todo"])
@@ -95,14 +98,11 @@ class TodoItemResponse(BaseModel):
 # ==================== Helper ====================
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户所属家庭ID"""
-    result = await db.execute(
-        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-    )
-    family_id = result.scalar_one_or_none()
-    if not family_id:
+    """获取用户所属家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=400, detail="您还没有加入家庭")
-    return family_id
+    return principal.family_id
 
 
 async def verify_list_access(list_id: int, family_id: int, db: AsyncSession) -> TodoList:
@@ -123,46 +123,32 @@ async def verify_list_access(list_id: int, family_id: int, db: AsyncSession) ->
 
 @router.get("/lists", response_model=List[TodoListResponse])
 async def get_lists(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取家庭所有清单"""
+    """获取家庭所有清单（任务计数取自清单上的计数列）"""
     family_id = await get_user_family_id(current_user.id, db)
     
-    # 获取清单列表及统计
     result = await db.execute(
         select(TodoList)
         .where(TodoList.family_id == family_id)
         .order_by(TodoList.sort_order, TodoList.created_at)
     )
-    lists = result.scalars().all()
     
-    response = []
-    for lst in lists:
-        # 统计任务数量
-        result = await db.execute(
-            select(
-                func.count(TodoItem.id),
-                func.sum(func.cast(TodoItem.is_completed, Integer))
-            ).where(TodoItem.list_id == lst.id)
-        )
-        counts = result.one()
-        item_count = counts[0] or 0
-        completed_count = int(counts[1] or 0)
-        
-        response.append(TodoListResponse(
+    return [
+        TodoListResponse(
             id=lst.id,
             name=lst.name,
             icon=lst.icon,
             color=lst.color,
             sort_order=lst.sort_order,
-            item_count=item_count,
-            completed_count=completed_count,
+            item_count=lst.item_count or 0,
+            completed_count=lst.completed_count or 0,
             created_by=lst.created_by,
             created_at=lst.created_at
-        ))
-    
-    return response
+        )
+        for lst in result.scalars().all()
+    ]
 
 
 @router.post("/lists", response_model=dict)
@@ -248,7 +234,7 @@ async def delete_list(
 async def get_items(
     list_id: int,
     show_completed: bool = True,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取清单中的任务"""
@@ -513,7 +499,7 @@ async def complete_item(
     try:
         # 检测成就
         achievement_service = AchievementService(db)
-        new_achievements = await achievement_service.check_and_unlock(current_user.id)
+        new_achievements = await achievement_service.check_and_unlock(current_user.id, events={"todo"})
         
         # 获取宠物并增加经验
         from app.models.models import FamilyPet
@@ -637,78 +623,19 @@ async def delete_item(
 
 @router.get("/stats", response_model=dict)
 async def get_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取任务统计"""
+    """获取任务统计（一次条件聚合查询，按家庭缓存，任务写入后失效）"""
     family_id = await get_user_family_id(current_user.id, db)
-    
-    # 家庭总任务统计
-    result = await db.execute(
-        select(
-            func.count(TodoItem.id),
-            func.sum(func.cast(TodoItem.is_completed, Integer))
-        )
-        .join(TodoList)
-        .where(TodoList.family_id == family_id)
-    )
-    counts = result.one()
-    total_tasks = counts[0] or 0
-    completed_tasks = int(counts[1] or 0)
-    
-    # 当前用户完成的任务数
-    result = await db.execute(
-        select(func.count(TodoItem.id))
-        .join(TodoList)
-        .where(
-            TodoList.family_id == family_id,
-            TodoItem.completed_by == current_user.id
-        )
-    )
-    my_completed = result.scalar() or 0
-    
-    # 指派给当前用户的未完成任务
-    result = await db.execute(
-        select(func.count(TodoItem.id))
-        .join(TodoList)
-        .where(
-            TodoList.family_id == family_id,
-            TodoItem.assignee_id == current_user.id,
-            TodoItem.is_completed == False
-        )
-    )
-    my_pending = result.scalar() or 0
-    
-    # 今日截止任务
-    today = datetime.utcnow().replace(hour=23, minute=59, second=59)
-    result = await db.execute(
-        select(func.count(TodoItem.id))
-        .join(TodoList)
-        .where(
-            TodoList.family_id == family_id,
-            TodoItem.is_completed == False,
-            TodoItem.due_date != None,
-            func.datetime(TodoItem.due_date) <= today
-        )
-    )
-    due_today = result.scalar() or 0
-    
-    return {
-        "total_tasks": total_tasks,
-        "completed_tasks": completed_tasks,
-        "pending_tasks": total_tasks - completed_tasks,
-        "my_completed": my_completed,
-        "my_pending": my_pending,
-        "due_today": due_today,
-        "completion_rate": round(completed_tasks / total_tasks * 100, 1) if total_tasks > 0 else 0
-    }
+    return await get_todo_stats(db, family_id, current_user.id)
 
 
 # ==================== 家庭成员列表 ====================
 
 @router.get("/members", response_model=List[dict])
 async def get_family_members(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取家庭成员列表（用于任务指派）"""
@@ -13,6 +13,9 @@ from app.models.models import Transaction, TransactionType, FamilyMember, User,
 from app.schemas.transaction import TransactionResponse, TransactionSummary, DividendCalculation, MemberDividend
 from app.schemas.common import TimeRange, get_time_range_filter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
+from app.services.balance import get_balance
 from app.services.equity import calculate_family_equity
 from app.services.ai_service import ai_service
 
@@ -40,20 +43,17 @@ class TransactionCategorizationResponse(BaseModel):
 
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户的家庭ID"""
-    result = await db.execute(
-        select(FamilyMember).where(FamilyMember.user_id == user_id)
-    )
-    membership = result.scalar_one_or_none()
-    if not membership:
+    """获取用户的家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=404, detail="您还没有加入任何家庭")
-    return membership.family_id
+    return principal.family_id
 
 
 @router.get("/list", response_model=List[TransactionResponse])
 async def list_transactions(
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取交易流水列表（支持时间范围筛选，默认最近一个月）"""
@@ -68,7 +68,7 @@ async def list_transactions(
         query = query.where(Transaction.created_at >= start_time)
     
     result = await db.execute(
-        query.order_by(Transaction.created_at.desc())
+        query.order_by(Transaction.created_at.desc(), Transaction.id.desc())
     )
     transactions = result.scalars().all()
     
@@ -100,7 +100,7 @@ async def list_transactions(
 
 @router.get("/summary", response_model=TransactionSummary)
 async def get_transaction_summary(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取交易汇总"""
@@ -124,14 +124,7 @@ async def get_transaction_summary(
     transaction_count = row[3] or 0
     
     # 获取当前余额
-    result = await db.execute(
-        select(Transaction)
-        .where(Transaction.family_id == family_id)
-        .order_by(Transaction.created_at.desc())
-        .limit(1)
-    )
-    last_transaction = result.scalar_one_or_none()
-    current_balance = last_transaction.balance_after if last_transaction else 0
+    current_balance = await get_balance(db, family_id)
     
     return TransactionSummary(
         family_id=family_id,
@@ -145,7 +138,7 @@ async def get_transaction_summary(
 
 @router.get("/dividend", response_model=DividendCalculation)
 async def calculate_dividend(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """计算分红"""
@@ -236,7 +229,7 @@ async def analyze_transactions_with_ai(
     if start_time:
         query = query.where(Transaction.created_at >= start_time)
     
-    result = await db.execute(query.order_by(Transaction.created_at.desc()))
+    result = await db.execute(query.order_by(Transaction.created_at.desc(), Transaction.id.desc()))
     transactions = result.scalars().all()
     
     if not transactions:
@@ -358,7 +351,8 @@ async def categorize_transaction_with_ai(
                 "description": request.description,
                 "amount": f"{request.amount:,.2f}",
             },
-            temperature=0.3
+            temperature=0.3,
+            cache=True,
         )
         
         if not result_json:
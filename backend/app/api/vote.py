@@ -7,16 +7,20 @@ import json
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, and_, or_
 from pydantic import BaseModel
 
 from app.core.database import get_db
 from app.core.limiter import limiter
 from app.api.auth import get_current_user
+from app.core.principal import Principal, load_principal
+from app.core.security import get_current_principal
 from app.models.models import (
     User, FamilyMember, Family, Proposal, Vote, ProposalStatus,
-    Dividend, DividendType, DividendStatus, Transaction, TransactionType
+    Dividend, DividendType, DividendStatus, TransactionType
 )
+from app.services.balance import post_transaction
+from app.services.proposal import effective_status, load_tallies, refresh_tally, voted_count
 from app.schemas.common import TimeRange, get_time_range_filter
 
 router = APIRouter(prefix="/vote", tags=["vote"])
@@ -62,14 +66,11 @@ class VoteResponse(BaseModel):
 # ==================== Helper ====================
 
 async def get_user_family_id(user_id: int, db: AsyncSession) -> int:
-    """获取用户所属家庭ID"""
-    result = await db.execute(
-        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-    )
-    family_id = result.scalar_one_or_none()
-    if not family_id:
+    """获取用户所属家庭ID（经主体缓存，命中时不访问数据库）"""
+    principal = await load_principal(db, user_id)
+    if not principal or not principal.family_id:
         raise HTTPException(status_code=400, detail="您还没有加入家庭")
-    return family_id
+    return principal.family_id
 
 
 async def get_user_equity(db: AsyncSession, user_id: int, family_id: int) -> float:
@@ -96,7 +97,7 @@ async def get_user_equity(db: AsyncSession, user_id: int, family_id: int) -> flo
 
 
 async def check_proposal_result(db: AsyncSession, proposal: Proposal, family_id: int):
-    """检查提案结果 - 全员同意才通过"""
+    """检查提案结果 - 全员同意才通过（同时刷新该提案的投票统计缓存）"""
     # 获取家庭成员数
     result = await db.execute(
         select(func.count(FamilyMember.id)).where(FamilyMember.family_id == family_id)
@@ -104,23 +105,14 @@ async def check_proposal_result(db: AsyncSession, proposal: Proposal, family_id:
     total_members = result.scalar() or 0
     
     # 获取已投票数
-    result = await db.execute(
-        select(func.count(Vote.id)).where(Vote.proposal_id == proposal.id)
-    )
-    voted_count = result.scalar() or 0
+    tally = await refresh_tally(db, proposal)
+    voted = voted_count(tally)
     
     # 如果所有人都投票了
-    if voted_count >= total_members:
-        # 检查是否全员选择同一选项（第一个选项通常是"同意"）
-        result = await db.execute(
-            select(Vote.option_index, func.count(Vote.id))
-            .where(Vote.proposal_id == proposal.id)
-            .group_by(Vote.option_index)
-        )
-        vote_counts = {row[0]: row[1] for row in result.fetchall()}
-        
-        # 全员同意（选项0）才通过
-        if vote_counts.get(0, 0) == total_members:
+    if voted >= total_members:
+        # 全员同意（选项0，第一个选项通常是"同意"）才通过
+        agreed = tally[0].count if 0 in tally else 0
+        if agreed == total_members:
             proposal.status = ProposalStatus.PASSED
             proposal.closed_at = datetime.utcnow()
             
@@ -193,55 +185,33 @@ async def handle_dividend_rejection(db: AsyncSession, proposal: Proposal):
 
 async def freeze_dividend_amount(db: AsyncSession, dividend: Dividend) -> None:
     """冻结分红金额"""
-    # 获取当前余额
-    result = await db.execute(
-        select(Transaction)
-        .where(Transaction.family_id == dividend.family_id)
-        .order_by(Transaction.created_at.desc())
-        .limit(1)
-    )
-    last_transaction = result.scalar_one_or_none()
-    current_balance = last_transaction.balance_after if last_transaction else 0
-    
     # 创建冻结交易记录
-    freeze_transaction = Transaction(
+    await post_transaction(
+        db,
         family_id=dividend.family_id,
         user_id=None,
         transaction_type=TransactionType.FREEZE,
         amount=-dividend.total_amount,  # 负数表示扣除
-        balance_after=current_balance - dividend.total_amount,
         description=f"冻结分红资金：{dividend.total_amount:.2f}元",
         reference_id=dividend.id,
         reference_type="dividend"
     )
-    db.add(freeze_transaction)
     logging.info(f"💰 Frozen {dividend.total_amount} for dividend {dividend.id}")
 
 
 async def unfreeze_dividend_amount(db: AsyncSession, dividend: Dividend) -> None:
     """解冻分红金额（投票未通过时）"""
-    # 获取当前余额
-    result = await db.execute(
-        select(Transaction)
-        .where(Transaction.family_id == dividend.family_id)
-        .order_by(Transaction.created_at.desc())
-        .limit(1)
-    )
-    last_transaction = result.scalar_one_or_none()
-    current_balance = last_transaction.balance_after if last_transaction else 0
-    
     # 创建解冻交易记录
-    unfreeze_transaction = Transaction(
+    await post_transaction(
+        db,
         family_id=dividend.family_id,
         user_id=None,
         transaction_type=TransactionType.UNFREEZE,
         amount=dividend.total_amount,  # 正数表示归还
-        balance_after=current_balance + dividend.total_amount,
         description=f"解冻分红资金（投票未通过）：{dividend.total_amount:.2f}元",
         reference_id=dividend.id,
         reference_type="dividend"
     )
-    db.add(unfreeze_transaction)
     logging.info(f"💰 Unfrozen {dividend.total_amount} for dividend {dividend.id}")
 
 
@@ -310,8 +280,7 @@ async def create_proposal(
     )
     
     db.add(proposal)
-    await db.commit()
-    await db.refresh(proposal)
+    await db.flush()
     
     # 发送新提案创建通知
     from app.services.notification import NotificationService
@@ -329,6 +298,9 @@ async def create_proposal(
             logging.info(f"✅ Proposal {proposal.id} notification sent successfully")
         except Exception as e:
             logging.error(f"❌ Failed to send proposal notification: {e}", exc_info=True)
+
+    await db.commit()
+    await db.refresh(proposal)
     
     return {
         "success": True,
@@ -341,17 +313,23 @@ async def create_proposal(
 async def list_proposals(
     status: Optional[str] = None,
     time_range: TimeRange = Query(TimeRange.MONTH, description="时间范围：day/week/month/year/all"),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取提案列表（支持时间范围筛选，默认最近一个月）"""
+    """获取提案列表（支持时间范围筛选，默认最近一个月；查询次数与提案数量无关）"""
     family_id = await get_user_family_id(current_user.id, db)
-    
-    # 先检查过期提案
-    await check_expired_proposals(db, family_id)
+    now = datetime.utcnow()
     
     query = select(Proposal).where(Proposal.family_id == family_id)
-    if status:
+    # 过期提案由后台任务持久化，这里按截止时间计算有效状态
+    if status == ProposalStatus.VOTING.value:
+        query = query.where(Proposal.status == ProposalStatus.VOTING, Proposal.deadline >= now)
+    elif status == ProposalStatus.EXPIRED.value:
+        query = query.where(or_(
+            Proposal.status == ProposalStatus.EXPIRED,
+            and_(Proposal.status == ProposalStatus.VOTING, Proposal.deadline < now)
+        ))
+    elif status:
         query = query.where(Proposal.status == status)
     
     # 时间范围筛选
@@ -363,6 +341,8 @@ async def list_proposals(
     
     result = await db.execute(query)
     proposals = result.scalars().all()
+    if not proposals:
+        return []
     
     # 获取家庭成员数
     result = await db.execute(
@@ -370,43 +350,36 @@ async def list_proposals(
     )
     total_members = result.scalar() or 0
     
+    # 批量获取创建者信息
+    result = await db.execute(
+        select(User.id, User.nickname, User.avatar_version)
+        .where(User.id.in_({p.creator_id for p in proposals}))
+    )
+    creators = {row.id: row for row in result.all()}
+    
+    # 批量获取投票统计（经缓存）与当前用户的投票
+    tallies = await load_tallies(db, proposals)
+    result = await db.execute(
+        select(Vote.proposal_id, Vote.option_index).where(
+            Vote.proposal_id.in_([p.id for p in proposals]),
+            Vote.user_id == current_user.id
+        )
+    )
+    my_votes = dict(result.all())
+    
     response = []
     for p in proposals:
-        # 获取创建者信息
-        result = await db.execute(select(User).where(User.id == p.creator_id))
-        creator = result.scalar_one_or_none()
-        
-        # 获取投票统计
-        result = await db.execute(
-            select(func.count(Vote.id)).where(Vote.proposal_id == p.id)
-        )
-        voted_count = result.scalar() or 0
-        
-        # 获取当前用户的投票
-        result = await db.execute(
-            select(Vote.option_index).where(
-                Vote.proposal_id == p.id,
-                Vote.user_id == current_user.id
-            )
-        )
-        my_vote = result.scalar_one_or_none()
-        
-        # 获取每个选项的投票统计（用于已完成提案显示结果）
-        result = await db.execute(
-            select(Vote.option_index, func.count(Vote.id), func.sum(Vote.weight))
-            .where(Vote.proposal_id == p.id)
-            .group_by(Vote.option_index)
-        )
-        vote_stats = {row[0]: {"count": row[1], "weight": row[2] or 0} for row in result.fetchall()}
+        creator = creators.get(p.creator_id)
+        tally = tallies.get(p.id, {})
         
         options = json.loads(p.options)
         votes_summary = []
         for i, opt in enumerate(options):
-            stat = vote_stats.get(i, {"count": 0, "weight": 0})
+            stat = tally.get(i)
             votes_summary.append({
                 "option": opt,
-                "count": stat["count"],
-                "weight_percent": round(stat["weight"] * 100, 1) if stat["weight"] else 0
+                "count": stat.count if stat else 0,
+                "weight_percent": round(stat.weight * 100, 1) if stat and stat.weight else 0
             })
         
         response.append({
@@ -414,15 +387,15 @@ async def list_proposals(
             "title": p.title,
             "description": p.description,
             "options": options,
-            "status": p.status.value if hasattr(p.status, 'value') else p.status,
+            "status": effective_status(p, now).value,
             "deadline": p.deadline.isoformat(),
             "created_at": p.created_at.isoformat(),
             "creator_id": creator.id if creator else None,
             "creator_name": creator.nickname if creator else "未知",
             "creator_avatar_version": creator.avatar_version or 0 if creator else 0,
             "total_members": total_members,
-            "voted_count": voted_count,
-            "my_vote": my_vote,
+            "voted_count": voted_count(tally),
+            "my_vote": my_votes.get(p.id),
             "votes_summary": votes_summary
         })
     
@@ -432,7 +405,7 @@ async def list_proposals(
 @router.get("/proposals/{proposal_id}", response_model=dict)
 async def get_proposal_detail(
     proposal_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取提案详情"""
@@ -491,7 +464,7 @@ async def get_proposal_detail(
         "title": proposal.title,
         "description": proposal.description,
         "options": options,
-        "status": proposal.status.value if hasattr(proposal.status, 'value') else proposal.status,
+        "status": effective_status(proposal).value,
         "deadline": proposal.deadline.isoformat(),
         "created_at": proposal.created_at.isoformat(),
         "closed_at": proposal.closed_at.isoformat() if proposal.closed_at else None,
@@ -596,28 +569,9 @@ async def cast_vote(
     )
 
 
-async def check_expired_proposals(db: AsyncSession, family_id: int):
-    """检查并更新过期提案"""
-    result = await db.execute(
-        select(Proposal).where(
-            Proposal.family_id == family_id,
-            Proposal.status == ProposalStatus.VOTING,
-            Proposal.deadline < datetime.utcnow()
-        )
-    )
-    expired = result.scalars().all()
-    
-    for p in expired:
-        p.status = ProposalStatus.EXPIRED
-        p.closed_at = datetime.utcnow()
-    
-    if expired:
-        await db.commit()
-
-
 @router.get("/stats", response_model=dict)
 async def get_vote_stats(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取投票统计（用于成就系统）"""
@@ -662,7 +616,7 @@ async def get_vote_stats(
 
 @router.get("/pending-count", response_model=dict)
 async def get_pending_count(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取待投票提案数量（用于显示红点）"""
@@ -702,7 +656,7 @@ async def get_pending_count(
 
 @router.get("/dividend-pool", response_model=dict)
 async def get_dividend_pool(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """获取可用于分红的资金池（只支持自由资金分红）"""
@@ -780,8 +734,7 @@ async def create_dividend_proposal(
     # 冻结分红金额
     await freeze_dividend_amount(db, dividend)
     
-    await db.commit()
-    await db.refresh(proposal)
+    await db.flush()
     
     # 发送分红提案创建通知
     from app.services.notification import NotificationService
@@ -799,6 +752,9 @@ async def create_dividend_proposal(
             logging.info(f"✅ Dividend proposal {proposal.id} notification sent successfully")
         except Exception as e:
             logging.error(f"❌ Failed to send dividend proposal notification: {e}", exc_info=True)
+
+    await db.commit()
+    await db.refresh(proposal)
     
     return {
         "success": True,
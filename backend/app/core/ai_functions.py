@@ -36,6 +36,7 @@ class AIFunctionDef:
     alternative_models: List[str] = field(default_factory=list)  # 备选模型列表
     input_variables: List[AIFunctionInputVar] = field(default_factory=list)  # 模板变量定义
     output_format: str = "text"     # 输出格式: text, json, structured_json
+    priority: str = "interactive"   # 调度优先级: interactive（用户等待结果）/ background（批量、自动处理）
 
 
 # ==================== AI 功能注册表 ====================
@@ -100,6 +101,22 @@ _register(
             AIFunctionInputVar(name="amount", label="消费金额", required=False),
         ],
         output_format="text",
+        priority="background",
+    ),
+    AIFunctionDef(
+        key="batch_category",
+        name="批量分类",
+        description="批量导入时将多条消费记录合并为一次调用推断分类",
+        capability="text_json",
+        group="accounting",
+        default_model="qwen-flash",
+        alternative_models=["qwen-turbo", "qwen-plus"],
+        input_variables=[
+            AIFunctionInputVar(name="count", label="记录条数", type="int"),
+            AIFunctionInputVar(name="entries", label="编号记录列表", type="text"),
+        ],
+        output_format="json",
+        priority="background",
     ),
     AIFunctionDef(
         key="duplicate_detection",
@@ -118,6 +135,7 @@ _register(
             AIFunctionInputVar(name="existing_category", label="已有记录分类"),
         ],
         output_format="json",
+        priority="background",
     ),
     AIFunctionDef(
         key="import_parse",
@@ -268,6 +286,7 @@ _register(
             AIFunctionInputVar(name="amount", label="交易金额"),
         ],
         output_format="json",
+        priority="background",
     ),
 )
 
@@ -388,6 +407,7 @@ def get_function_registry_for_api() -> List[dict]:
                 for v in func.input_variables
             ],
             "output_format": func.output_format,
+            "priority": func.priority,
         })
     # 按分组 order 排序
     group_order = {k: v["order"] for k, v in AI_FUNCTION_GROUPS.items()}
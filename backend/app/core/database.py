@@ -63,6 +63,13 @@ async def init_db():
         await conn.run_sync(Base.metadata.create_all)
         # 2. 自动添加缺失的列到已有表
         await conn.run_sync(_auto_migrate_columns)
+        # 3. 清理重复的系统日历事件（唯一索引建立前）
+        await conn.run_sync(_dedupe_calendar_system_events)
+        # 4. 自动补建已有表上缺失的索引
+        await conn.run_sync(_auto_migrate_indexes)
+        # 5. 校正冗余计数（新增计数列后回填，或修复不一致）
+        await conn.run_sync(_recount_todo_lists)
+        await conn.run_sync(_recount_announcements)
 
 
 def _auto_migrate_columns(connection):
@@ -100,3 +107,109 @@ def _auto_migrate_columns(connection):
             stmt = f'ALTER TABLE "{table_name}" ADD COLUMN "{column.name}" {col_type} {nullable} {default}'
             connection.execute(text(stmt.strip()))
             print(f"[auto-migrate] ALTER TABLE {table_name} ADD COLUMN {column.name} {col_type}")
+
+
+def _dedupe_calendar_system_events(connection):
+    """唯一索引 (family_id, source_type, source_id) 建立前，删除重复的系统事件（保留最早的一条）。
+    旧版本的同步与钩子逐条检查后插入，并发时可能产生重复；索引已存在时直接跳过。"""
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(connection)
+    if not inspector.has_table("calendar_events"):
+        return
+    if "ix_calendar_events_family_source" in {idx["name"] for idx in inspector.get_indexes("calendar_events")}:
+        return
+
+    duplicates = """
+        SELECT id FROM calendar_events
+        WHERE source_type IS NOT NULL AND source_id IS NOT NULL
+          AND id NOT IN (
+            SELECT MIN(id) FROM calendar_events
+            WHERE source_type IS NOT NULL AND source_id IS NOT NULL
+            GROUP BY family_id, source_type, source_id
+          )
+    """
+    connection.execute(text(f"DELETE FROM calendar_event_participants WHERE event_id IN ({duplicates})"))
+    removed = connection.execute(text(f"DELETE FROM calendar_events WHERE id IN ({duplicates})")).rowcount
+    if removed:
+        print(f"[auto-migrate] 删除重复的系统日历事件 {removed} 条")
+
+
+# 已被更宽的复合索引覆盖、需要从已有库中删除的旧索引：表名 -> 索引名
+_SUPERSEDED_INDEXES = {
+    "accounting_entries": ["ix_accounting_entries_family_date"],  # 由 ix_accounting_entries_family_keyset 覆盖
+}
+
+
+def _auto_migrate_indexes(connection):
+    """比对 ORM 模型声明的索引与实际表结构，自动 CREATE INDEX 缺失的索引。
+    create_all 只会为新表建索引，已有表上新增的（复合）索引由此补建；
+    除 _SUPERSEDED_INDEXES 中列出的旧索引外，不会删除或修改已有索引。"""
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(connection)
+    for table_name, table in Base.metadata.tables.items():
+        if not inspector.has_table(table_name):
+            continue
+
+        existing_indexes = {idx["name"] for idx in inspector.get_indexes(table_name)}
+
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+
+            index.create(connection, checkfirst=True)
+            cols = ", ".join(col.name for col in index.columns)
+            print(f"[auto-migrate] CREATE INDEX {index.name} ON {table_name} ({cols})")
+
+        for name in _SUPERSEDED_INDEXES.get(table_name, ()):
+            if name in existing_indexes:
+                connection.execute(text(f'DROP INDEX "{name}"'))
+                print(f"[auto-migrate] DROP INDEX {name} ON {table_name}")
+
+
+def _recount(connection, table: str, counters: dict) -> int:
+    """按子表重算冗余计数列，只更新不一致的行，返回校正的行数。
+    counters: 计数列 -> 计算实际值的标量子查询 SQL"""
+    from sqlalchemy import inspect, text
+
+    if not inspect(connection).has_table(table):
+        return 0
+    assignments = ", ".join(f"{col} = {actual}" for col, actual in counters.items())
+    mismatch = " OR ".join(f"{col} IS NOT {actual}" for col, actual in counters.items())
+    return connection.execute(text(f"UPDATE {table} SET {assignments} WHERE {mismatch}")).rowcount
+
+
+# todo_lists 冗余计数列 -> 实际值
+TODO_LIST_COUNTERS = {
+    "item_count": "(SELECT COUNT(*) FROM todo_items WHERE todo_items.list_id = todo_lists.id)",
+    "completed_count": (
+        "(SELECT COUNT(*) FROM todo_items WHERE todo_items.list_id = todo_lists.id AND todo_items.is_completed = 1)"
+    ),
+}
+
+
+def _recount_todo_lists(connection):
+    """按 todo_items 重算 todo_lists.item_count / completed_count。
+    计数由 app.services.todo 在写入时增量维护，此处用于加列后的回填与异常修复。"""
+    fixed = _recount(connection, "todo_lists", TODO_LIST_COUNTERS)
+    if fixed:
+        print(f"[auto-migrate] 校正清单任务计数 {fixed} 个")
+
+
+# announcements 冗余计数列 -> 实际值
+ANNOUNCEMENT_COUNTERS = {
+    "like_count": (
+        "(SELECT COUNT(*) FROM announcement_likes WHERE announcement_likes.announcement_id = announcements.id)"
+    ),
+    "comment_count": (
+        "(SELECT COUNT(*) FROM announcement_comments WHERE announcement_comments.announcement_id = announcements.id)"
+    ),
+}
+
+
+def _recount_announcements(connection):
+    """按点赞/评论表重算 announcements.like_count / comment_count（加列后的回填与异常修复）。"""
+    fixed = _recount(connection, "announcements", ANNOUNCEMENT_COUNTERS)
+    if fixed:
+        print(f"[auto-migrate] 校正公告点赞/评论计数 {fixed} 条")
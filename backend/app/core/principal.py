@@ -0,0 +1,124 @@
+"""
+小金库 (Golden Nest) - 登录主体缓存
+
+按用户ID缓存鉴权后常用的轻量信息 (id, nickname, family_id, role, avatar_version)，
+命中时鉴权与家庭解析不访问数据库。
+
+- 过期：PRINCIPAL_CACHE_TTL 秒后重新加载（多进程部署下的最长不一致时间）
+- 失效：User 的昵称/头像版本、FamilyMember 的新增/删除/变更在事务提交后
+  由 after_commit 事件清除对应用户的缓存；也可调用 invalidate_principal 手动清除
+"""
+import time
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import User, FamilyMember
+
+# 缓存有效期（秒）
+PRINCIPAL_CACHE_TTL = 60
+# 缓存上限，超出时淘汰最早写入的条目
+PRINCIPAL_CACHE_MAX_SIZE = 10000
+
+# 影响主体信息的 User 字段
+_USER_FIELDS = ("nickname", "avatar_version")
+_SESSION_KEY = "principal_invalidations"
+
+
+class Principal(NamedTuple):
+    """已鉴权用户的轻量信息（字段名与 User 一致，可替代只读取 id/nickname 的 current_user）"""
+    id: int
+    nickname: str
+    family_id: Optional[int]
+    role: Optional[str]
+    avatar_version: int
+
+
+# user_id -> (过期时间, Principal)
+_principal_cache: Dict[int, Tuple[float, Principal]] = {}
+
+
+def invalidate_principal(user_id: Optional[int] = None) -> None:
+    """清除指定用户（None 表示全部）的缓存"""
+    if user_id is None:
+        _principal_cache.clear()
+    else:
+        _principal_cache.pop(user_id, None)
+
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """
+    获取用户主体信息，未命中时一次查询加载用户及其家庭成员关系
+
+    Args:
+        db: 数据库会话（命中缓存时不使用）
+        user_id: 用户ID
+
+    Returns:
+        Principal，用户不存在时返回 None
+    """
+    now = time.monotonic()
+    cached = _principal_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    result = await db.execute(
+        select(User.id, User.nickname, FamilyMember.family_id, FamilyMember.role, User.avatar_version)
+        .outerjoin(FamilyMember, FamilyMember.user_id == User.id)
+        .where(User.id == user_id)
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        _principal_cache.pop(user_id, None)
+        return None
+
+    principal = Principal(row[0], row[1], row[2], row[3], row[4] or 0)
+    if len(_principal_cache) >= PRINCIPAL_CACHE_MAX_SIZE:
+        _principal_cache.pop(next(iter(_principal_cache)), None)
+    _principal_cache[user_id] = (now + PRINCIPAL_CACHE_TTL, principal)
+    return principal
+
+
+# ==================== 自动失效（after_flush / after_commit） ====================
+
+def _changed_user_ids(session: Session) -> Set[int]:
+    user_ids: Set[int] = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, FamilyMember):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, User) and obj.id is not None:
+            user_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, FamilyMember):
+            state = inspect(obj)
+            history = state.attrs.user_id.history
+            user_ids.update(uid for uid in (*history.added, *history.deleted) if uid is not None)
+            if state.attrs.family_id.history.has_changes() or state.attrs.role.history.has_changes():
+                user_ids.add(obj.user_id)
+        elif isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[f].history.has_changes() for f in _USER_FIELDS):
+                user_ids.add(obj.id)
+    return user_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session: Session, flush_context) -> None:
+    """记录本事务中主体信息发生变化的用户，提交后再清除缓存"""
+    user_ids = _changed_user_ids(session)
+    if user_ids:
+        session.info.setdefault(_SESSION_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session: Session) -> None:
+    for user_id in session.info.pop(_SESSION_KEY, ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_changes(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
@@ -12,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.principal import Principal, load_principal
 from app.models.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -53,29 +54,52 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """获取当前登录用户"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _token_user_id(token: str) -> int:
+    """从 JWT 中解析用户ID，无效时抛出 401"""
     payload = decode_access_token(token)
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
     user_id_str = payload.get("sub")
     if user_id_str is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
     try:
-        user_id = int(user_id_str)
+        return int(user_id_str)
     except (ValueError, TypeError):
-        raise credentials_exception
+        raise _credentials_exception()
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """获取当前登录用户的轻量信息（带缓存，命中时不访问数据库）
+
+    只读取 id/nickname/family_id/role 的接口使用此依赖；
+    需要修改用户本身的接口仍使用 get_current_user。
+    """
+    principal = await load_principal(db, _token_user_id(token))
+    if principal is None:
+        raise _credentials_exception()
+    return principal
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """获取当前登录用户"""
+    credentials_exception = _credentials_exception()
+    user_id = _token_user_id(token)
 
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
@@ -6,7 +6,8 @@
 import re as _re
 import random
 from datetime import datetime
-from collections import Counter
+from collections import Counter, OrderedDict
+from functools import lru_cache
 from fastapi import HTTPException
 
 
@@ -557,6 +558,16 @@ for _sid, _sdef in ITEM_SETS.items():
         for _iid in _sdef["items"]:
             _SET_BADGE[_iid] = _b
 
+# ---- 套装反向索引 (导入时构建一次): 物品 → 所属套装, 合体物品 → major套 ----
+_SETS_BY_ITEM: dict[str, tuple] = {}
+_MAJOR_SET_BY_MERGED: dict[str, str] = {}
+_SET_ORDER = {_sid: _i for _i, _sid in enumerate(ITEM_SETS)}
+for _sid, _sdef in ITEM_SETS.items():
+    for _iid in _sdef["items"]:
+        _SETS_BY_ITEM[_iid] = _SETS_BY_ITEM.get(_iid, ()) + (_sid,)
+    if _sdef.get("major"):
+        _MAJOR_SET_BY_MERGED[_sid.replace("_set", "_set_merged")] = _sid
+
 # ---- 附魔词缀池 ----
 ENCHANT_AFFIXES = [
     {"name": "锋利", "icon": "⚔️", "stat": "atk", "range": (2, 5)},
@@ -578,6 +589,11 @@ BP_BONUS_ZONES = {
     (7, 8): [(0, 7), (6, 7), (0, 0), (6, 0), (3, 3), (3, 4), (0, 3), (6, 3)],  # 7×8: 四角+中心2格+上下中点
     (8, 9): [(0, 8), (7, 8), (0, 0), (7, 0), (3, 4), (4, 4), (0, 4), (7, 4), (3, 0), (4, 8)],  # 8×9: 四角+中心+十字
 }
+# 特殊区域位图: 第 r 行第 c 列对应第 r*cols+c 位
+_BP_BONUS_MASKS = {
+    (rows, cols): sum(1 << (r * cols + c) for r, c in set(cells))
+    for (rows, cols), cells in BP_BONUS_ZONES.items()
+}
 
 RARITY_SHOP_WEIGHTS = {
     "common":    lambda f: max(10, 50 - f * 2),
@@ -608,15 +624,83 @@ def _bp_item_wh(it: dict) -> tuple:
     return w, h
 
 
-def _bp_occupied(bp: dict) -> dict:
-    """返回 {(row,col): uid} 占用表"""
-    occ = {}
-    for it in bp["items"]:
-        w, h = _bp_item_wh(it)
-        for dr in range(h):
-            for dc in range(w):
-                occ[(it["row"] + dr, it["col"] + dc)] = it["uid"]
-    return occ
+# ---- 背包派生数据缓存 ----
+# 背包本身是存放在会话中的 JSON dict，派生数据(占用位图/网格、套装、属性、连锁、被动)不写入背包，
+# 而是按 id(bp) 缓存在模块级。修改背包布局/物品的函数调用 _bp_touch 标记失效(脏标记)，
+# 下次读取时按需重新计算；背包未变化的回合(战斗、查看状态)直接复用上次结果。
+_BP_DERIVED_MAX_SIZE = 512
+
+
+class _BpDerived:
+    """单个背包的派生数据，各字段按需计算，None 表示尚未计算"""
+    __slots__ = ("bp", "mask", "grid", "set_info", "stats", "stats_no_scaling", "chain_bonus", "passives", "view")
+
+    def __init__(self, bp: dict):
+        self.bp = bp  # 持有引用，保证 id(bp) 在缓存期间不被复用
+        self.mask = None
+        self.grid = None
+        self.set_info = None
+        self.stats = None
+        self.stats_no_scaling = None
+        self.chain_bonus = None
+        self.passives = None
+        self.view = None
+
+
+_bp_derived_cache: "OrderedDict[int, _BpDerived]" = OrderedDict()
+
+
+def _bp_derived(bp: dict) -> _BpDerived:
+    """获取背包的派生数据缓存项(不存在时创建)"""
+    key = id(bp)
+    entry = _bp_derived_cache.get(key)
+    if entry is not None and entry.bp is bp:
+        _bp_derived_cache.move_to_end(key)
+        return entry
+    entry = _BpDerived(bp)
+    _bp_derived_cache[key] = entry
+    _bp_derived_cache.move_to_end(key)
+    while len(_bp_derived_cache) > _BP_DERIVED_MAX_SIZE:
+        _bp_derived_cache.popitem(last=False)
+    return entry
+
+
+def _bp_touch(bp: dict):
+    """背包内容发生变化(放置/移除/移动/旋转/扩展/附魔)，丢弃派生数据"""
+    _bp_derived_cache.pop(id(bp), None)
+
+
+@lru_cache(maxsize=None)
+def _bp_shape_mask(w: int, h: int, cols: int) -> int:
+    """w×h 矩形在 cols 列网格中(左上角位于第0位)的位图"""
+    row_bits = (1 << w) - 1
+    mask = 0
+    for dr in range(h):
+        mask |= row_bits << (dr * cols)
+    return mask
+
+
+def _bp_rect_mask(row: int, col: int, w: int, h: int, cols: int) -> int:
+    """网格内矩形区域的位图(调用方保证不越界)"""
+    return _bp_shape_mask(w, h, cols) << (row * cols + col)
+
+
+def _bp_layout(bp: dict) -> _BpDerived:
+    """占用位图 + 网格数组(grid[r*cols+c] 为占据该格的物品)"""
+    d = _bp_derived(bp)
+    if d.grid is None:
+        rows, cols = bp["rows"], bp["cols"]
+        grid = [None] * (rows * cols)
+        mask = 0
+        for it in bp["items"]:
+            w, h = _bp_item_wh(it)
+            for r in range(it["row"], it["row"] + h):
+                for c in range(it["col"], it["col"] + w):
+                    if 0 <= r < rows and 0 <= c < cols:
+                        grid[r * cols + c] = it
+                        mask |= 1 << (r * cols + c)
+        d.grid, d.mask = grid, mask
+    return d
 
 
 def _bp_can_place(bp: dict, item_id: str, row: int, col: int, rotated: bool = False) -> bool:
@@ -629,12 +713,7 @@ def _bp_can_place(bp: dict, item_id: str, row: int, col: int, rotated: bool = Fa
         w, h = h, w
     if row < 0 or col < 0 or row + h > bp["rows"] or col + w > bp["cols"]:
         return False
-    occ = _bp_occupied(bp)
-    for dr in range(h):
-        for dc in range(w):
-            if (row + dr, col + dc) in occ:
-                return False
-    return True
+    return not (_bp_layout(bp).mask & _bp_rect_mask(row, col, w, h, bp["cols"]))
 
 
 def _bp_place(bp: dict, item_id: str, row: int, col: int, rotated: bool = False) -> int | None:
@@ -647,6 +726,7 @@ def _bp_place(bp: dict, item_id: str, row: int, col: int, rotated: bool = False)
     if rotated:
         entry["rotated"] = True
     bp["items"].append(entry)
+    _bp_touch(bp)
     return uid
 
 
@@ -708,57 +788,59 @@ def _bp_remove(bp: dict, uid: int) -> str | None:
     for i, it in enumerate(bp["items"]):
         if it["uid"] == uid:
             bp["items"].pop(i)
+            _bp_touch(bp)
             return it["id"]
     return None
 
 
+def _bp_take_last(bp: dict, uid: int) -> dict | None:
+    """查找物品并将其排到物品列表末尾(移动/旋转过的物品排在最后)"""
+    items = bp["items"]
+    for i, it in enumerate(items):
+        if it["uid"] == uid:
+            if i != len(items) - 1:
+                items.append(items.pop(i))
+                _bp_touch(bp)  # 背包视图中的物品顺序随之变化
+            return it
+    return None
+
+
 def _bp_move(bp: dict, uid: int, new_row: int, new_col: int) -> bool:
     """移动物品到新位置"""
-    item = None
-    for it in bp["items"]:
-        if it["uid"] == uid:
-            item = it
-            break
+    item = _bp_take_last(bp, uid)
     if not item:
         return False
-    # 临时移除再检查能否放
-    bp["items"] = [i for i in bp["items"] if i["uid"] != uid]
     w, h = _bp_item_wh(item)
     if new_row < 0 or new_col < 0 or new_row + h > bp["rows"] or new_col + w > bp["cols"]:
-        bp["items"].append(item)
         return False
-    occ = _bp_occupied(bp)
-    for dr in range(h):
-        for dc in range(w):
-            if (new_row + dr, new_col + dc) in occ:
-                bp["items"].append(item)
-                return False
+    cols = bp["cols"]
+    # 占用位图中去掉物品自身
+    occ = _bp_layout(bp).mask & ~_bp_rect_mask(item["row"], item["col"], w, h, cols)
+    if occ & _bp_rect_mask(new_row, new_col, w, h, cols):
+        return False
     item["row"] = new_row
     item["col"] = new_col
-    bp["items"].append(item)
+    _bp_touch(bp)
     return True
 
 
 def _bp_rotate_item(bp: dict, uid: int) -> bool:
     """旋转物品(交换宽高)，如果旋转后放不下则尝试微调位置"""
-    item = None
-    for it in bp["items"]:
-        if it["uid"] == uid:
-            item = it
-            break
+    item = next((it for it in bp["items"] if it["uid"] == uid), None)
     if not item:
         return False
     defn = BACKPACK_ITEMS.get(item["id"], {})
     orig_w, orig_h = defn.get("w", 1), defn.get("h", 1)
     if orig_w == orig_h:
         return True  # 正方形无需旋转
+    _bp_take_last(bp, uid)
     # 切换旋转状态
     new_rotated = not item.get("rotated", False)
     new_w = orig_h if new_rotated else orig_w
     new_h = orig_w if new_rotated else orig_h
-    # 临时移除
-    bp["items"] = [i for i in bp["items"] if i["uid"] != uid]
-    occ = _bp_occupied(bp)
+    cols = bp["cols"]
+    w, h = _bp_item_wh(item)
+    occ = _bp_layout(bp).mask & ~_bp_rect_mask(item["row"], item["col"], w, h, cols)
     # 尝试原位放置，失败则在附近搜索
     r0, c0 = item["row"], item["col"]
     candidates = [(r0, c0)]
@@ -767,27 +849,19 @@ def _bp_rotate_item(bp: dict, uid: int) -> bool:
             if (dr, dc) != (0, 0):
                 candidates.append((r0 + dr, c0 + dc))
     for nr, nc in candidates:
-        if nr < 0 or nc < 0 or nr + new_h > bp["rows"] or nc + new_w > bp["cols"]:
+        if nr < 0 or nc < 0 or nr + new_h > bp["rows"] or nc + new_w > cols:
             continue
-        ok = True
-        for dr2 in range(new_h):
-            for dc2 in range(new_w):
-                if (nr + dr2, nc + dc2) in occ:
-                    ok = False
-                    break
-            if not ok:
-                break
-        if ok:
-            item["row"] = nr
-            item["col"] = nc
-            if new_rotated:
-                item["rotated"] = True
-            else:
-                item.pop("rotated", None)
-            bp["items"].append(item)
-            return True
-    # 无法旋转，恢复
-    bp["items"].append(item)
+        if occ & _bp_rect_mask(nr, nc, new_w, new_h, cols):
+            continue
+        item["row"] = nr
+        item["col"] = nc
+        if new_rotated:
+            item["rotated"] = True
+        else:
+            item.pop("rotated", None)
+        _bp_touch(bp)
+        return True
+    # 无法旋转
     return False
 
 
@@ -815,37 +889,62 @@ def _bp_expand(bp: dict) -> bool:
         if bp["rows"] == r and bp["cols"] == c:
             bp["rows"] = nr
             bp["cols"] = nc
+            _bp_touch(bp)
             return True
     return False
 
 
+def _bp_enchant(bp: dict, item: dict, ench_entry: dict):
+    """为背包中的物品追加附魔"""
+    item.setdefault("enchants", []).append(ench_entry)
+    _bp_touch(bp)
+
+
 def _bp_compute_set_info(bp: dict) -> dict:
-    """计算套装激活状态 (major套用激活限制, minor套始终激活)"""
-    item_ids_in_bp = {it["id"] for it in bp["items"]}
-    bp_id_list = [it["id"] for it in bp["items"]]
+    """计算套装激活状态 (major套用激活限制, minor套始终激活)；结果缓存，调用方只读"""
+    d = _bp_derived(bp)
+    if d.set_info is None:
+        d.set_info = _bp_build_set_info(bp)
+    return d.set_info
+
+
+def _bp_build_set_info(bp: dict) -> dict:
+    # 通过反向索引只统计背包中物品所属的套装
+    id_counts = Counter(it["id"] for it in bp["items"])
+    unique_pieces_by_set = {}  # sid -> 背包中该套装的不同散件数
+    merged_by_set = {}         # sid -> 合体物品数
+    for iid, n in id_counts.items():
+        for sid in _SETS_BY_ITEM.get(iid, ()):
+            unique_pieces_by_set[sid] = unique_pieces_by_set.get(sid, 0) + 1
+        sid = _MAJOR_SET_BY_MERGED.get(iid)
+        if sid:
+            merged_by_set[sid] = n
 
     major_info = {}      # sid -> {eff_pieces, is_complete, has_merged, unique_pieces}
     total_complete = 0
+    minor_info = {}
 
-    for sid, sdef in ITEM_SETS.items():
+    for sid in sorted(unique_pieces_by_set.keys() | merged_by_set.keys(), key=_SET_ORDER.__getitem__):
+        sdef = ITEM_SETS[sid]
+        unique_pieces = unique_pieces_by_set.get(sid, 0)
+        set_size = len(sdef["items"])
         if not sdef.get("major"):
+            # Minor套
+            if unique_pieces >= 2:
+                minor_info[sid] = {"pieces": unique_pieces, "total": set_size}
             continue
-        merged_id = sid.replace("_set", "_set_merged")
-        n_merged = bp_id_list.count(merged_id)
-        unique_pieces = len(sdef["items"] & item_ids_in_bp)
-        set_size = len(sdef["items"])
+        n_merged = merged_by_set.get(sid, 0)
         eff_pieces = min(set_size if n_merged > 0 else unique_pieces, set_size)
         is_complete = eff_pieces == set_size
         n_complete = n_merged + (1 if unique_pieces == set_size else 0)
         total_complete += n_complete
-        if eff_pieces > 0 or n_merged > 0:
-            major_info[sid] = {
-                "eff_pieces": eff_pieces,
-                "is_complete": is_complete,
-                "n_complete": n_complete,
-                "has_merged": n_merged > 0,
-                "unique_pieces": unique_pieces,
-            }
+        major_info[sid] = {
+            "eff_pieces": eff_pieces,
+            "is_complete": is_complete,
+            "n_complete": n_complete,
+            "has_merged": n_merged > 0,
+            "unique_pieces": unique_pieces,
+        }
 
     max_active = total_complete + 1
     prev_active = set(bp.get("_prev_active_major", []))
@@ -861,16 +960,6 @@ def _bp_compute_set_info(bp: dict) -> dict:
 
     bp["_prev_active_major"] = list(active_sids)
 
-    # Minor套
-    minor_info = {}
-    for sid, sdef in ITEM_SETS.items():
-        if sdef.get("major"):
-            continue
-        owned = sdef["items"] & item_ids_in_bp
-        count = len(owned)
-        if count >= 2:
-            minor_info[sid] = {"pieces": count, "total": len(sdef["items"])}
-
     return {
         "major": major_info,
         "active_major": active_sids,
@@ -883,9 +972,20 @@ def _bp_compute_set_info(bp: dict) -> dict:
 def _bp_calc_stats(bp: dict, set_info: dict = None, exclude_no_scaling: bool = False) -> dict:
     """计算背包总属性 (基础 + 相邻加成 + 诅咒 + 附魔 + 连锁 + 套装 + 特殊区域)
     exclude_no_scaling=True 时，标记了 no_scaling 的物品不计入（用于动态难度计算）"""
-    stats = {"atk": 0, "def": 0, "crit": 0, "crit_damage": 0, "lifesteal": 0, "max_hp": 0, "exp_bonus": 0}
     if not bp or not bp.get("items"):
-        return stats
+        return {"atk": 0, "def": 0, "crit": 0, "crit_damage": 0, "lifesteal": 0, "max_hp": 0, "exp_bonus": 0}
+    d = _bp_derived(bp)
+    if exclude_no_scaling:
+        if d.stats_no_scaling is None:
+            d.stats_no_scaling = _bp_build_stats(bp, set_info, True)
+        return dict(d.stats_no_scaling)
+    if d.stats is None:
+        d.stats = _bp_build_stats(bp, set_info, False)
+    return dict(d.stats)
+
+
+def _bp_build_stats(bp: dict, set_info: dict = None, exclude_no_scaling: bool = False) -> dict:
+    stats = {"atk": 0, "def": 0, "crit": 0, "crit_damage": 0, "lifesteal": 0, "max_hp": 0, "exp_bonus": 0}
     # 基础属性 + 诅咒惩罚
     for it in bp["items"]:
         defn = BACKPACK_ITEMS.get(it["id"], {})
@@ -905,34 +1005,28 @@ def _bp_calc_stats(bp: dict, set_info: dict = None, exclude_no_scaling: bool = F
             v = ench.get("value", 0)
             if s in stats:
                 stats[s] += v
-    # 相邻加成: 遍历每个物品, 检查相邻物品类型
-    occ = {}  # (r,c) -> item dict
-    for it in bp["items"]:
+    # 相邻加成 / 净化石: 通过网格数组查找四邻域中的其它物品
+    rows, cols = bp["rows"], bp["cols"]
+    grid = _bp_layout(bp).grid
+
+    def neighbors(it: dict) -> list:
         w, h = _bp_item_wh(it)
-        for dr in range(h):
-            for dc in range(w):
-                occ[(it["row"] + dr, it["col"] + dc)] = it
+        found = {}
+        for r in range(it["row"], it["row"] + h):
+            for c in range(it["col"], it["col"] + w):
+                for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    if 0 <= nr < rows and 0 <= nc < cols:
+                        nb = grid[nr * cols + nc]
+                        if nb is not None and nb["uid"] != it["uid"]:
+                            found[nb["uid"]] = nb
+        return list(found.values())
+
     for it in bp["items"]:
         defn = BACKPACK_ITEMS.get(it["id"], {})
         adj_rules = defn.get("adj")
         if not adj_rules:
             continue
-        # 找出所有相邻的不同物品
-        w, h = _bp_item_wh(it)
-        my_cells = set()
-        for dr in range(h):
-            for dc in range(w):
-                my_cells.add((it["row"] + dr, it["col"] + dc))
-        neighbor_uids = set()
-        for (r, c) in my_cells:
-            for nr, nc in [(r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)]:
-                nb = occ.get((nr, nc))
-                if nb and nb["uid"] != it["uid"]:
-                    neighbor_uids.add(nb["uid"])
-        for nb_uid in neighbor_uids:
-            nb_it = next((i for i in bp["items"] if i["uid"] == nb_uid), None)
-            if not nb_it:
-                continue
+        for nb_it in neighbors(it):
             nb_type = BACKPACK_ITEMS.get(nb_it["id"], {}).get("type", "")
             if nb_type in adj_rules:
                 for k, v in adj_rules[nb_type].items():
@@ -944,20 +1038,19 @@ def _bp_calc_stats(bp: dict, set_info: dict = None, exclude_no_scaling: bool = F
         if not defn.get("purifier"):
             continue
         w, h = _bp_item_wh(it)
-        my_cells = set()
-        for dr in range(h):
-            for dc in range(w):
-                my_cells.add((it["row"] + dr, it["col"] + dc))
-        for (r, c) in my_cells:
-            for nr, nc in [(r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)]:
-                nb = occ.get((nr, nc))
-                if nb and nb["uid"] != it["uid"]:
-                    nb_defn = BACKPACK_ITEMS.get(nb["id"], {})
-                    if nb_defn.get("cursed") and not nb.get("purified"):
-                        # 抵消curse惩罚(加回被扣的值)
-                        for k, v in nb_defn.get("curse", {}).items():
-                            if k in stats:
-                                stats[k] -= v  # v is negative, so -= negative = add
+        for r in range(it["row"], it["row"] + h):
+            for c in range(it["col"], it["col"] + w):
+                for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    if not (0 <= nr < rows and 0 <= nc < cols):
+                        continue
+                    nb = grid[nr * cols + nc]
+                    if nb and nb["uid"] != it["uid"]:
+                        nb_defn = BACKPACK_ITEMS.get(nb["id"], {})
+                        if nb_defn.get("cursed") and not nb.get("purified"):
+                            # 抵消curse惩罚(加回被扣的值)
+                            for k, v in nb_defn.get("curse", {}).items():
+                                if k in stats:
+                                    stats[k] -= v  # v is negative, so -= negative = add
 
     # 连锁加成: 同一行或同一列中 >=3 个相同类型物品 → 额外加成
     chain_bonus = _bp_calc_chain_bonus(bp)
@@ -989,20 +1082,12 @@ def _bp_calc_stats(bp: dict, set_info: dict = None, exclude_no_scaling: bool = F
                 stats[k] += v * minfo["pieces"]
 
     # 特殊区域加成: 物品占据bonus zone格子时，该物品的基础effects×0.5额外加成
-    bonus_cells = set(BP_BONUS_ZONES.get((bp["rows"], bp["cols"]), []))
-    if bonus_cells:
+    bonus_mask = _BP_BONUS_MASKS.get((rows, cols), 0)
+    if bonus_mask:
         for it in bp["items"]:
-            defn = BACKPACK_ITEMS.get(it["id"], {})
             w, h = _bp_item_wh(it)
-            on_bonus = False
-            for dr in range(h):
-                for dc in range(w):
-                    if (it["row"] + dr, it["col"] + dc) in bonus_cells:
-                        on_bonus = True
-                        break
-                if on_bonus:
-                    break
-            if on_bonus:
+            if _bp_rect_mask(it["row"], it["col"], w, h, cols) & bonus_mask:
+                defn = BACKPACK_ITEMS.get(it["id"], {})
                 for k, v in defn.get("effects", {}).items():
                     if k in stats and v > 0:
                         stats[k] += int(v * 0.5)  # 50% bonus
@@ -1012,9 +1097,16 @@ def _bp_calc_stats(bp: dict, set_info: dict = None, exclude_no_scaling: bool = F
 
 def _bp_calc_chain_bonus(bp: dict) -> dict:
     """计算连锁加成: 同行或同列>=3个同类型物品获得额外加成"""
-    bonus = {"atk": 0, "def": 0, "crit": 0, "max_hp": 0}
     if not bp or not bp.get("items"):
-        return bonus
+        return {"atk": 0, "def": 0, "crit": 0, "max_hp": 0}
+    d = _bp_derived(bp)
+    if d.chain_bonus is None:
+        d.chain_bonus = _bp_build_chain_bonus(bp)
+    return dict(d.chain_bonus)
+
+
+def _bp_build_chain_bonus(bp: dict) -> dict:
+    bonus = {"atk": 0, "def": 0, "crit": 0, "max_hp": 0}
     # 按物品左上角位置索引类型
     type_by_row = {}  # row -> [type, ...]
     type_by_col = {}  # col -> [type, ...]
@@ -1053,17 +1145,20 @@ def _bp_calc_chain_bonus(bp: dict) -> dict:
 
 def _bp_get_passives(bp: dict) -> dict:
     """收集背包中所有被动技能"""
-    passives = {}
     if not bp or not bp.get("items"):
-        return passives
-    for it in bp["items"]:
-        defn = BACKPACK_ITEMS.get(it["id"], {})
-        p = defn.get("passive")
-        if not p:
-            continue
-        for k, v in p.items():
-            passives[k] = passives.get(k, 0) + v
-    return passives
+        return {}
+    d = _bp_derived(bp)
+    if d.passives is None:
+        passives = {}
+        for it in bp["items"]:
+            defn = BACKPACK_ITEMS.get(it["id"], {})
+            p = defn.get("passive")
+            if not p:
+                continue
+            for k, v in p.items():
+                passives[k] = passives.get(k, 0) + v
+        d.passives = passives
+    return dict(d.passives)
 
 
 def _bp_generate_shop(floor: int) -> list:
@@ -1104,7 +1199,17 @@ def _hint(session: dict, key: str, msg: str):
 
 
 def _bp_sanitize(bp: dict) -> dict:
-    """返回前端需要的背包数据"""
+    """返回前端需要的背包数据 (已清除 surrogate；按背包缓存，除 passives 外调用方只读)"""
+    d = _bp_derived(bp)
+    if d.view is None:
+        d.view = _strip_surrogates(_bp_build_view(bp))
+    view = dict(d.view)
+    if view["passives"]:
+        view["passives"] = dict(view["passives"])
+    return view
+
+
+def _bp_build_view(bp: dict) -> dict:
     items = []
     set_info = _bp_compute_set_info(bp)
     bp_stats = _bp_calc_stats(bp, set_info)
@@ -1745,7 +1850,6 @@ def sanitize_adventure_state(session: dict) -> dict:
         elif _bps:
             bp_san["passives"] = dict(_bps)
         state["backpack"] = bp_san
-        state["bp_stats"] = bp_san["stats"]
     # 被动技能汇总（背包 + 祝福永久被动）
     bp_passives = {}
     if bp:
@@ -1793,7 +1897,13 @@ def sanitize_adventure_state(session: dict) -> dict:
             state["encounter"] = safe_enc
         else:
             state["encounter"] = {"type": enc["type"], "name": enc["name"], "resolved": True}
-    return _strip_surrogates(state)
+    # 背包视图已在缓存时清除 surrogate，不再逐层遍历
+    bp_view = state.pop("backpack", None)
+    state = _strip_surrogates(state)
+    if bp_view is not None:
+        state["backpack"] = bp_view
+        state["bp_stats"] = bp_view["stats"]
+    return state
 
 
 # ==================== 游戏逻辑处理 ====================
@@ -2085,9 +2195,7 @@ def process_adventure_action(session: dict, action: dict) -> dict:
         affix = random.choice(ENCHANT_AFFIXES)
         value = random.randint(affix["range"][0], affix["range"][1])
         ench_entry = {"name": affix["name"], "icon": affix["icon"], "stat": affix["stat"], "value": value}
-        if "enchants" not in bp_item:
-            bp_item["enchants"] = []
-        bp_item["enchants"].append(ench_entry)
+        _bp_enchant(bp, bp_item, ench_entry)
         stat_names = {"atk": "攻击", "def": "防御", "crit": "暴击", "crit_damage": "爆伤", "lifesteal": "吸血", "max_hp": "HP"}
         log.append(f"💎 附魔成功！{defn.get('name', '?')}获得 [{affix['icon']}{affix['name']}] {stat_names.get(affix['stat'], affix['stat'])}+{value}（花费{cost}EXP）")
         _hint(session, "enchant_info", f"附魔为物品添加随机属性。品质越高可附魔次数越多（普通1/优秀2/稀有+3），费用逐次递增。")
@@ -2172,11 +2280,9 @@ def process_adventure_action(session: dict, action: dict) -> dict:
                 _chain = _bp_calc_chain_bonus(bp)
                 if any(v > 0 for v in _chain.values()):
                     _hint(session, "chain", "连锁加成已激活！同一行或列放置3+同类型物品可获得额外属性加成。")
-                _ids = {it["id"] for it in bp["items"]}
-                for sdef in ITEM_SETS.values():
-                    if len(sdef["items"] & _ids) >= 2:
-                        _hint(session, "set", f"套装激活！拥有同套装2件以上即可获得加成。主题套装(7件)受激活限制，集齐全套可获得史诗级专属加成，还能合体节省空间！")
-                        break
+                _set_info = _bp_compute_set_info(bp)
+                if _set_info["minor"] or any(i["unique_pieces"] >= 2 for i in _set_info["major"].values()):
+                    _hint(session, "set", f"套装激活！拥有同套装2件以上即可获得加成。主题套装(7件)受激活限制，集齐全套可获得史诗级专属加成，还能合体节省空间！")
             monster_def = enc.get("monster_defense", 0)
             elite_ability = enc.get("ability", {}).get("id") if enc.get("elite") else None
             # ── 临时buff DoT/HoT 处理 ──
@@ -1,8 +1,11 @@
 """
 扫雷游戏 - 数据定义与逻辑
 """
+import base64
 import random
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from fastapi import HTTPException
 
 
@@ -16,21 +19,152 @@ MINESWEEPER_DIFFICULTIES = {
 }
 
 
+# ==================== 棋盘存储 ====================
+# 会话随每次操作整体序列化，棋盘以紧凑编码保存在会话中:
+# - board: 每格一个字节 (0-8 为周围雷数, _MINE 为地雷)，base64 编码
+# - revealed / flagged / questioned: 位集 (第 r*cols+c 位对应第 r 行第 c 列)，小端字节序 base64 编码
+# 操作时解码为 bytearray/整数位集，按扁平下标和预计算的邻居表访问；旧版会话中的嵌套列表读取时自动转换，
+# 下次操作后以新格式写回。
+
+_MINE = 9
+
+
+@lru_cache(maxsize=None)
+def _neighbor_table(rows: int, cols: int) -> tuple:
+    """每个格子(扁平下标)的相邻格子下标"""
+    table = []
+    for r in range(rows):
+        for c in range(cols):
+            table.append(tuple(
+                nr * cols + nc
+                for nr in range(r - 1, r + 2)
+                for nc in range(c - 1, c + 2)
+                if (nr, nc) != (r, c) and 0 <= nr < rows and 0 <= nc < cols
+            ))
+    return tuple(table)
+
+
+def _encode_bits(bits: int, size: int) -> str:
+    return base64.b64encode(bits.to_bytes((size + 7) // 8, "little")).decode("ascii")
+
+
+def _decode_bits(value, cols: int) -> int:
+    if not value:
+        return 0
+    if isinstance(value, str):
+        return int.from_bytes(base64.b64decode(value), "little")
+    # 旧版: 嵌套布尔列表
+    bits = 0
+    for r, row in enumerate(value):
+        for c, flag in enumerate(row):
+            if flag:
+                bits |= 1 << (r * cols + c)
+    return bits
+
+
+def _decode_cells(value, size: int) -> bytearray:
+    if not value:
+        return bytearray(size)
+    if isinstance(value, str):
+        return bytearray(base64.b64decode(value))
+    # 旧版: 嵌套整数列表，-1 为地雷
+    return bytearray(_MINE if v == -1 else v for row in value for v in row)
+
+
+class _Board:
+    """解码后的棋盘: cells 为每格数字的 bytearray，其余为整数位集"""
+    __slots__ = ("session", "encoded", "rows", "cols", "cells", "revealed", "flagged", "questioned")
+
+    def __init__(self, session: dict):
+        self.session = session
+        self.encoded = _encoded_fields(session)
+        self.rows, self.cols = session["rows"], session["cols"]
+        self.cells = _decode_cells(session.get("board"), self.rows * self.cols)
+        self.revealed = _decode_bits(session.get("revealed"), self.cols)
+        self.flagged = _decode_bits(session.get("flagged"), self.cols)
+        self.questioned = _decode_bits(session.get("questioned"), self.cols)
+
+    def store(self):
+        session, size = self.session, self.rows * self.cols
+        session["board"] = base64.b64encode(self.cells).decode("ascii")
+        session["revealed"] = _encode_bits(self.revealed, size)
+        session["flagged"] = _encode_bits(self.flagged, size)
+        session["questioned"] = _encode_bits(self.questioned, size)
+        self.encoded = _encoded_fields(session)
+
+    def value(self, i: int) -> int:
+        v = self.cells[i]
+        return -1 if v == _MINE else v
+
+    def bit_rows(self, bits: int) -> list:
+        """位集转为前端使用的嵌套布尔列表"""
+        cols = self.cols
+        mask = (1 << cols) - 1
+        return [list(_row_flags(cols, bits >> start & mask)) for start in range(0, self.rows * cols, cols)]
+
+    def visible_rows(self, shown: int) -> list:
+        """shown 位集中的格子显示数字(地雷为 -1)，其余为 None"""
+        cols, cells = self.cols, bytes(self.cells)
+        mask = (1 << cols) - 1
+        return [
+            list(_row_visible(cells[start:start + cols], shown >> start & mask))
+            for start in range(0, self.rows * cols, cols)
+        ]
+
+
+@lru_cache(maxsize=4096)
+def _row_flags(cols: int, bits: int) -> tuple:
+    return tuple(bool(bits >> c & 1) for c in range(cols))
+
+
+@lru_cache(maxsize=4096)
+def _row_visible(cells: bytes, bits: int) -> tuple:
+    return tuple((-1 if v == _MINE else v) if bits >> c & 1 else None for c, v in enumerate(cells))
+
+
+# 解码后的棋盘按会话缓存：会话对象在请求之间常驻内存（见 GameSessionStore），
+# 只要会话中的编码字段仍是上次写回的同一对象，就直接复用解码结果，省去每次点击的解码
+_BOARD_CACHE_MAX_SIZE = 512
+_board_cache: "OrderedDict[int, _Board]" = OrderedDict()
+
+
+def _encoded_fields(session: dict) -> tuple:
+    return (session.get("board"), session.get("revealed"), session.get("flagged"), session.get("questioned"))
+
+
+def _board_for(session: dict) -> _Board:
+    """获取会话的解码棋盘(缓存失效时重新解码)"""
+    key = id(session)
+    board = _board_cache.get(key)
+    if board is not None and board.session is session and all(
+        a is b for a, b in zip(board.encoded, _encoded_fields(session))
+    ):
+        _board_cache.move_to_end(key)
+        return board
+    board = _Board(session)
+    _board_cache[key] = board
+    _board_cache.move_to_end(key)
+    while len(_board_cache) > _BOARD_CACHE_MAX_SIZE:
+        _board_cache.popitem(last=False)
+    return board
+
+
 # ==================== 会话创建 ====================
 
 def create_minesweeper_session(difficulty: str) -> dict:
     cfg = MINESWEEPER_DIFFICULTIES[difficulty]
     rows, cols = cfg["rows"], cfg["cols"]
+    empty_bits = _encode_bits(0, rows * cols)
     return {
         "started_at": datetime.utcnow().isoformat(),
         "difficulty": difficulty,
         "rows": rows,
         "cols": cols,
         "mine_count": cfg["mines"],
-        "board": [[0] * cols for _ in range(rows)],
-        "revealed": [[False] * cols for _ in range(rows)],
-        "flagged": [[False] * cols for _ in range(rows)],
-        "questioned": [[False] * cols for _ in range(rows)],  # 添加问号标记支持
+        "board": base64.b64encode(bytes(rows * cols)).decode("ascii"),
+        "revealed": empty_bits,
+        "flagged": empty_bits,
+        "questioned": empty_bits,  # 添加问号标记支持
         "first_click": True,
         "completed": False,
         "won": False,
@@ -42,67 +176,56 @@ def create_minesweeper_session(difficulty: str) -> dict:
 
 # ==================== 内部工具函数 ====================
 
-def _place_mines(session: dict, safe_row: int, safe_col: int):
+def _place_mines(session: dict, board: _Board, safe_row: int, safe_col: int):
     """首次点击后放置地雷，确保点击位置及周围无雷"""
-    rows, cols = session["rows"], session["cols"]
+    rows, cols = board.rows, board.cols
     mine_count = session["mine_count"]
+    neighbors = _neighbor_table(rows, cols)
+    safe_idx = safe_row * cols + safe_col
     # 安全区域：点击位置及其8个邻居
-    safe_cells = set()
-    for dr in range(-1, 2):
-        for dc in range(-1, 2):
-            nr, nc = safe_row + dr, safe_col + dc
-            if 0 <= nr < rows and 0 <= nc < cols:
-                safe_cells.add((nr, nc))
+    safe_cells = set(neighbors[safe_idx])
+    safe_cells.add(safe_idx)
     # 可放雷的位置
-    candidates = [(r, c) for r in range(rows) for c in range(cols) if (r, c) not in safe_cells]
+    candidates = [i for i in range(rows * cols) if i not in safe_cells]
     # 如果可用位置不够（极小棋盘），放宽安全区域
     if len(candidates) < mine_count:
-        candidates = [(r, c) for r in range(rows) for c in range(cols) if (r, c) != (safe_row, safe_col)]
+        candidates = [i for i in range(rows * cols) if i != safe_idx]
     mines = random.sample(candidates, mine_count)
-    board = [[0] * cols for _ in range(rows)]
-    for mr, mc in mines:
-        board[mr][mc] = -1
-    # 计算数字
-    for r in range(rows):
-        for c in range(cols):
-            if board[r][c] == -1:
-                continue
-            count = 0
-            for dr in range(-1, 2):
-                for dc in range(-1, 2):
-                    if dr == 0 and dc == 0:
-                        continue
-                    nr, nc = r + dr, c + dc
-                    if 0 <= nr < rows and 0 <= nc < cols and board[nr][nc] == -1:
-                        count += 1
-            board[r][c] = count
-    session["board"] = board
-
-
-def _flood_fill(session: dict, row: int, col: int):
-    """翻开空格时递归展开相邻的0格"""
-    rows, cols = session["rows"], session["cols"]
-    stack = [(row, col)]
+    cells = bytearray(rows * cols)
+    for i in mines:
+        cells[i] = _MINE
+    # 计算数字：每个雷给相邻的非雷格子加一
+    for i in mines:
+        for n in neighbors[i]:
+            if cells[n] != _MINE:
+                cells[n] += 1
+    board.cells = cells
+
+
+def _flood_fill(session: dict, board: _Board, idx: int):
+    """翻开空格时展开相邻的0格"""
+    neighbors = _neighbor_table(board.rows, board.cols)
+    cells = board.cells
+    revealed, flagged, questioned = board.revealed, board.flagged, board.questioned
+    opened = 0
+    stack = [idx]
     while stack:
-        r, c = stack.pop()
-        if session["revealed"][r][c]:
+        i = stack.pop()
+        bit = 1 << i
+        if revealed & bit:
             continue
-        session["revealed"][r][c] = True
-        session["cells_revealed"] += 1
+        revealed |= bit
+        opened += 1
         # 清除问号标记（翻开时）
-        if session.get("questioned") and session["questioned"][r][c]:
-            session["questioned"][r][c] = False
+        questioned &= ~bit
         # 如果是0，展开周围
-        if session["board"][r][c] == 0:
-            for dr in range(-1, 2):
-                for dc in range(-1, 2):
-                    if dr == 0 and dc == 0:
-                        continue
-                    nr, nc = r + dr, c + dc
-                    if 0 <= nr < rows and 0 <= nc < cols and not session["revealed"][nr][nc]:
-                        # 不展开标旗的格子，但可以展开问号格子
-                        if not session["flagged"][nr][nc]:
-                            stack.append((nr, nc))
+        if cells[i] == 0:
+            for n in neighbors[i]:
+                # 不展开标旗的格子，但可以展开问号格子
+                if not (revealed | flagged) >> n & 1:
+                    stack.append(n)
+    board.revealed, board.questioned = revealed, questioned
+    session["cells_revealed"] += opened
 
 
 # ==================== 状态脱敏 ====================
@@ -112,28 +235,18 @@ def sanitize_minesweeper_state(session: dict) -> dict:
     rows = session["rows"]
     cols = session["cols"]
     completed = session.get("completed", False)
-    # 构建脱敏棋盘：已翻开的格子显示数字，未翻开的显示 None
-    visible_board = []
-    for r in range(rows):
-        row_data = []
-        for c in range(cols):
-            if session["revealed"][r][c]:
-                row_data.append(session["board"][r][c])
-            elif completed:
-                # 游戏结束后显示所有格子
-                row_data.append(session["board"][r][c])
-            else:
-                row_data.append(None)
-        visible_board.append(row_data)
+    board = _board_for(session)
+    # 构建脱敏棋盘：已翻开的格子显示数字，未翻开的显示 None；游戏结束后显示所有格子
+    visible_board = board.visible_rows(-1 if completed else board.revealed)
     return {
         "difficulty": session["difficulty"],
         "rows": rows,
         "cols": cols,
         "mine_count": session["mine_count"],
         "board": visible_board,
-        "revealed": session["revealed"],
-        "flagged": session["flagged"],
-        "questioned": session.get("questioned", [[False] * cols for _ in range(rows)]),  # 修复: 传递问号标记到前端
+        "revealed": board.bit_rows(board.revealed),
+        "flagged": board.bit_rows(board.flagged),
+        "questioned": board.bit_rows(board.questioned),
         "first_click": session.get("first_click", False),
         "completed": completed,
         "won": session.get("won", False),
@@ -167,128 +280,117 @@ def process_minesweeper_action(session: dict, action: dict) -> dict:
     if row is None or col is None or not (0 <= row < rows and 0 <= col < cols):
         raise HTTPException(status_code=400, detail="无效的坐标")
 
+    if act not in ("flag", "reveal", "chord"):
+        raise HTTPException(status_code=400, detail="操作必须是 reveal、flag 或 chord")
+
+    board = _board_for(session)
+    result = _apply_action(session, board, act, row * cols + col)
+    board.store()
+    return result
+
+
+def _win_or_continue(session: dict) -> dict:
+    """检查是否胜利"""
+    if session["cells_revealed"] >= session["total_safe"]:
+        session["completed"] = True
+        session["won"] = True
+        exp = MINESWEEPER_DIFFICULTIES[session["difficulty"]]["exp"]
+        session["exp_earned"] = exp
+        return {"completed": True, "exp_earned": exp, "won": True}
+    return {"completed": False, "exp_earned": 0}
+
+
+def _lose(session: dict) -> dict:
+    session["completed"] = True
+    session["won"] = False
+    session["exp_earned"] = 0
+    return {"completed": True, "exp_earned": 0, "won": False}
+
+
+def _apply_action(session: dict, board: _Board, act: str, idx: int) -> dict:
+    """在解码后的棋盘上执行操作（校验失败时在修改棋盘之前抛出异常）"""
+    bit = 1 << idx
+
     if act == "flag":
-        if session["revealed"][row][col]:
+        if board.revealed & bit:
             raise HTTPException(status_code=400, detail="不能标记已翻开的格子")
         # 循环状态: 隐藏 → 旗帜 → 问号 → 隐藏
-        is_flagged = session["flagged"][row][col]
-        is_questioned = session.get("questioned", [[False] * session["cols"] for _ in range(session["rows"])])[row][col]
-        
+        is_flagged = board.flagged & bit
+        is_questioned = board.questioned & bit
+        board.flagged &= ~bit
+        board.questioned &= ~bit
         if not is_flagged and not is_questioned:
             # 隐藏 → 旗帜
-            session["flagged"][row][col] = True
-            session["questioned"][row][col] = False
+            board.flagged |= bit
         elif is_flagged and not is_questioned:
             # 旗帜 → 问号
-            session["flagged"][row][col] = False
-            session["questioned"][row][col] = True
-        else:
-            # 问号 → 隐藏
-            session["flagged"][row][col] = False
-            session["questioned"][row][col] = False
-        
+            board.questioned |= bit
+        # 问号 → 隐藏
         return {"completed": False, "exp_earned": 0}
 
-    elif act == "reveal":
-        if session["revealed"][row][col]:
+    if act == "reveal":
+        if board.revealed & bit:
             raise HTTPException(status_code=400, detail="该格已翻开")
-        if session["flagged"][row][col]:
+        if board.flagged & bit:
             raise HTTPException(status_code=400, detail="请先取消标旗")
 
         # 首次点击：放置地雷
         if session.get("first_click"):
-            _place_mines(session, row, col)
+            _place_mines(session, board, idx // board.cols, idx % board.cols)
             session["first_click"] = False
 
         # 踩雷
-        if session["board"][row][col] == -1:
-            session["completed"] = True
-            session["won"] = False
-            session["exp_earned"] = 0
-            session["revealed"][row][col] = True
-            return {"completed": True, "exp_earned": 0, "won": False}
+        if board.cells[idx] == _MINE:
+            board.revealed |= bit
+            return _lose(session)
 
         # 翻开（含 flood fill）
-        _flood_fill(session, row, col)
-
-        # 检查是否胜利
-        if session["cells_revealed"] >= session["total_safe"]:
-            session["completed"] = True
-            session["won"] = True
-            exp = MINESWEEPER_DIFFICULTIES[session["difficulty"]]["exp"]
-            session["exp_earned"] = exp
-            return {"completed": True, "exp_earned": exp, "won": True}
-
-        return {"completed": False, "exp_earned": 0}
-
-    elif act == "chord":
-        if not session["revealed"][row][col]:
-            raise HTTPException(status_code=400, detail="只能对已翻开的格子使用快速翻开")
-        num = session["board"][row][col]
-        if num <= 0:
-            raise HTTPException(status_code=400, detail="该格不是数字格")
-
-        # 计算周围旗数和未翻开格子
-        flag_count = 0
-        unrevealed = []
-        for dr in range(-1, 2):
-            for dc in range(-1, 2):
-                if dr == 0 and dc == 0:
-                    continue
-                nr, nc = row + dr, col + dc
-                if 0 <= nr < rows and 0 <= nc < cols:
-                    if session["flagged"][nr][nc]:
-                        flag_count += 1
-                    elif not session["revealed"][nr][nc]:
-                        # 问号格子也算作未翻开
-                        unrevealed.append((nr, nc))
-
-        # 专业扫雷模式：两种和弦触发条件
-        # 1. 旗数等于数字 - 经典模式
-        # 2. 旗数 + 未翻开数 = 数字 - 智能模式(当剩余格子都是雷时)
-        can_chord = False
-        
-        if flag_count == num:
-            # 经典和弦：旗数正确，翻开其他格子
-            can_chord = True
-        elif flag_count + len(unrevealed) == num:
-            # 智能和弦：剩余格子都是雷，自动标旗并翻开
-            # 先标记所有未标记的格子为旗
-            for nr, nc in unrevealed:
-                if not session["flagged"][nr][nc]:
-                    session["flagged"][nr][nc] = True
-            unrevealed = []  # 清空待翻开列表
-            can_chord = True
-        
-        if not can_chord:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"无法和弦：周围有{flag_count}面旗，{len(unrevealed)}个未翻开格子，但数字是{num}"
-            )
-
-        # 翻开所有未翻开未标旗的邻居
-        hit_mine = False
-        for nr, nc in unrevealed:
-            if session["board"][nr][nc] == -1:
-                hit_mine = True
-                session["revealed"][nr][nc] = True
-            else:
-                _flood_fill(session, nr, nc)
-
-        if hit_mine:
-            session["completed"] = True
-            session["won"] = False
-            session["exp_earned"] = 0
-            return {"completed": True, "exp_earned": 0, "won": False}
-
-        if session["cells_revealed"] >= session["total_safe"]:
-            session["completed"] = True
-            session["won"] = True
-            exp = MINESWEEPER_DIFFICULTIES[session["difficulty"]]["exp"]
-            session["exp_earned"] = exp
-            return {"completed": True, "exp_earned": exp, "won": True}
-
-        return {"completed": False, "exp_earned": 0}
-
+        _flood_fill(session, board, idx)
+        return _win_or_continue(session)
+
+    # chord
+    if not board.revealed & bit:
+        raise HTTPException(status_code=400, detail="只能对已翻开的格子使用快速翻开")
+    num = board.value(idx)
+    if num <= 0:
+        raise HTTPException(status_code=400, detail="该格不是数字格")
+
+    # 计算周围旗数和未翻开格子
+    flag_count = 0
+    unrevealed = []
+    for n in _neighbor_table(board.rows, board.cols)[idx]:
+        if board.flagged >> n & 1:
+            flag_count += 1
+        elif not board.revealed >> n & 1:
+            # 问号格子也算作未翻开
+            unrevealed.append(n)
+
+    # 专业扫雷模式：两种和弦触发条件
+    # 1. 旗数等于数字 - 经典模式
+    # 2. 旗数 + 未翻开数 = 数字 - 智能模式(当剩余格子都是雷时)
+    if flag_count == num:
+        # 经典和弦：旗数正确，翻开其他格子
+        pass
+    elif flag_count + len(unrevealed) == num:
+        # 智能和弦：剩余格子都是雷，自动标旗
+        for n in unrevealed:
+            board.flagged |= 1 << n
+        unrevealed = []  # 清空待翻开列表
     else:
-        raise HTTPException(status_code=400, detail="操作必须是 reveal、flag 或 chord")
+        raise HTTPException(
+            status_code=400, 
+            detail=f"无法和弦：周围有{flag_count}面旗，{len(unrevealed)}个未翻开格子，但数字是{num}"
+        )
+
+    # 翻开所有未翻开未标旗的邻居
+    hit_mine = False
+    for n in unrevealed:
+        if board.cells[n] == _MINE:
+            hit_mine = True
+            board.revealed |= 1 << n
+        else:
+            _flood_fill(session, board, n)
+
+    if hit_mine:
+        return _lose(session)
+    return _win_or_continue(session)
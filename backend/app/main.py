@@ -19,7 +19,6 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
@@ -28,6 +27,7 @@ from app.core.database import init_db
 from app.core.limiter import limiter
 from app.api import auth, family, deposit, equity, investment, transaction, achievement, gift, vote, pet, announcement, report, approval, todo, calendar, asset, ai_config, ai_chat, ai_skill, bet, accounting, site_config, external_app
 from app.services.notification import set_external_base_url, detect_external_url_from_headers
+from app.services.blob_store import BlobStaticFiles
 import os
 
 
@@ -55,8 +55,26 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ 加载 AI 服务商配置失败（可能是首次启动）: {e}")
     
+    # 启动通知投递队列（继续投递上次未完成的消息）
+    from app.services.notification_queue import notification_queue
+    notification_queue.start()
+    
+    # 启动游戏会话延迟写入
+    from app.services.game_sessions import game_sessions
+    game_sessions.start()
+    
+    # 启动后台定时任务（提案过期、赌注截止、审批催办、日历同步；多 worker 时按租约只运行一份）
+    from app.services.jobs import register_jobs
+    job_scheduler = register_jobs()
+    job_scheduler.start()
+    
     yield
     # 关闭时清理资源
+    await job_scheduler.stop()
+    await game_sessions.stop()
+    await notification_queue.stop()
+    from app.services.ai_telemetry import ai_telemetry
+    await ai_telemetry.stop()
     print("👋 小金库服务关闭")
 
 
@@ -212,10 +230,10 @@ app.include_router(ai_chat.router, prefix="/api", tags=["AI 助手"])  # AI 通
 app.include_router(site_config.router, prefix="/api/site-config", tags=["站点配置"])  # 站点图标/PWA
 app.include_router(external_app.router, prefix="/api/external-apps", tags=["外部应用"])  # 第三方应用中心
 
-# 挂载静态文件服务（小票图片等）
+# 挂载静态文件服务（小票图片等；blobs 下的内容寻址文件使用强 ETag）
 uploads_root = os.path.join(BASE_DIR, "uploads")
 os.makedirs(uploads_root, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_root), name="uploads")
+app.mount("/uploads", BlobStaticFiles(directory=uploads_root), name="uploads")
 
 
 @app.get("/api/health")
@@ -4,7 +4,7 @@
 from datetime import datetime
 from decimal import Decimal
 from typing import List, Optional
-from sqlalchemy import String, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum, Integer
+from sqlalchemy import String, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum, Integer, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import enum
 
@@ -83,7 +83,7 @@ class User(Base):
     email: Mapped[str] = mapped_column(String(100), unique=True, index=True)
     hashed_password: Mapped[str] = mapped_column(String(255))
     nickname: Mapped[str] = mapped_column(String(50))  # 昵称，显示用
-    avatar: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 头像 Base64
+    avatar: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 头像 URL（/uploads/blobs/...，旧数据为 Base64）
     avatar_version: Mapped[int] = mapped_column(Integer, default=0)  # 头像版本号，用于缓存失效
     phone: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)  # 手机号
     gender: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)  # 性别: male/female/other
@@ -137,6 +137,10 @@ class Family(Base):
 class FamilyMember(Base):
     """家庭成员表（多对多关联表）"""
     __tablename__ = "family_members"
+    __table_args__ = (
+        Index("ix_family_members_user_id", "user_id"),
+        Index("ix_family_members_family_id", "family_id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -154,6 +158,10 @@ class FamilyMember(Base):
 class Deposit(Base):
     """资金注入记录表"""
     __tablename__ = "deposits"
+    __table_args__ = (
+        Index("ix_deposits_family_date", "family_id", "deposit_date"),
+        Index("ix_deposits_family_user", "family_id", "user_id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -212,6 +220,9 @@ Asset = Investment
 class InvestmentIncome(Base):
     """理财收益记录表（将重命名为AssetIncome）"""
     __tablename__ = "investment_incomes"
+    __table_args__ = (
+        Index("ix_investment_incomes_investment_date", "investment_id", "income_date"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     investment_id: Mapped[int] = mapped_column(ForeignKey("investments.id"))
@@ -238,6 +249,9 @@ AssetIncome = InvestmentIncome
 class InvestmentPosition(Base):
     """投资持仓变动记录表（将重命名为AssetPosition）"""
     __tablename__ = "investment_positions"
+    __table_args__ = (
+        Index("ix_investment_positions_investment_date", "investment_id", "operation_date"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     investment_id: Mapped[int] = mapped_column(ForeignKey("investments.id"))
@@ -309,6 +323,9 @@ class ExpenseApproval(Base):
 class Transaction(Base):
     """资金流水表 - 记录活期资产的变化"""
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_family_created", "family_id", "created_at"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
@@ -325,6 +342,60 @@ class Transaction(Base):
     family: Mapped["Family"] = relationship(back_populates="transactions")
 
 
+class FamilyAccount(Base):
+    """家庭活期账户表 - 当前活期余额（流水 balance_after 链的唯一记账点）
+
+    所有 Transaction 均经 app.services.balance.post_transaction 记账：
+    在同一事务内原子地更新本行余额，再以更新后的余额写入 balance_after。
+    """
+    __tablename__ = "family_accounts"
+
+    family_id: Mapped[int] = mapped_column(ForeignKey("families.id"), primary_key=True)
+    balance: Mapped[float] = mapped_column(Float, default=0.0)  # 当前活期余额（CNY）
+    last_transaction_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 最近一笔记账流水ID
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ==================== 家庭账本快照模型 ====================
+
+class FamilyLedger(Base):
+    """家庭账本快照表 - 股权汇总的物化结果
+
+    由 app.services.ledger 在写入 Deposit/Transaction/Position/Income 的同一事务内增量维护，
+    行存在即表示该家庭快照已构建；缺失时读取方会从原始流水重建。
+    """
+    __tablename__ = "family_ledgers"
+
+    family_id: Mapped[int] = mapped_column(ForeignKey("families.id"), primary_key=True)
+    free_cash: Mapped[float] = mapped_column(Float, default=0.0)  # 家庭自由资金（最后一笔流水的 balance_after）
+    frozen_amount: Mapped[float] = mapped_column(Float, default=0.0)  # 冻结资金（投票中/待领取的分红）
+    rebuilt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # 最近一次全量重建时间
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class FamilyLedgerMember(Base):
+    """家庭账本快照 - 成员存入汇总"""
+    __tablename__ = "family_ledger_members"
+    __table_args__ = (
+        UniqueConstraint("family_id", "user_id", name="uq_family_ledger_members_family_user"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey("families.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    total_deposit: Mapped[float] = mapped_column(Float, default=0.0)  # 原始存入总额
+
+
+class FamilyLedgerInvestment(Base):
+    """家庭账本快照 - 理财持仓汇总"""
+    __tablename__ = "family_ledger_investments"
+
+    investment_id: Mapped[int] = mapped_column(ForeignKey("investments.id"), primary_key=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey("families.id"), index=True)
+    current_principal: Mapped[float] = mapped_column(Float, default=0.0)  # 当前持仓本金
+    total_return: Mapped[float] = mapped_column(Float, default=0.0)  # 累计收益
+
+
 # ==================== 成就系统模型 ====================
 
 class AchievementCategory(str, enum.Enum):
@@ -385,6 +456,24 @@ class UserAchievement(Base):
     achievement: Mapped["Achievement"] = relationship(back_populates="user_achievements")
 
 
+class UserAchievementCounter(Base):
+    """用户成就计数器表 - 成就判定所需的按用户累计值
+
+    由 app.services.achievement_counters 在写入业务记录的同一事务内增量维护，
+    counter 与成就的 trigger_type 同名；带 _built 计数器表示该用户已完成回填。
+    """
+    __tablename__ = "user_achievement_counters"
+    __table_args__ = (
+        UniqueConstraint("user_id", "counter", name="uq_user_achievement_counters_user_counter"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    counter: Mapped[str] = mapped_column(String(50))                # 计数器名称
+    value: Mapped[float] = mapped_column(Float, default=0.0)        # 当前值
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 # ==================== 股权赠与模型 ====================
 
 class EquityGiftStatus(str, enum.Enum):
@@ -424,6 +513,9 @@ class ProposalStatus(str, enum.Enum):
 class Proposal(Base):
     """提案表"""
     __tablename__ = "proposals"
+    __table_args__ = (
+        Index("ix_proposals_family_created", "family_id", "created_at"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
@@ -443,6 +535,9 @@ class Proposal(Base):
 class Vote(Base):
     """投票记录表"""
     __tablename__ = "votes"
+    __table_args__ = (
+        Index("ix_votes_proposal_user", "proposal_id", "user_id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     proposal_id: Mapped[int] = mapped_column(ForeignKey("proposals.id"))
@@ -460,6 +555,9 @@ class Vote(Base):
 class Announcement(Base):
     """家庭公告表"""
     __tablename__ = "announcements"
+    __table_args__ = (
+        Index("ix_announcements_family_feed", "family_id", "is_pinned", "created_at", "id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
@@ -467,6 +565,8 @@ class Announcement(Base):
     content: Mapped[str] = mapped_column(Text)  # 公告内容
     images: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 图片URL(JSON数组)
     is_pinned: Mapped[bool] = mapped_column(Boolean, default=False)  # 是否置顶
+    like_count: Mapped[int] = mapped_column(Integer, default=0)  # 点赞数（点赞接口同事务维护）
+    comment_count: Mapped[int] = mapped_column(Integer, default=0)  # 评论数（评论接口同事务维护）
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
     # 关联关系
@@ -477,6 +577,9 @@ class Announcement(Base):
 class AnnouncementLike(Base):
     """公告点赞表"""
     __tablename__ = "announcement_likes"
+    __table_args__ = (
+        Index("ix_announcement_likes_announcement_user", "announcement_id", "user_id"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     announcement_id: Mapped[int] = mapped_column(ForeignKey("announcements.id"))
@@ -490,6 +593,9 @@ class AnnouncementLike(Base):
 class AnnouncementComment(Base):
     """公告评论表"""
     __tablename__ = "announcement_comments"
+    __table_args__ = (
+        Index("ix_announcement_comments_announcement_created", "announcement_id", "created_at"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     announcement_id: Mapped[int] = mapped_column(ForeignKey("announcements.id"))
@@ -533,7 +639,23 @@ class FamilyPet(Base):
     daily_game_counts: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)  # JSON: 每日游戏计数
     claimed_milestones: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)  # JSON: 已领取里程碑
     last_interaction_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # 最近互动时间
-    game_sessions: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)  # JSON: 游戏会话状态
+    game_sessions: Mapped[Optional[str]] = mapped_column(Text, nullable=True, default=None)  # JSON: 家庭游戏记录（_records；旧版也存放会话状态）
+
+
+class PetGameSession(Base):
+    """宠物小游戏会话表（每个家庭成员每种游戏一行，由 app.services.game_sessions 延迟写入）"""
+    __tablename__ = "pet_game_sessions"
+    __table_args__ = (
+        Index("ix_pet_game_sessions_owner", "family_id", "user_id", "game_type", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    game_type: Mapped[str] = mapped_column(String(30))  # memory/stock/adventure/minesweeper
+    state: Mapped[str] = mapped_column(Text)  # JSON: 游戏状态
+    last_active_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # 最后活跃时间（超时判断）
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class PetExpLog(Base):
@@ -596,6 +718,7 @@ class ApprovalRequest(Base):
     executed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # 执行时间
     execution_failed: Mapped[bool] = mapped_column(Boolean, default=False)  # 执行失败标记
     failure_reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 失败原因
+    reminded_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # 最近一次催办时间（手动或后台任务）
     
     # 关联关系
     approval_records: Mapped[List["ApprovalRecord"]] = relationship(back_populates="approval_request")
@@ -617,8 +740,11 @@ class ApprovalRecord(Base):
 
 
 class AnnualReport(Base):
-    """年度财务报告表"""
+    """年度财务报告表（按家庭+年份缓存的报告产物）"""
     __tablename__ = "annual_reports"
+    __table_args__ = (
+        Index("ix_annual_reports_family_year", "family_id", "year", unique=True),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
@@ -632,6 +758,11 @@ class AnnualReport(Base):
     equity_changes: Mapped[str] = mapped_column(Text)  # 各成员股权变化(JSON)
     monthly_data: Mapped[str] = mapped_column(Text)  # 月度数据(JSON)
     highlights: Mapped[str] = mapped_column(Text)  # 年度亮点(JSON)
+    report_data: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 完整报告(JSON)
+    format_version: Mapped[int] = mapped_column(Integer, default=0)  # 报告格式版本，与代码不一致时重新生成
+    data_version: Mapped[int] = mapped_column(Integer, default=0)  # 数据版本，该年及之前的流水变动时递增
+    is_stale: Mapped[bool] = mapped_column(Boolean, default=True)  # 是否需要重新生成
+    generated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
@@ -662,6 +793,8 @@ class TodoList(Base):
     icon: Mapped[str] = mapped_column(String(20), default="📋")  # 图标 emoji
     color: Mapped[str] = mapped_column(String(20), default="#667eea")  # 颜色主题
     sort_order: Mapped[int] = mapped_column(Integer, default=0)  # 排序顺序
+    item_count: Mapped[int] = mapped_column(Integer, default=0)  # 任务数（app.services.todo 增量维护）
+    completed_count: Mapped[int] = mapped_column(Integer, default=0)  # 已完成任务数
     created_by: Mapped[int] = mapped_column(ForeignKey("users.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -673,6 +806,9 @@ class TodoList(Base):
 class TodoItem(Base):
     """清单任务项表"""
     __tablename__ = "todo_items"
+    __table_args__ = (
+        Index("ix_todo_items_list_completed", "list_id", "is_completed"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     list_id: Mapped[int] = mapped_column(ForeignKey("todo_lists.id"))
@@ -717,6 +853,11 @@ class CalendarRepeatType(str, enum.Enum):
 class CalendarEvent(Base):
     """日历事件表"""
     __tablename__ = "calendar_events"
+    __table_args__ = (
+        Index("ix_calendar_events_family_start", "family_id", "start_time"),
+        # 系统事件按来源唯一（用户事件 source_type 为 NULL，不受约束）
+        Index("ix_calendar_events_family_source", "family_id", "source_type", "source_id", unique=True),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
@@ -946,6 +1087,10 @@ class AccountingEntrySource(str, enum.Enum):
 class AccountingEntry(Base):
     """记账条目表"""
     __tablename__ = "accounting_entries"
+    __table_args__ = (
+        # 前缀 (family_id, entry_date) 同时覆盖按家庭+日期的筛选，无需再单独建索引
+        Index("ix_accounting_entries_family_keyset", "family_id", "entry_date", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
@@ -956,7 +1101,7 @@ class AccountingEntry(Base):
     description: Mapped[str] = mapped_column(String(500))
     entry_date: Mapped[datetime] = mapped_column(DateTime)  # 消费日期
     source: Mapped[AccountingEntrySource] = mapped_column(SQLEnum(AccountingEntrySource), default=AccountingEntrySource.MANUAL)
-    image_data: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 照片Base64数据（拍照识别时）
+    image_data: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 照片 URL（拍照识别时，旧数据为 Base64）
     is_accounted: Mapped[bool] = mapped_column(Boolean, default=False)  # 是否已入账（转为支出申请）
     expense_request_id: Mapped[Optional[int]] = mapped_column(ForeignKey("expense_requests.id"), nullable=True)  # 关联的支出申请
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -982,6 +1127,8 @@ class AIProvider(Base):
     default_model: Mapped[str] = mapped_column(String(100), default="")  # 默认模型（从可用模型中选择）
     is_active: Mapped[bool] = mapped_column(Boolean, default=False, index=True)  # 是否为当前活跃服务商（全局唯一一个）
     is_enabled: Mapped[bool] = mapped_column(Boolean, default=True)  # 是否启用（可关闭但保留配置）
+    rate_limit_rpm: Mapped[int] = mapped_column(Integer, default=0)  # 每个模型每分钟请求数上限（0 不限）
+    max_concurrency: Mapped[int] = mapped_column(Integer, default=8)  # 每个模型同时进行的请求数上限（0 不限）
     created_by: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1058,6 +1205,46 @@ class AISkillAttachment(Base):
     skill: Mapped["AISkill"] = relationship("AISkill", back_populates="attachments")
 
 
+class AIResponseCache(Base):
+    """AI 回复缓存表 — 确定性 AI 功能的持久化缓存层（由 app.services.ai_cache 维护）
+
+    cache_key 为 (功能, 服务商地址, 模型, 渲染后的 messages, temperature, max_tokens) 的 SHA-256，
+    过期或超出行数上限时按最近使用时间淘汰；技能/服务商配置变更时整表清空。
+    """
+    __tablename__ = "ai_response_cache"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    cache_key: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    function_key: Mapped[str] = mapped_column(String(50), index=True)
+    model: Mapped[str] = mapped_column(String(100), default="")
+    response: Mapped[str] = mapped_column(Text)  # AI 回复原文
+    hit_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class AICallTelemetry(Base):
+    """AI 调用遥测表 — 每次上游调用一行，只追加（由 app.services.ai_telemetry 批量写入）
+
+    status: ok / error / rate_limited（重试后仍 429）/ busy（调度排队超时）；
+    token 数取自回复中的 usage 字段，上游未返回时为 0。缓存命中不产生上游调用，不记录。
+    """
+    __tablename__ = "ai_call_telemetry"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    function_key: Mapped[str] = mapped_column(String(50), index=True)     # 未指定功能时为 global
+    kind: Mapped[str] = mapped_column(String(20), default="chat")          # chat / stream / vision / transcription
+    model: Mapped[str] = mapped_column(String(100), default="")
+    source: Mapped[str] = mapped_column(String(20), default="")            # function / global / env
+    status: Mapped[str] = mapped_column(String(20), default="ok")
+    latency_ms: Mapped[int] = mapped_column(Integer, default=0)            # 含排队与重试的总耗时
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    retries: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
 class ExternalApp(Base):
     """第三方外部应用配置表 — 全局配置，所有用户可用"""
     __tablename__ = "external_apps"
@@ -1075,3 +1262,57 @@ class ExternalApp(Base):
     created_by: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, onupdate=datetime.utcnow)
+
+
+# ==================== 通知发件箱模型 ====================
+
+class NotificationOutbox(Base):
+    """通知发件箱表 - 待投递的渠道消息
+
+    业务请求在自己的会话中写入，与业务数据同一事务提交或回滚；提交后由
+    app.services.notification_queue 的后台工作协程认领（locked_until 租约）并投递，
+    失败按退避重试；同一家庭的消息按 id 顺序投递。
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_family", "status", "family_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey("families.id"))
+    channel: Mapped[str] = mapped_column(String(30))                        # 渠道名称，如 wechat_work
+    notification_type: Mapped[str] = mapped_column(String(50))              # NotificationType 值
+    payload: Mapped[str] = mapped_column(Text)                              # 渲染好的请求体 JSON
+    dedupe_key: Mapped[str] = mapped_column(String(64), index=True)         # 去重键（家庭+渠道+内容摘要）
+    status: Mapped[str] = mapped_column(String(20), default="pending")      # pending / sent / dead
+    attempts: Mapped[int] = mapped_column(Integer, default=0)               # 已尝试次数
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # 下次可投递时间
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # 投递租约到期时间（认领期间其它工作进程跳过）
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # 最近一次失败原因
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+# ==================== 后台任务模型 ====================
+
+class ScheduledJob(Base):
+    """后台定时任务状态表 - 每个任务一行
+
+    由 app.services.scheduler 维护：lease_owner/lease_expires_at 作为租约，
+    多个 worker 进程中同一时刻只有抢到租约的一个执行该任务；其余字段为运行统计。
+    """
+    __tablename__ = "scheduled_jobs"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)               # 任务名称
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # 下次运行时间
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)  # 当前持有租约的 worker
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # 租约到期时间
+    last_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_status: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)   # success / failed / timeout
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)           # 最近一次失败原因
+    last_result: Mapped[Optional[str]] = mapped_column(Text, nullable=True)          # 最近一次运行结果（JSON）
+    last_duration_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    total_duration_ms: Mapped[int] = mapped_column(Integer, default=0)
+    run_count: Mapped[int] = mapped_column(Integer, default=0)
+    failure_count: Mapped[int] = mapped_column(Integer, default=0)
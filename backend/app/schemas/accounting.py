@@ -68,10 +68,11 @@ class AccountingEntryResponse(AccountingEntryBase):
 
 class AccountingEntryListResponse(BaseModel):
     """记账条目列表响应"""
-    total: int
+    total: Optional[int] = None  # 按游标翻页时不统计
     page: int
     page_size: int
     entries: List[AccountingEntryResponse]
+    next_cursor: Optional[str] = None  # 下一页游标，为空表示没有更多
 
 
 class AccountingPhotoOCRResponse(BaseModel):
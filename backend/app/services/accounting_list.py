@@ -0,0 +1,138 @@
+"""
+小金库 (Golden Nest) - 记账条目列表查询
+
+- 列投影：只查询列表需要的列，照片 Base64（image_data）只在数据库内判断是否存在
+- 批量解析：记账人、消费人昵称合并为一次 IN 查询
+- 键集分页：按 (entry_date, created_at, id) 倒序，游标编码上一页最后一条的排序键，
+  翻到任意深度都只扫描 page_size 行；仍兼容 page/OFFSET 分页
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, func, and_, desc, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import User, AccountingEntry
+
+# 列表排序键（倒序）
+ORDER_COLUMNS = (AccountingEntry.entry_date, AccountingEntry.created_at, AccountingEntry.id)
+
+_LIST_COLUMNS = (
+    AccountingEntry.id,
+    AccountingEntry.family_id,
+    AccountingEntry.user_id,
+    AccountingEntry.consumer_id,
+    AccountingEntry.amount,
+    AccountingEntry.category,
+    AccountingEntry.description,
+    AccountingEntry.entry_date,
+    AccountingEntry.source,
+    and_(AccountingEntry.image_data.isnot(None), AccountingEntry.image_data != "").label("has_image"),
+    AccountingEntry.is_accounted,
+    AccountingEntry.expense_request_id,
+    AccountingEntry.created_at,
+)
+
+
+def encode_cursor(entry_date: datetime, created_at: datetime, entry_id: int) -> str:
+    """将排序键编码为不透明的游标字符串"""
+    raw = json.dumps([entry_date.isoformat(), created_at.isoformat(), entry_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, datetime, int]:
+    """
+    解析游标
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        entry_date, created_at, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(entry_date), datetime.fromisoformat(created_at), int(entry_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+async def resolve_nicknames(db: AsyncSession, user_ids) -> Dict[int, str]:
+    """一次查询批量获取用户昵称"""
+    ids = {uid for uid in user_ids if uid}
+    if not ids:
+        return {}
+    result = await db.execute(select(User.id, User.nickname).where(User.id.in_(ids)))
+    return dict(result.all())
+
+
+async def list_accounting_entries(
+    db: AsyncSession,
+    conditions: Sequence[Any],
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    page: Optional[int] = None,
+    with_total: bool = True,
+) -> Dict[str, Any]:
+    """
+    查询记账条目列表
+
+    Args:
+        db: 数据库会话
+        conditions: 过滤条件（至少包含 family_id 条件）
+        page_size: 每页条数
+        cursor: 上一页返回的 next_cursor，提供时忽略 page
+        page: 页码（OFFSET 分页，兼容旧客户端）
+        with_total: 是否统计总数（游标翻页时通常不需要）
+
+    Returns:
+        {"total", "entries", "next_cursor"}，entries 为字典列表，
+        已附带 has_image、user_nickname、consumer_nickname
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    where = list(conditions)
+    total = None
+    if with_total:
+        total = (await db.execute(
+            select(func.count(AccountingEntry.id)).where(and_(*where))
+        )).scalar() or 0
+
+    if cursor:
+        where.append(tuple_(*ORDER_COLUMNS) < tuple_(*decode_cursor(cursor)))
+
+    # 多取一条用于判断是否还有下一页
+    query = (
+        select(*_LIST_COLUMNS)
+        .where(and_(*where))
+        .order_by(*(desc(col) for col in ORDER_COLUMNS))
+        .limit(page_size + 1)
+    )
+    if not cursor and page and page > 1:
+        query = query.offset((page - 1) * page_size)
+
+    rows = (await db.execute(query)).mappings().all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    nicknames = await resolve_nicknames(
+        db, [row["user_id"] for row in rows] + [row["consumer_id"] for row in rows]
+    )
+
+    entries: List[Dict[str, Any]] = []
+    for row in rows:
+        entry = dict(row)
+        entry["category"] = row["category"].value
+        entry["source"] = row["source"].value
+        entry["has_image"] = bool(row["has_image"])
+        entry["user_nickname"] = nicknames.get(row["user_id"])
+        entry["consumer_nickname"] = nicknames.get(row["consumer_id"]) if row["consumer_id"] else None
+        entries.append(entry)
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last["entry_date"], last["created_at"], last["id"])
+
+    return {"total": total, "entries": entries, "next_cursor": next_cursor}
@@ -2,7 +2,7 @@
 成就系统服务 - 成就定义和检测逻辑
 """
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, FrozenSet, NamedTuple
 from sqlalchemy import select, func, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 import json
@@ -12,6 +12,7 @@ from app.models.models import (
     ExpenseRequest, Transaction, FamilyMember, Family,
     AchievementCategory, AchievementRarity
 )
+from app.services.achievement_counters import load_user_counters, current_streak
 
 
 # ==================== 成就定义数据 ====================
@@ -556,6 +557,126 @@ CATEGORY_NAMES = {
 }
 
 
+# ==================== 成就判定规则 ====================
+
+# 规则类型：
+# - counter: 读取同名的用户计数器（app.services.achievement_counters 增量维护）
+# - streak:  读取待办连续天数计数器
+# - context: 只依赖本次事件携带的上下文
+# - time:    只依赖当前时间，任何事件都参与判定
+# - query:   仍由 _check_achievement_condition 查询数据库
+RuleKind = str
+
+# 任何事件都参与判定
+ANY_EVENT = "*"
+
+# trigger_type -> (规则类型, 依赖的事件类型)
+TRIGGER_RULES: Dict[str, Tuple[RuleKind, FrozenSet[str]]] = {
+    # 存款
+    "deposit_count": ("counter", frozenset({"deposit"})),
+    "total_deposit": ("counter", frozenset({"deposit"})),
+    "exact_deposit": ("context", frozenset({"deposit"})),
+    "single_deposit": ("context", frozenset({"deposit"})),
+    "deposit_days": ("query", frozenset({"deposit"})),
+    # 理财
+    "investment_count": ("query", frozenset({"investment"})),
+    "active_investment_count": ("query", frozenset({"investment"})),
+    "total_principal": ("query", frozenset({"investment"})),
+    "investment_type_count": ("query", frozenset({"investment"})),
+    "income_count": ("query", frozenset({"income"})),
+    "total_income": ("query", frozenset({"income"})),
+    "monthly_income": ("query", frozenset({"income"})),
+    # 支出与审核
+    "expense_count": ("counter", frozenset({"expense"})),
+    "total_expense": ("counter", frozenset({"expense"})),
+    "single_expense": ("context", frozenset({"expense"})),
+    "review_count": ("counter", frozenset({"expense"})),
+    "reject_count": ("counter", frozenset({"expense"})),
+    "approved_streak": ("query", frozenset({"expense"})),
+    # 投票与赠送
+    "vote_count": ("counter", frozenset({"vote"})),
+    "proposal_count": ("counter", frozenset({"vote"})),
+    "proposal_passed": ("counter", frozenset({"vote"})),
+    "gift_count": ("counter", frozenset({"gift"})),
+    "receive_gift": ("counter", frozenset({"gift"})),
+    # 家庭
+    "create_family": ("query", frozenset({"family"})),
+    "join_family": ("query", frozenset({"family"})),
+    "family_members": ("query", frozenset({"family"})),
+    "invite_count": ("query", frozenset({"family"})),
+    # 待办
+    "todo_complete_count": ("counter", frozenset({"todo"})),
+    "todo_on_time_count": ("counter", frozenset({"todo"})),
+    "todo_high_priority_count": ("counter", frozenset({"todo"})),
+    "todo_assigned_complete": ("counter", frozenset({"todo"})),
+    "todo_list_count": ("counter", frozenset({"todo"})),
+    "todo_day_streak": ("streak", frozenset({"todo"})),
+    # 日历
+    "calendar_event_count": ("counter", frozenset({"calendar"})),
+    "calendar_family_event_count": ("counter", frozenset({"calendar"})),
+    "calendar_birthday_event_count": ("counter", frozenset({"calendar"})),
+    "calendar_repeat_event_count": ("counter", frozenset({"calendar"})),
+    "calendar_participant_invite_count": ("query", frozenset({"calendar"})),
+    "calendar_sync_count": ("query", frozenset({"calendar_sync"})),
+    # 宠物与游戏
+    "login_streak": ("query", frozenset({"pet"})),
+    "pet_level": ("query", frozenset({"pet"})),
+    "pet_age": ("query", frozenset({"pet"})),
+    "adventure_clear": ("context", frozenset({"game"})),
+    "adventure_endless_floor": ("context", frozenset({"game"})),
+    # 时间彩蛋 / 账户年龄
+    "time_range": ("time", frozenset({ANY_EVENT})),
+    "date": ("time", frozenset({ANY_EVENT})),
+    "date_range": ("time", frozenset({ANY_EVENT})),
+    "lunar_date": ("time", frozenset({ANY_EVENT})),
+    "lunar_date_range": ("time", frozenset({ANY_EVENT})),
+    "lunar_new_year_eve": ("time", frozenset({ANY_EVENT})),
+    "account_age": ("query", frozenset({ANY_EVENT})),
+    # 成就数量在本次其他成就判定完成后单独处理
+    "achievement_count": ("counter", frozenset()),
+}
+
+# 上下文 action -> 事件类型
+ACTION_EVENTS: Dict[str, str] = {
+    "deposit": "deposit",
+    "expense": "expense",
+    "investment_create": "investment",
+    "investment_income": "income",
+    "create_family": "family",
+    "join_family": "family",
+    "invite_member": "family",
+}
+
+
+def events_from_context(context: Dict[str, Any]) -> Optional[Set[str]]:
+    """
+    从旧式上下文推断事件类型
+
+    Returns:
+        事件类型集合；无法推断时返回 None（全量判定）
+    """
+    events = set()
+    action = context.get("action")
+    if action in ACTION_EVENTS:
+        events.add(ACTION_EVENTS[action])
+    if "adventure_cleared" in context or "adventure_endless_floor" in context:
+        events.add("game")
+    if "sync_count" in context:
+        events.add("calendar_sync")
+    return events or None
+
+
+class AchievementDefinition(NamedTuple):
+    """成就定义的判定字段（进程内缓存，避免每次检查都加载全部成就）"""
+    id: int
+    code: str
+    trigger_type: str
+    trigger_value: Optional[str]
+
+
+_definition_cache: Optional[List[AchievementDefinition]] = None
+
+
 # ==================== 成就服务类 ====================
 
 class AchievementService:
@@ -563,6 +684,8 @@ class AchievementService:
     
     def __init__(self, db: AsyncSession):
         self.db = db
+        # 单次检查内的查询结果缓存（同一查询被多个阈值的成就复用）
+        self._scalar_cache: Dict[Any, Any] = {}
     
     async def init_achievements(self):
         """初始化成就定义（幂等操作，支持并发请求）"""
@@ -671,60 +794,125 @@ class AchievementService:
         
         return user_achievement
     
-    async def check_and_unlock(self, user_id: int, context: Dict[str, Any] = None) -> List[UserAchievement]:
-        """检查并解锁符合条件的成就"""
+    async def get_definitions(self) -> List[AchievementDefinition]:
+        """获取成就判定字段（进程内缓存）"""
+        global _definition_cache
+        if _definition_cache is None:
+            # 确保成就定义已初始化
+            await self.init_achievements()
+            result = await self.db.execute(
+                select(Achievement.id, Achievement.code, Achievement.trigger_type, Achievement.trigger_value)
+                .order_by(Achievement.id)
+            )
+            _definition_cache = [AchievementDefinition(*row) for row in result.all()]
+        return _definition_cache
+    
+    async def check_and_unlock(
+        self,
+        user_id: int,
+        context: Dict[str, Any] = None,
+        events: Optional[Set[str]] = None,
+    ) -> List[UserAchievement]:
+        """
+        检查并解锁符合条件的成就
+        
+        只判定依赖本次事件的规则；计数类规则读取用户计数器，不再逐条 COUNT/SUM。
+        
+        Args:
+            user_id: 用户ID
+            context: 事件上下文（如 deposit_amount、adventure_cleared）
+            events: 事件类型集合（见 TRIGGER_RULES）；为 None 时从 context 推断，
+                仍无法推断则全量判定（如手动触发检查）
+        """
         new_unlocks = []
         context = context or {}
+        if events is None:
+            events = events_from_context(context)
         
-        # 确保成就定义已初始化
-        await self.init_achievements()
+        # 先写入本次业务记录，使计数器包含它们
+        await self.db.flush()
+        self._scalar_cache = {}
         
-        # 获取所有成就定义
-        all_achievements = await self.db.execute(select(Achievement))
-        achievements = all_achievements.scalars().all()
+        definitions = await self.get_definitions()
         
         # 获取用户已解锁的成就
         unlocked_result = await self.db.execute(
             select(UserAchievement.achievement_id)
             .where(UserAchievement.user_id == user_id)
         )
-        unlocked_ids = set(row[0] for row in unlocked_result.fetchall())
+        unlocked_ids = set(unlocked_result.scalars().all())
+        
+        counters = await load_user_counters(self.db, user_id)
         
-        # 检查每个未解锁的成就
-        for achievement in achievements:
-            if achievement.id in unlocked_ids:
+        achievement_count_rules = []
+        for definition in definitions:
+            if definition.id in unlocked_ids:
+                continue
+            rule = TRIGGER_RULES.get(definition.trigger_type)
+            if rule is None:
+                continue
+            kind, depends_on = rule
+            if definition.trigger_type == "achievement_count":
+                achievement_count_rules.append(definition)
+                continue
+            if events is not None and ANY_EVENT not in depends_on and not (depends_on & events):
                 continue
             
-            if await self._check_achievement_condition(user_id, achievement, context):
-                user_achievement = await self.unlock_achievement(user_id, achievement.code)
-                if user_achievement:
-                    new_unlocks.append(user_achievement)
-        
+            if await self._evaluate_rule(user_id, definition, kind, counters, context):
+                new_unlocks.append(self._grant(user_id, definition))
+        
+        # 成就数量类：计入本次新解锁的成就，按阈值从小到大判定
+        if new_unlocks or events is None:
+            unlocked_count = counters.get("achievement_count", 0) + len(new_unlocks)
+            for definition in sorted(achievement_count_rules, key=lambda d: int(d.trigger_value)):
+                if unlocked_count >= int(definition.trigger_value):
+                    new_unlocks.append(self._grant(user_id, definition))
+                    unlocked_count += 1
+        
+        if new_unlocks:
+            await self.db.flush()  # 只 flush 不 commit，让调用方控制事务
         return new_unlocks
     
-    async def _check_achievement_condition(self, user_id: int, achievement: Achievement, context: Dict[str, Any]) -> bool:
-        """检查单个成就条件是否满足"""
+    async def _evaluate_rule(
+        self,
+        user_id: int,
+        definition: AchievementDefinition,
+        kind: RuleKind,
+        counters: Dict[str, float],
+        context: Dict[str, Any],
+    ) -> bool:
+        """按规则类型判定单个成就"""
+        if kind == "counter":
+            return counters.get(definition.trigger_type, 0) >= float(definition.trigger_value)
+        if kind == "streak":
+            return current_streak(counters) >= int(definition.trigger_value)
+        return await self._check_achievement_condition(user_id, definition, context)
+    
+    async def _scalar(self, stmt):
+        """执行标量查询，同一次检查内相同的查询只执行一次"""
+        compiled = stmt.compile()
+        key = (str(compiled), tuple(sorted(compiled.params.items())))
+        if key not in self._scalar_cache:
+            result = await self.db.execute(stmt)
+            self._scalar_cache[key] = result.scalar()
+        return self._scalar_cache[key]
+    
+    def _grant(self, user_id: int, definition: AchievementDefinition) -> UserAchievement:
+        user_achievement = UserAchievement(
+            user_id=user_id,
+            achievement_id=definition.id,
+            unlocked_at=datetime.utcnow()
+        )
+        self.db.add(user_achievement)
+        return user_achievement
+    
+    async def _check_achievement_condition(self, user_id: int, achievement, context: Dict[str, Any]) -> bool:
+        """检查单个成就条件是否满足（计数类规则由用户计数器判定，见 TRIGGER_RULES）"""
         trigger_type = achievement.trigger_type
         trigger_value = achievement.trigger_value
         
-        # 存款次数检查
-        if trigger_type == "deposit_count":
-            result = await self.db.execute(
-                select(func.count(Deposit.id)).where(Deposit.user_id == user_id)
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        # 累计存款金额检查
-        elif trigger_type == "total_deposit":
-            result = await self.db.execute(
-                select(func.sum(Deposit.amount)).where(Deposit.user_id == user_id)
-            )
-            total = result.scalar() or 0
-            return total >= float(trigger_value)
-        
         # 精确存款金额检查（彩蛋）
-        elif trigger_type == "exact_deposit":
+        if trigger_type == "exact_deposit":
             if "deposit_amount" in context:
                 return abs(context["deposit_amount"] - float(trigger_value)) < 0.01
             return False
@@ -736,17 +924,16 @@ class AchievementService:
         
         # 理财产品数量检查
         elif trigger_type == "investment_count":
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(Investment.id))
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
                 .where(FamilyMember.user_id == user_id)
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         # 活跃理财产品数量检查
         elif trigger_type == "active_investment_count":
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(Investment.id))
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
                 .where(
@@ -755,24 +942,7 @@ class AchievementService:
                         Investment.is_active == True
                     )
                 )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        # 支出申请数量检查
-        elif trigger_type == "expense_count":
-            result = await self.db.execute(
-                select(func.count(ExpenseRequest.id)).where(ExpenseRequest.requester_id == user_id)
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        # 成就解锁数量检查
-        elif trigger_type == "achievement_count":
-            result = await self.db.execute(
-                select(func.count(UserAchievement.id)).where(UserAchievement.user_id == user_id)
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         # 时间段检查（彩蛋）
@@ -789,84 +959,25 @@ class AchievementService:
         
         # 账户年龄检查
         elif trigger_type == "account_age":
-            result = await self.db.execute(
+            created_at = await self._scalar(
                 select(User.created_at).where(User.id == user_id)
             )
-            created_at = result.scalar()
             if created_at:
                 days = (datetime.utcnow() - created_at).days
                 return days >= int(trigger_value)
             return False
         
-        # ==================== 投票类成就检测 ====================
-        elif trigger_type == "vote_count":
-            from app.models.models import Vote, Proposal
-            result = await self.db.execute(
-                select(func.count(Vote.id))
-                .join(Proposal, Vote.proposal_id == Proposal.id)
-                .join(FamilyMember, FamilyMember.family_id == Proposal.family_id)
-                .where(
-                    Vote.user_id == user_id,
-                    FamilyMember.user_id == user_id
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "proposal_count":
-            from app.models.models import Proposal
-            result = await self.db.execute(
-                select(func.count(Proposal.id)).where(Proposal.creator_id == user_id)
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "proposal_passed":
-            from app.models.models import Proposal, ProposalStatus
-            result = await self.db.execute(
-                select(func.count(Proposal.id)).where(
-                    Proposal.creator_id == user_id,
-                    Proposal.status == ProposalStatus.PASSED
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
         # ==================== 签到连续天数检测 ====================
         elif trigger_type == "login_streak":
             from app.models.models import FamilyPet
             # 通过宠物的连续签到天数判断
-            result = await self.db.execute(
+            streak = await self._scalar(
                 select(FamilyPet.checkin_streak)
                 .join(FamilyMember, FamilyMember.family_id == FamilyPet.family_id)
                 .where(FamilyMember.user_id == user_id)
-            )
-            streak = result.scalar() or 0
+            ) or 0
             return streak >= int(trigger_value)
         
-        # ==================== 股权赠送检测 ====================
-        elif trigger_type == "gift_count":
-            from app.models.models import EquityGift, EquityGiftStatus
-            result = await self.db.execute(
-                select(func.count(EquityGift.id)).where(
-                    EquityGift.from_user_id == user_id,
-                    EquityGift.status == EquityGiftStatus.ACCEPTED
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "receive_gift":
-            from app.models.models import EquityGift, EquityGiftStatus
-            result = await self.db.execute(
-                select(func.count(EquityGift.id)).where(
-                    EquityGift.to_user_id == user_id,
-                    EquityGift.status == EquityGiftStatus.ACCEPTED
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
         # ==================== 单笔存款金额检测 ====================
         elif trigger_type == "single_deposit":
             if "deposit_amount" in context:
@@ -876,24 +987,22 @@ class AchievementService:
         # ==================== 理财收益检测 ====================
         elif trigger_type == "income_count":
             from app.models.models import InvestmentIncome
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(InvestmentIncome.id))
                 .join(Investment, InvestmentIncome.investment_id == Investment.id)
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
                 .where(FamilyMember.user_id == user_id)
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         elif trigger_type == "total_income":
             from app.models.models import InvestmentIncome
-            result = await self.db.execute(
+            total = await self._scalar(
                 select(func.sum(InvestmentIncome.amount))
                 .join(Investment, InvestmentIncome.investment_id == Investment.id)
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
                 .where(FamilyMember.user_id == user_id)
-            )
-            total = result.scalar() or 0
+            ) or 0
             return total >= float(trigger_value)
         
         elif trigger_type == "monthly_income":
@@ -901,7 +1010,7 @@ class AchievementService:
             # 统计当月收益
             now = datetime.now()
             start_of_month = datetime(now.year, now.month, 1)
-            result = await self.db.execute(
+            monthly_total = await self._scalar(
                 select(func.sum(InvestmentIncome.amount))
                 .join(Investment, InvestmentIncome.investment_id == Investment.id)
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
@@ -909,32 +1018,29 @@ class AchievementService:
                     FamilyMember.user_id == user_id,
                     InvestmentIncome.income_date >= start_of_month
                 )
-            )
-            monthly_total = result.scalar() or 0
+            ) or 0
             return monthly_total >= float(trigger_value)
         
         elif trigger_type == "total_principal":
-            result = await self.db.execute(
+            total = await self._scalar(
                 select(func.sum(Investment.principal))
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
                 .where(
                     FamilyMember.user_id == user_id,
                     Investment.is_active == True
                 )
-            )
-            total = result.scalar() or 0
+            ) or 0
             return total >= float(trigger_value)
         
         elif trigger_type == "investment_type_count":
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(func.distinct(Investment.investment_type)))
                 .join(FamilyMember, FamilyMember.family_id == Investment.family_id)
                 .where(
                     FamilyMember.user_id == user_id,
                     Investment.is_active == True
                 )
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         # ==================== 支出类成就检测 ====================
@@ -943,38 +1049,6 @@ class AchievementService:
                 return context["expense_amount"] >= float(trigger_value)
             return False
         
-        elif trigger_type == "total_expense":
-            from app.models.models import ExpenseStatus
-            result = await self.db.execute(
-                select(func.sum(ExpenseRequest.amount)).where(
-                    ExpenseRequest.requester_id == user_id,
-                    ExpenseRequest.status == ExpenseStatus.APPROVED
-                )
-            )
-            total = result.scalar() or 0
-            return total >= float(trigger_value)
-        
-        elif trigger_type == "review_count":
-            from app.models.models import ExpenseApproval
-            result = await self.db.execute(
-                select(func.count(ExpenseApproval.id)).where(
-                    ExpenseApproval.approver_id == user_id
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "reject_count":
-            from app.models.models import ExpenseApproval
-            result = await self.db.execute(
-                select(func.count(ExpenseApproval.id)).where(
-                    ExpenseApproval.approver_id == user_id,
-                    ExpenseApproval.is_approved == False
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
         elif trigger_type == "approved_streak":
             from app.models.models import ExpenseStatus
             # 获取用户最近N次支出申请（按ID降序）
@@ -1083,28 +1157,26 @@ class AchievementService:
         
         elif trigger_type == "family_members":
             # 检查用户所在家庭的成员数量
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(FamilyMember.id))
                 .where(FamilyMember.family_id.in_(
                     select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
                 ))
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         elif trigger_type == "invite_count":
             # 用户邀请的成员数量（通过审批记录来判断）
             from app.models.models import ApprovalRequest, ApprovalRequestType, ApprovalRequestStatus, ApprovalRecord
             # 获取用户所在的家庭
-            fm_result = await self.db.execute(
+            family_id = await self._scalar(
                 select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
             )
-            family_id = fm_result.scalar()
             if not family_id:
                 return False
             
             # 统计该家庭中被批准加入的成员申请（用户审批通过的）
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(ApprovalRecord.id))
                 .join(ApprovalRequest, ApprovalRecord.request_id == ApprovalRequest.id)
                 .where(
@@ -1114,314 +1186,63 @@ class AchievementService:
                     ApprovalRecord.approver_id == user_id,
                     ApprovalRecord.is_approved == True
                 )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        # ==================== 待办任务类成就检测 (TODO) ====================
-        elif trigger_type == "todo_complete_count":
-            # 完成的待办任务数量
-            from app.models.models import TodoItem, TodoList
-            # 获取用户所在的家庭
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(TodoItem.id))
-                .join(TodoList, TodoItem.list_id == TodoList.id)
-                .where(
-                    TodoList.family_id == family_id,
-                    TodoItem.is_completed == True,
-                    TodoItem.completed_by == user_id
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "todo_day_streak":
-            # 连续完成任务天数
-            from app.models.models import TodoItem, TodoList
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            # 获取所有完成日期
-            result = await self.db.execute(
-                select(func.date(TodoItem.completed_at))
-                .join(TodoList, TodoItem.list_id == TodoList.id)
-                .where(
-                    TodoList.family_id == family_id,
-                    TodoItem.is_completed == True,
-                    TodoItem.completed_by == user_id,
-                    TodoItem.completed_at.isnot(None)
-                )
-                .distinct()
-                .order_by(func.date(TodoItem.completed_at).desc())
-            )
-            dates = [row[0] for row in result.fetchall()]
-            
-            if not dates:
-                return False
-            
-            # 检查今天或昨天是否有完成任务
-            today = datetime.now().date()
-            if dates[0] < today - timedelta(days=1):
-                return False
-            
-            # 计算连续天数
-            streak = 1
-            for i in range(1, len(dates)):
-                if (dates[i-1] - dates[i]).days == 1:
-                    streak += 1
-                else:
-                    break
-            
-            return streak >= int(trigger_value)
-        
-        elif trigger_type == "todo_on_time_count":
-            # 准时完成的任务数量（有截止日期且在截止日期前完成）
-            from app.models.models import TodoItem, TodoList
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(TodoItem.id))
-                .join(TodoList, TodoItem.list_id == TodoList.id)
-                .where(
-                    TodoList.family_id == family_id,
-                    TodoItem.is_completed == True,
-                    TodoItem.completed_by == user_id,
-                    TodoItem.due_date.isnot(None),
-                    TodoItem.completed_at <= TodoItem.due_date
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "todo_list_count":
-            # 创建的清单数量
-            from app.models.models import TodoList
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(TodoList.id))
-                .where(
-                    TodoList.family_id == family_id,
-                    TodoList.created_by == user_id
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "todo_high_priority_count":
-            # 完成的高优先级任务数量
-            from app.models.models import TodoItem, TodoList
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(TodoItem.id))
-                .join(TodoList, TodoItem.list_id == TodoList.id)
-                .where(
-                    TodoList.family_id == family_id,
-                    TodoItem.is_completed == True,
-                    TodoItem.completed_by == user_id,
-                    TodoItem.priority == "high"
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "todo_assigned_complete":
-            # 完成的指派给自己的任务数量
-            from app.models.models import TodoItem, TodoList
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(TodoItem.id))
-                .join(TodoList, TodoItem.list_id == TodoList.id)
-                .where(
-                    TodoList.family_id == family_id,
-                    TodoItem.is_completed == True,
-                    TodoItem.completed_by == user_id,
-                    TodoItem.assignee_id == user_id,
-                    TodoItem.created_by != user_id  # 不是自己创建的
-                )
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         # ==================== 日历类成就检测 (CALENDAR) ====================
-        elif trigger_type == "calendar_event_count":
-            # 创建的日历事件数量
-            from app.models.models import CalendarEvent
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(CalendarEvent.id))
-                .where(
-                    CalendarEvent.family_id == family_id,
-                    CalendarEvent.created_by == user_id
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
         elif trigger_type == "calendar_sync_count":
             # 通过 context 传递同步次数
             if "sync_count" in context:
                 return context["sync_count"] >= int(trigger_value)
             # 或者查询数据库中的系统生成事件数量（作为同步的代理指标）
             from app.models.models import CalendarEvent
-            fm_result = await self.db.execute(
+            family_id = await self._scalar(
                 select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
             )
-            family_id = fm_result.scalar()
             if not family_id:
                 return False
             
             # 统计系统生成的事件（is_system = True）
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(CalendarEvent.id))
                 .where(
                     CalendarEvent.family_id == family_id,
                     CalendarEvent.is_system == True
                 )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "calendar_family_event_count":
-            # 创建的家庭活动类事件数量
-            from app.models.models import CalendarEvent
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(CalendarEvent.id))
-                .where(
-                    CalendarEvent.family_id == family_id,
-                    CalendarEvent.created_by == user_id,
-                    CalendarEvent.category == "family"
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-        
-        elif trigger_type == "calendar_birthday_event_count":
-            # 创建的生日/纪念日事件数量
-            from app.models.models import CalendarEvent
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(CalendarEvent.id))
-                .where(
-                    CalendarEvent.family_id == family_id,
-                    CalendarEvent.created_by == user_id,
-                    or_(
-                        CalendarEvent.category == "birthday",
-                        CalendarEvent.category == "anniversary"
-                    )
-                )
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
         elif trigger_type == "calendar_participant_invite_count":
             # 邀请参与者数量
             from app.models.models import CalendarEvent, CalendarEventParticipant
-            fm_result = await self.db.execute(
+            family_id = await self._scalar(
                 select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
             )
-            family_id = fm_result.scalar()
             if not family_id:
                 return False
             
             # 统计用户创建的事件中的参与者数量
-            result = await self.db.execute(
+            count = await self._scalar(
                 select(func.count(CalendarEventParticipant.id))
                 .join(CalendarEvent, CalendarEventParticipant.event_id == CalendarEvent.id)
                 .where(
                     CalendarEvent.family_id == family_id,
                     CalendarEvent.created_by == user_id
                 )
-            )
-            count = result.scalar() or 0
+            ) or 0
             return count >= int(trigger_value)
         
-        elif trigger_type == "calendar_repeat_event_count":
-            # 创建的重复事件数量
-            from app.models.models import CalendarEvent, CalendarRepeatType
-            fm_result = await self.db.execute(
-                select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-            )
-            family_id = fm_result.scalar()
-            if not family_id:
-                return False
-            
-            result = await self.db.execute(
-                select(func.count(CalendarEvent.id))
-                .where(
-                    CalendarEvent.family_id == family_id,
-                    CalendarEvent.created_by == user_id,
-                    CalendarEvent.repeat_type != CalendarRepeatType.NONE
-                )
-            )
-            count = result.scalar() or 0
-            return count >= int(trigger_value)
-
         # 宠物等级检查
         elif trigger_type == "pet_level":
             from app.models.models import FamilyPet
-            fm_result = await self.db.execute(
+            family_id = await self._scalar(
                 select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
             )
-            family_id = fm_result.scalar()
             if not family_id:
                 return False
-            pet_result = await self.db.execute(
+            pet_level = await self._scalar(
                 select(FamilyPet.level).where(FamilyPet.family_id == family_id)
             )
-            pet_level = pet_result.scalar()
             if pet_level is None:
                 return False
             return pet_level >= int(trigger_value)
@@ -1429,16 +1250,14 @@ class AchievementService:
         # 宠物年龄检查
         elif trigger_type == "pet_age":
             from app.models.models import FamilyPet
-            fm_result = await self.db.execute(
+            family_id = await self._scalar(
                 select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
             )
-            family_id = fm_result.scalar()
             if not family_id:
                 return False
-            pet_result = await self.db.execute(
+            created_at = await self._scalar(
                 select(FamilyPet.created_at).where(FamilyPet.family_id == family_id)
             )
-            created_at = pet_result.scalar()
             if created_at is None:
                 return False
             age_days = (datetime.now() - created_at).days
@@ -1463,11 +1282,10 @@ class AchievementService:
     
     async def _calculate_deposit_days(self, user_id: int) -> int:
         """计算累计存款天数（不同日期的存款天数总和）"""
-        result = await self.db.execute(
+        count = await self._scalar(
             select(func.count(func.distinct(func.date(Deposit.deposit_date))))
             .where(Deposit.user_id == user_id)
-        )
-        count = result.scalar() or 0
+        ) or 0
         return count
     
     async def _calculate_deposit_streak(self, user_id: int) -> int:
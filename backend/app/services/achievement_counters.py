@@ -0,0 +1,370 @@
+"""
+小金库 (Golden Nest) - 成就计数器服务
+
+把成就判定依赖的按用户累计值（存款次数/金额、支出、审核、投票、赠送、
+待办完成与连续天数、日历事件、已解锁成就数）物化到 user_achievement_counters。
+
+- 增量维护：注册在 Session 的 after_flush 事件上，业务记录新增/修改/删除时
+  按「修改前贡献 - 修改后贡献」在同一事务内累加到计数器；绕过 flush 的批量写入
+  （如日历系统事件的 Core INSERT/DELETE）由写入方调用 apply_counter_changes 补记
+- 惰性回填：用户缺少 _built 计数器时，读取方从历史记录全量重建
+- 校验修复：verify_user_counters 比对计数器与历史记录，rebuild_user_counters 全量重算
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, date
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, or_, event, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    Deposit, ExpenseRequest, ExpenseApproval, ExpenseStatus, Vote, Proposal, ProposalStatus,
+    EquityGift, EquityGiftStatus, TodoItem, TodoList, TodoPriority, CalendarEvent,
+    CalendarRepeatType, UserAchievement, UserAchievementCounter,
+)
+
+logger = logging.getLogger(__name__)
+
+# 回填标记：存在即表示该用户计数器已从历史记录构建
+COUNTER_BUILT = "_built"
+
+# 待办连续完成天数：当前连续天数 / 最近一次完成日期（date.toordinal()）
+TODO_STREAK = "todo_streak"
+TODO_STREAK_DAY = "todo_streak_day"
+
+# 计数器与历史记录的允许误差（浮点累加误差）
+DRIFT_TOLERANCE = 0.01
+
+Contribution = Iterable[Tuple[int, str, float]]
+
+
+# ==================== 各类记录对计数器的贡献 ====================
+
+def _deposit(o) -> Contribution:
+    yield o.user_id, "deposit_count", 1
+    yield o.user_id, "total_deposit", o.amount or 0.0
+
+
+def _expense_request(o) -> Contribution:
+    yield o.requester_id, "expense_count", 1
+    if o.status == ExpenseStatus.APPROVED:
+        yield o.requester_id, "total_expense", o.amount or 0.0
+
+
+def _expense_approval(o) -> Contribution:
+    yield o.approver_id, "review_count", 1
+    if o.is_approved is False:
+        yield o.approver_id, "reject_count", 1
+
+
+def _vote(o) -> Contribution:
+    yield o.user_id, "vote_count", 1
+
+
+def _proposal(o) -> Contribution:
+    yield o.creator_id, "proposal_count", 1
+    if o.status == ProposalStatus.PASSED:
+        yield o.creator_id, "proposal_passed", 1
+
+
+def _equity_gift(o) -> Contribution:
+    if o.status == EquityGiftStatus.ACCEPTED:
+        yield o.from_user_id, "gift_count", 1
+        yield o.to_user_id, "receive_gift", 1
+
+
+def _todo_item(o) -> Contribution:
+    if not o.is_completed or not o.completed_by:
+        return
+    user_id = o.completed_by
+    yield user_id, "todo_complete_count", 1
+    if o.priority == TodoPriority.HIGH:
+        yield user_id, "todo_high_priority_count", 1
+    if o.due_date is not None and o.completed_at is not None and o.completed_at <= o.due_date:
+        yield user_id, "todo_on_time_count", 1
+    if o.assignee_id == user_id and o.created_by != user_id:
+        yield user_id, "todo_assigned_complete", 1
+
+
+def _todo_list(o) -> Contribution:
+    yield o.created_by, "todo_list_count", 1
+
+
+def _calendar_event(o) -> Contribution:
+    yield o.created_by, "calendar_event_count", 1
+    if o.category == "family":
+        yield o.created_by, "calendar_family_event_count", 1
+    if o.category in ("birthday", "anniversary"):
+        yield o.created_by, "calendar_birthday_event_count", 1
+    if o.repeat_type is not None and o.repeat_type != CalendarRepeatType.NONE:
+        yield o.created_by, "calendar_repeat_event_count", 1
+
+
+def _user_achievement(o) -> Contribution:
+    yield o.user_id, "achievement_count", 1
+
+
+# 模型 -> (贡献函数, 归属用户字段)；归属字段用于从历史记录回填单个用户
+COUNTER_SOURCES: Dict[type, Tuple[Callable, tuple]] = {
+    Deposit: (_deposit, ("user_id",)),
+    ExpenseRequest: (_expense_request, ("requester_id",)),
+    ExpenseApproval: (_expense_approval, ("approver_id",)),
+    Vote: (_vote, ("user_id",)),
+    Proposal: (_proposal, ("creator_id",)),
+    EquityGift: (_equity_gift, ("from_user_id", "to_user_id")),
+    TodoItem: (_todo_item, ("completed_by",)),
+    TodoList: (_todo_list, ("created_by",)),
+    CalendarEvent: (_calendar_event, ("created_by",)),
+    UserAchievement: (_user_achievement, ("user_id",)),
+}
+
+
+def _snapshot(obj, previous: bool):
+    """取对象 flush 前（previous=True）或当前的列值快照，不触发加载"""
+    state = inspect(obj)
+    values = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if previous:
+            history = state.attrs[key].history
+            if history.deleted:
+                values[key] = history.deleted[0]
+                continue
+        values[key] = state.dict.get(key)
+    return SimpleNamespace(**values)
+
+
+def _completion_day(o) -> Optional[int]:
+    """待办完成日期序号，未完成返回 None"""
+    if o.is_completed and o.completed_by and o.completed_at:
+        return o.completed_at.date().toordinal()
+    return None
+
+
+def advance_streak(streak: float, last_day: float, day: int) -> Tuple[float, float]:
+    """
+    在连续天数上追加一次完成记录
+
+    Returns:
+        (新连续天数, 新最近完成日期序号)
+    """
+    if last_day and day <= last_day:
+        return streak, last_day
+    if last_day and day == last_day + 1:
+        return streak + 1, day
+    return 1, day
+
+
+def current_streak(counters: Dict[str, float], today: Optional[date] = None) -> int:
+    """今天或昨天有完成记录时返回连续天数，否则为 0"""
+    today = today or datetime.now().date()
+    last_day = counters.get(TODO_STREAK_DAY, 0)
+    if not last_day or last_day < today.toordinal() - 1:
+        return 0
+    return int(counters.get(TODO_STREAK, 0))
+
+
+# ==================== 增量维护 ====================
+
+@event.listens_for(Session, "after_flush")
+def _apply_counter_deltas(session: Session, flush_context) -> None:
+    """在同一事务内把本次 flush 的记录变化增量写入成就计数器"""
+    deltas: Dict[Tuple[int, str], float] = defaultdict(float)
+    completions: Dict[int, List[int]] = defaultdict(list)
+
+    def collect(obj, before, after) -> None:
+        _accumulate(deltas, COUNTER_SOURCES[type(obj)][0], before, after)
+        if isinstance(obj, TodoItem) and after is not None:
+            day = _completion_day(after)
+            if day is not None and (before is None or _completion_day(before) is None):
+                completions[after.completed_by].append(day)
+
+    for obj in session.new:
+        if type(obj) in COUNTER_SOURCES:
+            collect(obj, None, _snapshot(obj, previous=False))
+    for obj in session.deleted:
+        if type(obj) in COUNTER_SOURCES:
+            collect(obj, _snapshot(obj, previous=True), None)
+    for obj in session.dirty:
+        if type(obj) in COUNTER_SOURCES and session.is_modified(obj, include_collections=False):
+            collect(obj, _snapshot(obj, previous=True), _snapshot(obj, previous=False))
+
+    rows = _delta_rows(deltas)
+    if not rows and not completions:
+        return
+
+    conn = session.connection()
+    table = UserAchievementCounter.__table__
+    if rows:
+        conn.execute(_add_deltas_stmt(), rows)
+
+    # 连续天数不可加，读取当前值后推进
+    for user_id, days in completions.items():
+        current = dict(conn.execute(
+            select(table.c.counter, table.c.value).where(
+                table.c.user_id == user_id,
+                table.c.counter.in_((TODO_STREAK, TODO_STREAK_DAY)),
+            )
+        ).all())
+        streak, last_day = current.get(TODO_STREAK, 0), current.get(TODO_STREAK_DAY, 0)
+        for day in sorted(days):
+            streak, last_day = advance_streak(streak, last_day, day)
+        _upsert_values(conn, user_id, {TODO_STREAK: streak, TODO_STREAK_DAY: last_day})
+
+
+def _accumulate(deltas: Dict[Tuple[int, str], float], contribute: Callable, before, after) -> None:
+    if before is not None:
+        for user_id, counter, value in contribute(before):
+            deltas[(user_id, counter)] -= value
+    if after is not None:
+        for user_id, counter, value in contribute(after):
+            deltas[(user_id, counter)] += value
+
+
+def _delta_rows(deltas: Dict[Tuple[int, str], float]) -> List[dict]:
+    return [
+        {"user_id": user_id, "counter": counter, "value": value, "updated_at": datetime.utcnow()}
+        for (user_id, counter), value in deltas.items()
+        if user_id and abs(value) > 1e-9
+    ]
+
+
+def _add_deltas_stmt():
+    table = UserAchievementCounter.__table__
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "counter"],
+        set_={"value": table.c.value + stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+    )
+
+
+async def apply_counter_changes(db: AsyncSession, model: type, changes: Iterable[tuple]) -> None:
+    """
+    为绕过 ORM flush 的批量写入补记计数器增量（不提交事务，由调用方管理）
+
+    Args:
+        db: 数据库会话（与批量写入同一事务）
+        model: 记录模型，须在 COUNTER_SOURCES 中
+        changes: (修改前, 修改后) 记录快照，新增时修改前为 None，删除时修改后为 None；
+                 快照只需包含贡献函数用到的字段
+    """
+    deltas: Dict[Tuple[int, str], float] = defaultdict(float)
+    contribute = COUNTER_SOURCES[model][0]
+    for before, after in changes:
+        _accumulate(deltas, contribute, before, after)
+    rows = _delta_rows(deltas)
+    if rows:
+        await db.execute(_add_deltas_stmt(), rows)
+
+
+def _upsert_values(conn, user_id: int, values: Dict[str, float]) -> None:
+    table = UserAchievementCounter.__table__
+    stmt = sqlite_insert(table)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "counter"],
+            set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+        ),
+        [
+            {"user_id": user_id, "counter": counter, "value": value, "updated_at": datetime.utcnow()}
+            for counter, value in values.items()
+        ],
+    )
+
+
+# ==================== 全量计算 / 回填 / 校验 ====================
+
+async def compute_user_counters(db: AsyncSession, user_id: int) -> Dict[str, float]:
+    """从历史记录全量计算用户的成就计数器（回填与校验使用）"""
+    counters: Dict[str, float] = defaultdict(float)
+    for model, (contribute, user_columns) in COUNTER_SOURCES.items():
+        result = await db.execute(
+            select(model).where(or_(*(getattr(model, col) == user_id for col in user_columns)))
+        )
+        for obj in result.scalars().all():
+            for owner, counter, value in contribute(obj):
+                if owner == user_id:
+                    counters[counter] += value
+
+    # 待办连续天数：按完成日期从旧到新推进
+    result = await db.execute(
+        select(TodoItem.completed_at).where(
+            TodoItem.completed_by == user_id,
+            TodoItem.is_completed == True,
+            TodoItem.completed_at.isnot(None),
+        )
+    )
+    streak, last_day = 0, 0
+    for day in sorted({ts.date().toordinal() for ts in result.scalars().all()}):
+        streak, last_day = advance_streak(streak, last_day, day)
+    if last_day:
+        counters[TODO_STREAK] = streak
+        counters[TODO_STREAK_DAY] = last_day
+
+    return dict(counters)
+
+
+async def rebuild_user_counters(db: AsyncSession, user_id: int) -> Dict[str, float]:
+    """全量重建用户计数器（不提交事务，由调用方管理）"""
+    table = UserAchievementCounter.__table__
+    # 先写后读：删除语句获取写锁，避免与并发的增量更新交错
+    await db.execute(delete(table).where(table.c.user_id == user_id))
+    counters = await compute_user_counters(db, user_id)
+    counters[COUNTER_BUILT] = 1
+    await db.execute(
+        table.insert(),
+        [
+            {"user_id": user_id, "counter": counter, "value": value, "updated_at": datetime.utcnow()}
+            for counter, value in counters.items()
+        ],
+    )
+    return counters
+
+
+async def load_user_counters(db: AsyncSession, user_id: int) -> Dict[str, float]:
+    """
+    读取用户的成就计数器，未回填时先从历史记录重建
+
+    Returns:
+        计数器名称 -> 值
+    """
+    result = await db.execute(
+        select(UserAchievementCounter.counter, UserAchievementCounter.value)
+        .where(UserAchievementCounter.user_id == user_id)
+    )
+    counters = dict(result.all())
+    if COUNTER_BUILT not in counters:
+        logger.info(f"Backfilling achievement counters for user {user_id}")
+        counters = await rebuild_user_counters(db, user_id)
+    return counters
+
+
+async def verify_user_counters(db: AsyncSession, user_id: int) -> List[dict]:
+    """
+    比对用户计数器与历史记录
+
+    Returns:
+        漂移列表，每项为 {"counter", "expected"(历史记录), "actual"(计数器)}；
+        未回填时返回单条 counter=_built 的记录
+    """
+    result = await db.execute(
+        select(UserAchievementCounter.counter, UserAchievementCounter.value)
+        .where(UserAchievementCounter.user_id == user_id)
+    )
+    actual = dict(result.all())
+    if COUNTER_BUILT not in actual:
+        return [{"counter": COUNTER_BUILT, "expected": 1, "actual": None}]
+
+    expected = await compute_user_counters(db, user_id)
+    drifts = []
+    # 连续天数只前进不回退（取消完成不扣减），不参与校验
+    skipped = {COUNTER_BUILT, TODO_STREAK, TODO_STREAK_DAY}
+    for counter in (set(expected) | set(actual)) - skipped:
+        exp, act = expected.get(counter, 0.0), actual.get(counter, 0.0)
+        if abs(exp - act) > DRIFT_TOLERANCE:
+            drifts.append({"counter": counter, "expected": exp, "actual": act})
+    return drifts
@@ -6,13 +6,14 @@ import base64
 import json
 import re
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from app.schemas.accounting import (
     AccountingPhotoOCRResponse,
     AccountingVoiceTranscriptResponse,
     PhotoRecognizeItem,
 )
 from app.services.ai_service import ai_service, resolve_skill, _skill_cache_loaded, load_skill_cache
+from app.services.category_batcher import category_batcher
 
 logger = logging.getLogger(__name__)
 
@@ -185,12 +186,20 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
         转录的文本内容
     """
     import httpx
+    import time
     from app.core.config import get_active_ai_config, settings
+    from app.services.ai_telemetry import ai_telemetry, usage_tokens
 
     def _get(key: str) -> str:
         val = get_active_ai_config(key)
         return val if val else getattr(settings, key, "")
 
+    def _record(model: str, status: str, started: float, usage=None):
+        ai_telemetry.record(
+            "voice_transcription", kind="transcription", model=model, source="global", status=status,
+            latency_ms=(time.perf_counter() - started) * 1000, **usage_tokens(usage),
+        )
+
     api_key = _get("AI_API_KEY")
     base_url = _get("AI_BASE_URL")
 
@@ -209,6 +218,7 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
 
     # --- 方案1: 尝试 Whisper API（OpenAI / Azure） ---
     whisper_url = f"{base_url.rstrip('/')}/audio/transcriptions"
+    started = time.perf_counter()
     try:
         async with httpx.AsyncClient(timeout=60.0) as client:
             files = {"file": (filename, audio_bytes)}
@@ -220,6 +230,7 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
                 text = result.get("text", "").strip()
                 if text:
                     logger.info(f"Whisper OK: {text[:100]}")
+                    _record("whisper-1", "ok", started, result.get("usage"))
                     from app.services.ai_service import ai_call_metadata
                     ai_call_metadata.set({
                         "function_key": "voice_transcription",
@@ -230,6 +241,7 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
                     return text
     except Exception as e:
         logger.info(f"Whisper not available: {e}")
+    _record("whisper-1", "error", started)
 
     # --- 方案2: 使用后台配置的 AI_MODEL ---
     chat_url = f"{base_url.rstrip('/')}/chat/completions"
@@ -292,6 +304,8 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
 
     logger.info(f"Trying audio transcription (stream) via configured model → {ai_model}, format={actual_ext}")
     error_msg = None
+    started = time.perf_counter()
+    usage = None
     try:
         async with httpx.AsyncClient(timeout=120.0) as client:
             # 先发送请求，获取完整响应头
@@ -321,6 +335,8 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
                             break
                         try:
                             chunk = json.loads(data_str)
+                            if chunk.get("usage"):
+                                usage = chunk["usage"]
                             choices = chunk.get("choices", [])
                             if choices:
                                 delta = choices[0].get("delta", {})
@@ -333,6 +349,7 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
                     text = "".join(collected_text).strip()
                     if text:
                         logger.info(f"Audio OK ({ai_model}): {text[:100]}")
+                        _record(ai_model, "ok", started, usage)
                         from app.services.ai_service import ai_call_metadata
                         ai_call_metadata.set({
                             "function_key": "voice_transcription",
@@ -352,6 +369,7 @@ async def transcribe_audio_file(audio_bytes: bytes, filename: str = "audio.webm"
         import traceback
         logger.error(f"Audio error ({ai_model}): {e}\n{traceback.format_exc()}")
 
+    _record(ai_model, "error", started, usage)
     raise ValueError(
         error_msg or (
             f"语音转录失败（模型: {ai_model}）。"
@@ -415,6 +433,7 @@ async def parse_voice_text(text: str) -> List[PhotoRecognizeItem]:
             function_key="voice_parse",
             prompt_vars={"text": text},
             temperature=0.1,
+            cache=True,
         )
 
         if result is None:
@@ -600,6 +619,7 @@ async def categorize_entry(description: str, amount: Optional[float] = None) ->
             system_prompt="你是一个消费分类助手，根据用户提供的消费信息返回最合适的分类代码。",
             function_key="auto_category",
             prompt_vars={"description": description, "amount": str(amount) if amount else "未知"},
+            cache=True,
         )
 
         # 清理返回值（去除可能的空格、换行）
@@ -691,6 +711,7 @@ async def check_duplicate_with_ai(
                 "existing_entry_amount": str(existing_entry_amount),
                 "existing_entry_category": existing_entry_category,
             },
+            cache=True,
         )
 
         # 解析JSON响应
@@ -784,7 +805,7 @@ async def _parse_excel(file_bytes: bytes, filename: str) -> List[PhotoRecognizeI
 
     if col_map.get("amount") is not None and col_map.get("description") is not None:
         # 直接解析（不需要 AI）
-        return _parse_rows_with_mapping(header, data_rows, col_map)
+        return await _parse_rows_with_mapping(header, data_rows, col_map)
     else:
         # 列名不明确，用 AI 辅助解析
         return await _parse_table_with_ai(header, data_rows)
@@ -819,7 +840,7 @@ async def _parse_csv(file_bytes: bytes) -> List[PhotoRecognizeItem]:
     col_map = _detect_columns(header)
 
     if col_map.get("amount") is not None and col_map.get("description") is not None:
-        return _parse_rows_with_mapping(header, data_rows, col_map)
+        return await _parse_rows_with_mapping(header, data_rows, col_map)
     else:
         return await _parse_table_with_ai(header, data_rows)
 
@@ -999,15 +1020,16 @@ def _detect_columns(header: List[str]) -> Dict[str, Optional[int]]:
     return col_map
 
 
-def _parse_rows_with_mapping(
+async def _parse_rows_with_mapping(
     header: List[str],
     data_rows: List[tuple],
     col_map: Dict[str, Optional[int]]
 ) -> List[PhotoRecognizeItem]:
-    """根据列映射直接解析行数据"""
+    """根据列映射直接解析行数据（未填分类的行归为 other；填写了但无法识别的分类合并为少量 AI 调用判断）"""
     from dateutil import parser as date_parser
 
     items = []
+    raw_categories: List[Optional[str]] = []
     for row in data_rows:
         if not row or all(c is None or str(c).strip() == "" for c in row):
             continue
@@ -1051,23 +1073,28 @@ def _parse_rows_with_mapping(
                 except Exception:
                     pass
 
-        # 解析分类
-        category = "other"
+        # 解析分类（稍后统一确定）
+        raw_cat = None
         if col_map["category"] is not None and col_map["category"] < len(row):
             raw_cat = row[col_map["category"]]
-            if raw_cat:
-                category = _map_category(str(raw_cat).strip())
+        raw_categories.append(str(raw_cat).strip() if raw_cat else None)
 
         items.append(PhotoRecognizeItem(
             amount=amount,
             description=description,
-            category=category,
+            category="other",
             entry_date=entry_date,
             confidence=0.9,
         ))
 
     if not items:
         raise ValueError("未能从文件中解析出有效的消费记录")
+
+    categories = await resolve_categories([
+        (raw, item.description, item.amount) for raw, item in zip(raw_categories, items)
+    ])
+    for item, category in zip(items, categories):
+        item.category = category
     return items
 
 
@@ -1112,6 +1139,37 @@ def _map_category(raw: str) -> str:
     return "other"
 
 
+# 明确填写为“其他”的原始分类，不再交给 AI 判断
+_EXPLICIT_OTHER = {"other", "其他", "其它"}
+
+
+async def resolve_categories(
+    entries: List[Tuple[Optional[str], str, Optional[float]]],
+) -> List[str]:
+    """
+    批量确定分类，entries 为 (原始分类, 描述, 金额) 列表，结果顺序一致。
+
+    原始分类能由 _map_category 识别时直接使用；未填写分类的条目与以往一样归为 other，不调用 AI；
+    填写了但无法识别的分类交给 category_batcher，按时间窗口合并为少量批量 AI 调用。
+    """
+    results: List[str] = []
+    ambiguous: List[int] = []
+    for i, (raw, description, amount) in enumerate(entries):
+        raw = (raw or "").strip()
+        category = _map_category(raw) if raw else "other"
+        if raw and category == "other" and raw.lower() not in _EXPLICIT_OTHER:
+            ambiguous.append(i)
+        results.append(category)
+
+    if ambiguous:
+        classified = await category_batcher.classify_many([
+            (entries[i][1], entries[i][2]) for i in ambiguous
+        ])
+        for i, category in zip(ambiguous, classified):
+            results[i] = category
+    return results
+
+
 async def _parse_table_with_ai(header: List[str], data_rows: List[tuple]) -> List[PhotoRecognizeItem]:
     """用 AI 解析表格数据（列名不明确时的兜底方案）"""
     # 构建表格文本（限制大小）
@@ -1247,6 +1305,7 @@ async def _parse_text_with_ai(text: str, source_type: str) -> List[PhotoRecogniz
             prompt_vars={"text": text, "source_type": source_type},
             temperature=0.1,
             max_tokens=4000,
+            cache=True,
         )
 
         return _extract_items_from_ai_response(response_text, source_type)
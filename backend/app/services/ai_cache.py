@@ -0,0 +1,271 @@
+"""
+小金库 (Golden Nest) - AI 回复缓存
+
+分类、重复检测、表格/语音解析等确定性 AI 功能经常收到完全相同的输入（同一商户描述、
+同一导入表头），命中缓存即可省去一次完整的 LLM 往返。
+
+- 缓存键：(功能, 服务商地址, 模型, 渲染后的 messages, temperature, max_tokens) 的 SHA-256，
+  技能模板改动后渲染结果不同，切换服务商/模型后键也随之变化
+- 两级存储：进程内 LRU（条目数 + 字节数上限）+ ai_response_cache 表（行数上限），均带 TTL；
+  内存未命中时查表，命中后回填内存
+- 同一键的并发请求只调用一次 AI，其余等待同一结果；发起调用的请求被取消时由一个等待者接手
+- 技能缓存或服务商/功能模型配置刷新时 invalidate() 清空两级缓存
+- 按功能统计命中率（stats()）
+
+只缓存成功的回复；缓存读写失败只记录日志，不影响 AI 调用本身。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.models import AIResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    function_key: str,
+    base_url: str,
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """计算缓存键"""
+    payload = json.dumps(
+        [function_key, base_url.rstrip("/"), model, messages, temperature, max_tokens],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("response", "expires_at", "size")
+
+    def __init__(self, response: str, expires_at: datetime):
+        self.response = response
+        self.expires_at = expires_at
+        self.size = len(response.encode("utf-8"))
+
+
+class AIResponseCacheStore:
+    """
+    AI 回复缓存
+
+    Args:
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+        ttl: 条目有效期（秒）
+        max_entries: 内存中的条目数上限
+        max_bytes: 内存中回复文本的总字节数上限
+        max_rows: 持久化表的行数上限（每 trim_every 次写入清理一次过期和超出的行）
+    """
+
+    def __init__(
+        self,
+        session_maker=None,
+        ttl: float = 7 * 86400,
+        max_entries: int = 2000,
+        max_bytes: int = 8 * 1024 * 1024,
+        max_rows: int = 20000,
+        trim_every: int = 100,
+    ):
+        self._session_maker = session_maker
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.trim_every = trim_every
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes = 0
+        self._generation = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _maker(self):
+        if self._session_maker is None:
+            from app.core.database import async_session_maker
+            self._session_maker = async_session_maker
+        return self._session_maker
+
+    # ==================== 读写 ====================
+
+    async def get_or_call(
+        self, key: str, function_key: str, model: str, call: Callable[[], Awaitable[str]],
+        now: Optional[datetime] = None,
+    ) -> str:
+        """命中缓存时返回缓存的回复，否则调用 call() 并缓存其结果（call 抛出的异常原样传出，不缓存）"""
+        now = now or datetime.utcnow()
+        stats = self._stats.setdefault(function_key, {"memory_hits": 0, "db_hits": 0, "misses": 0})
+
+        while True:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._memory.move_to_end(key)
+                    stats["memory_hits"] += 1
+                    return entry.response
+                self._drop(key)
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            # 同一键已有请求在进行中，等待其结果（视为命中）
+            try:
+                response = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # 发起调用的请求被取消时共享的 future 随之取消；本请求未被取消则重新查缓存，
+                # 由第一个醒来的等待者接手调用，其余继续等待它
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                continue
+            stats["memory_hits"] += 1
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            generation = self._generation
+            row = await self._load(key, now)
+            if row is not None:
+                stats["db_hits"] += 1
+                response, expires_at = row
+            else:
+                stats["misses"] += 1
+                response = await call()
+                expires_at = now + timedelta(seconds=self.ttl)
+                if generation == self._generation:
+                    await self._persist(key, function_key, model, response, now, expires_at)
+            if generation == self._generation:
+                self._remember(key, _Entry(response, expires_at))
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其它等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _remember(self, key: str, entry: _Entry):
+        self._drop(key)
+        self._memory[key] = entry
+        self._memory_bytes += entry.size
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size
+
+    def _drop(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size
+
+    async def _load(self, key: str, now: datetime) -> Optional[Tuple[str, datetime]]:
+        """从持久化表读取未过期的回复及其过期时间，命中时更新使用时间"""
+        try:
+            async with self._maker()() as db:
+                row = (await db.execute(
+                    select(AIResponseCache.response, AIResponseCache.expires_at)
+                    .where(AIResponseCache.cache_key == key, AIResponseCache.expires_at > now)
+                )).one_or_none()
+                if row is not None:
+                    await db.execute(
+                        update(AIResponseCache)
+                        .where(AIResponseCache.cache_key == key)
+                        .values(hit_count=AIResponseCache.hit_count + 1, last_used_at=now)
+                    )
+                    await db.commit()
+                return tuple(row) if row is not None else None
+        except Exception as e:
+            logger.warning(f"读取 AI 回复缓存失败: {e}")
+            return None
+
+    async def _persist(
+        self, key: str, function_key: str, model: str, response: str, now: datetime, expires_at: datetime,
+    ):
+        try:
+            async with self._maker()() as db:
+                stmt = sqlite_insert(AIResponseCache).values(
+                    cache_key=key, function_key=function_key, model=model, response=response,
+                    hit_count=0, created_at=now, last_used_at=now, expires_at=expires_at,
+                )
+                await db.execute(stmt.on_conflict_do_update(
+                    index_elements=["cache_key"],
+                    set_={"response": response, "model": model, "last_used_at": now, "expires_at": expires_at},
+                ))
+                self._writes += 1
+                if self._writes % self.trim_every == 0:
+                    await self._trim(db, now)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"写入 AI 回复缓存失败: {e}")
+
+    async def _trim(self, db, now: datetime):
+        """删除过期行，并按最近使用时间只保留 max_rows 行"""
+        await db.execute(delete(AIResponseCache).where(AIResponseCache.expires_at <= now))
+        keep = (
+            select(AIResponseCache.id)
+            .order_by(AIResponseCache.last_used_at.desc(), AIResponseCache.id.desc())
+            .limit(self.max_rows)
+        )
+        await db.execute(delete(AIResponseCache).where(AIResponseCache.id.not_in(keep)))
+
+    async def trim(self, now: Optional[datetime] = None):
+        """立即清理持久化表"""
+        async with self._maker()() as db:
+            await self._trim(db, now or datetime.utcnow())
+            await db.commit()
+
+    # ==================== 失效与统计 ====================
+
+    async def invalidate(self):
+        """清空两级缓存（技能或服务商配置变更后调用）；进行中的调用结果不再写入"""
+        self._generation += 1
+        self._memory.clear()
+        self._memory_bytes = 0
+        try:
+            async with self._maker()() as db:
+                await db.execute(delete(AIResponseCache))
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"清空 AI 回复缓存失败: {e}")
+        logger.info("AI 回复缓存已清空")
+
+    def stats(self) -> Dict[str, Any]:
+        """按功能统计的命中率，以及内存占用"""
+        functions = []
+        for function_key, s in sorted(self._stats.items()):
+            hits = s["memory_hits"] + s["db_hits"]
+            total = hits + s["misses"]
+            functions.append({
+                "function_key": function_key,
+                "requests": total,
+                "hits": hits,
+                "memory_hits": s["memory_hits"],
+                "db_hits": s["db_hits"],
+                "misses": s["misses"],
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            })
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "functions": functions,
+        }
+
+    def reset_stats(self):
+        self._stats.clear()
+
+
+# ======================== 全局单例 ========================
+ai_response_cache = AIResponseCacheStore()
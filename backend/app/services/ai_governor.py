@@ -0,0 +1,378 @@
+"""
+小金库 (Golden Nest) - AI 调用并发与限流调度
+
+所有发往上游的 chat/completions 请求在发送前向 ai_governor 申请许可，避免批量上传小票等场景下
+请求同时涌向服务商、全部被 429 限流。
+
+- 通道：按 (服务商地址, 模型) 划分，每个通道一个令牌桶（每分钟请求数）和一个并发上限，
+  限额取自 AIProvider 行的 rate_limit_rpm / max_concurrency（0 表示不限）
+- 优先级：交互功能（聊天、宠物对话等）优先于后台功能（自动分类、导入解析等，见
+  AIFunctionDef.priority），同一优先级内按调用方（家庭/用户）轮转，单个家庭的大批量请求
+  不会饿死其它家庭
+- 截止时间：预计等待超过截止时间的请求立即以 AIBusyError 拒绝，排队超时同样拒绝
+- 上游返回 429 时 penalize() 暂停整个通道 retry-after 秒，排队中的请求一起等待，而不是各自重试
+- stats() 提供各通道的排队深度、并发数与等待时间分布
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from app.services.write_behind import percentile
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# 各优先级默认的最长等待时间（秒）
+DEFAULT_DEADLINES = {PRIORITY_INTERACTIVE: 30.0, PRIORITY_BACKGROUND: 300.0}
+# 未在 AIProvider 中配置（如 .env 服务商）的通道的并发上限
+DEFAULT_MAX_CONCURRENCY = 8
+# 令牌桶容量（秒）：允许的突发请求数为此时长内的配额
+BURST_SECONDS = 6
+# 每个通道保留的最近等待时间样本数（用于分位数统计）
+WAIT_SAMPLES = 500
+
+# 当前请求的调用方（"family:{id}" 或 "user:{id}"），用于同一优先级内的公平轮转
+ai_call_owner: contextvars.ContextVar[str] = contextvars.ContextVar("ai_call_owner", default="")
+
+
+def set_ai_call_owner(owner: str) -> None:
+    ai_call_owner.set(owner)
+
+
+class AIBusyError(ValueError):
+    """排队等待会超过截止时间，请求被拒绝"""
+
+
+class Permit:
+    """一次调用许可，完成后 release()（可重复调用）"""
+    __slots__ = ("_lane", "_governor", "_released")
+
+    def __init__(self, governor: "AIGovernor", lane: "_Lane"):
+        self._governor = governor
+        self._lane = lane
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._lane.active -= 1
+        self._governor._dispatch(self._lane)
+
+
+class _Waiter:
+    __slots__ = ("future", "owner", "priority", "enqueued")
+
+    def __init__(self, future: asyncio.Future, owner: str, priority: int, enqueued: float):
+        self.future = future
+        self.owner = owner
+        self.priority = priority
+        self.enqueued = enqueued
+
+
+class _Lane:
+    def __init__(self, key: Tuple[str, str], rpm: int, max_concurrency: int, now: float):
+        self.key = key
+        self.active = 0
+        self.blocked_until = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # priority -> owner -> 该调用方排队中的请求（OrderedDict 顺序即轮转顺序）
+        self.queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self.granted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.max_wait = 0.0
+        self.updated = now
+        self.tokens = float("inf")
+        self.set_limits(rpm, max_concurrency)
+
+    def set_limits(self, rpm: int, max_concurrency: int) -> None:
+        self.rpm = max(0, rpm)
+        self.max_concurrency = max(0, max_concurrency)
+        self.rate = self.rpm / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def refill(self, now: float) -> None:
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def can_start(self, now: float) -> bool:
+        if now < self.blocked_until:
+            return False
+        if self.max_concurrency and self.active >= self.max_concurrency:
+            return False
+        return not self.rate or self.tokens >= 1
+
+    def take(self) -> None:
+        self.active += 1
+        self.granted += 1
+        if self.rate:
+            self.tokens -= 1
+
+    def queued(self, priority: Optional[int] = None) -> int:
+        return sum(
+            len(dq) for p, owners in self.queues.items() if priority is None or p == priority
+            for dq in owners.values()
+        )
+
+    def enqueue(self, waiter: _Waiter) -> None:
+        owners = self.queues.setdefault(waiter.priority, OrderedDict())
+        owners.setdefault(waiter.owner, deque()).append(waiter)
+
+    def remove(self, waiter: _Waiter) -> None:
+        owners = self.queues.get(waiter.priority)
+        dq = owners.get(waiter.owner) if owners else None
+        if dq is not None and waiter in dq:
+            dq.remove(waiter)
+            if not dq:
+                del owners[waiter.owner]
+
+    def pop_next(self) -> Optional[_Waiter]:
+        """取出下一个请求：优先级高者优先，同一优先级内按调用方轮转"""
+        for priority in sorted(self.queues):
+            owners = self.queues[priority]
+            if not owners:
+                continue
+            owner, dq = next(iter(owners.items()))
+            waiter = dq.popleft()
+            if dq:
+                owners.move_to_end(owner)
+            else:
+                del owners[owner]
+            return waiter
+        return None
+
+    def ahead_of(self, owner: str, priority: int) -> int:
+        """新请求入队后排在它前面的请求数（同一优先级内按轮转估算）"""
+        ahead = 0
+        for p, owners in self.queues.items():
+            if p < priority:
+                ahead += sum(len(dq) for dq in owners.values())
+            elif p == priority:
+                rounds = len(owners.get(owner, ())) + 1
+                ahead += sum(min(len(dq), rounds) for o, dq in owners.items() if o != owner)
+                ahead += rounds - 1
+        return ahead
+
+    def estimate_wait(self, owner: str, priority: int, now: float) -> float:
+        """按令牌桶与暂停时间估算的最短等待秒数（只受并发上限约束时无法估算，记为 0）"""
+        wait = max(0.0, self.blocked_until - now)
+        if self.rate:
+            wait = max(wait, (self.ahead_of(owner, priority) + 1 - self.tokens) / self.rate)
+        return wait
+
+    def next_ready_in(self, now: float) -> float:
+        """令牌或暂停导致无法开始时，距离可以开始的秒数"""
+        delay = max(0.0, self.blocked_until - now)
+        if self.rate and self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return delay
+
+    def record_wait(self, wait: float) -> None:
+        self.waits.append(wait)
+        self.max_wait = max(self.max_wait, wait)
+
+
+class AIGovernor:
+    """
+    按 (服务商地址, 模型) 的令牌桶 + 并发上限调度器
+
+    Args:
+        default_max_concurrency: 未配置服务商的通道的并发上限
+        clock: 单调时钟（测试中可替换）
+    """
+
+    def __init__(self, default_max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 clock: Callable[[], float] = time.monotonic):
+        self.default_max_concurrency = default_max_concurrency
+        self._clock = clock
+        self._limits: Dict[str, Tuple[int, int]] = {}
+        self._lanes: Dict[Tuple[str, str], _Lane] = {}
+
+    # ==================== 配置 ====================
+
+    def configure(self, providers: Iterable[Tuple[str, int, int]]) -> None:
+        """
+        设置服务商限额，providers 为 (base_url, rate_limit_rpm, max_concurrency)。
+        同一地址配置了多个服务商时取更严格的限额；已有通道立即按新限额调度。
+        """
+        limits: Dict[str, Tuple[int, int]] = {}
+        for base_url, rpm, concurrency in providers:
+            key = _normalize(base_url)
+            if key in limits:
+                rpm = _stricter(limits[key][0], rpm)
+                concurrency = _stricter(limits[key][1], concurrency)
+            limits[key] = (rpm, concurrency)
+        self._limits = limits
+        for lane in self._lanes.values():
+            lane.set_limits(*self._limits_for(lane.key[0]))
+            self._dispatch(lane)
+
+    def _limits_for(self, base_url: str) -> Tuple[int, int]:
+        return self._limits.get(base_url, (0, self.default_max_concurrency))
+
+    def _lane(self, base_url: str, model: str) -> _Lane:
+        key = (_normalize(base_url), model)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane(key, *self._limits_for(key[0]), now=self._clock())
+        return lane
+
+    # ==================== 申请与释放 ====================
+
+    async def acquire(
+        self,
+        base_url: str,
+        model: str,
+        *,
+        priority: int = PRIORITY_INTERACTIVE,
+        owner: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Permit:
+        """
+        申请调用许可，deadline 为 clock() 时间基准下的截止时刻（默认按优先级）。
+
+        Raises:
+            AIBusyError: 预计或实际等待超过截止时间
+        """
+        lane = self._lane(base_url, model)
+        owner = owner if owner is not None else ai_call_owner.get()
+        now = self._clock()
+        if deadline is None:
+            deadline = now + DEFAULT_DEADLINES.get(priority, DEFAULT_DEADLINES[PRIORITY_BACKGROUND])
+        lane.refill(now)
+
+        if not lane.queued() and lane.can_start(now):
+            lane.take()
+            lane.record_wait(0.0)
+            return Permit(self, lane)
+
+        remaining = deadline - now
+        if lane.estimate_wait(owner, priority, now) > remaining:
+            lane.rejected += 1
+            logger.warning(
+                f"AI 调用排队超过截止时间被拒绝: {lane.key[1]} @ {lane.key[0]} "
+                f"({PRIORITY_NAMES.get(priority, priority)}, 排队 {lane.queued()})"
+            )
+            raise AIBusyError("AI 服务繁忙，请稍后再试")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), owner, priority, now)
+        lane.enqueue(waiter)
+        self._dispatch(lane)
+        try:
+            await asyncio.wait({waiter.future}, timeout=max(0.0, remaining))
+        except asyncio.CancelledError:
+            self._abandon(lane, waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(lane, waiter)
+            lane.timeouts += 1
+            raise AIBusyError("AI 服务繁忙，请稍后再试")
+        return waiter.future.result()
+
+    def _abandon(self, lane: _Lane, waiter: _Waiter) -> None:
+        """放弃等待：已分配的许可立即归还，未分配的移出队列"""
+        if waiter.future.done() and not waiter.future.cancelled():
+            waiter.future.result().release()
+            return
+        waiter.future.cancel()
+        lane.remove(waiter)
+        self._dispatch(lane)
+
+    def _dispatch(self, lane: _Lane) -> None:
+        now = self._clock()
+        lane.refill(now)
+        while lane.queued() and lane.can_start(now):
+            waiter = lane.pop_next()
+            if waiter.future.done():
+                continue
+            lane.take()
+            lane.record_wait(now - waiter.enqueued)
+            waiter.future.set_result(Permit(self, lane))
+        if lane.timer is not None:
+            lane.timer.cancel()
+            lane.timer = None
+        if lane.queued():
+            delay = lane.next_ready_in(now)
+            if delay > 0:
+                # 受并发上限约束时由 release() 触发调度，这里只处理令牌与暂停
+                lane.timer = asyncio.get_running_loop().call_later(delay, self._dispatch, lane)
+
+    def penalize(self, base_url: str, model: str, retry_after: float) -> None:
+        """上游返回 429：暂停通道 retry_after 秒并清空令牌"""
+        lane = self._lane(base_url, model)
+        lane.blocked_until = max(lane.blocked_until, self._clock() + retry_after)
+        if lane.rate:
+            lane.tokens = 0.0
+        self._dispatch(lane)
+
+    # ==================== 统计 ====================
+
+    def stats(self) -> Dict[str, Any]:
+        """各通道的限额、并发数、排队深度与等待时间（毫秒）"""
+        now = self._clock()
+        lanes = []
+        for (base_url, model), lane in sorted(self._lanes.items()):
+            lane.refill(now)
+            waits = list(lane.waits)
+            lanes.append({
+                "base_url": base_url,
+                "model": model,
+                "rate_limit_rpm": lane.rpm,
+                "max_concurrency": lane.max_concurrency,
+                "active": lane.active,
+                "queued": {name: lane.queued(p) for p, name in PRIORITY_NAMES.items()},
+                "tokens": round(lane.tokens, 2) if lane.rate else None,
+                "paused_seconds": round(max(0.0, lane.blocked_until - now), 1),
+                "granted": lane.granted,
+                "rejected": lane.rejected,
+                "timeouts": lane.timeouts,
+                "wait_ms": {
+                    "avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    "p50": round(percentile(waits, 0.5) * 1000, 1),
+                    "p95": round(percentile(waits, 0.95) * 1000, 1),
+                    "max": round(lane.max_wait * 1000, 1),
+                },
+            })
+        return {"lanes": lanes}
+
+
+def _normalize(base_url: str) -> str:
+    return (base_url or "").rstrip("/")
+
+
+def _stricter(a: int, b: int) -> int:
+    """两个限额中更严格的一个（0 表示不限）"""
+    return min(a, b) if a and b else (a or b)
+
+
+async def load_provider_limits(session_maker=None) -> None:
+    """从 AIProvider 表加载已启用服务商的限额"""
+    try:
+        from sqlalchemy import select
+        from app.models.models import AIProvider
+
+        if session_maker is None:
+            from app.core.database import async_session_maker
+            session_maker = async_session_maker
+        async with session_maker() as db:
+            rows = (await db.execute(
+                select(AIProvider.base_url, AIProvider.rate_limit_rpm, AIProvider.max_concurrency)
+                .where(AIProvider.is_enabled == True)
+            )).all()
+        ai_governor.configure((r[0], r[1] or 0, r[2] or 0) for r in rows)
+    except Exception as e:
+        logger.warning(f"加载 AI 服务商限额失败: {e}")
+
+
+# ======================== 全局单例 ========================
+ai_governor = AIGovernor()
@@ -8,7 +8,10 @@
 - 支持按功能（function_key）使用不同服务商+模型
 - 未配置的功能自动回退到全局活跃服务商
 - 内置错误状态报告，方便前端感知
-- 429 限流自动重试
+- 按服务商/模型限流与并发调度（见 app.services.ai_governor），429 时暂停整个通道后重试
+- 流式输出（OpenAI 兼容的 stream=true SSE 格式），以首字节时间（TTFB）衡量延迟
+- 确定性功能可开启回复缓存（cache=True，见 app.services.ai_cache）
+- 每次上游调用的耗时、token 用量、状态与重试次数写入遥测表（见 app.services.ai_telemetry）
 - 单例模式，共享 HTTP 连接池
 
 使用示例：
@@ -19,19 +22,30 @@
 
     # 不指定 function_key 则使用全局默认
     reply = await ai_service.chat("你好", system_prompt="你是助手")
+
+    # 流式输出：建立连接后逐段迭代增量文本
+    stream = await ai_service.chat_stream("你好", function_key="chat_reply")
+    async for delta in stream:
+        ...
 """
 import json
 import logging
 import asyncio
 import re
+import time
 import contextvars
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from string import Template
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 
 import httpx
 
 from app.core.config import settings, get_active_ai_config
+from app.services.ai_cache import ai_response_cache, make_cache_key
+from app.services.ai_governor import (
+    ai_governor, load_provider_limits, AIBusyError, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, DEFAULT_DEADLINES,
+)
+from app.services.ai_telemetry import ai_telemetry, usage_tokens
 
 # 请求级 AI 调用元数据，供中间件读取后注入响应头
 # 值格式: {"function_key": str, "model": str, "source": str, "function_name": str}
@@ -99,6 +113,7 @@ async def load_function_model_configs():
             _function_model_cache = cache
             _cache_loaded = True
             logger.info(f"已加载 {len(cache)} 条功能模型配置到缓存")
+        await load_provider_limits()
     except Exception as e:
         logger.warning(f"加载功能模型配置失败: {e}")
         _cache_loaded = True  # 标记已尝试加载，避免重复
@@ -107,6 +122,7 @@ async def load_function_model_configs():
 async def refresh_function_model_cache():
     """刷新缓存（配置变更后调用）"""
     await load_function_model_configs()
+    await ai_response_cache.invalidate()
 
 
 # ==================== AI 技能缓存 ====================
@@ -172,6 +188,7 @@ async def load_skill_cache():
 async def refresh_skill_cache():
     """刷新技能缓存（技能变更后调用）"""
     await load_skill_cache()
+    await ai_response_cache.invalidate()
 
 
 def resolve_skill(function_key: str, prompt_vars: Optional[Dict[str, Any]] = None):
@@ -227,6 +244,14 @@ def _get_ai_config(key: str) -> str:
     return getattr(settings, key, "")
 
 
+def _retry_after_seconds(response: httpx.Response) -> float:
+    """429 响应的 retry-after（秒，缺失或无法解析时为 5，最长 30）"""
+    try:
+        return min(max(float(response.headers.get("retry-after", "5")), 0.0), 30.0)
+    except ValueError:
+        return 5.0
+
+
 def _resolve_config_for_function(function_key: str = "") -> ResolvedAIConfig:
     """
     为指定功能解析最终使用的 AI 配置。
@@ -277,6 +302,251 @@ def _resolve_config_for_function(function_key: str = "") -> ResolvedAIConfig:
     )
 
 
+@dataclass
+class _PreparedCall:
+    """一次 chat/completions 调用的配置与请求内容"""
+    cfg: ResolvedAIConfig
+    model: str
+    function_key: str
+    api_url: str
+    headers: Dict[str, str]
+    body: Dict[str, Any]
+    permit: Any = field(default=None, repr=False)  # 流式调用持有的调度许可，流结束时释放
+    retries: int = 0       # 429 重试次数
+    http_status: int = 0   # 最近一次失败的 HTTP 状态码
+
+    @property
+    def fk_tag(self) -> str:
+        return f"[{self.function_key}] " if self.function_key else ""
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        fn_name = ""
+        if self.function_key:
+            try:
+                from app.core.ai_functions import AI_FUNCTION_REGISTRY
+                fn_def = AI_FUNCTION_REGISTRY.get(self.function_key)
+                fn_name = fn_def.name if fn_def else self.function_key
+            except Exception:
+                fn_name = self.function_key
+        return {
+            "function_key": self.function_key or "global",
+            "function_name": fn_name,
+            "model": self.model,
+            "source": self.cfg.source,
+        }
+
+    def publish_metadata(self):
+        """写入请求级上下文，供中间件注入响应头"""
+        ai_call_metadata.set(self.metadata)
+
+    @property
+    def priority(self) -> int:
+        try:
+            from app.core.ai_functions import AI_FUNCTION_REGISTRY
+            fn_def = AI_FUNCTION_REGISTRY.get(self.function_key)
+        except Exception:
+            fn_def = None
+        return PRIORITY_BACKGROUND if fn_def and fn_def.priority == "background" else PRIORITY_INTERACTIVE
+
+    def release_permit(self):
+        if self.permit is not None:
+            self.permit.release()
+            self.permit = None
+
+    @property
+    def kind(self) -> str:
+        if self.body.get("stream"):
+            return "stream"
+        for message in self.body.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+                return "vision"
+        return "chat"
+
+    def failure_status(self, error: BaseException) -> str:
+        if isinstance(error, AIBusyError):
+            return "busy"
+        return "rate_limited" if self.http_status == 429 else "error"
+
+    def record_telemetry(self, status: str, started: float, usage: Any = None):
+        """记录本次上游调用（耗时从发出请求前开始计算，含排队与重试）"""
+        ai_telemetry.record(
+            self.function_key,
+            kind=self.kind,
+            model=self.model,
+            source=self.cfg.source,
+            status=status,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            retries=self.retries,
+            **usage_tokens(usage),
+        )
+
+
+class AIChatStream:
+    """
+    流式回复（OpenAI 兼容 SSE 格式：逐行 `data: {json}`，以 `data: [DONE]` 结束）。
+
+    异步迭代得到增量文本；迭代结束后 text 为完整回复，ttfb_ms 为从发出请求到
+    收到首段文本的毫秒数，total_ms 为总耗时。迭代结束或出错时自动关闭上游连接，
+    提前放弃时调用 aclose()。
+
+    Raises（迭代过程中）:
+        ValueError: 连接中断或上游在流中返回错误
+    """
+
+    def __init__(self, call: _PreparedCall, response: httpx.Response, started: float):
+        self._call = call
+        self._response = response
+        self._started = started
+        self.metadata = call.metadata
+        self.text = ""
+        self.ttfb_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self._usage: Any = None
+        self._recorded = False
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iter_deltas()
+
+    async def _iter_deltas(self) -> AsyncIterator[str]:
+        fk_tag = self._call.fk_tag
+        parts: List[str] = []
+        status = "cancelled"
+        try:
+            async for line in self._response.aiter_lines():
+                data = parse_sse_data(line)
+                if data is None:
+                    continue
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"{fk_tag}AI stream: 无法解析的数据块 {data[:200]}")
+                    continue
+                if chunk.get("error"):
+                    logger.error(f"{fk_tag}AI stream error: {chunk['error']}")
+                    status = "error"
+                    raise ValueError("AI 服务返回了意外的结果")
+                if chunk.get("usage"):
+                    self._usage = chunk["usage"]
+                delta = _stream_delta_text(chunk)
+                if not delta:
+                    continue
+                if self.ttfb_ms is None:
+                    self.ttfb_ms = (time.perf_counter() - self._started) * 1000
+                parts.append(delta)
+                yield delta
+            status = "ok"
+        except httpx.HTTPError as e:
+            logger.error(f"{fk_tag}AI stream connection error: {e}")
+            status = "error"
+            raise ValueError(f"AI 服务连接失败: {str(e)}")
+        finally:
+            await self._response.aclose()
+            self._call.release_permit()
+            self.text = "".join(parts)
+            self.total_ms = (time.perf_counter() - self._started) * 1000
+            self._record(status)
+        ttfb = f"{self.ttfb_ms:.0f}ms" if self.ttfb_ms is not None else "-"
+        logger.info(
+            f"{fk_tag}AI stream response ({len(self.text)} chars), TTFB {ttfb}, "
+            f"total {self.total_ms:.0f}ms: {self.text[:200]}..."
+        )
+
+    async def aclose(self):
+        """提前结束时关闭上游连接"""
+        await self._response.aclose()
+        self._call.release_permit()
+        self._record("cancelled")
+
+    def _record(self, status: str):
+        if not self._recorded:
+            self._recorded = True
+            self._call.record_telemetry(status, self._started, self._usage)
+
+
+def parse_sse_data(line: str) -> Optional[str]:
+    """解析一行 SSE：返回 data 字段内容，空行/注释/其它字段返回 None"""
+    if not line.startswith("data:"):
+        return None
+    return line[5:].strip()
+
+
+def _stream_delta_text(chunk: Dict[str, Any]) -> str:
+    choices = chunk.get("choices") or []
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or ""
+
+
+# SSE 响应头：禁止代理缓冲/缓存，确保逐段送达
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """构建一条发往前端的 SSE 消息（data 为 JSON）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class JSONFieldStreamer:
+    """
+    从逐段到达的 JSON 文本中增量提取某个字符串字段的内容。
+
+    用于要求模型输出 JSON（如宠物对话的 {"reply": ...}）的场景：
+    字段值的字符一到达就可以转发给前端，不必等待完整 JSON。
+    """
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, field: str):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buf = ""
+        self._pos: Optional[int] = None  # 字段值中下一个待解析字符的位置
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """追加文本，返回字段值中新解析出的部分"""
+        self._buf += chunk
+        if self.done:
+            return ""
+        if self._pos is None:
+            m = self._key.search(self._buf)
+            if not m:
+                return ""
+            self._pos = m.end()
+        out: List[str] = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # 转义序列不完整时等待后续文本
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc == "u":
+                if i + 6 > len(buf):
+                    break
+                try:
+                    out.append(chr(int(buf[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+            else:
+                out.append(self._ESCAPES.get(esc, esc))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
 class AIService:
     """
     统一 AI 调用服务（OpenAI 兼容格式）
@@ -285,7 +555,8 @@ class AIService:
     - 支持按功能（function_key）使用不同服务商+模型
     - 自动从配置中读取活跃服务商信息
     - 支持纯文本对话、视觉理解、JSON 结构化输出
-    - 内置 429 限流自动重试 + 错误状态报告
+    - 按服务商/模型限流调度 + 429 重试 + 错误状态报告
+    - 流式输出（chat_stream）
     - 单例模式，共享 HTTP 连接池
     """
 
@@ -352,6 +623,7 @@ class AIService:
         prompt_vars: Optional[Dict[str, Any]] = None,
         max_tokens: int = 2000,
         temperature: float = 0.7,
+        cache: bool = False,
     ) -> str:
         """
         纯文本对话，返回 AI 回复文本。
@@ -365,32 +637,47 @@ class AIService:
             prompt_vars: 技能模板变量（可选，传入时从 DB 技能解析 prompt）
             max_tokens: 最大输出 token 数
             temperature: 生成温度
+            cache: 是否使用回复缓存（仅用于相同输入应得到相同结果的功能）
         """
-        # 如果传入 prompt_vars 且有 function_key，从技能缓存解析 prompt
-        # 技能存在时覆盖传入的 prompt；技能不存在时回退到传入的 prompt
-        resolved_system = system_prompt
-        resolved_user = user_prompt
-        if prompt_vars is not None and function_key:
-            try:
-                skill_system, skill_user, skill_params = resolve_skill(function_key, prompt_vars)
-                resolved_system = skill_system  # 技能 prompt 优先
-                if skill_user:  # 技能定义了 user_prompt_template 时使用
-                    resolved_user = skill_user
-                # 技能参数覆盖默认值
-                if "temperature" in skill_params:
-                    temperature = skill_params["temperature"]
-                if "max_tokens" in skill_params:
-                    max_tokens = skill_params["max_tokens"]
-            except ValueError as e:
-                logger.warning(f"技能解析失败，使用传入的 prompt: {e}")
-
-        messages = self._build_messages_with_history(resolved_system, resolved_user, history)
+        messages, max_tokens, temperature = self._resolve_text_messages(
+            user_prompt, system_prompt, history, function_key, prompt_vars, max_tokens, temperature
+        )
         return await self._call_chat(
             messages=messages,
             model=model,
             function_key=function_key,
             max_tokens=max_tokens,
             temperature=temperature,
+            cache=cache,
+        )
+
+    async def chat_stream(
+        self,
+        user_prompt: str,
+        *,
+        system_prompt: str = "",
+        history: list = None,
+        model: str = "",
+        function_key: str = "",
+        prompt_vars: Optional[Dict[str, Any]] = None,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+    ) -> "AIChatStream":
+        """
+        流式纯文本对话，参数与 chat() 相同。
+
+        返回时上游已响应（限流重试、HTTP 错误都已在此处理并以 ValueError 抛出），
+        且请求级元数据已写入，调用方可以据此先发送响应头，再迭代返回对象得到增量文本。
+        """
+        messages, max_tokens, temperature = self._resolve_text_messages(
+            user_prompt, system_prompt, history, function_key, prompt_vars, max_tokens, temperature
+        )
+        return await self._call_chat_stream(
+            messages=messages,
+            model=model,
+            function_key=function_key,
+            max_tokens=max_tokens,
+            temperature=temperature,
         )
 
     async def chat_with_vision(
@@ -455,6 +742,7 @@ class AIService:
         prompt_vars: Optional[Dict[str, Any]] = None,
         max_tokens: int = 2000,
         temperature: float = 0.1,
+        cache: bool = False,
     ) -> Optional[Dict[str, Any]]:
         """对话并期望 JSON 结构化输出。"""
         raw = await self.chat(
@@ -466,6 +754,7 @@ class AIService:
             prompt_vars=prompt_vars,
             max_tokens=max_tokens,
             temperature=temperature,
+            cache=cache,
         )
         return self.extract_json(raw)
 
@@ -501,23 +790,17 @@ class AIService:
             self._client = httpx.AsyncClient(timeout=120.0)
         return self._client
 
-    async def _call_chat(
+    async def _prepare_call(
         self,
         messages: List[Dict[str, Any]],
         *,
-        model: str = "",
-        function_key: str = "",
-        max_tokens: int = 2000,
-        temperature: float = 0.7,
-    ) -> str:
-        """
-        底层 chat/completions 调用，含重试逻辑和按功能模型解析。
-
-        优先级：model参数 > function_key配置 > 全局配置 > .env
-
-        Raises:
-            ValueError: 配置缺失或 API 调用失败
-        """
+        model: str,
+        function_key: str,
+        max_tokens: int,
+        temperature: float,
+        stream: bool = False,
+    ) -> "_PreparedCall":
+        """解析配置并构建 chat/completions 请求（优先级：model参数 > function_key配置 > 全局配置 > .env）"""
         # 确保缓存已加载
         if not _cache_loaded:
             await load_function_model_configs()
@@ -529,88 +812,169 @@ class AIService:
 
         # model 参数最高优先级
         ai_model = model or cfg.model
-        ai_base_url = cfg.base_url
-        ai_api_key = cfg.api_key
-
-        if not ai_api_key or not ai_base_url or not ai_model:
+        if not cfg.api_key or not cfg.base_url or not ai_model:
             raise ValueError("AI 服务未配置，请联系管理员配置 AI 服务商")
 
-        api_url = f"{ai_base_url.rstrip('/')}/chat/completions"
-
         request_body = {
             "model": ai_model,
             "messages": messages,
             "max_tokens": max_tokens,
             "temperature": temperature,
         }
+        if stream:
+            request_body["stream"] = True
+            # 流式回复默认不含 usage，要求上游在最后一段中返回
+            request_body["stream_options"] = {"include_usage": True}
+
+        return _PreparedCall(
+            cfg=cfg,
+            model=ai_model,
+            function_key=function_key,
+            api_url=f"{cfg.base_url.rstrip('/')}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {cfg.api_key}",
+                "Content-Type": "application/json",
+            },
+            body=request_body,
+        )
 
+    async def _send_with_retry(self, call: "_PreparedCall", *, stream: bool = False) -> httpx.Response:
+        """
+        向调度器申请许可后发送请求，429 时暂停该通道并重新排队重试；
+        stream=True 时只读取响应头，响应体由调用方读取并关闭，许可保存在 call.permit 中直到流结束
+        """
         client = await self._get_client()
-        headers = {
-            "Authorization": f"Bearer {ai_api_key}",
-            "Content-Type": "application/json",
-        }
-
-        fk_tag = f"[{function_key}] " if function_key else ""
-        logger.info(f"{fk_tag}AI request → {api_url}, model={ai_model}, source={cfg.source}")
+        fk_tag = call.fk_tag
+        logger.info(
+            f"{fk_tag}AI {'stream ' if stream else ''}request → {call.api_url}, "
+            f"model={call.model}, source={call.cfg.source}"
+        )
 
-        # 429 自动重试
+        priority = call.priority
+        # 排队与 429 重试的总等待不超过该优先级的截止时间
+        deadline = time.monotonic() + DEFAULT_DEADLINES[priority]
         max_retries = 2
-        last_error: Optional[Exception] = None
         for attempt in range(max_retries + 1):
+            permit = await ai_governor.acquire(
+                call.cfg.base_url, call.model, priority=priority, deadline=deadline,
+            )
+            keep_permit = False
             try:
-                response = await client.post(api_url, json=request_body, headers=headers)
+                request = client.build_request("POST", call.api_url, json=call.body, headers=call.headers)
+                response = await client.send(request, stream=stream)
+                if stream and response.is_error:
+                    await response.aread()
+                    await response.aclose()
                 response.raise_for_status()
-                break
+                if stream:
+                    call.permit = permit
+                    keep_permit = True
+                return response
             except httpx.HTTPStatusError as e:
-                last_error = e
                 if e.response.status_code == 429 and attempt < max_retries:
-                    retry_after = min(int(e.response.headers.get("retry-after", "5")), 30)
+                    retry_after = _retry_after_seconds(e.response)
                     logger.warning(
-                        f"{fk_tag}AI rate limited (429), retry after {retry_after}s "
+                        f"{fk_tag}AI rate limited (429), pause {call.model} for {retry_after}s "
                         f"(attempt {attempt + 1}/{max_retries})"
                     )
-                    await asyncio.sleep(retry_after)
+                    ai_governor.penalize(call.cfg.base_url, call.model, retry_after)
+                    call.retries += 1
                     continue
+                call.http_status = e.response.status_code
                 logger.error(f"{fk_tag}AI HTTP error: {e.response.status_code} - {e.response.text}")
                 if e.response.status_code == 429:
                     raise ValueError("AI 服务请求频率超限，请稍后再试")
                 raise ValueError(
                     f"AI 服务调用失败: HTTP {e.response.status_code}"
-                    + (f" (功能: {function_key}, 模型: {ai_model})" if function_key else "")
+                    + (f" (功能: {call.function_key}, 模型: {call.model})" if call.function_key else "")
                 )
             except httpx.RequestError as e:
                 logger.error(f"{fk_tag}AI connection error: {e}")
                 raise ValueError(f"AI 服务连接失败: {str(e)}")
-        else:
-            raise ValueError("AI 服务请求频率超限，请稍后再试")
+            finally:
+                if not keep_permit:
+                    permit.release()
+        raise ValueError("AI 服务请求频率超限，请稍后再试")
 
-        # 解析响应
-        result = response.json()
-        if "choices" not in result or not result["choices"]:
-            logger.error(f"{fk_tag}AI unexpected response: {result}")
-            raise ValueError("AI 服务返回了意外的结果")
+    async def _call_chat(
+        self,
+        messages: List[Dict[str, Any]],
+        *,
+        model: str = "",
+        function_key: str = "",
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        cache: bool = False,
+    ) -> str:
+        """
+        底层 chat/completions 调用，含重试逻辑和按功能模型解析。
 
-        content = result["choices"][0]["message"]["content"].strip()
-        logger.info(f"{fk_tag}AI response ({len(content)} chars): {content[:200]}...")
+        优先级：model参数 > function_key配置 > 全局配置 > .env
+
+        Raises:
+            ValueError: 配置缺失或 API 调用失败
+        """
+        call = await self._prepare_call(
+            messages, model=model, function_key=function_key, max_tokens=max_tokens, temperature=temperature,
+        )
+        if cache:
+            key = make_cache_key(function_key, call.cfg.base_url, call.model, messages, temperature, max_tokens)
+            content = await ai_response_cache.get_or_call(
+                key, function_key or "global", call.model, lambda: self._request_content(call),
+            )
+        else:
+            content = await self._request_content(call)
 
         # 写入请求级上下文，供中间件注入响应头
-        fn_name = ""
-        if function_key:
-            try:
-                from app.core.ai_functions import AI_FUNCTION_REGISTRY
-                fn_def = AI_FUNCTION_REGISTRY.get(function_key)
-                fn_name = fn_def.name if fn_def else function_key
-            except Exception:
-                fn_name = function_key
-        ai_call_metadata.set({
-            "function_key": function_key or "global",
-            "function_name": fn_name,
-            "model": ai_model,
-            "source": cfg.source,
-        })
+        call.publish_metadata()
+
+        return content
 
+    async def _request_content(self, call: "_PreparedCall") -> str:
+        """发送请求并取出回复文本"""
+        fk_tag = call.fk_tag
+        started = time.perf_counter()
+        try:
+            response = await self._send_with_retry(call)
+
+            # 解析响应
+            result = response.json()
+            if "choices" not in result or not result["choices"]:
+                logger.error(f"{fk_tag}AI unexpected response: {result}")
+                raise ValueError("AI 服务返回了意外的结果")
+
+            content = result["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            call.record_telemetry(call.failure_status(e), started)
+            raise
+        call.record_telemetry("ok", started, result.get("usage"))
+        logger.info(f"{fk_tag}AI response ({len(content)} chars): {content[:200]}...")
         return content
 
+    async def _call_chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        *,
+        model: str = "",
+        function_key: str = "",
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+    ) -> "AIChatStream":
+        """底层流式 chat/completions 调用：上游返回响应头后即返回，响应体交给 AIChatStream 逐段解析"""
+        call = await self._prepare_call(
+            messages, model=model, function_key=function_key,
+            max_tokens=max_tokens, temperature=temperature, stream=True,
+        )
+        started = time.perf_counter()
+        try:
+            response = await self._send_with_retry(call, stream=True)
+        except Exception as e:
+            call.record_telemetry(call.failure_status(e), started)
+            raise
+        # 流式响应的响应头在生成回复之前发送，此时就写入元数据
+        call.publish_metadata()
+        return AIChatStream(call, response, started)
+
     # -------------------- 工具方法 --------------------
 
     @staticmethod
@@ -679,6 +1043,38 @@ class AIService:
         msgs.append({"role": "user", "content": user_prompt})
         return msgs
 
+    def _resolve_text_messages(
+        self,
+        user_prompt: str,
+        system_prompt: str,
+        history: Optional[list],
+        function_key: str,
+        prompt_vars: Optional[Dict[str, Any]],
+        max_tokens: int,
+        temperature: float,
+    ) -> tuple:
+        """解析技能后构建纯文本对话的 messages，返回 (messages, max_tokens, temperature)"""
+        # 如果传入 prompt_vars 且有 function_key，从技能缓存解析 prompt
+        # 技能存在时覆盖传入的 prompt；技能不存在时回退到传入的 prompt
+        resolved_system = system_prompt
+        resolved_user = user_prompt
+        if prompt_vars is not None and function_key:
+            try:
+                skill_system, skill_user, skill_params = resolve_skill(function_key, prompt_vars)
+                resolved_system = skill_system  # 技能 prompt 优先
+                if skill_user:  # 技能定义了 user_prompt_template 时使用
+                    resolved_user = skill_user
+                # 技能参数覆盖默认值
+                if "temperature" in skill_params:
+                    temperature = skill_params["temperature"]
+                if "max_tokens" in skill_params:
+                    max_tokens = skill_params["max_tokens"]
+            except ValueError as e:
+                logger.warning(f"技能解析失败，使用传入的 prompt: {e}")
+
+        messages = self._build_messages_with_history(resolved_system, resolved_user, history)
+        return messages, max_tokens, temperature
+
     async def close(self):
         """关闭 HTTP 连接池"""
         if self._client and not self._client.is_closed:
@@ -0,0 +1,185 @@
+"""
+小金库 (Golden Nest) - AI 调用遥测
+
+每次上游 AI 调用（chat/completions、流式、视觉、语音转写）结束后记录一行到 ai_call_telemetry：
+功能、模型、配置来源、总耗时、usage 中的 prompt/completion token 数、状态与 429 重试次数。
+
+- 非阻塞：record 只把记录追加到内存缓冲并唤醒后台协程（write_behind.WriteBehindWorker），不做任何 I/O
+- 批量写入：合并一个 flush_delay 窗口内的记录后一次 INSERT；stop 时写完剩余记录
+- 写入失败时记录放回缓冲等待重试，缓冲超过 max_buffer 条时丢弃最旧的记录（遥测不应拖垮业务）
+- summary 按 (日期, 功能, 模型) 汇总调用次数、失败次数、p50/p95 耗时与 token 总量，用于为各功能挑选更快的模型
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import AICallTelemetry
+from app.services.write_behind import WriteBehindWorker, percentile
+
+logger = logging.getLogger(__name__)
+
+
+def usage_tokens(usage: Any) -> Dict[str, int]:
+    """从 OpenAI 兼容的 usage 字段取出 token 数，缺失或格式不对时为 0"""
+    if not isinstance(usage, dict):
+        return {"prompt_tokens": 0, "completion_tokens": 0}
+    tokens = {}
+    for key in ("prompt_tokens", "completion_tokens"):
+        try:
+            tokens[key] = max(0, int(usage.get(key) or 0))
+        except (TypeError, ValueError):
+            tokens[key] = 0
+    return tokens
+
+
+class AITelemetryWriter(WriteBehindWorker):
+    """
+    AI 调用遥测的缓冲写入器
+
+    Args:
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+        flush_delay: 合并窗口（秒）
+        max_buffer: 内存缓冲上限（条）
+    """
+
+    _task_name = "ai-telemetry-flusher"
+    _label = "AI 调用遥测"
+
+    def __init__(self, session_maker=None, flush_delay: float = 2.0, max_buffer: int = 5000):
+        super().__init__(session_maker, flush_delay)
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0}
+
+    # ==================== 记录 ====================
+
+    def record(
+        self,
+        function_key: str,
+        *,
+        kind: str = "chat",
+        model: str = "",
+        source: str = "",
+        status: str = "ok",
+        latency_ms: float = 0,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        retries: int = 0,
+    ) -> None:
+        """追加一条调用记录（立即返回，不做任何 I/O）"""
+        self._buffer.append({
+            "function_key": function_key or "global",
+            "kind": kind,
+            "model": model or "",
+            "source": source or "",
+            "status": status,
+            "latency_ms": int(round(latency_ms)),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "retries": retries,
+            "created_at": datetime.utcnow(),
+        })
+        self.stats["recorded"] += 1
+        self._trim()
+        try:
+            if not self.running:
+                self.start()
+            self._wakeup.set()
+        except RuntimeError:
+            # 不在事件循环中（如同步脚本），留在缓冲中等待下次 flush
+            pass
+
+    def _has_pending(self) -> bool:
+        return bool(self._buffer)
+
+    def _trim(self) -> None:
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.stats["dropped"] += overflow
+
+    async def flush(self) -> int:
+        """将缓冲中的记录批量写入，返回写入条数"""
+        if not self._buffer:
+            return 0
+        rows, self._buffer = self._buffer, []
+        try:
+            async with self._maker()() as db:
+                await db.execute(insert(AICallTelemetry), rows)
+                await db.commit()
+        except Exception:
+            # 写入失败时放回缓冲，下一轮重试
+            self._buffer[:0] = rows
+            self._trim()
+            raise
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(rows)
+        return len(rows)
+
+
+async def summarize_telemetry(
+    db: AsyncSession,
+    days: int = 7,
+    function_key: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    按 (日期, 功能, 模型) 汇总最近 days 天（UTC）的调用
+
+    Returns:
+        按日期倒序、功能与模型正序排列的汇总行；耗时分位数只统计成功的调用
+    """
+    since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=max(days, 1) - 1)
+    query = select(
+        AICallTelemetry.created_at,
+        AICallTelemetry.function_key,
+        AICallTelemetry.model,
+        AICallTelemetry.status,
+        AICallTelemetry.latency_ms,
+        AICallTelemetry.prompt_tokens,
+        AICallTelemetry.completion_tokens,
+        AICallTelemetry.retries,
+    ).where(AICallTelemetry.created_at >= since)
+    if function_key:
+        query = query.where(AICallTelemetry.function_key == function_key)
+    result = await db.execute(query)
+
+    groups: Dict[tuple, Dict[str, Any]] = defaultdict(lambda: {
+        "calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0, "latencies": [],
+    })
+    for created_at, fk, model, status, latency_ms, prompt_tokens, completion_tokens, retries in result.all():
+        group = groups[(created_at.date().isoformat(), fk, model)]
+        group["calls"] += 1
+        group["retries"] += retries or 0
+        group["prompt_tokens"] += prompt_tokens or 0
+        group["completion_tokens"] += completion_tokens or 0
+        if status == "ok":
+            group["latencies"].append(latency_ms or 0)
+        else:
+            group["errors"] += 1
+
+    rows = []
+    for (day, fk, model), group in groups.items():
+        latencies = group.pop("latencies")
+        rows.append({
+            "date": day,
+            "function_key": fk,
+            "model": model,
+            **group,
+            "total_tokens": group["prompt_tokens"] + group["completion_tokens"],
+            "latency_ms": {
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+                "max": max(latencies, default=0),
+            },
+        })
+    rows.sort(key=lambda r: (r["function_key"], r["model"]))
+    rows.sort(key=lambda r: r["date"], reverse=True)
+    return rows
+
+
+# ======================== 全局单例 ========================
+ai_telemetry = AITelemetryWriter()
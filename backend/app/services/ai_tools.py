@@ -7,19 +7,28 @@
   Phase 2: 后端执行查询，将结果喂给 AI 生成最终回复
 
 兼容任何 OpenAI 格式的模型（无需原生 function calling 支持）。
+
+Phase 2 的多个工具并发执行，每个工具使用独立的短会话（不占用请求会话）；
+格式化后的结果按 (家庭, 工具) 缓存（个人工具再按用户区分），并以家庭数据版本号校验：
+相关数据写入提交后由 after_commit 事件递增版本号，连续几轮对话可直接复用查询结果。
 """
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, event, inspect
 
 from app.models.models import (
     User, Family, FamilyMember, Deposit, Transaction, Investment,
     InvestmentIncome, InvestmentPosition, PositionOperationType,
-    Asset, TransactionType
+    Asset, TransactionType, FamilyAccount
 )
+from app.services.balance import get_balance
 
 logger = logging.getLogger(__name__)
 
@@ -116,22 +125,148 @@ async def execute_tool(
         return f"[查询 {tool_name} 时出错]"
 
 
+async def _execute_tool_cached(tool_name: str, user: User, family_id: int, session_maker) -> str:
+    """使用独立会话执行单个工具；结果按家庭数据版本号缓存，出错时不缓存"""
+    handler = _TOOL_HANDLERS.get(tool_name)
+    if not handler:
+        return f"[工具 {tool_name} 不存在]"
+
+    key = (family_id, tool_name, user.id if tool_name in USER_SCOPED_TOOLS else None)
+    # 先取版本号再查询：查询期间若有写入提交，缓存的结果版本号已过时，下次不会命中
+    version = _family_versions.get(family_id, 0)
+    now = time.monotonic()
+    cached = _tool_cache.get(key)
+    if cached is not None and cached[0] == version and cached[1] > now:
+        _tool_cache.move_to_end(key)
+        return cached[2]
+
+    try:
+        async with session_maker() as db:
+            result = await handler(db, user, family_id)
+    except Exception as e:
+        logger.error(f"Tool execution error ({tool_name}): {e}", exc_info=True)
+        return f"[查询 {tool_name} 时出错]"
+
+    _tool_cache[key] = (version, now + TOOL_CACHE_TTL, result)
+    _tool_cache.move_to_end(key)
+    while len(_tool_cache) > TOOL_CACHE_MAX_SIZE:
+        _tool_cache.popitem(last=False)
+    return result
+
+
 async def execute_tools(
     tool_names: List[str],
     db: AsyncSession,
     user: User,
     family_id: int,
+    session_maker=None,
 ) -> str:
-    """批量执行工具查询，返回汇总结果文本"""
+    """
+    批量并发执行工具查询，返回汇总结果文本（顺序与 tool_names 一致）
+
+    db 为请求会话，仅为兼容保留；各工具使用 session_maker
+    （默认 app.core.database.async_session_maker）创建的独立会话。
+    """
     if not tool_names:
         return ""
 
-    results = []
-    for name in tool_names:
-        result = await execute_tool(name, db, user, family_id)
-        results.append(f"【{name}】\n{result}")
+    if session_maker is None:
+        from app.core.database import async_session_maker
+        session_maker = async_session_maker
+
+    outputs = await asyncio.gather(*(
+        _execute_tool_cached(name, user, family_id, session_maker) for name in tool_names
+    ))
+    return "\n\n".join(f"【{name}】\n{result}" for name, result in zip(tool_names, outputs))
+
+
+# ==================== 结果缓存与家庭数据版本号 ====================
+
+# 缓存有效期（秒）：多进程部署下其它进程的写入不会递增本进程的版本号，以此限定最长不一致时间
+TOOL_CACHE_TTL = 300
+# 缓存条目数上限，超出时淘汰最久未使用的条目
+TOOL_CACHE_MAX_SIZE = 2000
+# 结果依赖当前用户的工具，缓存键额外包含 user_id
+USER_SCOPED_TOOLS = {"get_my_deposits"}
+
+_SESSION_KEY = "ai_tool_data_changes"
+
+# family_id -> 数据版本号（相关数据写入提交后递增）
+_family_versions: Dict[int, int] = {}
+# (family_id, 工具名, user_id 或 None) -> (数据版本号, 过期时间, 格式化结果)
+_tool_cache: "OrderedDict[Tuple[int, str, Optional[int]], Tuple[int, float, str]]" = OrderedDict()
+
+# 直接带 family_id 的、工具会读取的模型
+_FAMILY_MODELS = (Deposit, Transaction, Investment, FamilyMember, FamilyAccount)
 
-    return "\n\n".join(results)
+
+def get_family_data_version(family_id: int) -> int:
+    return _family_versions.get(family_id, 0)
+
+
+def bump_family_data_version(family_id: int) -> None:
+    """递增家庭数据版本号，使该家庭已缓存的工具结果失效"""
+    _family_versions[family_id] = _family_versions.get(family_id, 0) + 1
+
+
+def clear_tool_cache() -> None:
+    _tool_cache.clear()
+
+
+def _values(obj, field: str) -> Set:
+    """字段当前值及本次 flush 前的旧值（不触发加载）"""
+    state = inspect(obj)
+    history = state.attrs[field].history
+    values = set(history.added) | set(history.deleted) | set(history.unchanged)
+    if not values and field in state.dict:
+        values.add(state.dict[field])
+    values.discard(None)
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_tool_data_changes(session: Session, flush_context) -> None:
+    """记录本次 flush 中工具相关数据发生变化的家庭，提交后递增其版本号"""
+    family_ids: Set[int] = set()
+    investment_ids: Set[int] = set()
+    renamed_users: Set[int] = set()
+
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        if isinstance(obj, _FAMILY_MODELS):
+            family_ids.update(_values(obj, "family_id"))
+        elif isinstance(obj, (InvestmentIncome, InvestmentPosition)):
+            investment_ids.update(_values(obj, "investment_id"))
+        elif isinstance(obj, Family):
+            if obj.id is not None:
+                family_ids.add(obj.id)
+        elif isinstance(obj, User) and obj in session.dirty:
+            if inspect(obj).attrs.nickname.history.has_changes():
+                renamed_users.add(obj.id)
+
+    if not (family_ids or investment_ids or renamed_users):
+        return
+
+    conn = session.connection()
+    if investment_ids:
+        family_ids.update(conn.execute(
+            select(Investment.family_id).where(Investment.id.in_(investment_ids))
+        ).scalars())
+    if renamed_users:
+        family_ids.update(conn.execute(
+            select(FamilyMember.family_id).where(FamilyMember.user_id.in_(renamed_users))
+        ).scalars())
+    session.info.setdefault(_SESSION_KEY, set()).update(family_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_families(session: Session) -> None:
+    for family_id in session.info.pop(_SESSION_KEY, ()):
+        bump_family_data_version(family_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tool_data_changes(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
 
 
 # ==================== 各工具的具体实现 ====================
@@ -196,14 +331,7 @@ async def _get_recent_deposits(db: AsyncSession, user: User, family_id: int) ->
 
 
 async def _get_balance(db: AsyncSession, user: User, family_id: int) -> str:
-    result = await db.execute(
-        select(Transaction)
-        .where(Transaction.family_id == family_id)
-        .order_by(Transaction.created_at.desc())
-        .limit(1)
-    )
-    last_tx = result.scalar_one_or_none()
-    balance = last_tx.balance_after if last_tx else 0
+    balance = await get_balance(db, family_id)
     return f"当前活期余额：¥{balance:,.2f}"
 
 
@@ -211,7 +339,7 @@ async def _get_recent_transactions(db: AsyncSession, user: User, family_id: int)
     result = await db.execute(
         select(Transaction)
         .where(Transaction.family_id == family_id)
-        .order_by(Transaction.created_at.desc())
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
         .limit(15)
     )
     transactions = result.scalars().all()
@@ -0,0 +1,222 @@
+"""
+小金库 (Golden Nest) - 家庭公告信息流
+
+- 计数冗余：announcements.like_count / comment_count 由点赞、评论接口在同一事务内
+  原子加减（adjust_counters），信息流不再逐条 COUNT
+- 批量组装：作者、我的点赞、每条公告最近 N 条评论（窗口函数）各一次 IN 查询，
+  查询次数与页大小无关
+- 键集分页：按 (is_pinned, created_at, id) 倒序，游标编码上一页最后一条的排序键；仍兼容 page/OFFSET 分页
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update, func, and_, desc, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import User, Announcement, AnnouncementLike, AnnouncementComment
+
+# 信息流排序键（倒序）：置顶优先，再按发布时间
+ORDER_COLUMNS = (Announcement.is_pinned, Announcement.created_at, Announcement.id)
+
+# 信息流中每条公告附带的最近评论数
+FEED_COMMENTS_LIMIT = 3
+
+
+def encode_cursor(is_pinned: bool, created_at: datetime, announcement_id: int) -> str:
+    """将排序键编码为不透明的游标字符串"""
+    raw = json.dumps([bool(is_pinned), created_at.isoformat(), announcement_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[bool, datetime, int]:
+    """
+    解析游标
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        is_pinned, created_at, announcement_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return bool(is_pinned), datetime.fromisoformat(created_at), int(announcement_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+async def adjust_counters(db: AsyncSession, announcement_id: int, likes: int = 0, comments: int = 0) -> None:
+    """原子加减公告的点赞数/评论数（与点赞、评论写入同一事务，由调用方提交）"""
+    await db.execute(
+        update(Announcement)
+        .where(Announcement.id == announcement_id)
+        .values(
+            like_count=Announcement.like_count + likes,
+            comment_count=Announcement.comment_count + comments,
+        )
+    )
+
+
+def comment_dict(comment: AnnouncementComment, author_name: Optional[str]) -> dict:
+    return {
+        "id": comment.id,
+        "content": comment.content,
+        "created_at": comment.created_at.isoformat(),
+        "author_id": comment.user_id,
+        "author_name": author_name,
+    }
+
+
+async def _latest_comments(
+    db: AsyncSession, announcement_ids: List[int], limit: Optional[int]
+) -> Dict[int, List[dict]]:
+    """每条公告最近 limit 条评论（None 表示全部），按时间正序返回"""
+    comments: Dict[int, List[dict]] = {announcement_id: [] for announcement_id in announcement_ids}
+    if not announcement_ids or limit == 0:
+        return comments
+
+    query = select(AnnouncementComment).where(AnnouncementComment.announcement_id.in_(announcement_ids))
+    if limit is not None:
+        rank = func.row_number().over(
+            partition_by=AnnouncementComment.announcement_id,
+            order_by=(desc(AnnouncementComment.created_at), desc(AnnouncementComment.id)),
+        ).label("rank")
+        ranked = (
+            select(AnnouncementComment.id, rank)
+            .where(AnnouncementComment.announcement_id.in_(announcement_ids))
+            .subquery()
+        )
+        query = (
+            select(AnnouncementComment)
+            .join(ranked, ranked.c.id == AnnouncementComment.id)
+            .where(ranked.c.rank <= limit)
+        )
+    query = query.add_columns(User.nickname).join(User, AnnouncementComment.user_id == User.id)
+    result = await db.execute(
+        query.order_by(AnnouncementComment.created_at.asc(), AnnouncementComment.id.asc())
+    )
+    for comment, nickname in result.all():
+        comments[comment.announcement_id].append(comment_dict(comment, nickname))
+    return comments
+
+
+async def build_feed(
+    db: AsyncSession,
+    announcements: Sequence[Announcement],
+    current_user_id: int,
+    comments_limit: Optional[int] = FEED_COMMENTS_LIMIT,
+) -> List[dict]:
+    """
+    批量组装公告响应
+
+    Args:
+        db: 数据库会话
+        announcements: 公告列表（保持顺序）
+        current_user_id: 当前用户ID（判断是否已点赞）
+        comments_limit: 每条公告附带的最近评论数，None 表示全部
+
+    Returns:
+        公告字典列表
+    """
+    if not announcements:
+        return []
+    ids = [a.id for a in announcements]
+
+    authors = {row.id: row for row in (await db.execute(
+        select(User.id, User.nickname, User.avatar_version)
+        .where(User.id.in_({a.user_id for a in announcements}))
+    )).all()}
+    liked = set((await db.execute(
+        select(AnnouncementLike.announcement_id).where(
+            AnnouncementLike.announcement_id.in_(ids),
+            AnnouncementLike.user_id == current_user_id,
+        )
+    )).scalars().all())
+    comments = await _latest_comments(db, ids, comments_limit)
+
+    items = []
+    for announcement in announcements:
+        author = authors.get(announcement.user_id)
+        images = []
+        if announcement.images:
+            try:
+                images = json.loads(announcement.images)
+            except (TypeError, ValueError):
+                images = []
+        items.append({
+            "id": announcement.id,
+            "content": announcement.content,
+            "images": images,
+            "is_pinned": announcement.is_pinned,
+            "created_at": announcement.created_at.isoformat(),
+            "author_id": author.id if author else 0,
+            "author_name": author.nickname if author else "未知用户",
+            "author_avatar_version": (author.avatar_version or 0) if author else 0,
+            "likes_count": announcement.like_count or 0,
+            "comments_count": announcement.comment_count or 0,
+            "is_liked": announcement.id in liked,
+            "comments": comments[announcement.id],
+        })
+    return items
+
+
+async def list_announcement_feed(
+    db: AsyncSession,
+    conditions: Sequence[Any],
+    current_user_id: int,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    page: Optional[int] = None,
+    comments_limit: Optional[int] = FEED_COMMENTS_LIMIT,
+) -> Dict[str, Any]:
+    """
+    查询公告信息流
+
+    Args:
+        db: 数据库会话
+        conditions: 过滤条件（至少包含 family_id 条件）
+        current_user_id: 当前用户ID
+        page_size: 每页条数
+        cursor: 上一页返回的 next_cursor，提供时忽略 page 且不统计总数
+        page: 页码（OFFSET 分页，兼容旧客户端）
+        comments_limit: 每条公告附带的最近评论数
+
+    Returns:
+        {"total", "items", "next_cursor"}
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    where = list(conditions)
+    total = None
+    if not cursor:
+        total = (await db.execute(
+            select(func.count(Announcement.id)).where(and_(*where))
+        )).scalar() or 0
+    else:
+        where.append(tuple_(*ORDER_COLUMNS) < tuple_(*decode_cursor(cursor)))
+
+    # 多取一条用于判断是否还有下一页
+    query = (
+        select(Announcement)
+        .where(and_(*where))
+        .order_by(*(desc(col) for col in ORDER_COLUMNS))
+        .limit(page_size + 1)
+    )
+    if not cursor and page and page > 1:
+        query = query.offset((page - 1) * page_size)
+
+    announcements = (await db.execute(query)).scalars().all()
+    has_more = len(announcements) > page_size
+    announcements = announcements[:page_size]
+
+    next_cursor = None
+    if has_more and announcements:
+        last = announcements[-1]
+        next_cursor = encode_cursor(last.is_pinned, last.created_at, last.id)
+
+    return {
+        "total": total,
+        "items": await build_feed(db, announcements, current_user_id, comments_limit),
+        "next_cursor": next_cursor,
+    }
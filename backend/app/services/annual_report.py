@@ -0,0 +1,574 @@
+"""
+小金库 (Golden Nest) - 年度报告生成与缓存服务
+
+- 单次聚合：月度存款/支出/收益用一条 UNION ALL + GROUP BY 月份 查询得到，
+  年度合计由月度数据累加，余额、股权、亮点各一条查询
+- 报告产物：生成结果写入 annual_reports（每个家庭每年一行），
+  format_version 与 REPORT_FORMAT_VERSION 一致且未失效时直接返回
+- 失效：after_flush 监听存款/流水/理财收益/成员变动，
+  将受影响年份及之后年份（年初余额与股权按累计计算）的报告标记为过期并递增 data_version
+- 批量预生成：pregenerate_annual_reports 以有限并发为所有家庭生成指定年份报告
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, date
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, func, case, extract, literal, union_all, inspect, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    User, Family, FamilyMember, Deposit, Transaction, TransactionType,
+    Investment, InvestmentIncome, AnnualReport,
+)
+
+logger = logging.getLogger(__name__)
+
+# 报告数据格式版本，修改 generate_annual_report_data 的输出结构时递增
+REPORT_FORMAT_VERSION = 2
+
+# 影响报告内容的字段（字段变化才触发失效）
+_WATCHED_FIELDS = {
+    Deposit: ("family_id", "user_id", "amount", "deposit_date"),
+    Transaction: ("family_id", "transaction_type", "amount", "balance_after", "created_at"),
+    InvestmentIncome: ("investment_id", "amount", "income_date"),
+}
+_DATE_FIELDS = {
+    Deposit: "deposit_date",
+    Transaction: "created_at",
+    InvestmentIncome: "income_date",
+}
+
+
+# ==================== 聚合查询 ====================
+
+def _last_balance(family_id: int, cutoff: datetime):
+    """截至 cutoff 最后一笔流水的 balance_after"""
+    return (
+        select(Transaction.balance_after)
+        .where(
+            Transaction.family_id == family_id,
+            Transaction.created_at <= cutoff
+        )
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+async def _monthly_totals(db: AsyncSession, family_id: int, year: int) -> Dict[int, Dict[str, float]]:
+    """一次查询按月汇总存款、支出、理财收益"""
+    start = datetime(year, 1, 1)
+    end = datetime(year + 1, 1, 1)
+
+    deposit_month = extract("month", Deposit.deposit_date)
+    withdraw_month = extract("month", Transaction.created_at)
+    income_month = extract("month", InvestmentIncome.income_date)
+
+    stmt = union_all(
+        select(literal("deposits").label("source"), deposit_month.label("month"), func.sum(Deposit.amount))
+        .where(
+            Deposit.family_id == family_id,
+            Deposit.deposit_date >= start,
+            Deposit.deposit_date < end
+        )
+        .group_by(deposit_month),
+        select(literal("withdrawals").label("source"), withdraw_month.label("month"), func.sum(Transaction.amount))
+        .where(
+            Transaction.family_id == family_id,
+            Transaction.transaction_type == TransactionType.WITHDRAW,
+            Transaction.created_at >= start,
+            Transaction.created_at < end
+        )
+        .group_by(withdraw_month),
+        select(literal("income").label("source"), income_month.label("month"), func.sum(InvestmentIncome.amount))
+        .join(Investment, InvestmentIncome.investment_id == Investment.id)
+        .where(
+            Investment.family_id == family_id,
+            InvestmentIncome.income_date >= start,
+            InvestmentIncome.income_date < end
+        )
+        .group_by(income_month),
+    )
+
+    months = {m: {"deposits": 0, "withdrawals": 0, "income": 0} for m in range(1, 13)}
+    for source, month, total in (await db.execute(stmt)).all():
+        value = total or 0
+        months[int(month)][source] = abs(value) if source == "withdrawals" else value
+    return months
+
+
+async def _equity_snapshot(db: AsyncSession, family_id: int, year: int):
+    """
+    一次查询得到各成员年初、年末累计存款及年内存款
+
+    Returns:
+        (members, deposits) members: [(user_id, nickname, avatar_version)]，
+        deposits: user_id -> {"nickname", "start", "end", "in_year", "in_year_count"}
+    """
+    start_cutoff = datetime.combine(date(year, 1, 1), datetime.max.time())
+    end_cutoff = datetime.combine(date(year, 12, 31), datetime.max.time())
+    start_of_year = datetime(year, 1, 1)
+    end_of_year = datetime(year, 12, 31, 23, 59, 59)
+
+    result = await db.execute(
+        select(User.id, User.nickname, User.avatar_version)
+        .join(FamilyMember, FamilyMember.user_id == User.id)
+        .where(FamilyMember.family_id == family_id)
+    )
+    members = result.all()
+
+    in_year = (Deposit.deposit_date >= start_of_year) & (Deposit.deposit_date <= end_of_year)
+    result = await db.execute(
+        select(
+            User.id,
+            User.nickname,
+            func.sum(case((Deposit.deposit_date <= start_cutoff, Deposit.amount), else_=0)),
+            func.sum(Deposit.amount),
+            func.sum(case((in_year, Deposit.amount), else_=0)),
+            func.sum(case((in_year, 1), else_=0)),
+        )
+        .join(User, Deposit.user_id == User.id)
+        .where(
+            Deposit.family_id == family_id,
+            Deposit.deposit_date <= end_cutoff
+        )
+        .group_by(User.id, User.nickname)
+    )
+    deposits = {
+        user_id: {"nickname": nickname, "start": start or 0, "end": end or 0,
+                  "in_year": in_year_total or 0, "in_year_count": count or 0}
+        for user_id, nickname, start, end, in_year_total, count in result.all()
+    }
+    return members, deposits
+
+
+def _equity_at(members, deposits: Dict[int, Dict[str, Any]], key: str) -> dict:
+    """按累计存款计算股权分布（key 为 start/end）"""
+    total_deposits = sum(d[key] for d in deposits.values())
+    equity_data = {}
+    for user_id, nickname, avatar_version in members:
+        user_deposits = deposits[user_id][key] if user_id in deposits else 0
+        equity_ratio = (user_deposits / total_deposits * 100) if total_deposits > 0 else 0
+        equity_data[str(user_id)] = {
+            "member_id": user_id,
+            "name": nickname,
+            "deposits": user_deposits,
+            "equity_ratio": round(equity_ratio, 2),
+            "avatar_version": avatar_version or 0
+        }
+    return equity_data
+
+
+async def generate_annual_report_data(db: AsyncSession, family_id: int, year: int) -> dict:
+    """生成年度报告数据（不读写缓存）"""
+    start_of_year = datetime(year, 1, 1)
+    end_of_year = datetime(year, 12, 31, 23, 59, 59)
+    start_of_prev_year = datetime(year - 1, 12, 31, 23, 59, 59)
+
+    # 1. 月度数据（一次查询），年度合计由月度累加
+    months = await _monthly_totals(db, family_id, year)
+    monthly_data = [
+        {
+            "month": month,
+            "deposits": m["deposits"],
+            "withdrawals": m["withdrawals"],
+            "income": m["income"],
+            "net": m["deposits"] - m["withdrawals"] + m["income"]
+        }
+        for month, m in sorted(months.items())
+    ]
+    total_deposits = sum(m["deposits"] for m in monthly_data)
+    total_withdrawals = sum(m["withdrawals"] for m in monthly_data)
+    total_income = sum(m["income"] for m in monthly_data)
+
+    # 2. 年初/年末余额（上年末、本年末最后一笔交易的 balance_after）
+    row = (await db.execute(
+        select(_last_balance(family_id, start_of_prev_year), _last_balance(family_id, end_of_year))
+    )).one()
+    start_balance = row[0] or 0
+    end_balance = row[1] or 0
+    net_change = end_balance - start_balance
+
+    # 3. 股权变化（年初 vs 年末）
+    members, member_deposits = await _equity_snapshot(db, family_id, year)
+    equity_start = _equity_at(members, member_deposits, "start")
+    equity_end = _equity_at(members, member_deposits, "end")
+
+    equity_changes = {}
+    all_user_ids = set(equity_start.keys()) | set(equity_end.keys())
+    for user_id in all_user_ids:
+        start_data = equity_start.get(user_id, {"name": "未知", "equity_ratio": 0})
+        end_data = equity_end.get(user_id, {"name": start_data.get("name", "未知"), "equity_ratio": 0})
+
+        equity_changes[user_id] = {
+            "name": end_data.get("name", start_data.get("name", "未知")),
+            "start_ratio": start_data.get("equity_ratio", 0),
+            "end_ratio": end_data.get("equity_ratio", 0),
+            "change": round(end_data.get("equity_ratio", 0) - start_data.get("equity_ratio", 0), 2)
+        }
+
+    # 4. 年度亮点
+    highlights = []
+
+    # 最大单笔存款
+    result = await db.execute(
+        select(Deposit, User)
+        .join(User, Deposit.user_id == User.id)
+        .where(
+            Deposit.family_id == family_id,
+            Deposit.deposit_date >= start_of_year,
+            Deposit.deposit_date <= end_of_year
+        )
+        .order_by(Deposit.amount.desc())
+        .limit(1)
+    )
+    max_deposit = result.first()
+    if max_deposit:
+        deposit, user = max_deposit
+        highlights.append({
+            "type": "max_deposit",
+            "title": "最大单笔存款",
+            "value": deposit.amount,
+            "description": f"{user.nickname} 在 {deposit.deposit_date.strftime('%m月%d日')} 存入 ¥{deposit.amount:,.2f}"
+        })
+
+    # 最佳理财收益月
+    best_month = max(monthly_data, key=lambda x: x["income"]) if monthly_data else None
+    if best_month and best_month["income"] > 0:
+        highlights.append({
+            "type": "best_income_month",
+            "title": "最佳收益月份",
+            "value": best_month["income"],
+            "description": f"{best_month['month']}月理财收益 ¥{best_month['income']:,.2f}"
+        })
+
+    # 年度储蓄率
+    if total_deposits > 0:
+        savings_rate = ((total_deposits - total_withdrawals) / total_deposits) * 100
+        highlights.append({
+            "type": "savings_rate",
+            "title": "年度储蓄率",
+            "value": round(savings_rate, 1),
+            "description": f"全年储蓄率 {savings_rate:.1f}%"
+        })
+
+    # 资产增长率
+    if start_balance > 0:
+        growth_rate = ((end_balance - start_balance) / start_balance) * 100
+        highlights.append({
+            "type": "growth_rate",
+            "title": "资产增长率",
+            "value": round(growth_rate, 1),
+            "description": f"全年资产增长 {growth_rate:.1f}%"
+        })
+
+    # 转换 equity_changes 为前端期望的数组格式
+    equity_start_list = []
+    equity_end_list = []
+    for user_id, data in equity_changes.items():
+        # 从 equity_end 获取 avatar_version（因为它是当前最新的数据）
+        avatar_version = equity_end.get(user_id, {}).get("avatar_version", 0)
+        equity_start_list.append({
+            "member_id": int(user_id),
+            "name": data["name"],
+            "percentage": data["start_ratio"],
+            "avatar_version": avatar_version
+        })
+        equity_end_list.append({
+            "member_id": int(user_id),
+            "name": data["name"],
+            "percentage": data["end_ratio"],
+            "avatar_version": avatar_version
+        })
+
+    # 转换 monthly_data 为前端期望的格式
+    monthly_data_formatted = []
+    for m in monthly_data:
+        monthly_data_formatted.append({
+            "month": m["month"],
+            "income": m["deposits"] + m["income"],  # 收入 = 存款 + 理财收益
+            "expense": m["withdrawals"],
+            "net": m["net"]
+        })
+
+    # 转换 highlights 为前端期望的对象格式
+    highlights_obj = {}
+    for h in highlights:
+        if h["type"] == "max_deposit":
+            highlights_obj["biggest_deposit"] = {
+                "amount": h["value"],
+                "member": h["description"].split(" 在 ")[0] if " 在 " in h["description"] else "",
+                "date": None  # 日期需要从描述解析或添加到原数据
+            }
+        elif h["type"] == "best_income_month":
+            highlights_obj["best_month"] = {
+                "month": int(h["description"].split("月")[0]) if "月" in h["description"] else 1,
+                "net": h["value"]
+            }
+        elif h["type"] == "savings_rate":
+            highlights_obj["savings_rate"] = h["value"]
+        elif h["type"] == "growth_rate":
+            highlights_obj["growth_rate"] = h["value"]
+
+    # 添加理财收益到亮点
+    if total_income > 0:
+        highlights_obj["investment_return"] = total_income
+
+    # 查找最佳存款人（年内存款总额最高的成员）
+    depositors = [d for d in member_deposits.values() if d["in_year_count"]]
+    if max_deposit and depositors:
+        top_depositor = max(depositors, key=lambda d: d["in_year"])
+        highlights_obj["most_deposits_member"] = {
+            "name": top_depositor["nickname"],
+            "total": top_depositor["in_year"]
+        }
+
+    # 5. 计算建议分红（基于年末持股比例分配投资收益）
+    dividend_suggestion = {
+        "total_investment_income": total_income,  # 可分配的投资收益总额
+        "distribution": [],  # 各成员的分红明细
+        "has_dividend": total_income > 0  # 是否有可分配收益
+    }
+
+    if total_income > 0:
+        for eq in equity_end_list:
+            # 按年末持股比例计算每人应得分红
+            member_dividend = round(total_income * eq["percentage"] / 100, 2)
+            dividend_suggestion["distribution"].append({
+                "member_id": eq["member_id"],
+                "name": eq["name"],
+                "equity_percentage": eq["percentage"],
+                "dividend_amount": member_dividend,
+                "avatar_version": eq.get("avatar_version", 0)
+            })
+
+    return {
+        "year": year,
+        "summary": {
+            "total_income": total_deposits + total_income,  # 总收入 = 存款 + 理财收益
+            "total_expense": total_withdrawals,
+            "net_change": net_change,
+            "start_balance": start_balance,
+            "end_balance": end_balance
+        },
+        "monthly_data": monthly_data_formatted,
+        "equity_start": equity_start_list,
+        "equity_end": equity_end_list,
+        "highlights": highlights_obj,
+        "dividend_suggestion": dividend_suggestion,  # 建议分红
+        # 也保留原始数据，方便以后使用
+        "raw": {
+            "total_deposits": total_deposits,
+            "total_withdrawals": total_withdrawals,
+            "total_income": total_income,
+            "equity_changes": equity_changes
+        }
+    }
+
+
+# ==================== 报告产物缓存 ====================
+
+async def get_annual_report(db: AsyncSession, family_id: int, year: int, force: bool = False) -> dict:
+    """
+    获取年度报告：缓存有效时直接返回，否则重新生成并写回 annual_reports
+
+    生成期间若有流水变动（data_version 变化），结果照常返回但不标记为有效，
+    下次读取时重新生成。
+
+    Args:
+        db: 数据库会话（函数内会提交）
+        family_id: 家庭ID
+        year: 报告年份
+        force: 忽略缓存强制重新生成
+
+    Returns:
+        报告数据，附带 is_cached 与 generated_at
+    """
+    report = (await db.execute(
+        select(AnnualReport).where(AnnualReport.family_id == family_id, AnnualReport.year == year)
+    )).scalar_one_or_none()
+
+    if (
+        report is not None and not force and not report.is_stale
+        and report.format_version == REPORT_FORMAT_VERSION and report.report_data
+    ):
+        data = json.loads(report.report_data)
+        data["is_cached"] = True
+        data["generated_at"] = report.generated_at.isoformat() if report.generated_at else None
+        return data
+
+    if report is None:
+        # 先占位，使生成期间的流水变动能递增 data_version
+        await db.execute(
+            sqlite_insert(AnnualReport)
+            .values(family_id=family_id, year=year, equity_changes="{}", monthly_data="[]",
+                    highlights="{}", is_stale=True, data_version=0, format_version=0)
+            .on_conflict_do_nothing(index_elements=["family_id", "year"])
+        )
+        await db.commit()
+        report = (await db.execute(
+            select(AnnualReport).where(AnnualReport.family_id == family_id, AnnualReport.year == year)
+        )).scalar_one()
+
+    data_version = report.data_version
+    data = await generate_annual_report_data(db, family_id, year)
+    generated_at = datetime.now()
+
+    raw = data["raw"]
+    result = await db.execute(
+        update(AnnualReport)
+        .where(AnnualReport.id == report.id, AnnualReport.data_version == data_version)
+        .values(
+            total_deposits=raw["total_deposits"],
+            total_withdrawals=raw["total_withdrawals"],
+            total_income=raw["total_income"],
+            net_change=data["summary"]["net_change"],
+            start_balance=data["summary"]["start_balance"],
+            end_balance=data["summary"]["end_balance"],
+            equity_changes=json.dumps(raw["equity_changes"], ensure_ascii=False),
+            monthly_data=json.dumps(data["monthly_data"], ensure_ascii=False),
+            highlights=json.dumps(data["highlights"], ensure_ascii=False),
+            report_data=json.dumps(data, ensure_ascii=False),
+            format_version=REPORT_FORMAT_VERSION,
+            is_stale=False,
+            generated_at=generated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount == 0:
+        logger.info(f"Annual report {family_id}/{year} changed during generation, not cached")
+
+    data["is_cached"] = False
+    data["generated_at"] = generated_at.isoformat()
+    return data
+
+
+async def pregenerate_annual_reports(
+    year: int,
+    concurrency: int = 4,
+    force: bool = False,
+    session_maker=None,
+) -> Dict[str, int]:
+    """
+    为所有家庭预生成指定年份的报告（年末批量任务）
+
+    Args:
+        year: 报告年份
+        concurrency: 同时生成的最大家庭数
+        force: 忽略已有缓存
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+
+    Returns:
+        统计 {"families", "generated", "cached", "failed"}
+    """
+    if session_maker is None:
+        from app.core.database import async_session_maker
+        session_maker = async_session_maker
+
+    async with session_maker() as db:
+        family_ids = (await db.execute(select(Family.id).order_by(Family.id))).scalars().all()
+
+    stats = {"families": len(family_ids), "generated": 0, "cached": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(family_id: int) -> None:
+        async with semaphore:
+            try:
+                async with session_maker() as db:
+                    data = await get_annual_report(db, family_id, year, force=force)
+                stats["cached" if data["is_cached"] else "generated"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error(f"Failed to generate annual report {family_id}/{year}: {e}", exc_info=True)
+
+    await asyncio.gather(*(run(fid) for fid in family_ids))
+    logger.info(f"📊 {year} 年度报告预生成完成: {stats}")
+    return stats
+
+
+# ==================== 失效（after_flush） ====================
+
+def _field_values(obj, field: str) -> set:
+    """字段当前值及本次 flush 前的旧值"""
+    history = inspect(obj).attrs[field].history
+    values = set(history.added) | set(history.deleted) | set(history.unchanged)
+    if not values:
+        values.add(getattr(obj, field))
+    return values
+
+
+def _year_of(value) -> int:
+    return value.year if value is not None else datetime.utcnow().year
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_annual_reports(session: Session, flush_context) -> None:
+    """流水、成员或成员昵称变化时，使受影响年份及之后的报告过期"""
+    from_year: Dict[int, int] = {}           # family_id -> 最早受影响年份
+    income_years: Dict[int, int] = defaultdict(lambda: 9999)  # investment_id -> 最早年份
+    member_families = set()
+    renamed_users = set()
+
+    def touch(family_id, year: int) -> None:
+        if family_id is not None:
+            from_year[family_id] = min(year, from_year.get(family_id, year))
+
+    def collect(obj, changed_only: bool) -> None:
+        model = type(obj)
+        if model in _WATCHED_FIELDS:
+            if changed_only and not any(
+                inspect(obj).attrs[f].history.has_changes() for f in _WATCHED_FIELDS[model]
+            ):
+                return
+            year = min(_year_of(v) for v in _field_values(obj, _DATE_FIELDS[model]))
+            if model is InvestmentIncome:
+                for inv_id in _field_values(obj, "investment_id"):
+                    income_years[inv_id] = min(income_years[inv_id], year)
+            else:
+                for fid in _field_values(obj, "family_id"):
+                    touch(fid, year)
+        elif isinstance(obj, FamilyMember):
+            member_families.update(_field_values(obj, "family_id"))
+        elif isinstance(obj, User) and changed_only:
+            state = inspect(obj)
+            if state.attrs.nickname.history.has_changes() or state.attrs.avatar_version.history.has_changes():
+                renamed_users.add(obj.id)
+
+    for obj in session.new:
+        collect(obj, False)
+    for obj in session.deleted:
+        collect(obj, False)
+    for obj in session.dirty:
+        collect(obj, True)
+
+    if not (from_year or income_years or member_families or renamed_users):
+        return
+
+    conn = session.connection()
+    if income_years:
+        rows = conn.execute(
+            select(Investment.id, Investment.family_id).where(Investment.id.in_(list(income_years)))
+        ).all()
+        for inv_id, fid in rows:
+            touch(fid, income_years[inv_id])
+    if renamed_users:
+        member_families.update(conn.execute(
+            select(FamilyMember.family_id).where(FamilyMember.user_id.in_(list(renamed_users)))
+        ).scalars())
+    for fid in member_families:
+        if fid is not None:
+            from_year[fid] = 0
+
+    table = AnnualReport.__table__
+    for fid, year in from_year.items():
+        conn.execute(
+            update(table)
+            .where(table.c.family_id == fid, table.c.year >= year)
+            .values(is_stale=True, data_version=table.c.data_version + 1)
+        )
@@ -12,9 +12,10 @@ from app.models.models import (
     ApprovalRequest, ApprovalRecord, ApprovalRequestType, ApprovalRequestStatus,
     FamilyMember, User, Deposit, Investment, InvestmentIncome, InvestmentType,
     InvestmentPosition, PositionOperationType,
-    Transaction, TransactionType, Family, ExpenseRequest, ExpenseStatus
+    TransactionType, Family, ExpenseRequest, ExpenseStatus
 )
 from app.schemas.approval import ApprovalRequestResponse, ApprovalRecordResponse
+from app.services.balance import get_balance, post_transaction
 from app.services.calendar import calendar_service
 from app.services.notification import NotificationService, NotificationType, send_approval_notification
 
@@ -547,7 +548,7 @@ class ApprovalService:
         注意：活期资产(CASH)应通过 Deposit 接口创建，此处仅处理投资型资产
         支持多币种和汇率自动计算
         """
-        from app.models.models import Asset, AssetType, CurrencyType, AssetPosition, PositionOperationType, Deposit, Transaction, TransactionType, User
+        from app.models.models import Asset, AssetType, CurrencyType, AssetPosition, PositionOperationType, Deposit, TransactionType, User
         from app.services.exchange_rate import exchange_rate_service
         from app.services.asset_helper import get_cash_balance
         
@@ -642,16 +643,6 @@ class ApprovalService:
         
         # 更新Transaction（仅在有活期变化时）
         if cash_change != 0:
-            # 获取当前余额
-            result = await self.db.execute(
-                select(Transaction)
-                .where(Transaction.family_id == request.family_id)
-                .order_by(Transaction.created_at.desc())
-                .limit(1)
-            )
-            last_transaction = result.scalar_one_or_none()
-            current_balance = last_transaction.balance_after if last_transaction else 0
-            
             # 获取用户昵称
             result = await self.db.execute(
                 select(User).where(User.id == user_id)
@@ -674,18 +665,17 @@ class ApprovalService:
             else:
                 desc = f"{user.nickname}从活期转入{asset_type_name} {name}"
             
-            transaction = Transaction(
+            transaction = await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=user_id,
                 transaction_type=TransactionType.DEPOSIT if cash_change > 0 else TransactionType.WITHDRAW,
                 amount=abs(cash_change),
-                balance_after=current_balance + cash_change,
+                balance_delta=cash_change,
                 description=desc,
                 reference_id=asset.id,
                 reference_type="asset_create"
             )
-            self.db.add(transaction)
-            await self.db.flush()
             
             # 关联交易ID到持仓记录
             position.transaction_id = transaction.id
@@ -755,31 +745,19 @@ class ApprovalService:
         self.db.add(deposit)
         await self.db.flush()
         
-        # 2. 获取当前活期余额（Transaction.balance_after）
-        result = await self.db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == request.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
-        
-        # 3. 创建交易流水（更新家庭活期余额）
-        transaction = Transaction(
+        # 2. 记账（原子更新家庭活期余额并写入交易流水）
+        await post_transaction(
+            self.db,
             family_id=request.family_id,
             user_id=request.requester_id,
             transaction_type=TransactionType.DEPOSIT,
             amount=request.amount,
-            balance_after=current_balance + request.amount,
             description=f"{user.nickname}存入{request.amount}元",
             reference_id=deposit.id,
             reference_type="deposit"
         )
-        self.db.add(transaction)
-        await self.db.flush()
         
-        # 4. 检查成就解锁（失败不影响主业务）
+        # 3. 检查成就解锁（失败不影响主业务）
         try:
             from app.services.achievement import AchievementService
             achievement_service = AchievementService(self.db)
@@ -835,14 +813,7 @@ class ApprovalService:
         deduct_from_cash = data.get("deduct_from_cash", False)  # 默认使用外部资金
         
         # 获取当前余额
-        result = await self.db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == request.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
+        current_balance = await get_balance(self.db, request.family_id)
         
         # 只有从自由资金扣除时才检查余额
         if deduct_from_cash and current_balance < principal:
@@ -895,47 +866,41 @@ class ApprovalService:
         # 创建交易流水和关联
         if deduct_from_cash:
             # 从自由资金扣除：创建WITHDRAW交易
-            transaction = Transaction(
+            transaction = await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=request.requester_id,
                 transaction_type=TransactionType.WITHDRAW,
                 amount=-principal,
-                balance_after=current_balance - principal,
                 description=f"创建投资: {investment.name} (从自由资金)",
                 reference_id=investment.id,
                 reference_type="investment_create"
             )
-            self.db.add(transaction)
-            await self.db.flush()
             position.transaction_id = transaction.id
         else:
             # 外部资金：先创建DEPOSIT交易记录资金进入
-            deposit_transaction = Transaction(
+            await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=request.requester_id,
                 transaction_type=TransactionType.DEPOSIT,
                 amount=principal,
-                balance_after=current_balance + principal,
                 description=f"外部资金注入: {investment.name} (创建投资)",
                 reference_id=investment.id,
                 reference_type="investment_create"
             )
-            self.db.add(deposit_transaction)
-            await self.db.flush()
             
             # 再创建INVESTMENT_BUY交易，从余额扣款到投资，net balance不变
-            buy_transaction = Transaction(
+            buy_transaction = await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=request.requester_id,
                 transaction_type=TransactionType.INVESTMENT_BUY,
-                amount=-principal,
-                balance_after=current_balance,  # 净余额不变
+                amount=-principal,  # 紧接注入流水扣回，净余额不变
                 description=f"投资买入: {investment.name} (外部资金)",
                 reference_id=investment.id,
                 reference_type="investment_create"
             )
-            self.db.add(buy_transaction)
-            await self.db.flush()
             position.transaction_id = buy_transaction.id
         
         # 创建存款记录（记录权益贡献）
@@ -1134,28 +1099,18 @@ class ApprovalService:
         self.db.add(income)
         await self.db.flush()
         
-        # 获取当前余额
-        result = await self.db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == request.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
-        
         # 创建交易流水（理财收益不影响家庭自由资金余额，仅作记录）
-        transaction = Transaction(
+        await post_transaction(
+            self.db,
             family_id=request.family_id,
             user_id=None,
             transaction_type=TransactionType.INCOME,
             amount=income_amount,
-            balance_after=current_balance,  # 余额不变，收益留在理财产品中
+            balance_delta=0,  # 余额不变，收益留在理财产品中
             description=f"理财收益: {investment.name} +{income_amount}元",
             reference_id=income.id,
             reference_type="investment_income"
         )
-        self.db.add(transaction)
         
         # 检查成就解锁（失败不影响主业务）
         try:
@@ -1219,15 +1174,8 @@ class ApprovalService:
         
         deduct_from_cash = data.get("deduct_from_cash", True)  # 默认从自由资金扣除
         
-        # 获取当前余额（无论是否从自由资金扣除都需要，用于维护 balance_after 流水）
-        result = await self.db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == request.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
+        # 获取当前余额（仅用于余额检查，balance_after 由记账服务维护）
+        current_balance = await get_balance(self.db, request.family_id)
         
         # 如果从自由资金扣除，需要检查余额
         if deduct_from_cash:
@@ -1269,47 +1217,41 @@ class ApprovalService:
         # 只有从自由资金扣除时才创建交易流水
         if deduct_from_cash:
             # 创建交易流水（从余额扣款）
-            transaction = Transaction(
+            transaction = await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=request.requester_id,
                 transaction_type=TransactionType.INVESTMENT_BUY,
                 amount=-amount,
-                balance_after=current_balance - amount,
                 description=f"投资买入: {investment.name} (从自由资金)",
                 reference_id=investment_id,
                 reference_type="investment_increase"
             )
-            self.db.add(transaction)
-            await self.db.flush()
             position.transaction_id = transaction.id
         else:
             # 外部资金：先创建DEPOSIT交易记录资金进入
-            deposit_transaction = Transaction(
+            await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=request.requester_id,
                 transaction_type=TransactionType.DEPOSIT,
                 amount=amount,
-                balance_after=current_balance + amount,
                 description=f"外部资金注入: {investment.name} (增持)",
                 reference_id=investment_id,
                 reference_type="investment_increase"
             )
-            self.db.add(deposit_transaction)
-            await self.db.flush()
             
             # 再创建INVESTMENT_BUY交易，从余额扣款到投资，net balance不变
-            buy_transaction = Transaction(
+            buy_transaction = await post_transaction(
+                self.db,
                 family_id=request.family_id,
                 user_id=request.requester_id,
                 transaction_type=TransactionType.INVESTMENT_BUY,
-                amount=-amount,
-                balance_after=current_balance,  # 净余额不变
+                amount=-amount,  # 紧接注入流水扣回，净余额不变
                 description=f"投资买入: {investment.name} (外部资金)",
                 reference_id=investment_id,
                 reference_type="investment_increase"
             )
-            self.db.add(buy_transaction)
-            await self.db.flush()
             position.transaction_id = buy_transaction.id
             
             # 创建存款记录（增加权益贡献）
@@ -1400,29 +1342,17 @@ class ApprovalService:
         self.db.add(position)
         await self.db.flush()
         
-        # 获取当前余额
-        result = await self.db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == request.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
-        
         # 创建交易流水（返还到余额）
-        transaction = Transaction(
+        transaction = await post_transaction(
+            self.db,
             family_id=request.family_id,
             user_id=request.requester_id,
             transaction_type=TransactionType.INVESTMENT_REDEEM,
             amount=amount,
-            balance_after=current_balance + amount,
             description=f"投资赎回: {investment.name}",
             reference_id=investment_id,
             reference_type="investment_decrease"
         )
-        self.db.add(transaction)
-        await self.db.flush()
         position.transaction_id = transaction.id
         
         # 注意：减持时资金回到自由资金池，不影响股权分布，因此不创建 Deposit 记录
@@ -1566,28 +1496,17 @@ class ApprovalService:
             )
             self.db.add(deposit)
 
-        # 获取当前余额
-        result = await self.db.execute(
-            select(Transaction)
-            .where(Transaction.family_id == request.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        last_transaction = result.scalar_one_or_none()
-        current_balance = last_transaction.balance_after if last_transaction else 0
-
         # 创建支出流水
-        transaction = Transaction(
+        await post_transaction(
+            self.db,
             family_id=request.family_id,
             user_id=expense.requester_id,
             transaction_type=TransactionType.WITHDRAW,
             amount=-expense.amount,
-            balance_after=current_balance - expense.amount,
             description=f"大额支出: {expense.title}",
             reference_id=expense.id,
             reference_type="expense"
         )
-        self.db.add(transaction)
 
         # 检查成就解锁
         try:
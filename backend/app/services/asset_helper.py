@@ -5,12 +5,13 @@ from typing import Optional
 from sqlalchemy import select, func, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.models import Asset, AssetType, CurrencyType, Transaction
+from app.models.models import Asset, AssetType, CurrencyType
+from app.services.balance import get_balance
 
 
 async def get_cash_balance(db: AsyncSession, family_id: int) -> float:
     """
-    获取家庭的活期现金余额（从Transaction表获取最新余额）
+    获取家庭的活期现金余额（从家庭活期账户读取）
     
     Args:
         db: 数据库会话
@@ -19,14 +20,7 @@ async def get_cash_balance(db: AsyncSession, family_id: int) -> float:
     Returns:
         活期现金余额（CNY）
     """
-    result = await db.execute(
-        select(Transaction.balance_after)
-        .where(Transaction.family_id == family_id)
-        .order_by(Transaction.created_at.desc())
-        .limit(1)
-    )
-    last_transaction = result.scalar_one_or_none()
-    return last_transaction if last_transaction is not None else 0.0
+    return await get_balance(db, family_id)
 
 
 async def check_cash_sufficient(db: AsyncSession, family_id: int, required_amount: float) -> bool:
@@ -63,7 +57,7 @@ async def get_asset_summary(db: AsyncSession, family_id: int) -> dict:
             "by_currency": {按币种分组}
         }
     """
-    # 1. 获取活期余额（从Transaction表）
+    # 1. 获取活期余额（从家庭活期账户）
     cash_balance = await get_cash_balance(db, family_id)
     
     # 2. 获取所有投资型资产（不包括CASH类型）
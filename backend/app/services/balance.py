@@ -0,0 +1,133 @@
+"""
+小金库 (Golden Nest) - 活期余额记账服务
+
+家庭活期余额只通过 post_transaction 变更：
+1. 对 family_accounts 行执行 UPDATE balance = balance + delta（原子读改写）
+2. 以 RETURNING 得到的新余额写入 Transaction.balance_after
+
+UPDATE 是事务中的首条写语句时即获取写锁，并发的记账会排队到当前事务提交之后，
+读到的一定是已提交的最新余额，因此 balance_after 链不会分叉。
+不同家庭操作的是不同的账户行，彼此之间没有额外的应用层锁。
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update, func, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import FamilyAccount, Transaction, TransactionType
+
+
+def _last_balance_subquery(family_id: int):
+    """流水链末端的 balance_after（按 id 排序，与记账顺序一致）"""
+    return (
+        select(Transaction.balance_after)
+        .where(Transaction.family_id == family_id)
+        .order_by(Transaction.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+async def _ensure_account(db: AsyncSession, family_id: int) -> None:
+    """账户行不存在时，以现有流水链末端余额初始化（幂等）"""
+    account_table = FamilyAccount.__table__
+    stmt = sqlite_insert(account_table).from_select(
+        ["family_id", "balance", "updated_at"],
+        select(
+            literal(family_id),
+            func.coalesce(_last_balance_subquery(family_id), 0.0),
+            literal(datetime.utcnow()),
+        ),
+    )
+    await db.execute(stmt.on_conflict_do_nothing(index_elements=["family_id"]))
+
+
+async def get_balance(db: AsyncSession, family_id: int) -> float:
+    """
+    获取家庭当前活期余额
+
+    Args:
+        db: 数据库会话
+        family_id: 家庭ID
+
+    Returns:
+        活期余额（CNY）
+    """
+    result = await db.execute(
+        select(FamilyAccount.balance).where(FamilyAccount.family_id == family_id)
+    )
+    balance = result.scalar_one_or_none()
+    if balance is not None:
+        return balance
+
+    # 尚未初始化账户（历史数据），直接读取流水链末端
+    result = await db.execute(select(func.coalesce(_last_balance_subquery(family_id), 0.0)))
+    return result.scalar() or 0.0
+
+
+async def post_transaction(
+    db: AsyncSession,
+    family_id: int,
+    transaction_type: TransactionType,
+    amount: float,
+    description: str,
+    balance_delta: Optional[float] = None,
+    user_id: Optional[int] = None,
+    reference_id: Optional[int] = None,
+    reference_type: Optional[str] = None,
+) -> Transaction:
+    """
+    记一笔资金流水并原子地更新家庭活期余额（不提交事务，由调用方管理）
+
+    Args:
+        db: 数据库会话
+        family_id: 家庭ID
+        transaction_type: 交易类型
+        amount: 流水金额（展示用）
+        description: 描述
+        balance_delta: 对活期余额的影响，默认等于 amount；
+            余额不变的流水（如收益登记、分红提现）传 0
+        user_id: 操作用户ID
+        reference_id: 关联记录ID
+        reference_type: 关联类型
+
+    Returns:
+        已 flush 的 Transaction（含 id 与 balance_after）
+    """
+    delta = amount if balance_delta is None else balance_delta
+    account_table = FamilyAccount.__table__
+
+    stmt = (
+        update(account_table)
+        .where(account_table.c.family_id == family_id)
+        .values(balance=account_table.c.balance + delta, updated_at=datetime.utcnow())
+        .returning(account_table.c.balance)
+    )
+    result = await db.execute(stmt)
+    balance_after = result.scalar_one_or_none()
+    if balance_after is None:
+        await _ensure_account(db, family_id)
+        result = await db.execute(stmt)
+        balance_after = result.scalar_one()
+
+    transaction = Transaction(
+        family_id=family_id,
+        user_id=user_id,
+        transaction_type=transaction_type,
+        amount=amount,
+        balance_after=balance_after,
+        description=description,
+        reference_id=reference_id,
+        reference_type=reference_type,
+    )
+    db.add(transaction)
+    await db.flush()
+
+    await db.execute(
+        update(account_table)
+        .where(account_table.c.family_id == family_id)
+        .values(last_transaction_id=transaction.id)
+    )
+    return transaction
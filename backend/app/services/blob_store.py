@@ -0,0 +1,157 @@
+"""
+小金库 (Golden Nest) - 内容寻址图片存储
+
+头像、记账凭证、公告图片等以文件形式保存在 uploads/blobs 下，数据库只保存 URL：
+
+    uploads/blobs/ab/cd/abcdef...(sha256).jpg  ->  /uploads/blobs/ab/cd/abcdef....jpg
+
+- 内容寻址：文件名即内容的 SHA-256，相同图片只存一份（天然去重）
+- 分片目录：按哈希前两级各 2 个十六进制字符分目录，避免单目录文件过多
+- 原子写入：先写临时文件再 os.replace，并发写入同一内容也不会产生半截文件
+- 强 ETag：通过 /uploads 静态挂载访问时，ETag 即内容哈希，可永久缓存
+"""
+import base64
+import binascii
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+from app.core.config import BASE_DIR
+
+BLOB_ROOT = os.path.join(BASE_DIR, "uploads", "blobs")
+BLOB_URL_PREFIX = "/uploads/blobs/"
+
+# 内容哈希永不变化，静态访问可永久缓存
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_DATA_URI_RE = re.compile(r"^data:([\w.+-]+/[\w.+-]+)?(?:;[\w-]+=[^;,]*)*;base64,", re.IGNORECASE)
+_BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[\w]+)?$")
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/jpg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
+
+
+def is_data_uri(value: Optional[str]) -> bool:
+    """是否为 Base64 data URI"""
+    return bool(value) and value.startswith("data:")
+
+
+def is_blob_url(value: Optional[str]) -> bool:
+    """是否为本存储生成的 URL"""
+    return bool(value) and value.startswith(BLOB_URL_PREFIX)
+
+
+def _extension(mime_type: Optional[str]) -> str:
+    mime_type = (mime_type or "").lower()
+    return _EXTENSIONS.get(mime_type) or mimetypes.guess_extension(mime_type) or ".bin"
+
+
+def store_bytes(data: bytes, mime_type: Optional[str] = None) -> str:
+    """
+    保存内容，已存在相同内容时直接复用
+
+    Args:
+        data: 文件内容
+        mime_type: MIME 类型，决定文件扩展名
+
+    Returns:
+        可通过 /uploads 静态挂载访问的 URL
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    relative = os.path.join(digest[:2], digest[2:4], digest + _extension(mime_type))
+    path = os.path.join(BLOB_ROOT, relative)
+
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o644)  # mkstemp 默认 0600，静态服务器需要可读
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return BLOB_URL_PREFIX + relative.replace(os.sep, "/")
+
+
+def decode_data_uri(value: str, default_mime: str = "image/jpeg") -> Tuple[bytes, str]:
+    """
+    解析 Base64 data URI（无前缀时视为纯 Base64）
+
+    Raises:
+        ValueError: 不是有效的 Base64 数据
+    """
+    mime_type = default_mime
+    encoded = value
+    match = _DATA_URI_RE.match(value)
+    if match:
+        mime_type = match.group(1) or default_mime
+        encoded = value[match.end():]
+    elif value.startswith("data:"):
+        raise ValueError("unsupported data URI")
+    try:
+        return base64.b64decode(encoded, validate=False), mime_type
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"invalid base64 data: {e}") from e
+
+
+def store_data_uri(value: str, default_mime: str = "image/jpeg") -> str:
+    """保存 Base64 data URI，返回 URL"""
+    data, mime_type = decode_data_uri(value, default_mime)
+    return store_bytes(data, mime_type)
+
+
+def externalize(value: Optional[str]) -> Optional[str]:
+    """data URI 转存为文件并返回 URL，其它值（URL/路径/空）原样返回"""
+    if is_data_uri(value):
+        return store_data_uri(value)
+    return value
+
+
+def blob_path(url: str) -> Optional[str]:
+    """URL 对应的本地文件路径（不是本存储的 URL 或文件不存在时返回 None）"""
+    if not is_blob_url(url):
+        return None
+    relative = url[len(BLOB_URL_PREFIX):]
+    parts = relative.split("/")
+    if len(parts) != 3 or not _BLOB_NAME_RE.match(parts[2]):
+        return None
+    path = os.path.join(BLOB_ROOT, *parts)
+    return path if os.path.isfile(path) else None
+
+
+def blob_digest(path) -> Optional[str]:
+    """从文件名解析内容哈希（非本存储文件返回 None）"""
+    path = os.path.realpath(os.fspath(path))
+    if os.path.dirname(os.path.dirname(os.path.dirname(path))) != os.path.realpath(BLOB_ROOT):
+        return None
+    match = _BLOB_NAME_RE.match(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+class BlobStaticFiles(StaticFiles):
+    """/uploads 静态挂载：blobs 下的文件使用内容哈希作为强 ETag 并永久缓存"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        digest = blob_digest(full_path)
+        if digest is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={"etag": f'"{digest}"', "cache-control": BLOB_CACHE_CONTROL},
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,120 +1,327 @@
 """
 日历服务 - 提供模块联动的自动事件生成功能
+
+系统事件（理财到期、待办截止、股权赠与）以 (family_id, source_type, source_id) 唯一标识，
+统一由 reconcile_system_events 按集合比对后批量新增 / 更新 / 删除：
+
+- 全量同步（/calendar/sync）：一次查询家庭内某类来源的全部已有事件，与候选集合比对
+- 增量同步（各模块钩子）：只比对本次变更的来源ID
+
+批量写入不经过 ORM flush，新增/删除/改分类的事件由 apply_counter_changes 补记成就计数器。
 """
 from datetime import datetime, timedelta
-from typing import Optional
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.core.constants import NotificationConstants
 from app.models.models import (
     CalendarEvent, CalendarEventParticipant,
     CalendarEventCategory, CalendarRepeatType,
-    Investment, TodoItem, EquityGift
+    Investment, TodoItem, TodoList, EquityGift, EquityGiftStatus
 )
+from app.services.achievement_counters import apply_counter_changes
+
+# 系统事件来源类型
+SOURCE_INVESTMENT = "investment"
+SOURCE_TODO = "todo"
+SOURCE_GIFT = "gift"
+
+# 由来源数据决定、同步时会被覆盖的字段
+SYNCED_FIELDS = ("title", "description", "category", "start_time", "is_all_day", "color")
+
+_TODO_PRIORITY_COLORS = {
+    "high": "#ef4444",    # 红色
+    "medium": "#f59e0b",  # 橙色
+    "low": "#10b981"      # 绿色
+}
+
+# 赠与状态 -> (标题, 颜色)
+_GIFT_STATUS_STYLES = {
+    EquityGiftStatus.PENDING: ("🎁 股权赠与待接收", "#8b5cf6"),
+    EquityGiftStatus.ACCEPTED: ("🎁 股权赠与已接收", "#10b981"),
+    EquityGiftStatus.REJECTED: ("🎁 股权赠与已拒绝", "#6b7280"),
+    EquityGiftStatus.EXPIRED: ("🎁 股权赠与已过期", "#6b7280"),
+}
+
+
+class SystemEvent(NamedTuple):
+    """期望存在的系统事件"""
+    values: dict                          # SYNCED_FIELDS 对应的字段值
+    participant_ids: Tuple[int, ...] = ()
+    creatable: bool = True                # False：已存在时更新，不存在时不新建
+
+
+# ==================== 候选事件 ====================
+
+def investment_event(investment: Investment) -> Optional[SystemEvent]:
+    """理财到期提醒：到期前7天（已过则为到期当天）；无到期日或已不活跃时不需要事件"""
+    if not investment.end_date or not investment.is_active:
+        return None
+    remind_date = investment.end_date - timedelta(days=NotificationConstants.REMINDER_DAYS_BEFORE_DUE)
+    now = datetime.utcnow()
+    if remind_date <= now:
+        remind_date = investment.end_date
+    return SystemEvent(
+        values={
+            "title": f"💰 理财到期：{investment.name}",
+            "description": f"理财产品「{investment.name}」将于 {investment.end_date.strftime('%Y-%m-%d')} 到期\n"
+                           f"本金：¥{investment.principal:,.2f}",
+            "category": CalendarEventCategory.FINANCE,
+            "start_time": remind_date,
+            "is_all_day": True,
+            "color": "#f59e0b",
+        },
+        creatable=investment.end_date >= now,
+    )
+
+
+def todo_event(todo: TodoItem, assignee_id: Optional[int] = None) -> Optional[SystemEvent]:
+    """待办截止提醒：截止日当天；已完成或无截止日期时不需要事件，已过期的不再新建"""
+    if todo.is_completed or not todo.due_date:
+        return None
+    due_date = todo.due_date.replace(tzinfo=None) if todo.due_date.tzinfo else todo.due_date
+    priority_value = todo.priority.value if hasattr(todo.priority, 'value') else str(todo.priority)
+    return SystemEvent(
+        values={
+            "title": f"📋 待办截止：{todo.title}",
+            "description": todo.description or f"任务「{todo.title}」截止日期",
+            "category": CalendarEventCategory.SYSTEM,
+            "start_time": due_date,
+            "is_all_day": False,
+            "color": _TODO_PRIORITY_COLORS.get(priority_value, "#667eea"),
+        },
+        participant_ids=(assignee_id,) if assignee_id else (),
+        creatable=due_date >= datetime.utcnow(),
+    )
+
+
+def gift_event(gift: EquityGift) -> SystemEvent:
+    """股权赠与提醒：只为待接收的赠与新建，已处理的赠与更新标题与颜色"""
+    title, color = _GIFT_STATUS_STYLES.get(gift.status, _GIFT_STATUS_STYLES[EquityGiftStatus.PENDING])
+    return SystemEvent(
+        values={
+            "title": title,
+            "description": f"您收到一笔股权赠与\n"
+                           f"赠与比例：{gift.amount * 100:.2f}%\n"
+                           f"祝福语：{gift.message or '无'}",
+            "category": CalendarEventCategory.SYSTEM,
+            "start_time": gift.created_at,
+            "is_all_day": True,
+            "color": color,
+        },
+        participant_ids=(gift.to_user_id,),
+        creatable=gift.status == EquityGiftStatus.PENDING,
+    )
+
+
+# ==================== 集合比对 ====================
+
+async def reconcile_system_events(
+    db: AsyncSession,
+    family_id: int,
+    source_type: str,
+    desired: Dict[int, Optional[SystemEvent]],
+    created_by: int,
+    full: bool = False,
+) -> Dict[str, int]:
+    """
+    将某类来源的系统事件与期望集合比对，批量新增 / 更新 / 删除
+
+    Args:
+        db: 数据库会话
+        family_id: 家庭ID
+        source_type: 来源类型（investment / todo / gift）
+        desired: source_id -> 期望事件（None 表示应删除）
+        created_by: 新建事件的创建者
+        full: True 时 desired 为该来源的完整集合，集合外的已有事件一并删除；
+              False 时只处理 desired 中的来源ID
+
+    Returns:
+        {"created": 新增数, "updated": 更新数, "deleted": 删除数}
+    """
+    stats = {"created": 0, "updated": 0, "deleted": 0}
+    if not desired and not full:
+        return stats
+
+    query = select(
+        CalendarEvent.id, CalendarEvent.source_id, CalendarEvent.created_by, CalendarEvent.repeat_type,
+        *(getattr(CalendarEvent, f) for f in SYNCED_FIELDS),
+    ).where(
+        CalendarEvent.family_id == family_id,
+        CalendarEvent.source_type == source_type,
+    )
+    if not full:
+        query = query.where(CalendarEvent.source_id.in_(list(desired)))
+    existing = {row.source_id: row for row in (await db.execute(query)).all()}
+
+    participants: Dict[int, set] = {}
+    if existing:
+        rows = await db.execute(
+            select(CalendarEventParticipant.event_id, CalendarEventParticipant.user_id)
+            .where(CalendarEventParticipant.event_id.in_([row.id for row in existing.values()]))
+        )
+        for event_id, user_id in rows.all():
+            participants.setdefault(event_id, set()).add(user_id)
+
+    to_insert: List[Tuple[int, SystemEvent]] = []
+    to_update: List[dict] = []
+    reset_participants: Dict[int, Tuple[int, ...]] = {}
+    to_delete: List[int] = []
+    counter_changes: List[tuple] = []  # (修改前, 修改后)，供成就计数器补记
+
+    for source_id, row in existing.items():
+        target = desired.get(source_id)
+        if target is None:
+            to_delete.append(row.id)
+            counter_changes.append((row, None))
+            continue
+        if any(getattr(row, f) != target.values[f] for f in SYNCED_FIELDS):
+            to_update.append({"id": row.id, **target.values, "updated_at": datetime.utcnow()})
+            if row.category != target.values["category"]:
+                counter_changes.append((row, SimpleNamespace(
+                    created_by=row.created_by, repeat_type=row.repeat_type, category=target.values["category"],
+                )))
+        if participants.get(row.id, set()) != set(target.participant_ids):
+            reset_participants[row.id] = target.participant_ids
+
+    for source_id, target in desired.items():
+        if target is not None and target.creatable and source_id not in existing:
+            to_insert.append((source_id, target))
+
+    if to_delete:
+        await db.execute(delete(CalendarEventParticipant).where(CalendarEventParticipant.event_id.in_(to_delete)))
+        await db.execute(delete(CalendarEvent).where(CalendarEvent.id.in_(to_delete)))
+        stats["deleted"] = len(to_delete)
+
+    if to_update:
+        await db.execute(update(CalendarEvent), to_update)
+        stats["updated"] = len(to_update)
+
+    if to_insert:
+        now = datetime.utcnow()
+        stmt = sqlite_insert(CalendarEvent.__table__).on_conflict_do_nothing(
+            index_elements=["family_id", "source_type", "source_id"]
+        ).returning(CalendarEvent.__table__.c.id, CalendarEvent.__table__.c.source_id)
+        rows = [
+            {
+                "family_id": family_id,
+                **target.values,
+                "end_time": None,
+                "repeat_type": CalendarRepeatType.NONE,
+                "repeat_until": None,
+                "location": None,
+                "is_system": True,
+                "source_type": source_type,
+                "source_id": source_id,
+                "created_by": created_by,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for source_id, target in to_insert
+        ]
+        inserted = (await db.execute(stmt, rows)).all()
+        targets = dict(to_insert)
+        for event_id, source_id in inserted:
+            reset_participants[event_id] = targets[source_id].participant_ids
+            counter_changes.append((None, SimpleNamespace(
+                created_by=created_by, repeat_type=CalendarRepeatType.NONE,
+                category=targets[source_id].values["category"],
+            )))
+        stats["created"] = len(inserted)
+
+    if counter_changes:
+        await apply_counter_changes(db, CalendarEvent, counter_changes)
+
+    if reset_participants:
+        await db.execute(
+            delete(CalendarEventParticipant)
+            .where(CalendarEventParticipant.event_id.in_(list(reset_participants)))
+        )
+        participant_rows = [
+            {"event_id": event_id, "user_id": user_id, "created_at": datetime.utcnow()}
+            for event_id, user_ids in reset_participants.items()
+            for user_id in user_ids
+        ]
+        if participant_rows:
+            await db.execute(CalendarEventParticipant.__table__.insert(), participant_rows)
+
+    return stats
+
+
+async def sync_family_system_events(db: AsyncSession, family_id: int, created_by: int) -> Dict[str, int]:
+    """
+    全量同步家庭的系统事件（每类来源一次查询来源数据、一次查询已有事件）
+
+    Returns:
+        三类来源合计的 {"created", "updated", "deleted"}
+    """
+    investments = (await db.execute(
+        select(Investment).where(Investment.family_id == family_id)
+    )).scalars().all()
+    todos = (await db.execute(
+        select(TodoItem).join(TodoList).where(
+            TodoList.family_id == family_id,
+            TodoItem.is_completed == False,
+            TodoItem.due_date != None
+        )
+    )).scalars().all()
+    gifts = (await db.execute(
+        select(EquityGift).where(EquityGift.family_id == family_id)
+    )).scalars().all()
+
+    sources = [
+        (SOURCE_INVESTMENT, {inv.id: investment_event(inv) for inv in investments}),
+        (SOURCE_TODO, {todo.id: todo_event(todo, todo.assignee_id) for todo in todos}),
+        (SOURCE_GIFT, {gift.id: gift_event(gift) for gift in gifts}),
+    ]
+    totals = {"created": 0, "updated": 0, "deleted": 0}
+    for source_type, desired in sources:
+        stats = await reconcile_system_events(db, family_id, source_type, desired, created_by, full=True)
+        for key, value in stats.items():
+            totals[key] += value
+    return totals
+
+
+async def _delete_source_events(db: AsyncSession, family_id: int, source_type: str, source_ids: Iterable[int]):
+    await reconcile_system_events(db, family_id, source_type, dict.fromkeys(source_ids), created_by=0)
 
 
 class CalendarService:
-    """日历服务类"""
-    
+    """日历服务类（各模块的增量同步钩子）"""
+
     @staticmethod
     async def create_investment_reminder(
         db: AsyncSession,
         family_id: int,
         investment: Investment,
         created_by: int
-    ) -> Optional[CalendarEvent]:
+    ) -> Dict[str, int]:
         """
         创建理财到期提醒事件
         - 在理财产品到期前7天生成提醒
         """
-        if not investment.end_date:
-            return None
-        
-        # 检查是否已存在
-        existing = await db.execute(
-            select(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "investment",
-                CalendarEvent.source_id == investment.id
-            )
+        return await reconcile_system_events(
+            db, family_id, SOURCE_INVESTMENT, {investment.id: investment_event(investment)}, created_by
         )
-        if existing.scalar_one_or_none():
-            return None
-        
-        # 计算提醒时间（提前7天）
-        remind_date = investment.end_date - timedelta(days=NotificationConstants.REMINDER_DAYS_BEFORE_DUE)
-        if remind_date <= datetime.utcnow():
-            # 如果已经过了提醒时间，则在当天提醒
-            remind_date = datetime.utcnow()
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"💰 理财到期：{investment.name}",
-            description=f"理财产品「{investment.name}」将于 {investment.end_date.strftime('%Y-%m-%d')} 到期\n"
-                       f"本金：¥{investment.principal:,.2f}",
-            category=CalendarEventCategory.FINANCE,
-            start_time=remind_date,
-            is_all_day=True,
-            repeat_type=CalendarRepeatType.NONE,
-            color="#f59e0b",
-            is_system=True,
-            source_type="investment",
-            source_id=investment.id,
-            created_by=created_by
-        )
-        
-        db.add(event)
-        return event
-    
+
     @staticmethod
     async def update_investment_reminder(
         db: AsyncSession,
         family_id: int,
         investment: Investment,
         created_by: int
-    ) -> Optional[CalendarEvent]:
+    ) -> Dict[str, int]:
         """
         更新理财到期提醒事件
-        - 删除旧事件，创建新事件
+        - 无到期日或已不活跃时删除提醒，否则就地更新（不存在则新建）
         """
-        # 删除旧事件
-        await db.execute(
-            delete(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "investment",
-                CalendarEvent.source_id == investment.id
-            )
+        return await reconcile_system_events(
+            db, family_id, SOURCE_INVESTMENT, {investment.id: investment_event(investment)}, created_by
         )
-        
-        # 如果没有到期日或已不活跃，不创建新事件
-        if not investment.end_date or not investment.is_active:
-            return None
-        
-        # 创建新提醒
-        remind_date = investment.end_date - timedelta(days=NotificationConstants.REMINDER_DAYS_BEFORE_DUE)
-        if remind_date <= datetime.utcnow():
-            remind_date = investment.end_date
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"💰 理财到期：{investment.name}",
-            description=f"理财产品「{investment.name}」将于 {investment.end_date.strftime('%Y-%m-%d')} 到期\n"
-                       f"本金：¥{investment.principal:,.2f}",
-            category=CalendarEventCategory.FINANCE,
-            start_time=remind_date,
-            is_all_day=True,
-            repeat_type=CalendarRepeatType.NONE,
-            color="#f59e0b",
-            is_system=True,
-            source_type="investment",
-            source_id=investment.id,
-            created_by=created_by
-        )
-        
-        db.add(event)
-        return event
-    
+
     @staticmethod
     async def delete_investment_reminder(
         db: AsyncSession,
@@ -122,14 +329,8 @@ class CalendarService:
         investment_id: int
     ):
         """删除理财到期提醒事件"""
-        await db.execute(
-            delete(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "investment",
-                CalendarEvent.source_id == investment_id
-            )
-        )
-    
+        await _delete_source_events(db, family_id, SOURCE_INVESTMENT, [investment_id])
+
     @staticmethod
     async def create_todo_reminder(
         db: AsyncSession,
@@ -137,62 +338,15 @@ class CalendarService:
         todo: TodoItem,
         created_by: int,
         assignee_id: Optional[int] = None
-    ) -> Optional[CalendarEvent]:
+    ) -> Dict[str, int]:
         """
         创建待办截止提醒事件
-        - 在截止日当天提醒
+        - 在截止日当天提醒，指派人作为参与者
         """
-        if not todo.due_date:
-            return None
-        
-        # 检查是否已存在
-        existing = await db.execute(
-            select(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "todo",
-                CalendarEvent.source_id == todo.id
-            )
+        return await reconcile_system_events(
+            db, family_id, SOURCE_TODO, {todo.id: todo_event(todo, assignee_id)}, created_by
         )
-        if existing.scalar_one_or_none():
-            return None
-        
-        # 根据优先级设置颜色
-        priority_colors = {
-            "high": "#ef4444",    # 红色
-            "medium": "#f59e0b",  # 橙色
-            "low": "#10b981"      # 绿色
-        }
-        priority_value = todo.priority.value if hasattr(todo.priority, 'value') else str(todo.priority)
-        color = priority_colors.get(priority_value, "#667eea")
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"📋 待办截止：{todo.title}",
-            description=todo.description or f"任务「{todo.title}」截止日期",
-            category=CalendarEventCategory.SYSTEM,
-            start_time=todo.due_date,
-            is_all_day=False,
-            repeat_type=CalendarRepeatType.NONE,
-            color=color,
-            is_system=True,
-            source_type="todo",
-            source_id=todo.id,
-            created_by=created_by
-        )
-        
-        db.add(event)
-        await db.flush()  # 获取 event.id
-        
-        # 如果有指派人，添加为参与者
-        if assignee_id:
-            participant = CalendarEventParticipant(
-                event_id=event.id,
-                user_id=assignee_id
-            )
-            db.add(participant)
-        
-        return event
-    
+
     @staticmethod
     async def update_todo_reminder(
         db: AsyncSession,
@@ -200,65 +354,16 @@ class CalendarService:
         todo: TodoItem,
         created_by: int,
         assignee_id: Optional[int] = None
-    ) -> Optional[CalendarEvent]:
+    ) -> Dict[str, int]:
         """
         更新待办截止提醒事件
-        - 如果任务已完成，删除提醒
-        - 如果截止日期变更，更新事件
+        - 如果任务已完成或无截止日期，删除提醒
+        - 否则就地更新标题、截止时间、颜色与参与者（已过期的不再新建）
         """
-        # 先删除旧事件
-        await db.execute(
-            delete(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "todo",
-                CalendarEvent.source_id == todo.id
-            )
-        )
-        
-        # 如果已完成或无截止日期，不创建新事件
-        if todo.is_completed or not todo.due_date:
-            return None
-        
-        # 如果截止日期已过，不创建提醒
-        if todo.due_date < datetime.utcnow():
-            return None
-        
-        # 根据优先级设置颜色
-        priority_colors = {
-            "high": "#ef4444",
-            "medium": "#f59e0b",
-            "low": "#10b981"
-        }
-        priority_value = todo.priority.value if hasattr(todo.priority, 'value') else str(todo.priority)
-        color = priority_colors.get(priority_value, "#667eea")
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"📋 待办截止：{todo.title}",
-            description=todo.description or f"任务「{todo.title}」截止日期",
-            category=CalendarEventCategory.SYSTEM,
-            start_time=todo.due_date,
-            is_all_day=False,
-            repeat_type=CalendarRepeatType.NONE,
-            color=color,
-            is_system=True,
-            source_type="todo",
-            source_id=todo.id,
-            created_by=created_by
+        return await reconcile_system_events(
+            db, family_id, SOURCE_TODO, {todo.id: todo_event(todo, assignee_id)}, created_by
         )
-        
-        db.add(event)
-        await db.flush()
-        
-        if assignee_id:
-            participant = CalendarEventParticipant(
-                event_id=event.id,
-                user_id=assignee_id
-            )
-            db.add(participant)
-        
-        return event
-    
+
     @staticmethod
     async def delete_todo_reminder(
         db: AsyncSession,
@@ -266,14 +371,8 @@ class CalendarService:
         todo_id: int
     ):
         """删除待办截止提醒事件"""
-        await db.execute(
-            delete(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "todo",
-                CalendarEvent.source_id == todo_id
-            )
-        )
-    
+        await _delete_source_events(db, family_id, SOURCE_TODO, [todo_id])
+
     @staticmethod
     async def create_gift_reminder(
         db: AsyncSession,
@@ -281,51 +380,14 @@ class CalendarService:
         gift: EquityGift,
         to_user_id: int,
         created_by: int
-    ) -> Optional[CalendarEvent]:
+    ) -> Dict[str, int]:
         """
         创建股权赠与提醒事件
-        - 在赠与创建时生成提醒，通知接收人
+        - 在赠与创建时生成提醒，接收人作为参与者
         """
-        # 检查是否已存在
-        existing = await db.execute(
-            select(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "gift",
-                CalendarEvent.source_id == gift.id
-            )
-        )
-        if existing.scalar_one_or_none():
-            return None
-        
-        event = CalendarEvent(
-            family_id=family_id,
-            title=f"🎁 股权赠与待接收",
-            description=f"您收到一笔股权赠与\n"
-                       f"赠与比例：{gift.amount * 100:.2f}%\n"
-                       f"祝福语：{gift.message or '无'}",
-            category=CalendarEventCategory.SYSTEM,
-            start_time=gift.created_at,
-            is_all_day=True,
-            repeat_type=CalendarRepeatType.NONE,
-            color="#8b5cf6",
-            is_system=True,
-            source_type="gift",
-            source_id=gift.id,
-            created_by=created_by
-        )
-        
-        db.add(event)
-        await db.flush()
-        
-        # 添加接收人为参与者
-        participant = CalendarEventParticipant(
-            event_id=event.id,
-            user_id=to_user_id
-        )
-        db.add(participant)
-        
-        return event
-    
+        target = gift_event(gift)._replace(participant_ids=(to_user_id,))
+        return await reconcile_system_events(db, family_id, SOURCE_GIFT, {gift.id: target}, created_by)
+
     @staticmethod
     async def update_gift_status(
         db: AsyncSession,
@@ -335,25 +397,18 @@ class CalendarService:
     ):
         """
         更新股权赠与状态
-        - 如果已接收或拒绝，更新事件标题
+        - 如果已接收或拒绝，更新事件标题与颜色
         """
-        result = await db.execute(
-            select(CalendarEvent).where(
+        status = EquityGiftStatus.ACCEPTED if is_accepted else EquityGiftStatus.REJECTED
+        title, color = _GIFT_STATUS_STYLES[status]
+        await db.execute(
+            update(CalendarEvent).where(
                 CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "gift",
+                CalendarEvent.source_type == SOURCE_GIFT,
                 CalendarEvent.source_id == gift_id
-            )
+            ).values(title=title, color=color, updated_at=datetime.utcnow())
         )
-        event = result.scalar_one_or_none()
-        
-        if event:
-            if is_accepted:
-                event.title = "🎁 股权赠与已接收"
-                event.color = "#10b981"  # 绿色
-            else:
-                event.title = "🎁 股权赠与已拒绝"
-                event.color = "#6b7280"  # 灰色
-    
+
     @staticmethod
     async def delete_gift_reminder(
         db: AsyncSession,
@@ -361,14 +416,8 @@ class CalendarService:
         gift_id: int
     ):
         """删除股权赠与提醒事件"""
-        await db.execute(
-            delete(CalendarEvent).where(
-                CalendarEvent.family_id == family_id,
-                CalendarEvent.source_type == "gift",
-                CalendarEvent.source_id == gift_id
-            )
-        )
-    
+        await _delete_source_events(db, family_id, SOURCE_GIFT, [gift_id])
+
     @staticmethod
     async def create_birthday_reminder(
         db: AsyncSession,
@@ -394,7 +443,7 @@ class CalendarService:
             is_system=False,
             created_by=created_by
         )
-        
+
         db.add(event)
         return event
 
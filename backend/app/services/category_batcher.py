@@ -0,0 +1,199 @@
+"""
+小金库 (Golden Nest) - 消费分类微批处理
+
+批量导入时每条分类不明确的记录单独调用一次 auto_category 会产生上百次 AI 往返。
+CategoryBatcher 把同一时间窗口内的分类请求合并为一次结构化调用（batch_category）：
+
+- 攒批：待分类请求达到 max_batch 条立即发送，否则在首条请求到达 window 秒后发送
+- 去重：(描述, 金额) 相同的请求在同一批内只占一个位置，已在调用中的直接等待其结果
+- 回退：批量回复无法解析、缺少某条或分类无效时，仅对这些条目逐条调用 categorize_entry；
+  批量调用本身失败（服务不可用等）时全部返回 other，与 categorize_entry 的失败行为一致
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.models.models import AccountingCategory
+
+logger = logging.getLogger(__name__)
+
+VALID_CATEGORIES = {c.value for c in AccountingCategory}
+
+CATEGORY_OPTIONS = (
+    "food(餐饮), transport(交通), shopping(购物), entertainment(娱乐), healthcare(医疗), "
+    "education(教育), housing(住房), utilities(水电煤), communication(通讯), clothing(服装鞋帽), "
+    "beauty(美容美发), pet(宠物), insurance(保险), gift(礼品红包), travel(旅行), fitness(运动健身), "
+    "appliances(家用电器), maintenance(维修维护), tax(税费), investment(投资理财), income(收入), "
+    "salary(工资), reimbursement(报销), transfer(转账), refund(退款), subsidy(补贴), bonus(奖金), "
+    "allowance(津贴), other(其他，无法归类时选择)"
+)
+
+
+def format_batch_entries(entries: List[Tuple[str, Optional[float]]]) -> str:
+    """条目列表文本，从 1 开始编号"""
+    return "\n".join(
+        f"{i}. {description} | {amount if amount else '未知'}元"
+        for i, (description, amount) in enumerate(entries, start=1)
+    )
+
+
+def build_batch_prompt(entries: List[Tuple[str, Optional[float]]]) -> str:
+    """构建批量分类 prompt"""
+    lines = format_batch_entries(entries)
+    return f"""请判断以下 {len(entries)} 条消费记录的分类（格式：编号. 描述 | 金额）：
+{lines}
+
+分类必须从以下选项中选一个（只返回英文代码）：
+{CATEGORY_OPTIONS}
+
+请严格按以下 JSON 格式返回，每条记录一项，不要返回其他内容：
+{{"results": [{{"i": 1, "category": "food"}}, {{"i": 2, "category": "transport"}}]}}"""
+
+
+def parse_batch_response(data: Any, count: int) -> Dict[int, str]:
+    """从批量回复中取出 {编号(0 起): 分类}；缺失、越界或无效的条目不出现在结果中"""
+    results: Dict[int, str] = {}
+    if not isinstance(data, dict):
+        return results
+    for item in data.get("results") or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("i")) - 1
+        except (TypeError, ValueError):
+            continue
+        category = str(item.get("category") or "").strip().lower()
+        if 0 <= index < count and category in VALID_CATEGORIES:
+            results.setdefault(index, category)
+    return results
+
+
+class _Pending:
+    __slots__ = ("description", "amount", "futures")
+
+    def __init__(self, description: str, amount: Optional[float]):
+        self.description = description
+        self.amount = amount
+        self.futures: List[asyncio.Future] = []
+
+
+class CategoryBatcher:
+    """
+    消费分类微批处理器
+
+    Args:
+        max_batch: 单次批量调用的最大条目数（去重后）
+        window: 攒批时间窗口（秒）
+        call_batch: 批量调用函数 (entries) -> 解析后的 JSON，默认 ai_service.chat_json(batch_category)
+        fallback: 单条分类函数 (description, amount) -> 分类，默认 categorize_entry
+    """
+
+    def __init__(
+        self,
+        max_batch: int = 40,
+        window: float = 0.05,
+        call_batch: Optional[Callable[[List[Tuple[str, Optional[float]]]], Awaitable[Any]]] = None,
+        fallback: Optional[Callable[[str, Optional[float]], Awaitable[str]]] = None,
+    ):
+        self.max_batch = max_batch
+        self.window = window
+        self._call_batch = call_batch or _default_call_batch
+        self._fallback = fallback
+        self._pending: Dict[Tuple[str, Optional[float]], _Pending] = {}
+        self._inflight: Dict[Tuple[str, Optional[float]], _Pending] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "batches": 0, "fallbacks": 0}
+
+    async def classify(self, description: str, amount: Optional[float] = None) -> str:
+        """分类单条记录（与同一窗口内的其它请求合并发送）"""
+        self.stats["requests"] += 1
+        key = (description, amount)
+        future = asyncio.get_running_loop().create_future()
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            inflight.futures.append(future)
+            return await future
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _Pending(description, amount)
+        pending.futures.append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    async def classify_many(self, entries: List[Tuple[str, Optional[float]]]) -> List[str]:
+        """分类多条记录，结果顺序与 entries 一致"""
+        return list(await asyncio.gather(*(self.classify(d, a) for d, a in entries)))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch = list(self._pending.values())
+        self._inflight.update(self._pending)
+        self._pending = {}
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        try:
+            categories = await self._classify_batch(batch)
+        except Exception as e:
+            logger.error(f"Batch category failed: {e}", exc_info=True)
+            categories = ["other"] * len(batch)
+        for pending, category in zip(batch, categories):
+            self._inflight.pop((pending.description, pending.amount), None)
+            for future in pending.futures:
+                if not future.done():
+                    future.set_result(category)
+
+    async def _classify_batch(self, batch: List[_Pending]) -> List[str]:
+        fallback = self._fallback
+        if fallback is None:
+            from app.services.ai_accounting import categorize_entry
+            fallback = categorize_entry
+        if len(batch) == 1:
+            return [await fallback(batch[0].description, batch[0].amount)]
+
+        self.stats["batches"] += 1
+        try:
+            data = await self._call_batch([(p.description, p.amount) for p in batch])
+        except Exception as e:
+            logger.warning(f"批量分类调用失败，全部归为 other: {e}")
+            return ["other"] * len(batch)
+
+        results = parse_batch_response(data, len(batch))
+        missing = [i for i in range(len(batch)) if i not in results]
+        if missing:
+            logger.warning(f"批量分类回复缺少 {len(missing)}/{len(batch)} 条，逐条回退")
+            self.stats["fallbacks"] += len(missing)
+            fallbacks = await asyncio.gather(*(
+                fallback(batch[i].description, batch[i].amount) for i in missing
+            ))
+            results.update(zip(missing, fallbacks))
+        return [results[i] for i in range(len(batch))]
+
+
+async def _default_call_batch(entries: List[Tuple[str, Optional[float]]]) -> Any:
+    from app.services.ai_service import ai_service
+
+    return await ai_service.chat_json(
+        user_prompt=build_batch_prompt(entries),
+        system_prompt="你是一个消费分类助手，根据每条消费信息返回最合适的分类代码。只返回JSON。",
+        function_key="batch_category",
+        prompt_vars={"count": str(len(entries)), "entries": format_batch_entries(entries)},
+        max_tokens=max(200, 30 * len(entries)),
+        cache=True,
+    )
+
+
+# ======================== 全局单例 ========================
+category_batcher = CategoryBatcher()
@@ -11,9 +11,10 @@ import json
 from app.models.models import (
     Dividend, DividendClaim, DividendType, DividendStatus, DividendClaimStatus,
     ApprovalRequest, ApprovalRequestType, ApprovalRequestStatus,
-    Deposit, Transaction, TransactionType, Investment, InvestmentIncome,
+    Deposit, TransactionType, Investment, InvestmentIncome,
     Family, FamilyMember, User
 )
+from app.services.balance import get_balance, post_transaction
 from app.services.equity import calculate_family_equity
 from app.services.notification import NotificationType, send_approval_notification
 
@@ -45,14 +46,8 @@ async def calculate_dividend_pool(
         return float(total_profit)
     
     elif dividend_type == DividendType.CASH:
-        # 获取最新的Transaction记录的balance_after字段
-        result = await db.execute(
-            select(Transaction.balance_after)
-            .where(Transaction.family_id == family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        balance = result.scalar()
+        # 家庭当前活期余额
+        balance = await get_balance(db, family_id)
         return float(balance) if balance else 0.0
     
     return 0.0
@@ -166,28 +161,17 @@ async def clear_dividend_pool(
     elif dividend_type == DividendType.CASH:
         # 如果资金已经冻结，则不需要再次扣除余额
         if not already_frozen:
-            # 创建一笔支出Transaction，减少balance_after
-            # 获取当前余额
-            result = await db.execute(
-                select(Transaction.balance_after)
-                .where(Transaction.family_id == family_id)
-                .order_by(Transaction.created_at.desc())
-                .limit(1)
-            )
-            current_balance = result.scalar() or 0.0
-            
-            # 创建分红支出交易
-            transaction = Transaction(
+            # 创建分红支出交易，减少活期余额
+            await post_transaction(
+                db,
                 family_id=family_id,
                 user_id=None,  # 系统操作
                 transaction_type=TransactionType.DIVIDEND,
                 amount=-amount,  # 负数表示支出
-                balance_after=current_balance - amount,
                 description=f"分红发放 - {amount:.2f}元",
                 reference_type="dividend",
                 reference_id=None  # 可以后续关联dividend_id
             )
-            db.add(transaction)
         # 如果已冻结，资金在创建提案时就已经扣除了，这里不需要额外操作
     
     await db.commit()
@@ -246,25 +230,16 @@ async def process_dividend_claim(
         await db.flush()
         
         # 创建Transaction记录：从冻结资金转回自由资金
-        result = await db.execute(
-            select(Transaction.balance_after)
-            .where(Transaction.family_id == dividend.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        current_balance = result.scalar() or 0.0
-        
-        transaction = Transaction(
+        await post_transaction(
+            db,
             family_id=dividend.family_id,
             user_id=user_id,
             transaction_type=TransactionType.UNFREEZE,  # 使用UNFREEZE而非DEPOSIT
             amount=claim.amount,  # 正数，表示解冻
-            balance_after=current_balance + claim.amount,
             description=f"分红再投（解冻） - {claim.amount:.2f}元",
             reference_type="dividend_claim",
             reference_id=claim.id
         )
-        db.add(transaction)
         
         # 更新claim记录
         claim.status = DividendClaimStatus.REINVESTED
@@ -272,27 +247,18 @@ async def process_dividend_claim(
         claim.deposit_id = deposit.id
     else:
         # 🌟 取现：从冻结资金中扣除，创建流水记录但不增加自由资金
-        # 获取当前余额
-        result = await db.execute(
-            select(Transaction.balance_after)
-            .where(Transaction.family_id == dividend.family_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(1)
-        )
-        current_balance = result.scalar() or 0.0
-        
         # 创建Transaction记录：WITHDRAW类型，余额不变（因为钱已经在FREEZE时扣除）
-        transaction = Transaction(
+        await post_transaction(
+            db,
             family_id=dividend.family_id,
             user_id=user_id,
             transaction_type=TransactionType.WITHDRAW,
             amount=-claim.amount,  # 负数表示取出
-            balance_after=current_balance,  # 余额不变（已在冻结时扣除）
+            balance_delta=0,  # 余额不变（已在冻结时扣除）
             description=f"分红提现 - {claim.amount:.2f}元",
             reference_type="dividend_claim",
             reference_id=claim.id
         )
-        db.add(transaction)
         
         # 更新claim记录
         claim.status = DividendClaimStatus.WITHDRAWN
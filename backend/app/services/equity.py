@@ -4,15 +4,12 @@
 from datetime import datetime
 from typing import List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 import math
 
-from app.models.models import (
-    Deposit, Family, FamilyMember, User,
-    Transaction, Investment, InvestmentPosition, InvestmentIncome,
-    PositionOperationType, Dividend, DividendStatus, DividendClaim, DividendClaimStatus
-)
+from app.models.models import Family, FamilyMember, User
 from app.schemas.equity import MemberEquity, EquitySummary
+from app.services.ledger import get_family_ledger_summary
 
 
 def calculate_weighted_amount(amount: float, deposit_date: datetime, rate: float, calculate_date: datetime = None) -> float:
@@ -72,32 +69,19 @@ async def calculate_family_equity(family_id: int, db: AsyncSession) -> EquitySum
     )
     member_rows = result.all()
     
-    # 获取所有存款记录
-    result = await db.execute(
-        select(Deposit).where(Deposit.family_id == family_id)
-    )
-    deposits = result.scalars().all()
+    # 读取账本快照（成员存入、自由资金、理财价值、冻结资金均已物化）
+    ledger = await get_family_ledger_summary(family_id, db)
+    member_deposits = ledger["member_deposits"]
     
     # 计算基准时间
     now = datetime.utcnow()
     
-    # 按用户统计存款
-    user_deposits: Dict[int, List[Deposit]] = {}
-    for deposit in deposits:
-        if deposit.user_id not in user_deposits:
-            user_deposits[deposit.user_id] = []
-        user_deposits[deposit.user_id].append(deposit)
-    
     # 计算每个成员的股权
     members_equity: List[MemberEquity] = []
     total_original = 0.0
     
     for membership, user in member_rows:
-        user_original = 0.0
-        
-        if user.id in user_deposits:
-            for deposit in user_deposits[user.id]:
-                user_original += deposit.amount
+        user_original = member_deposits.get(user.id, 0.0)
         
         total_original += user_original
         
@@ -125,92 +109,11 @@ async def calculate_family_equity(family_id: int, db: AsyncSession) -> EquitySum
     # 转换为 Pydantic 模型
     member_equity_list = [MemberEquity(**m) for m in members_equity]
     
-    # 🌟 计算当前储蓄 = 家庭自由资金 + 理财实际价值
-    
-    # 1. 获取家庭自由资金（最后一笔交易的 balance_after）
-    free_cash = 0.0
-    result = await db.execute(
-        select(Transaction.balance_after)
-        .where(Transaction.family_id == family_id)
-        .order_by(Transaction.id.desc())
-        .limit(1)
-    )
-    last_balance = result.scalar_one_or_none()
-    if last_balance is not None:
-        free_cash = last_balance
-    
-    # 2. 获取所有理财产品的实际价值
-    investment_value = 0.0
-    result = await db.execute(
-        select(Investment)
-        .where(Investment.family_id == family_id)
-        .where(Investment.is_active == True)
-        .where(Investment.is_deleted == False)
-    )
-    investments = result.scalars().all()
-    
-    for inv in investments:
-        # 计算当前持仓本金
-        result = await db.execute(
-            select(InvestmentPosition)
-            .where(InvestmentPosition.investment_id == inv.id)
-        )
-        positions = result.scalars().all()
-        
-        current_principal = sum(
-            p.amount if p.operation_type in [PositionOperationType.CREATE, PositionOperationType.INCREASE]
-            else -p.amount
-            for p in positions
-        )
-        
-        # 计算总收益
-        result = await db.execute(
-            select(InvestmentIncome)
-            .where(InvestmentIncome.investment_id == inv.id)
-        )
-        income_records = result.scalars().all()
-        
-        total_return = sum(
-            ir.calculated_income if ir.calculated_income is not None else ir.amount
-            for ir in income_records
-        )
-        
-        # 实际价值 = 当前持仓本金 + 总收益
-        investment_value += current_principal + total_return
-    
-    # 3. 当前储蓄 = 家庭自由资金 + 理财实际价值
-    total_savings = free_cash + investment_value
-    
-    # 4. 计算冻结资金（投票中或已通过但未处理的分红）
-    frozen_amount = 0.0
+    # 🌟 当前储蓄 = 家庭自由资金 + 理财实际价值（持仓本金 + 总收益）
+    total_savings = ledger["free_cash"] + ledger["investment_value"]
     
-    # 获取所有投票中或已通过的分红记录
-    result = await db.execute(
-        select(Dividend.id, Dividend.total_amount, Dividend.status)
-        .where(
-            Dividend.family_id == family.id,
-            Dividend.status.in_([DividendStatus.VOTING, DividendStatus.APPROVED])
-        )
-    )
-    dividends = result.all()
-    
-    for dividend_id, total_amount, status in dividends:
-        if status == DividendStatus.VOTING:
-            # 投票中：整笔金额都冻结
-            frozen_amount += total_amount
-        elif status == DividendStatus.APPROVED:
-            # 已通过：只有未处理的claim金额仍然冻结
-            result = await db.execute(
-                select(func.sum(DividendClaim.amount))
-                .where(
-                    DividendClaim.dividend_id == dividend_id,
-                    DividendClaim.status == DividendClaimStatus.PENDING
-                )
-            )
-            pending_amount = result.scalar() or 0.0
-            frozen_amount += pending_amount
-    
-    frozen_amount = round(frozen_amount, 2)
+    # 冻结资金（投票中或已通过但未处理的分红）
+    frozen_amount = round(ledger["frozen_amount"], 2)
     
     # 计算目标进度
     target_progress = min(total_savings / family.savings_target, 1.0) if family.savings_target > 0 else 0
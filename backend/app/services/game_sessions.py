@@ -0,0 +1,315 @@
+"""
+小金库 (Golden Nest) - 宠物小游戏会话存储
+
+每个家庭成员每种游戏一个会话，持久化在 pet_game_sessions（每行一个会话），
+不再与其它游戏、其它成员的会话共用 family_pets.game_sessions 一个 JSON 字段。
+
+- 活跃会话缓存：按 (family_id, user_id, game_type) 保存在进程内 LRU 中，get 直接返回缓存中的状态对象，
+  命中时不访问数据库、不做 JSON 解析或复制（同一对象上的派生缓存跨请求有效）
+- 随请求事务提交：put/discard 先暂存在请求的数据库会话中（同一请求内的 get 可读到），
+  after_commit 时才写入缓存；回滚时丢弃暂存的修改，并淘汰本请求 get 过（可能被就地修改）的缓存会话，
+  下次 get 从会话表重新加载（仍有未写入修改的先写入再淘汰）
+- 延迟写入（write-behind，后台协程见 write_behind.WriteBehindWorker）：提交的修改只标记脏数据并唤醒
+  后台协程，合并一个 flush_delay 窗口内的修改后批量 upsert/删除，每个会话只序列化一次；stop 时写完剩余修改
+- 超时：最后活跃时间超过 session_timeout 的会话视为已结束
+- 脏会话不会被 LRU 淘汰，写入失败时保留脏标记等待下次重试
+
+缓存为进程内状态，部署为单进程（见 Dockerfile）；多进程部署时同一用户的游戏请求需路由到同一进程。
+"""
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select, delete, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import PetGameSession
+from app.services.write_behind import WriteBehindWorker
+
+logger = logging.getLogger(__name__)
+
+# 会话空闲超时（秒）：冒险模式（尤其是无尽）允许更长的空闲时间
+SESSION_TIMEOUTS = {"adventure": 14400}
+DEFAULT_SESSION_TIMEOUT = 1800
+
+SessionKey = Tuple[int, int, str]
+
+# session.info 中暂存未提交会话修改的键：(存储, 会话键) -> _LiveSession
+_SESSION_KEY = "game_session_changes"
+# session.info 中本事务 get 过的缓存会话：{(存储, 会话键)}
+_TOUCHED_KEY = "game_session_touched"
+
+
+def session_timeout(game_type: str) -> int:
+    return SESSION_TIMEOUTS.get(game_type, DEFAULT_SESSION_TIMEOUT)
+
+
+class _LiveSession:
+    """缓存中的会话；state 为 None 表示会话已结束（删除待写入或已确认不存在）"""
+    __slots__ = ("state", "last_active")
+
+    def __init__(self, state: Optional[Dict[str, Any]], last_active: Optional[datetime]):
+        self.state = state
+        self.last_active = last_active
+
+
+class GameSessionStore(WriteBehindWorker):
+    """
+    游戏会话存储
+
+    Args:
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+        max_live: 缓存的会话数上限（超出时淘汰最久未使用的已写入会话）
+        flush_delay: 延迟写入的合并窗口（秒）
+    """
+
+    _task_name = "game-session-flusher"
+    _label = "游戏会话"
+
+    def __init__(self, session_maker=None, max_live: int = 1000, flush_delay: float = 2.0):
+        super().__init__(session_maker, flush_delay)
+        self.max_live = max_live
+        self._live: "OrderedDict[SessionKey, _LiveSession]" = OrderedDict()
+        self._dirty: Set[SessionKey] = set()
+        # 回滚时仍有未写入修改的会话：写入后从缓存淘汰
+        self._stale: Set[SessionKey] = set()
+        self.stats = {"hits": 0, "misses": 0, "flushes": 0, "written": 0}
+
+    # ==================== 读写 ====================
+
+    async def get(
+        self, db: AsyncSession, family_id: int, user_id: int, game_type: str,
+        now: Optional[datetime] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取活跃会话状态（返回缓存中的对象本身，修改后调用 put 保存，随事务提交生效）
+
+        Returns:
+            会话状态，不存在或已超时返回 None
+        """
+        key = (family_id, user_id, game_type)
+        staged = _staged(db).get((self, key))
+        entry = staged or self._live.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            if staged is None:
+                self._live.move_to_end(key)
+        else:
+            self.stats["misses"] += 1
+            row = (await db.execute(
+                select(PetGameSession.state, PetGameSession.last_active_at).where(
+                    PetGameSession.family_id == family_id,
+                    PetGameSession.user_id == user_id,
+                    PetGameSession.game_type == game_type,
+                )
+            )).first()
+            state = None
+            if row is not None:
+                try:
+                    state = json.loads(row.state)
+                except (TypeError, ValueError):
+                    logger.warning(f"⚠️ 游戏会话 {key} 状态无法解析，已丢弃")
+                    self.discard(db, family_id, user_id, game_type)
+                    return None
+            # 查询期间其它请求已提交更新的会话时沿用缓存中的新状态，不用旧行覆盖
+            entry = self._live.get(key)
+            if entry is None:
+                entry = _LiveSession(state, row.last_active_at if row is not None else None)
+                self._remember(key, entry)
+
+        if entry.state is None:
+            return None
+        now = now or datetime.utcnow()
+        if entry.last_active and (now - entry.last_active).total_seconds() > session_timeout(game_type):
+            self.discard(db, family_id, user_id, game_type)
+            return None
+        if staged is None:
+            # 调用方可能就地修改缓存中的状态，回滚时需淘汰；命中缓存时事务可能尚未开始，
+            # 先开启会话事务（不连接数据库），否则未执行任何 SQL 的回滚不会触发 after_rollback
+            session = db.sync_session
+            if not session.in_transaction():
+                session.begin()
+            session.info.setdefault(_TOUCHED_KEY, set()).add((self, key))
+        return entry.state
+
+    async def active_games(
+        self, db: AsyncSession, family_id: int, user_id: int, game_types: Iterable[str],
+        now: Optional[datetime] = None,
+    ) -> Set[str]:
+        """成员有活跃会话的游戏（缓存中的会话直接判断，其余一次查询最后活跃时间，不加载状态）"""
+        now = now or datetime.utcnow()
+        active: Set[str] = set()
+        last_active: Dict[str, Optional[datetime]] = {}
+        pending = []
+        staged = _staged(db)
+        for game_type in game_types:
+            key = (family_id, user_id, game_type)
+            entry = staged.get((self, key)) or self._live.get(key)
+            if entry is None:
+                pending.append(game_type)
+            elif entry.state is not None:
+                last_active[game_type] = entry.last_active
+        if pending:
+            result = await db.execute(
+                select(PetGameSession.game_type, PetGameSession.last_active_at).where(
+                    PetGameSession.family_id == family_id,
+                    PetGameSession.user_id == user_id,
+                    PetGameSession.game_type.in_(pending),
+                )
+            )
+            last_active.update(result.all())
+        for game_type, ts in last_active.items():
+            if not ts or (now - ts).total_seconds() <= session_timeout(game_type):
+                active.add(game_type)
+        return active
+
+    def put(
+        self, db: AsyncSession, family_id: int, user_id: int, game_type: str, state: Dict[str, Any],
+        now: Optional[datetime] = None,
+    ) -> None:
+        """保存会话状态并刷新最后活跃时间（随 db 的事务提交后生效，延迟写入）"""
+        self._stage(db, (family_id, user_id, game_type), _LiveSession(state, now or datetime.utcnow()))
+
+    def discard(self, db: AsyncSession, family_id: int, user_id: int, game_type: str) -> None:
+        """结束会话（随 db 的事务提交后生效，延迟删除）"""
+        self._stage(db, (family_id, user_id, game_type), _LiveSession(None, None))
+
+    def _stage(self, db: AsyncSession, key: SessionKey, entry: _LiveSession) -> None:
+        db.sync_session.info.setdefault(_SESSION_KEY, {})[(self, key)] = entry
+
+    def _publish(self, key: SessionKey, entry: _LiveSession) -> None:
+        """事务提交后写入缓存并标记延迟写入"""
+        self._stale.discard(key)
+        self._remember(key, entry)
+        self._mark_dirty(key)
+
+    def _forget(self, keys: Iterable[SessionKey]) -> None:
+        """事务回滚后淘汰可能被就地修改的缓存会话，下次 get 从会话表重新加载"""
+        for key in keys:
+            if key in self._dirty:
+                # 已提交的修改尚未写入，只存在于缓存中：先写入再淘汰
+                self._stale.add(key)
+                self._wake()
+            else:
+                self._live.pop(key, None)
+
+    def _remember(self, key: SessionKey, entry: _LiveSession) -> None:
+        self._live[key] = entry
+        self._live.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        if len(self._live) <= self.max_live:
+            return
+        for key in list(self._live):
+            if len(self._live) <= self.max_live:
+                break
+            if key not in self._dirty:
+                del self._live[key]
+
+    def _has_pending(self) -> bool:
+        return bool(self._dirty)
+
+    def _mark_dirty(self, key: SessionKey) -> None:
+        self._dirty.add(key)
+        self._wake()
+
+    # ==================== 延迟写入 ====================
+
+    async def flush(self) -> int:
+        """
+        立即写入所有脏会话
+
+        Returns:
+            写入（含删除）的会话数
+        """
+        if not self._dirty:
+            return 0
+        keys = list(self._dirty)
+        self._dirty.clear()
+
+        now = datetime.utcnow()
+        upserts, deletes = [], []
+        for key in keys:
+            entry = self._live.get(key)
+            if entry is None:
+                continue
+            family_id, user_id, game_type = key
+            if entry.state is None:
+                deletes.append(key)
+            else:
+                upserts.append({
+                    "family_id": family_id,
+                    "user_id": user_id,
+                    "game_type": game_type,
+                    # ensure_ascii 转义所有非 ASCII 字符（含孤立 surrogate），无需预先清洗整棵状态树
+                    "state": json.dumps(entry.state, separators=(",", ":")),
+                    "last_active_at": entry.last_active or now,
+                    "updated_at": now,
+                })
+
+        try:
+            async with self._maker()() as db:
+                if upserts:
+                    stmt = sqlite_insert(PetGameSession)
+                    await db.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=["family_id", "user_id", "game_type"],
+                            set_={
+                                "state": stmt.excluded.state,
+                                "last_active_at": stmt.excluded.last_active_at,
+                                "updated_at": stmt.excluded.updated_at,
+                            },
+                        ),
+                        upserts,
+                    )
+                for family_id, user_id, game_type in deletes:
+                    await db.execute(delete(PetGameSession).where(
+                        PetGameSession.family_id == family_id,
+                        PetGameSession.user_id == user_id,
+                        PetGameSession.game_type == game_type,
+                    ))
+                await db.commit()
+        except Exception:
+            # 写入期间又被修改的会话已重新标记；其余恢复脏标记等待下次重试
+            self._dirty.update(keys)
+            raise
+
+        self.stats["flushes"] += 1
+        self.stats["written"] += len(upserts) + len(deletes)
+        for key in keys:
+            # 写入期间重新提交的会话仍以缓存为准
+            if key in self._stale and key not in self._dirty:
+                self._stale.discard(key)
+                self._live.pop(key, None)
+        self._evict()
+        return len(upserts) + len(deletes)
+
+
+def _staged(db: AsyncSession) -> Dict[Tuple["GameSessionStore", SessionKey], _LiveSession]:
+    return db.sync_session.info.get(_SESSION_KEY, {})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_sessions(session: Session) -> None:
+    session.info.pop(_TOUCHED_KEY, None)
+    for (store, key), entry in session.info.pop(_SESSION_KEY, {}).items():
+        store._publish(key, entry)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_session_changes(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
+    touched: Dict["GameSessionStore", list] = {}
+    for store, key in session.info.pop(_TOUCHED_KEY, ()):
+        touched.setdefault(store, []).append(key)
+    for store, keys in touched.items():
+        store._forget(keys)
+
+
+# 全局单例
+game_sessions = GameSessionStore()
@@ -0,0 +1,125 @@
+"""
+小金库 (Golden Nest) - 后台定时任务
+
+每个任务接收一个独立会话，由调度器提交并记录返回值：
+
+- proposal_expiry：把已过截止时间的投票中提案标记为 EXPIRED
+- bet_deadlines：已截止的进行中赌注按投票人数转为已取消 / 等待结果
+- approval_reminders：待审批超过 APPROVAL_REMIND_AFTER 仍未处理（且未催办过）的申请自动催办一次
+- calendar_sync：全量同步各家庭的日历系统事件（理财到期、待办截止、股权赠与）
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import (
+    ApprovalRequest, ApprovalRequestStatus, Bet, BetParticipant, BetStatus,
+    Family, FamilyMember, User,
+)
+from app.services.scheduler import JobScheduler, scheduler
+
+logger = logging.getLogger(__name__)
+
+# 待审批多久后自动催办
+APPROVAL_REMIND_AFTER = timedelta(hours=24)
+
+
+async def expire_proposals_job(db: AsyncSession) -> Dict[str, int]:
+    from app.services.proposal import expire_overdue_proposals
+
+    return {"expired": await expire_overdue_proposals(db)}
+
+
+async def bet_deadlines_job(db: AsyncSession) -> Dict[str, int]:
+    """已截止的 ACTIVE 赌注：投票人数 <= 1 取消，否则进入等待结果登记（与 effective_bet_status 规则一致）"""
+    now = datetime.utcnow()
+    voted = (
+        select(func.count(BetParticipant.id))
+        .where(BetParticipant.bet_id == Bet.id, BetParticipant.selected_option_id.isnot(None))
+        .scalar_subquery()
+    )
+    rows = (await db.execute(
+        select(Bet.id, voted).where(Bet.status == BetStatus.ACTIVE, Bet.end_date <= now)
+    )).all()
+    cancelled = [bet_id for bet_id, count in rows if count <= 1]
+    awaiting = [bet_id for bet_id, count in rows if count > 1]
+
+    for ids, status in ((cancelled, BetStatus.CANCELLED), (awaiting, BetStatus.AWAITING_RESULT)):
+        if ids:
+            await db.execute(
+                update(Bet)
+                .where(Bet.id.in_(ids), Bet.status == BetStatus.ACTIVE)
+                .values(status=status)
+                .execution_options(synchronize_session=False)
+            )
+    return {"cancelled": len(cancelled), "awaiting_result": len(awaiting)}
+
+
+async def approval_reminders_job(db: AsyncSession) -> Dict[str, int]:
+    """自动催办长时间未处理的申请（每个申请最多一次，手动催办过的不再重复）"""
+    from app.services.notification import NotificationService
+
+    now = datetime.utcnow()
+    requests = (await db.execute(
+        select(ApprovalRequest).where(
+            ApprovalRequest.status == ApprovalRequestStatus.PENDING,
+            ApprovalRequest.created_at <= now - APPROVAL_REMIND_AFTER,
+            ApprovalRequest.reminded_at.is_(None),
+        ).order_by(ApprovalRequest.id).limit(200)
+    )).scalars().all()
+    if not requests:
+        return {"reminded": 0}
+
+    families = {f.id: f for f in (await db.execute(
+        select(Family).where(Family.id.in_({r.family_id for r in requests}))
+    )).scalars().all()}
+    users = {u.id: u for u in (await db.execute(
+        select(User).where(User.id.in_({r.requester_id for r in requests}))
+    )).scalars().all()}
+    # 系统催办：以"小金库"名义发送，不关联真实用户
+    system_user = User(id=0, nickname="小金库")
+
+    service = NotificationService(db)
+    reminded = 0
+    for request in requests:
+        family = families.get(request.family_id)
+        requester = users.get(request.requester_id) or system_user
+        if family:
+            try:
+                await service.notify_approval_reminder(request, family, requester, system_user)
+                reminded += 1
+            except Exception as e:
+                logger.warning(f"⚠️ 申请 {request.id} 自动催办失败: {e}")
+        request.reminded_at = now
+    return {"reminded": reminded}
+
+
+async def calendar_sync_job(db: AsyncSession) -> Dict[str, int]:
+    """按家庭全量同步日历系统事件，新建事件的创建者为该家庭的管理员"""
+    from app.services.calendar import sync_family_system_events
+
+    admins = (await db.execute(
+        select(FamilyMember.family_id, func.min(FamilyMember.user_id))
+        .where(FamilyMember.role == "admin")
+        .group_by(FamilyMember.family_id)
+    )).all()
+    totals = {"families": 0, "created": 0, "updated": 0, "deleted": 0}
+    for family_id, admin_id in admins:
+        stats = await sync_family_system_events(db, family_id, admin_id)
+        await db.commit()
+        totals["families"] += 1
+        for key, value in stats.items():
+            totals[key] += value
+    return totals
+
+
+def register_jobs(target: JobScheduler = scheduler) -> JobScheduler:
+    """注册默认任务"""
+    target.register("proposal_expiry", expire_proposals_job, interval=300)
+    target.register("bet_deadlines", bet_deadlines_job, interval=300)
+    target.register("approval_reminders", approval_reminders_job, interval=3600)
+    target.register("calendar_sync", calendar_sync_job, interval=6 * 3600, timeout=1800)
+    return target
@@ -0,0 +1,457 @@
+"""
+小金库 (Golden Nest) - 家庭账本快照服务
+
+将股权汇总所需的聚合结果（成员存入、理财本金/收益、自由资金、冻结资金）
+物化到 family_ledgers / family_ledger_members / family_ledger_investments 三张表。
+
+- 增量维护：注册在 Session 的 after_flush 事件上，写入 Deposit/Transaction/
+  InvestmentPosition/InvestmentIncome/Dividend/DividendClaim 时在同一事务内更新快照
+- 惰性构建：家庭快照不存在时，读取方从原始流水全量重建
+- 校验修复：verify_family_ledger 比对快照与原始流水，rebuild_family_ledger 全量重算
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update, delete, func, case, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import (
+    Deposit, Transaction, Investment, InvestmentPosition, InvestmentIncome,
+    PositionOperationType, Dividend, DividendStatus, DividendClaim, DividendClaimStatus,
+    FamilyLedger, FamilyLedgerMember, FamilyLedgerInvestment,
+)
+
+logger = logging.getLogger(__name__)
+
+# 快照与原始流水的允许误差（浮点累加误差）
+DRIFT_TOLERANCE = 0.01
+
+_POSITION_INCREASE_TYPES = (PositionOperationType.CREATE, PositionOperationType.INCREASE)
+
+
+# ==================== 聚合表达式 ====================
+
+def _position_delta(position: InvestmentPosition) -> float:
+    """持仓变动对本金的影响（创建/增持为正，其余为负）"""
+    if position.operation_type in _POSITION_INCREASE_TYPES:
+        return position.amount
+    return -position.amount
+
+
+def _income_value(income: InvestmentIncome) -> float:
+    """收益记录的收益金额（新模式优先使用 calculated_income）"""
+    return income.calculated_income if income.calculated_income is not None else income.amount
+
+
+def _free_cash_expr(family_id):
+    """自由资金 = 最后一笔流水的 balance_after"""
+    last_balance = (
+        select(Transaction.balance_after)
+        .where(Transaction.family_id == family_id)
+        .order_by(Transaction.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return func.coalesce(last_balance, 0.0)
+
+
+def _frozen_amount_expr(family_id):
+    """冻结资金 = 投票中分红总额 + 已通过分红中未处理的领取金额"""
+    voting = (
+        select(func.coalesce(func.sum(Dividend.total_amount), 0.0))
+        .where(
+            Dividend.family_id == family_id,
+            Dividend.status == DividendStatus.VOTING,
+        )
+        .scalar_subquery()
+    )
+    pending = (
+        select(func.coalesce(func.sum(DividendClaim.amount), 0.0))
+        .join(Dividend, DividendClaim.dividend_id == Dividend.id)
+        .where(
+            Dividend.family_id == family_id,
+            Dividend.status == DividendStatus.APPROVED,
+            DividendClaim.status == DividendClaimStatus.PENDING,
+        )
+        .scalar_subquery()
+    )
+    return voting + pending
+
+
+# ==================== 增量维护（after_flush） ====================
+
+@event.listens_for(Session, "after_flush")
+def _apply_ledger_deltas(session: Session, flush_context) -> None:
+    """在同一事务内把本次 flush 的流水变化增量写入账本快照
+
+    只更新已构建快照的家庭；未构建的家庭会在首次读取时全量重建。
+    """
+    deposit_deltas: Dict[tuple, float] = defaultdict(float)
+    investment_deltas: Dict[int, List[float]] = defaultdict(lambda: [0.0, 0.0])
+    cash_families: Dict[int, Optional[Transaction]] = {}
+    frozen_families = set()
+    claim_dividend_ids = set()
+
+    def collect(obj, sign: int) -> None:
+        if isinstance(obj, Deposit):
+            deposit_deltas[(obj.family_id, obj.user_id)] += sign * obj.amount
+        elif isinstance(obj, Transaction):
+            # 流水经记账服务串行写入，同一家庭 id 最大者即链末端
+            # 删除流水时置为 None，改为按流水链重新取末端余额
+            latest = cash_families.get(obj.family_id, obj)
+            if sign < 0 or latest is None:
+                cash_families[obj.family_id] = None
+            elif obj.id >= latest.id:
+                cash_families[obj.family_id] = obj
+        elif isinstance(obj, InvestmentPosition):
+            investment_deltas[obj.investment_id][0] += sign * _position_delta(obj)
+        elif isinstance(obj, InvestmentIncome):
+            investment_deltas[obj.investment_id][1] += sign * _income_value(obj)
+        elif isinstance(obj, Dividend):
+            frozen_families.add(obj.family_id)
+        elif isinstance(obj, DividendClaim):
+            claim_dividend_ids.add(obj.dividend_id)
+
+    for obj in session.new:
+        collect(obj, 1)
+    for obj in session.deleted:
+        collect(obj, -1)
+    for obj in session.dirty:
+        # 分红/领取状态变化只影响冻结资金，直接重算
+        if isinstance(obj, (Dividend, DividendClaim)):
+            collect(obj, 0)
+
+    if not (deposit_deltas or investment_deltas or cash_families or frozen_families or claim_dividend_ids):
+        return
+
+    conn = session.connection()
+
+    investment_families: Dict[int, int] = {}
+    if investment_deltas:
+        rows = conn.execute(
+            select(Investment.id, Investment.family_id)
+            .where(Investment.id.in_(list(investment_deltas)))
+        ).all()
+        investment_families = {inv_id: fid for inv_id, fid in rows}
+    if claim_dividend_ids:
+        rows = conn.execute(
+            select(Dividend.family_id).where(Dividend.id.in_(list(claim_dividend_ids)))
+        ).all()
+        frozen_families.update(fid for (fid,) in rows)
+
+    touched = (
+        {fid for fid, _ in deposit_deltas}
+        | set(investment_families.values())
+        | set(cash_families)
+        | frozen_families
+    )
+    built = set(conn.execute(
+        select(FamilyLedger.family_id).where(FamilyLedger.family_id.in_(list(touched)))
+    ).scalars())
+    if not built:
+        return
+
+    ledger_table = FamilyLedger.__table__
+    member_table = FamilyLedgerMember.__table__
+    investment_table = FamilyLedgerInvestment.__table__
+
+    member_rows = [
+        {"family_id": fid, "user_id": uid, "total_deposit": delta}
+        for (fid, uid), delta in deposit_deltas.items()
+        if fid in built and delta
+    ]
+    if member_rows:
+        stmt = sqlite_insert(member_table)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["family_id", "user_id"],
+                set_={"total_deposit": member_table.c.total_deposit + stmt.excluded.total_deposit},
+            ),
+            member_rows,
+        )
+
+    investment_rows = [
+        {
+            "investment_id": inv_id,
+            "family_id": investment_families[inv_id],
+            "current_principal": principal_delta,
+            "total_return": return_delta,
+        }
+        for inv_id, (principal_delta, return_delta) in investment_deltas.items()
+        if investment_families.get(inv_id) in built
+    ]
+    if investment_rows:
+        stmt = sqlite_insert(investment_table)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["investment_id"],
+                set_={
+                    "current_principal": investment_table.c.current_principal + stmt.excluded.current_principal,
+                    "total_return": investment_table.c.total_return + stmt.excluded.total_return,
+                },
+            ),
+            investment_rows,
+        )
+
+    now = datetime.utcnow()
+    for family_id in built:
+        values = {"updated_at": now}
+        if family_id in cash_families:
+            latest = cash_families[family_id]
+            values["free_cash"] = latest.balance_after if latest is not None else _free_cash_expr(family_id)
+        if family_id in frozen_families:
+            values["frozen_amount"] = _frozen_amount_expr(family_id)
+        conn.execute(
+            update(ledger_table)
+            .where(ledger_table.c.family_id == family_id)
+            .values(**values)
+        )
+
+
+# ==================== 全量计算 / 重建 / 校验 ====================
+
+async def compute_family_ledger(family_id: int, db: AsyncSession) -> dict:
+    """
+    从原始流水全量计算家庭账本（每类数据一条 GROUP BY 查询）
+
+    Returns:
+        {
+            "free_cash": 自由资金,
+            "frozen_amount": 冻结资金,
+            "members": {user_id: 存入总额},
+            "investments": {investment_id: {"current_principal": 本金, "total_return": 收益}}
+        }
+    """
+    result = await db.execute(
+        select(Deposit.user_id, func.sum(Deposit.amount))
+        .where(Deposit.family_id == family_id)
+        .group_by(Deposit.user_id)
+    )
+    members = {user_id: total or 0.0 for user_id, total in result.all()}
+
+    investments: Dict[int, Dict[str, float]] = defaultdict(
+        lambda: {"current_principal": 0.0, "total_return": 0.0}
+    )
+    result = await db.execute(
+        select(
+            InvestmentPosition.investment_id,
+            func.sum(case(
+                (InvestmentPosition.operation_type.in_(_POSITION_INCREASE_TYPES), InvestmentPosition.amount),
+                else_=-InvestmentPosition.amount,
+            )),
+        )
+        .join(Investment, InvestmentPosition.investment_id == Investment.id)
+        .where(Investment.family_id == family_id)
+        .group_by(InvestmentPosition.investment_id)
+    )
+    for investment_id, principal in result.all():
+        investments[investment_id]["current_principal"] = principal or 0.0
+
+    result = await db.execute(
+        select(
+            InvestmentIncome.investment_id,
+            func.sum(func.coalesce(InvestmentIncome.calculated_income, InvestmentIncome.amount)),
+        )
+        .join(Investment, InvestmentIncome.investment_id == Investment.id)
+        .where(Investment.family_id == family_id)
+        .group_by(InvestmentIncome.investment_id)
+    )
+    for investment_id, total_return in result.all():
+        investments[investment_id]["total_return"] = total_return or 0.0
+
+    result = await db.execute(select(_free_cash_expr(family_id), _frozen_amount_expr(family_id)))
+    free_cash, frozen_amount = result.one()
+
+    return {
+        "free_cash": free_cash or 0.0,
+        "frozen_amount": frozen_amount or 0.0,
+        "members": members,
+        "investments": dict(investments),
+    }
+
+
+async def rebuild_family_ledger(family_id: int, db: AsyncSession) -> dict:
+    """
+    从原始流水全量重建家庭账本快照（不提交事务，由调用方管理）
+
+    Returns:
+        重建后的账本数据（同 compute_family_ledger）
+    """
+    now = datetime.utcnow()
+    ledger_table = FamilyLedger.__table__
+
+    # 先写快照主行：SQLite 在首条写语句时获取写锁，此后的并发写入会等待本事务提交，
+    # 并在提交后按增量路径更新快照，不会遗漏重建期间的流水
+    stmt = sqlite_insert(ledger_table).values(family_id=family_id, rebuilt_at=now, updated_at=now)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["family_id"],
+        set_={"rebuilt_at": now, "updated_at": now},
+    ))
+
+    ledger = await compute_family_ledger(family_id, db)
+
+    await db.execute(
+        update(ledger_table)
+        .where(ledger_table.c.family_id == family_id)
+        .values(free_cash=ledger["free_cash"], frozen_amount=ledger["frozen_amount"])
+    )
+    await db.execute(delete(FamilyLedgerMember.__table__).where(FamilyLedgerMember.family_id == family_id))
+    await db.execute(delete(FamilyLedgerInvestment.__table__).where(FamilyLedgerInvestment.family_id == family_id))
+
+    if ledger["members"]:
+        await db.execute(
+            FamilyLedgerMember.__table__.insert(),
+            [
+                {"family_id": family_id, "user_id": user_id, "total_deposit": total}
+                for user_id, total in ledger["members"].items()
+            ],
+        )
+    if ledger["investments"]:
+        await db.execute(
+            FamilyLedgerInvestment.__table__.insert(),
+            [
+                {"investment_id": investment_id, "family_id": family_id, **values}
+                for investment_id, values in ledger["investments"].items()
+            ],
+        )
+
+    logger.info(f"家庭 {family_id} 账本快照已重建")
+    return ledger
+
+
+async def load_family_ledger(family_id: int, db: AsyncSession) -> Optional[dict]:
+    """
+    读取家庭账本快照（原样返回快照表中的数据，未构建时返回 None）
+
+    Returns:
+        结构同 compute_family_ledger
+    """
+    result = await db.execute(
+        select(FamilyLedger.free_cash, FamilyLedger.frozen_amount)
+        .where(FamilyLedger.family_id == family_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    result = await db.execute(
+        select(FamilyLedgerMember.user_id, FamilyLedgerMember.total_deposit)
+        .where(FamilyLedgerMember.family_id == family_id)
+    )
+    members = {user_id: total for user_id, total in result.all()}
+
+    result = await db.execute(
+        select(
+            FamilyLedgerInvestment.investment_id,
+            FamilyLedgerInvestment.current_principal,
+            FamilyLedgerInvestment.total_return,
+        )
+        .where(FamilyLedgerInvestment.family_id == family_id)
+    )
+    investments = {
+        investment_id: {"current_principal": principal, "total_return": total_return}
+        for investment_id, principal, total_return in result.all()
+    }
+
+    return {
+        "free_cash": row.free_cash,
+        "frozen_amount": row.frozen_amount,
+        "members": members,
+        "investments": investments,
+    }
+
+
+async def get_family_ledger_summary(family_id: int, db: AsyncSession) -> dict:
+    """
+    读取股权汇总所需的快照数据，快照不存在时先全量重建
+
+    Returns:
+        {
+            "free_cash": 自由资金,
+            "frozen_amount": 冻结资金,
+            "investment_value": 有效理财实际价值（本金 + 收益）,
+            "member_deposits": {user_id: 存入总额}
+        }
+    """
+    result = await db.execute(
+        select(FamilyLedger.free_cash, FamilyLedger.frozen_amount)
+        .where(FamilyLedger.family_id == family_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        await rebuild_family_ledger(family_id, db)
+        result = await db.execute(
+            select(FamilyLedger.free_cash, FamilyLedger.frozen_amount)
+            .where(FamilyLedger.family_id == family_id)
+        )
+        row = result.one()
+
+    result = await db.execute(
+        select(FamilyLedgerMember.user_id, FamilyLedgerMember.total_deposit)
+        .where(FamilyLedgerMember.family_id == family_id)
+    )
+    member_deposits = {user_id: total for user_id, total in result.all()}
+
+    # 仅统计有效（未停用、未删除）的理财产品
+    result = await db.execute(
+        select(func.coalesce(func.sum(
+            FamilyLedgerInvestment.current_principal + FamilyLedgerInvestment.total_return
+        ), 0.0))
+        .join(Investment, FamilyLedgerInvestment.investment_id == Investment.id)
+        .where(
+            FamilyLedgerInvestment.family_id == family_id,
+            Investment.is_active == True,
+            Investment.is_deleted == False,
+        )
+    )
+    investment_value = result.scalar() or 0.0
+
+    return {
+        "free_cash": row.free_cash,
+        "frozen_amount": row.frozen_amount,
+        "investment_value": investment_value,
+        "member_deposits": member_deposits,
+    }
+
+
+def _diff(drifts: list, field: str, key, expected: float, actual: float) -> None:
+    if abs((expected or 0.0) - (actual or 0.0)) > DRIFT_TOLERANCE:
+        drifts.append({"field": field, "key": key, "expected": expected, "actual": actual})
+
+
+async def verify_family_ledger(family_id: int, db: AsyncSession) -> List[dict]:
+    """
+    比对家庭账本快照与原始流水
+
+    Returns:
+        漂移列表，每项为 {"field", "key", "expected"(原始流水), "actual"(快照)}；
+        快照未构建时返回单条 field="ledger" 的记录
+    """
+    snapshot = await load_family_ledger(family_id, db)
+    if snapshot is None:
+        return [{"field": "ledger", "key": family_id, "expected": "built", "actual": None}]
+
+    expected = await compute_family_ledger(family_id, db)
+    drifts: List[dict] = []
+
+    _diff(drifts, "free_cash", family_id, expected["free_cash"], snapshot["free_cash"])
+    _diff(drifts, "frozen_amount", family_id, expected["frozen_amount"], snapshot["frozen_amount"])
+
+    for user_id in set(expected["members"]) | set(snapshot["members"]):
+        _diff(
+            drifts, "total_deposit", user_id,
+            expected["members"].get(user_id, 0.0), snapshot["members"].get(user_id, 0.0),
+        )
+
+    empty = {"current_principal": 0.0, "total_return": 0.0}
+    for investment_id in set(expected["investments"]) | set(snapshot["investments"]):
+        exp = expected["investments"].get(investment_id, empty)
+        act = snapshot["investments"].get(investment_id, empty)
+        _diff(drifts, "current_principal", investment_id, exp["current_principal"], act["current_principal"])
+        _diff(drifts, "total_return", investment_id, exp["total_return"], act["total_return"])
+
+    return drifts
@@ -9,8 +9,9 @@
 https://developer.work.weixin.qq.com/document/path/91770
 """
 import logging
+import time
 import httpx
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from enum import Enum
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
@@ -195,6 +196,31 @@ class NotificationChannel(ABC):
     def is_configured(self, config: Dict[str, Any]) -> bool:
         """检查渠道是否已配置"""
         pass
+    
+    @abstractmethod
+    def build_payload(self, context: NotificationContext) -> Optional[Dict[str, Any]]:
+        """
+        渲染渠道请求体（入队时调用，投递时不再依赖上下文对象）
+        
+        Returns:
+            请求体，渲染失败返回 None
+        """
+        pass
+    
+    @abstractmethod
+    async def deliver(self, client: httpx.AsyncClient, payload: Dict[str, Any], config: Dict[str, Any]) -> None:
+        """
+        使用共享 HTTP 客户端投递已渲染的请求体
+        
+        Raises:
+            httpx.HTTPError / NotificationDeliveryError: 投递失败（由发件箱重试）
+        """
+        pass
+
+
+class NotificationDeliveryError(Exception):
+    """渠道明确返回失败（如企业微信 errcode != 0）"""
+    pass
 
 
 # ==================== 企业微信通知渠道 ====================
@@ -249,7 +275,7 @@ class WeChatWorkChannel(NotificationChannel):
     
     async def send(self, context: NotificationContext, config: Dict[str, Any]) -> bool:
         """
-        发送企业微信机器人消息
+        发送企业微信机器人消息（即时发送，业务通知请走发件箱）
         
         使用 Markdown 格式发送富文本消息
         """
@@ -258,44 +284,55 @@ class WeChatWorkChannel(NotificationChannel):
             logging.debug("WeChatWork webhook URL not configured, skipping notification")
             return False
         
-        logging.info(f"Building markdown message for {context.notification_type}")
+        payload = self.build_payload(context)
+        if payload is None:
+            return False
         
-        # 构建 Markdown 消息内容
+        try:
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                await self.deliver(client, payload, config)
+            logging.info(f"✅ WeChatWork notification sent successfully: {context.notification_type}")
+            return True
+        except NotificationDeliveryError as e:
+            logging.warning(f"❌ WeChatWork notification failed: {e}")
+            return False
+        except httpx.HTTPError as e:
+            logging.error(f"❌ WeChatWork notification HTTP error: {e}", exc_info=True)
+            return False
+        except Exception as e:
+            logging.error(f"❌ WeChatWork notification error: {e}", exc_info=True)
+            return False
+    
+    def build_payload(self, context: NotificationContext) -> Optional[Dict[str, Any]]:
+        """构建企业微信 Markdown 消息请求体"""
+        logging.info(f"Building markdown message for {context.notification_type}")
         try:
             markdown_content = self._build_markdown_message(context)
             logging.debug(f"Markdown content built, length={len(markdown_content)}")
         except Exception as e:
             logging.error(f"Failed to build markdown message: {e}", exc_info=True)
-            return False
+            return None
         
-        # 构建请求体
-        payload = {
+        return {
             "msgtype": "markdown",
             "markdown": {
                 "content": markdown_content
             }
         }
+    
+    async def deliver(self, client: httpx.AsyncClient, payload: Dict[str, Any], config: Dict[str, Any]) -> None:
+        """投递到企业微信 Webhook"""
+        webhook_url = config.get("wechat_work_webhook_url")
+        if not webhook_url:
+            raise NotificationDeliveryError("webhook URL not configured")
         
-        try:
-            logging.info(f"Sending to WeChatWork webhook: {webhook_url[:50]}...")
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.post(webhook_url, json=payload)
-                response.raise_for_status()
-                
-                result = response.json()
-                if result.get("errcode") == 0:
-                    logging.info(f"✅ WeChatWork notification sent successfully: {context.notification_type}")
-                    return True
-                else:
-                    logging.warning(f"❌ WeChatWork notification failed: {result}")
-                    return False
-                    
-        except httpx.HTTPError as e:
-            logging.error(f"❌ WeChatWork notification HTTP error: {e}", exc_info=True)
-            return False
-        except Exception as e:
-            logging.error(f"❌ WeChatWork notification error: {e}", exc_info=True)
-            return False
+        logging.info(f"Sending to WeChatWork webhook: {webhook_url[:50]}...")
+        response = await client.post(webhook_url, json=payload)
+        response.raise_for_status()
+        
+        result = response.json()
+        if result.get("errcode") != 0:
+            raise NotificationDeliveryError(f"errcode={result.get('errcode')} errmsg={result.get('errmsg')}")
     
     def _build_markdown_message(self, context: NotificationContext) -> str:
         """构建企业微信 Markdown 格式消息"""
@@ -554,6 +591,69 @@ class WeChatWorkChannel(NotificationChannel):
         return "\n".join(lines)
 
 
+# ==================== 家庭通知配置缓存 ====================
+
+# 家庭配置缓存 TTL（秒）；配置修改时由接口主动失效
+FAMILY_CONFIG_CACHE_TTL = 300
+
+# family_id -> (过期时间, 配置)
+_family_config_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+
+
+def invalidate_family_notification_config(family_id: int) -> None:
+    """家庭通知配置变更后调用，使缓存失效"""
+    _family_config_cache.pop(family_id, None)
+
+
+async def load_family_notification_config(db: AsyncSession, family_id: int) -> Dict[str, Any]:
+    """
+    获取家庭的通知配置（带缓存，Webhook 只在缓存未命中时解密一次）
+    
+    优先级：
+    1. 数据库中的家庭配置（每个家庭独立配置）
+    2. 环境变量（全局默认配置）
+    
+    Returns:
+        配置字典（只读，调用方如需修改请先复制）
+    """
+    import os
+    from app.core.encryption import decrypt_sensitive_data
+    
+    cached = _family_config_cache.get(family_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    # 默认配置（从环境变量读取）
+    config = {
+        "wechat_work_webhook_url": os.getenv("WECHAT_WORK_WEBHOOK_URL", ""),
+        "notification_enabled": os.getenv("NOTIFICATION_ENABLED", "true").lower() == "true",
+    }
+    
+    # 尝试从数据库读取家庭配置（优先级更高）
+    try:
+        result = await db.execute(
+            select(Family).where(Family.id == family_id)
+        )
+        family = result.scalar_one_or_none()
+        
+        if family:
+            # 家庭配置覆盖默认配置（webhook URL 需要解密）
+            if family.wechat_webhook_url:
+                config["wechat_work_webhook_url"] = decrypt_sensitive_data(family.wechat_webhook_url)
+            config["notification_enabled"] = family.notification_enabled
+            # 外网访问地址配置
+            if family.external_base_url:
+                config["external_base_url"] = family.external_base_url
+            
+    except Exception as e:
+        logging.warning(f"Failed to load family notification config: {e}")
+        # 读取失败不缓存，下次重试
+        return config
+    
+    _family_config_cache[family_id] = (time.monotonic() + FAMILY_CONFIG_CACHE_TTL, config)
+    return config
+
+
 # ==================== 通知服务主类 ====================
 
 class NotificationService:
@@ -578,42 +678,8 @@ class NotificationService:
         }
     
     async def get_family_notification_config(self, family_id: int) -> Dict[str, Any]:
-        """
-        获取家庭的通知配置
-        
-        优先级：
-        1. 数据库中的家庭配置（每个家庭独立配置）
-        2. 环境变量（全局默认配置）
-        """
-        import os
-        from app.core.encryption import decrypt_sensitive_data
-        
-        # 默认配置（从环境变量读取）
-        config = {
-            "wechat_work_webhook_url": os.getenv("WECHAT_WORK_WEBHOOK_URL", ""),
-            "notification_enabled": os.getenv("NOTIFICATION_ENABLED", "true").lower() == "true",
-        }
-        
-        # 尝试从数据库读取家庭配置（优先级更高）
-        try:
-            result = await self.db.execute(
-                select(Family).where(Family.id == family_id)
-            )
-            family = result.scalar_one_or_none()
-            
-            if family:
-                # 家庭配置覆盖默认配置（webhook URL 需要解密）
-                if family.wechat_webhook_url:
-                    config["wechat_work_webhook_url"] = decrypt_sensitive_data(family.wechat_webhook_url)
-                config["notification_enabled"] = family.notification_enabled
-                # 外网访问地址配置
-                if family.external_base_url:
-                    config["external_base_url"] = family.external_base_url
-                
-        except Exception as e:
-            logging.warning(f"Failed to load family notification config: {e}")
-        
-        return config
+        """获取家庭的通知配置（见 load_family_notification_config）"""
+        return dict(await load_family_notification_config(self.db, family_id))
     
     async def notify_approval_created(
         self,
@@ -989,10 +1055,12 @@ class NotificationService:
     
     async def _send_to_all_channels(self, context: NotificationContext) -> None:
         """
-        向所有已配置的渠道发送通知
+        向所有已配置的渠道发送通知（写入发件箱即返回，随调用方的事务提交）
         
         注意：通知失败不应影响主业务逻辑
         """
+        # 先 flush 业务数据：flush 失败是业务错误，须由调用方回滚处理，不能被下面的异常捕获吞掉
+        await self.db.flush()
         try:
             logging.info(f"_send_to_all_channels called for {context.notification_type}, family_id={context.family_id}")
             
@@ -1016,27 +1084,31 @@ class NotificationService:
                 context.base_url = "http://localhost:8000"
                 logging.debug("Using default localhost URL")
             
-            # 向所有配置的渠道发送
-            sent_count = 0
+            # 渲染消息并写入发件箱（与业务数据同一事务提交），提交后由后台队列投递
+            from app.services.notification_queue import notification_queue
+            
+            queued_count = 0
             for channel_name, channel in self.channels.items():
                 if channel.is_configured(config):
-                    logging.info(f"Channel {channel_name} is configured, attempting to send")
-                    try:
-                        success = await channel.send(context, config)
-                        if success:
-                            logging.info(f"✅ Notification sent successfully via {channel_name}")
-                            sent_count += 1
-                        else:
-                            logging.warning(f"❌ Notification via {channel_name} returned false")
-                    except Exception as e:
-                        logging.error(f"❌ Error sending notification via {channel_name}: {e}", exc_info=True)
+                    payload = channel.build_payload(context)
+                    if payload is None:
+                        logging.warning(f"❌ Failed to build payload for {channel_name}, skipping")
+                        continue
+                    if await notification_queue.enqueue(
+                        self.db,
+                        family_id=context.family_id,
+                        channel=channel_name,
+                        notification_type=context.notification_type.value,
+                        payload=payload,
+                    ):
+                        queued_count += 1
                 else:
                     logging.debug(f"Channel {channel_name} not configured, skipping")
             
-            if sent_count == 0:
-                logging.warning(f"No notifications sent for {context.notification_type} (no channels configured)")
+            if queued_count == 0:
+                logging.warning(f"No notifications queued for {context.notification_type} (no channels configured)")
             else:
-                logging.info(f"Notification sent to {sent_count} channel(s)")
+                logging.info(f"Notification queued for {queued_count} channel(s)")
                     
         except Exception as e:
             # 通知失败不应该影响主业务
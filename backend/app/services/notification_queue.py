@@ -0,0 +1,361 @@
+"""
+小金库 (Golden Nest) - 通知发件箱投递队列
+
+业务请求调用 enqueue 在自己的会话中写入 notification_outbox（事务型发件箱）：
+消息与业务数据同一事务提交，业务回滚时消息一并丢弃；去重窗口内内容完全相同的消息不再写入。
+会话提交后（after_commit）才唤醒后台调度协程，调度协程负责：
+1. 每个家庭只取队首一条交给工作协程（同一家庭严格按 id 顺序投递）
+2. 投递前以带条件的 UPDATE 认领消息（locked_until 租约），多个工作进程不会重复投递同一条
+3. 失败按指数退避重试，超过最大次数标记为 dead，不再阻塞该家庭后续消息
+
+所有投递共用一个 httpx.AsyncClient 连接池；家庭渠道配置由
+app.services.notification 按家庭缓存，不再每条消息解密一次。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import httpx
+from sqlalchemy import select, update, func, or_, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.models import NotificationOutbox
+from app.services.notification import (
+    NotificationChannel,
+    NotificationDeliveryError,
+    WeChatWorkChannel,
+    load_family_notification_config,
+)
+
+logger = logging.getLogger(__name__)
+
+_SESSION_KEY = "notification_outbox_queues"
+
+
+class NotificationQueue:
+    """
+    进程内通知投递队列
+
+    Args:
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+        channels: 渠道名称 -> 渠道实例，默认与 NotificationService 一致
+        config_loader: family_id -> 渠道配置，默认读取缓存的家庭配置
+        concurrency: 同时投递的最大家庭数
+        max_attempts: 最大尝试次数，超过后标记为 dead
+        backoff_base: 首次重试等待秒数，之后逐次翻倍
+        backoff_max: 单次重试最长等待秒数
+        dedupe_window: 去重窗口（秒）
+        poll_interval: 无事件时的轮询间隔（秒），用于拾取重试与重启遗留消息
+        http_timeout: 单次 Webhook 请求超时（秒）
+        lease_seconds: 认领租约时长（秒），工作进程崩溃后租约到期由其它进程接手
+    """
+
+    def __init__(
+        self,
+        session_maker=None,
+        channels: Optional[Dict[str, NotificationChannel]] = None,
+        config_loader: Optional[Callable[[int], Awaitable[Dict[str, Any]]]] = None,
+        concurrency: int = 4,
+        max_attempts: int = 6,
+        backoff_base: float = 5.0,
+        backoff_max: float = 600.0,
+        dedupe_window: float = 600.0,
+        poll_interval: float = 5.0,
+        http_timeout: float = 10.0,
+        lease_seconds: float = 60.0,
+    ):
+        self._session_maker = session_maker
+        self.channels = channels or {"wechat_work": WeChatWorkChannel()}
+        self._config_loader = config_loader or self._load_config
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dedupe_window = dedupe_window
+        self.poll_interval = poll_interval
+        self.http_timeout = http_timeout
+        self.lease_seconds = lease_seconds
+
+        self._inflight: Set[int] = set()          # 正在投递的家庭ID
+        self._finished = 0                        # 已结束的投递次数，用于识别过期的队首快照
+        self._tasks: Set[asyncio.Task] = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._stopping = False
+
+        self.stats = {"enqueued": 0, "deduped": 0, "sent": 0, "retried": 0, "dead": 0, "claim_conflicts": 0}
+
+    # ==================== 生命周期 ====================
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None and not self._dispatcher.done()
+
+    def start(self) -> None:
+        """启动调度协程（需在事件循环中调用，重复调用无副作用）"""
+        if self.running:
+            return
+        if self._session_maker is None:
+            from app.core.database import async_session_maker
+            self._session_maker = async_session_maker
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=self.http_timeout,
+            limits=httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency),
+        )
+        self._dispatcher = asyncio.create_task(self._run(), name="notification-dispatcher")
+        logger.info(f"📮 通知投递队列已启动 (concurrency={self.concurrency})")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止队列：等待进行中的投递结束
+
+        未投递的消息保留在发件箱中，下次启动后继续投递。
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._dispatcher
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+            for task in list(self._tasks):
+                task.cancel()
+        await self._client.aclose()
+        self._dispatcher = None
+        self._client = None
+        logger.info(f"📮 通知投递队列已停止: {self.stats}")
+
+    # ==================== 入队 ====================
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        family_id: int,
+        channel: str,
+        notification_type: str,
+        payload: Dict[str, Any],
+    ) -> bool:
+        """
+        在调用方的会话中写入一条渲染好的渠道消息（不提交，随业务事务提交或回滚）
+
+        Args:
+            db: 业务请求的数据库会话
+            family_id: 家庭ID
+            channel: 渠道名称
+            notification_type: 通知类型
+            payload: 渠道请求体
+
+        Returns:
+            是否写入（去重窗口内已有相同消息时返回 False）
+        """
+        body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        dedupe_key = hashlib.sha256(f"{family_id}:{channel}:{body}".encode("utf-8")).hexdigest()
+        # 不触发自动 flush：业务数据由调用方先行 flush，写入发件箱失败时业务会话仍可提交；
+        # 同一事务内尚未 flush 的相同消息在 db.new 中查找
+        pending = any(
+            isinstance(obj, NotificationOutbox) and obj.dedupe_key == dedupe_key for obj in db.new
+        )
+        if not pending:
+            since = datetime.utcnow() - timedelta(seconds=self.dedupe_window)
+            with db.no_autoflush:
+                result = await db.execute(
+                    select(NotificationOutbox.id).where(
+                        NotificationOutbox.dedupe_key == dedupe_key,
+                        NotificationOutbox.created_at >= since,
+                    ).limit(1)
+                )
+            pending = result.first() is not None
+        if pending:
+            self.stats["deduped"] += 1
+            logger.info(f"Duplicate notification dropped: family={family_id} type={notification_type}")
+            return False
+
+        db.add(NotificationOutbox(
+            family_id=family_id,
+            channel=channel,
+            notification_type=notification_type,
+            payload=body,
+            dedupe_key=dedupe_key,
+        ))
+        db.sync_session.info.setdefault(_SESSION_KEY, set()).add(self)
+        self.stats["enqueued"] += 1
+        return True
+
+    def wake(self) -> None:
+        """有新消息提交：唤醒调度协程（未启动时启动）"""
+        if not self.running:
+            self.start()
+        self._wakeup.set()
+
+    # ==================== 调度 ====================
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self.poll_interval
+            try:
+                if self._stopping:
+                    return
+                delay = await self._dispatch_due()
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {e}", exc_info=True)
+                if self._stopping:
+                    return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_due(self) -> float:
+        """
+        为每个空闲家庭派发队首消息
+
+        Returns:
+            距离下一条待重试消息的等待秒数
+        """
+        heads = (
+            select(func.min(NotificationOutbox.id))
+            .where(NotificationOutbox.status == "pending")
+            .group_by(NotificationOutbox.family_id)
+        )
+        finished = self._finished
+        async with self._session_maker() as db:
+            result = await db.execute(
+                select(NotificationOutbox).where(NotificationOutbox.id.in_(heads))
+            )
+            rows = result.scalars().all()
+        if finished != self._finished:
+            # 查询期间有投递结束，快照可能包含刚送达的消息，重新查询
+            return 0.0
+
+        now = datetime.utcnow()
+        delay = self.poll_interval
+        for row in rows:
+            if row.family_id in self._inflight:
+                continue
+            if row.next_attempt_at and row.next_attempt_at > now:
+                delay = min(delay, (row.next_attempt_at - now).total_seconds())
+                continue
+            if row.locked_until and row.locked_until > now:
+                # 其它工作进程正在投递该家庭的队首消息
+                delay = min(delay, (row.locked_until - now).total_seconds())
+                continue
+            lease = now + timedelta(seconds=self.lease_seconds)
+            if not await self._claim(row, now, lease):
+                self.stats["claim_conflicts"] += 1
+                continue
+            row.locked_until = lease
+            self._inflight.add(row.family_id)
+            task = asyncio.create_task(self._deliver(row))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return max(delay, 0.05)
+
+    async def _claim(self, row: NotificationOutbox, now: datetime, lease: datetime) -> bool:
+        """带条件的 UPDATE 认领消息：仅当仍为 pending 且无有效租约时成功"""
+        async with self._session_maker() as db:
+            result = await db.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id == row.id,
+                    NotificationOutbox.status == "pending",
+                    or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until <= now),
+                )
+                .values(locked_until=lease)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _deliver(self, row: NotificationOutbox) -> None:
+        """投递一条消息并记录结果"""
+        try:
+            async with self._semaphore:
+                error, give_up = None, False
+                try:
+                    channel = self.channels.get(row.channel)
+                    if channel is None:
+                        raise NotificationDeliveryError(f"unknown channel {row.channel}")
+                    config = await self._config_loader(row.family_id)
+                    if not config.get("notification_enabled", True) or not channel.is_configured(config):
+                        # 入队后家庭关闭了通知或移除了渠道，直接丢弃
+                        error, give_up = "channel disabled", True
+                    else:
+                        await channel.deliver(self._client, json.loads(row.payload), config)
+                except Exception as e:
+                    error = str(e) or e.__class__.__name__
+                await self._finish(row, error, give_up=give_up)
+        except Exception as e:
+            logger.error(f"Failed to record notification {row.id} result: {e}", exc_info=True)
+        finally:
+            self._finished += 1
+            self._inflight.discard(row.family_id)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _finish(self, row: NotificationOutbox, error: Optional[str], give_up: bool = False) -> None:
+        attempts = (row.attempts or 0) + 1
+        now = datetime.utcnow()
+        values: Dict[str, Any] = {"attempts": attempts, "locked_until": None}
+        if error is None:
+            values.update(status="sent", sent_at=now, last_error=None)
+            self.stats["sent"] += 1
+            logger.info(f"✅ Notification {row.id} delivered via {row.channel} (family={row.family_id})")
+        elif give_up or attempts >= self.max_attempts:
+            values.update(status="dead", last_error=error)
+            self.stats["dead"] += 1
+            logger.warning(f"❌ Notification {row.id} dropped after {attempts} attempt(s): {error}")
+        else:
+            values.update(next_attempt_at=now + timedelta(seconds=self._backoff(attempts)), last_error=error)
+            self.stats["retried"] += 1
+            logger.warning(f"⏳ Notification {row.id} failed (attempt {attempts}), will retry: {error}")
+
+        async with self._session_maker() as db:
+            # 仅在仍持有租约时写回结果（租约过期后已被其它进程接手的不覆盖）
+            result = await db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id == row.id, NotificationOutbox.locked_until == row.locked_until)
+                .values(**values)
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            logger.warning(f"Notification {row.id} lease expired before its result was recorded")
+
+    def _backoff(self, attempts: int) -> float:
+        """指数退避，附带 ±20% 抖动避免重试集中"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _load_config(self, family_id: int) -> Dict[str, Any]:
+        async with self._session_maker() as db:
+            return await load_family_notification_config(db, family_id)
+
+
+# ==================== 提交后唤醒 ====================
+
+@event.listens_for(Session, "after_commit")
+def _wake_committed_queues(session: Session) -> None:
+    for queue in session.info.pop(_SESSION_KEY, ()):
+        try:
+            queue.wake()
+        except RuntimeError:
+            # 不在事件循环中（如同步脚本），由下次启动或轮询拾取
+            pass
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_wakeups(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+# 全局投递队列实例（在应用 lifespan 中启动/停止）
+notification_queue = NotificationQueue()
@@ -0,0 +1,132 @@
+"""
+小金库 (Golden Nest) - 提案投票统计与过期处理
+
+- 投票统计：按提案缓存各选项的 (票数, 权重)，未命中的提案一次 GROUP BY 查询批量加载；
+  /proposals/{id}/vote 写入后立即刷新该提案的统计
+- 过期处理：不再在读取列表时写库。读取时按截止时间计算有效状态，
+  由后台任务 proposal_expiry（app.services.jobs）定期批量持久化为 EXPIRED
+"""
+import time
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Proposal, ProposalStatus, Vote
+
+# 投票中提案的统计缓存有效期（秒，多进程部署下的最长不一致时间）；已结束的提案统计不再变化
+PROPOSAL_TALLY_TTL = 60
+# 缓存上限，超出时淘汰最早写入的条目
+PROPOSAL_TALLY_MAX_SIZE = 5000
+
+
+class OptionTally(NamedTuple):
+    """单个选项的投票统计"""
+    count: int
+    weight: float
+
+
+Tally = Dict[int, OptionTally]
+
+# proposal_id -> (过期时间，None 表示永久, 统计)
+_tally_cache: Dict[int, Tuple[Optional[float], Tally]] = {}
+
+
+def invalidate_tally(proposal_id: Optional[int] = None) -> None:
+    """清除指定提案（None 表示全部）的统计缓存"""
+    if proposal_id is None:
+        _tally_cache.clear()
+    else:
+        _tally_cache.pop(proposal_id, None)
+
+
+def voted_count(tally: Tally) -> int:
+    """已投票人数"""
+    return sum(option.count for option in tally.values())
+
+
+def effective_status(proposal: Proposal, now: Optional[datetime] = None) -> ProposalStatus:
+    """有效状态：已过截止时间但尚未持久化的投票中提案视为已过期"""
+    if proposal.status == ProposalStatus.VOTING and proposal.deadline < (now or datetime.utcnow()):
+        return ProposalStatus.EXPIRED
+    return proposal.status
+
+
+def _store_tally(proposal_id: int, tally: Tally, final: bool) -> None:
+    # 投票只增不减：并发刷新时不让较旧的结果覆盖较新的结果
+    cached = _tally_cache.get(proposal_id)
+    if cached and voted_count(cached[1]) > voted_count(tally):
+        return
+    if proposal_id not in _tally_cache and len(_tally_cache) >= PROPOSAL_TALLY_MAX_SIZE:
+        _tally_cache.pop(next(iter(_tally_cache)), None)
+    _tally_cache[proposal_id] = (None if final else time.monotonic() + PROPOSAL_TALLY_TTL, tally)
+
+
+async def _query_tallies(db: AsyncSession, proposal_ids) -> Dict[int, Tally]:
+    result = await db.execute(
+        select(Vote.proposal_id, Vote.option_index, func.count(Vote.id), func.sum(Vote.weight))
+        .where(Vote.proposal_id.in_(proposal_ids))
+        .group_by(Vote.proposal_id, Vote.option_index)
+    )
+    tallies: Dict[int, Tally] = {proposal_id: {} for proposal_id in proposal_ids}
+    for proposal_id, option_index, count, weight in result.all():
+        tallies[proposal_id][option_index] = OptionTally(count, weight or 0)
+    return tallies
+
+
+async def load_tallies(db: AsyncSession, proposals: Iterable[Proposal]) -> Dict[int, Tally]:
+    """
+    批量获取提案的投票统计（未命中缓存的提案合并为一次查询）
+
+    Args:
+        db: 数据库会话
+        proposals: 提案列表
+
+    Returns:
+        proposal_id -> {option_index: OptionTally}
+    """
+    now = time.monotonic()
+    tallies: Dict[int, Tally] = {}
+    misses: Dict[int, bool] = {}
+    for proposal in proposals:
+        cached = _tally_cache.get(proposal.id)
+        if cached and (cached[0] is None or cached[0] > now):
+            tallies[proposal.id] = cached[1]
+        else:
+            misses[proposal.id] = proposal.status != ProposalStatus.VOTING
+
+    if misses:
+        for proposal_id, tally in (await _query_tallies(db, list(misses))).items():
+            _store_tally(proposal_id, tally, final=misses[proposal_id])
+            tallies[proposal_id] = tally
+    return tallies
+
+
+async def refresh_tally(db: AsyncSession, proposal: Proposal) -> Tally:
+    """重新统计单个提案并写入缓存（投票写入提交后调用）"""
+    tally = (await _query_tallies(db, [proposal.id]))[proposal.id]
+    _store_tally(proposal.id, tally, final=proposal.status != ProposalStatus.VOTING)
+    return tally
+
+
+# ==================== 过期提案 ====================
+
+async def expire_overdue_proposals(db: AsyncSession, family_id: Optional[int] = None) -> int:
+    """
+    将已过截止时间的投票中提案批量标记为 EXPIRED（单条 UPDATE，由调用方提交）
+
+    Returns:
+        标记的提案数
+    """
+    now = datetime.utcnow()
+    stmt = update(Proposal).where(
+        Proposal.status == ProposalStatus.VOTING,
+        Proposal.deadline < now
+    )
+    if family_id is not None:
+        stmt = stmt.where(Proposal.family_id == family_id)
+    result = await db.execute(
+        stmt.values(status=ProposalStatus.EXPIRED, closed_at=now)
+    )
+    return result.rowcount or 0
@@ -0,0 +1,160 @@
+"""
+小金库 (Golden Nest) - 日历重复事件展开
+
+按算术直接定位窗口内的第一次重复，而不是从事件创建时间逐次累加：
+
+- 每天/每周：按固定天数整除求出第一个不早于窗口开始的序号
+- 每月/每年：按月份差定位，第 k 次 = 原始时间 + k 个月（年），
+  日期超出当月天数时取月末（1月31日 -> 2月28/29日 -> 3月31日），不会逐月漂移
+
+实例按需惰性生成；同一事件的所有实例共享一份只读的基础字段（含参与者列表）。
+"""
+import heapq
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, Mapping, Optional
+
+from dateutil.relativedelta import relativedelta
+
+from app.models.models import CalendarEvent, CalendarRepeatType
+
+_FIXED_STEPS = {
+    CalendarRepeatType.DAILY: timedelta(days=1),
+    CalendarRepeatType.WEEKLY: timedelta(weeks=1),
+}
+_REPEATING = {*_FIXED_STEPS, CalendarRepeatType.MONTHLY, CalendarRepeatType.YEARLY}
+
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else value
+
+
+def occurrence(start: datetime, repeat_type: CalendarRepeatType, index: int) -> datetime:
+    """第 index 次重复的开始时间（index=0 即原始时间）"""
+    step = _FIXED_STEPS.get(repeat_type)
+    if step is not None:
+        return start + step * index
+    if repeat_type == CalendarRepeatType.MONTHLY:
+        return start + relativedelta(months=index)
+    if repeat_type == CalendarRepeatType.YEARLY:
+        return start + relativedelta(years=index)
+    return start
+
+
+def first_index_from(start: datetime, repeat_type: CalendarRepeatType, moment: datetime) -> int:
+    """第一个不早于 moment 的重复序号"""
+    if moment <= start:
+        return 0
+    step = _FIXED_STEPS.get(repeat_type)
+    if step is not None:
+        return -((start - moment) // step)  # 向上取整
+    if repeat_type == CalendarRepeatType.MONTHLY:
+        index = (moment.year - start.year) * 12 + moment.month - start.month
+    elif repeat_type == CalendarRepeatType.YEARLY:
+        index = moment.year - start.year
+    else:
+        return 1  # 不重复：原始时间已早于 moment
+    # 同月（年）内的那次可能仍早于 moment，最多再前进一次
+    while occurrence(start, repeat_type, index) < moment:
+        index += 1
+    return index
+
+
+def iter_occurrences(
+    start: datetime,
+    repeat_type: CalendarRepeatType,
+    window_start: datetime,
+    window_end: datetime,
+    until: Optional[datetime] = None,
+) -> Iterator[datetime]:
+    """
+    惰性生成落在 [window_start, window_end] 内的重复开始时间
+
+    Args:
+        start: 事件原始开始时间
+        repeat_type: 重复类型
+        window_start: 窗口开始（含）
+        window_end: 窗口结束（含）
+        until: 重复截止时间（含），None 表示不截止
+    """
+    last = window_end if until is None else min(window_end, until)
+    if repeat_type not in _REPEATING:
+        if window_start <= start <= last:
+            yield start
+        return
+
+    index = first_index_from(start, repeat_type, window_start)
+    current = occurrence(start, repeat_type, index)
+    while current <= last:
+        yield current
+        index += 1
+        current = occurrence(start, repeat_type, index)
+
+
+def event_payload(event: CalendarEvent, members_map: Dict[int, dict]) -> Mapping:
+    """事件的基础字段（只读，供该事件的所有实例共享）"""
+    participants = tuple(
+        members_map[p.user_id] for p in event.participants if p.user_id in members_map
+    )
+    return MappingProxyType({
+        "id": event.id,
+        "title": event.title,
+        "description": event.description,
+        "category": _enum_value(event.category),
+        "is_all_day": event.is_all_day,
+        "repeat_type": _enum_value(event.repeat_type),
+        "repeat_until": event.repeat_until,
+        "color": event.color,
+        "location": event.location,
+        "is_system": event.is_system,
+        "source_type": event.source_type,
+        "source_id": event.source_id,
+        "created_by": event.created_by,
+        "created_by_name": members_map.get(event.created_by, {}).get("nickname", "未知"),
+        "created_at": event.created_at,
+        "participants": participants,
+    })
+
+
+def iter_event_instances(
+    event: CalendarEvent,
+    window_start: datetime,
+    window_end: datetime,
+    members_map: Dict[int, dict],
+) -> Iterator[dict]:
+    """惰性生成单个事件在窗口内的实例（重复事件带 is_recurring_instance / original_id）"""
+    if event.repeat_type == CalendarRepeatType.NONE:
+        yield {**event_payload(event, members_map), "start_time": event.start_time, "end_time": event.end_time}
+        return
+
+    base = None
+    duration = event.end_time - event.start_time if event.end_time else None
+    for current in iter_occurrences(
+        event.start_time, event.repeat_type, window_start, window_end, event.repeat_until
+    ):
+        if base is None:
+            base = event_payload(event, members_map)
+        yield {
+            **base,
+            "start_time": current,
+            "end_time": current + duration if duration is not None else None,
+            "is_recurring_instance": True,
+            "original_id": event.id,
+        }
+
+
+def iter_instances(
+    events: Iterable[CalendarEvent],
+    window_start: datetime,
+    window_end: datetime,
+    members_map: Dict[int, dict],
+) -> Iterator[dict]:
+    """
+    按开始时间顺序惰性合并多个事件的实例
+
+    开始时间相同的实例保持 events 中的先后顺序，调用方只取前 N 个时无需展开全部。
+    """
+    return heapq.merge(
+        *(iter_event_instances(event, window_start, window_end, members_map) for event in events),
+        key=lambda instance: instance["start_time"],
+    )
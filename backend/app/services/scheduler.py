@@ -0,0 +1,230 @@
+"""
+小金库 (Golden Nest) - 进程内后台任务调度
+
+按时间驱动的状态变更（提案过期、赌注截止、审批催办、日历系统事件同步等）
+由这里定期执行，读取接口不再顺带写库。
+
+- 持久化状态：每个任务在 scheduled_jobs 中一行，记录下次运行时间与运行统计，进程重启后延续
+- 租约选主：多个 uvicorn worker 同时运行时，通过条件 UPDATE 抢占任务租约，
+  同一任务同一时刻只有一个 worker 执行；持有者崩溃后租约到期由其它 worker 接管
+- 抖动：下次运行时间在间隔上加减随机比例，避免多个任务/多个实例同时触发
+- 运行统计：次数、失败次数、耗时、最近结果写入任务行，同时保留在内存 stats 中
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import update, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+
+class Job(NamedTuple):
+    """定时任务定义"""
+    name: str
+    func: Callable[[AsyncSession], Awaitable[Any]]  # 接收独立会话，返回值（可 JSON 序列化）记为运行结果
+    interval: float                                 # 运行间隔（秒）
+    jitter: float = 0.1                             # 间隔的随机浮动比例
+    timeout: float = 600.0                          # 单次运行超时（秒），同时作为租约时长
+
+
+class JobScheduler:
+    """
+    后台任务调度器
+
+    Args:
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+        tick: 检查到期任务的间隔（秒）
+        worker_id: 租约持有者标识，默认 主机名:进程号:随机串
+    """
+
+    def __init__(self, session_maker=None, tick: float = 15.0, worker_id: Optional[str] = None):
+        self._session_maker = session_maker
+        self.tick = tick
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.jobs: Dict[str, Job] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._running_jobs: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def register(self, name: str, func, interval: float, jitter: float = 0.1, timeout: float = 600.0) -> None:
+        """注册任务（重复注册同名任务会覆盖）"""
+        self.jobs[name] = Job(name, func, interval, jitter, timeout)
+        self.stats.setdefault(name, {"runs": 0, "failures": 0, "last_duration_ms": None})
+
+    def _next_delay(self, job: Job) -> float:
+        return max(1.0, job.interval * (1 + random.uniform(-job.jitter, job.jitter)))
+
+    # ==================== 生命周期 ====================
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    def start(self) -> None:
+        """启动调度协程（需在事件循环中调用，重复调用无副作用）"""
+        if self.running:
+            return
+        if self._session_maker is None:
+            from app.core.database import async_session_maker
+            self._session_maker = async_session_maker
+        self._stopping = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run(), name="job-scheduler")
+        logger.info(f"⏱️ 后台任务调度已启动 ({len(self.jobs)} 个任务, worker={self.worker_id})")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """停止调度：不再领取新任务，等待进行中的任务结束（超时则取消，租约到期后由其它 worker 接管）"""
+        if not self.running:
+            return
+        self._stopping.set()
+        await self._loop_task
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
+            for task in list(self._tasks):
+                task.cancel()
+        self._loop_task = None
+        logger.info(f"⏱️ 后台任务调度已停止: {self.stats}")
+
+    async def _run(self) -> None:
+        try:
+            await self._ensure_rows()
+        except Exception as e:
+            logger.error(f"❌ 初始化任务状态失败: {e}", exc_info=True)
+        while not self._stopping.is_set():
+            try:
+                await self.run_due_jobs()
+            except Exception as e:
+                logger.error(f"❌ 任务调度失败: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.tick * random.uniform(0.8, 1.2))
+            except asyncio.TimeoutError:
+                pass
+
+    # ==================== 调度 ====================
+
+    async def _ensure_rows(self) -> None:
+        """为新注册的任务插入状态行，首次运行时间加随机偏移，避免启动时集中触发"""
+        now = datetime.utcnow()
+        rows = [
+            {"name": job.name, "next_run_at": now + timedelta(seconds=random.uniform(0, min(job.interval, 60)))}
+            for job in self.jobs.values()
+        ]
+        if not rows:
+            return
+        async with self._session_maker() as db:
+            await db.execute(sqlite_insert(ScheduledJob).on_conflict_do_nothing(index_elements=["name"]), rows)
+            await db.commit()
+
+    async def _claim(self, job: Job) -> bool:
+        """抢占任务租约：仅当任务到期且租约空闲/已过期时成功"""
+        now = datetime.utcnow()
+        async with self._session_maker() as db:
+            result = await db.execute(
+                update(ScheduledJob)
+                .where(
+                    ScheduledJob.name == job.name,
+                    ScheduledJob.next_run_at <= now,
+                    or_(ScheduledJob.lease_owner.is_(None), ScheduledJob.lease_expires_at < now),
+                )
+                .values(
+                    lease_owner=self.worker_id,
+                    lease_expires_at=now + timedelta(seconds=job.timeout),
+                    last_started_at=now,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def run_due_jobs(self) -> List[str]:
+        """领取并启动所有到期任务，返回本次启动的任务名"""
+        started = []
+        for job in list(self.jobs.values()):
+            if job.name in self._running_jobs:
+                continue
+            if not await self._claim(job):
+                continue
+            self._running_jobs.add(job.name)
+            task = asyncio.create_task(self._execute(job), name=f"job-{job.name}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started.append(job.name)
+        return started
+
+    async def run_job(self, name: str) -> Any:
+        """立即在当前协程中执行一次任务（不经过租约，供脚本/测试使用）"""
+        job = self.jobs[name]
+        async with self._session_maker() as db:
+            result = await job.func(db)
+            await db.commit()
+        return result
+
+    async def _execute(self, job: Job) -> None:
+        status, error, result = "success", None, None
+        begin = time.perf_counter()
+        try:
+            async with self._session_maker() as db:
+                result = await asyncio.wait_for(job.func(db), timeout=job.timeout)
+                await db.commit()
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"超过 {job.timeout:.0f}s 未完成"
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"
+            logger.error(f"❌ 任务 {job.name} 失败: {e}", exc_info=True)
+        finally:
+            self._running_jobs.discard(job.name)
+        duration_ms = int((time.perf_counter() - begin) * 1000)
+
+        stats = self.stats[job.name]
+        stats["runs"] += 1
+        stats["last_duration_ms"] = duration_ms
+        if status != "success":
+            stats["failures"] += 1
+        elif result and (not isinstance(result, dict) or any(result.values())):
+            logger.info(f"⏱️ 任务 {job.name} 完成 ({duration_ms}ms): {result}")
+
+        try:
+            result_json = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        except (TypeError, ValueError):
+            result_json = None
+        now = datetime.utcnow()
+        try:
+            async with self._session_maker() as db:
+                await db.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.name == job.name, ScheduledJob.lease_owner == self.worker_id)
+                    .values(
+                        next_run_at=now + timedelta(seconds=self._next_delay(job)),
+                        lease_owner=None,
+                        lease_expires_at=None,
+                        last_finished_at=now,
+                        last_status=status,
+                        last_error=error,
+                        last_result=result_json,
+                        last_duration_ms=duration_ms,
+                        total_duration_ms=ScheduledJob.total_duration_ms + duration_ms,
+                        run_count=ScheduledJob.run_count + 1,
+                        failure_count=ScheduledJob.failure_count + (0 if status == "success" else 1),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"❌ 记录任务 {job.name} 运行结果失败: {e}", exc_info=True)
+
+
+# 全局单例（任务在 app.services.jobs 中注册）
+scheduler = JobScheduler()
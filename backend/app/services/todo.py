@@ -0,0 +1,197 @@
+"""
+小金库 (Golden Nest) - 家庭清单计数与统计
+
+- 清单计数：todo_lists.item_count / completed_count 由 Session 的 after_flush 事件
+  在同一事务内按任务的新增/完成/取消完成/删除/移动增量维护，清单列表不再逐个 COUNT
+- 任务统计：/todo/stats 的各项指标合并为一次条件聚合查询，按家庭缓存（内含各成员的个人指标），
+  任务或清单写入提交后由 after_commit 事件清除对应家庭的缓存并递增其代数；查询前记下代数，
+  查询期间有写入提交时结果不写入缓存
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, date
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import select, update, func, case, and_, bindparam, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.models import TodoItem, TodoList
+
+# 统计缓存有效期（秒，多进程部署下的最长不一致时间）
+TODO_STATS_TTL = 60
+# 缓存的家庭数上限，超出时淘汰最早写入的条目
+TODO_STATS_MAX_SIZE = 5000
+
+_SESSION_KEY = "todo_stats_invalidations"
+
+# family_id -> (过期时间, 统计日期, {user_id: 统计})
+_stats_cache: Dict[int, Tuple[float, date, Dict[int, dict]]] = {}
+# family_id -> 缓存代数（清除缓存时递增）；None 键为全部清除的代数
+_stats_generations: Dict[Optional[int], int] = {}
+
+
+def _stats_generation(family_id: int) -> Tuple[int, int]:
+    return _stats_generations.get(None, 0), _stats_generations.get(family_id, 0)
+
+
+def invalidate_todo_stats(family_id: Optional[int] = None) -> None:
+    """清除指定家庭（None 表示全部）的任务统计缓存"""
+    _stats_generations[family_id] = _stats_generations.get(family_id, 0) + 1
+    if family_id is None:
+        _stats_cache.clear()
+    else:
+        _stats_cache.pop(family_id, None)
+
+
+# ==================== 清单计数 ====================
+
+def _item_state(obj: TodoItem, previous: bool) -> Tuple[Optional[int], bool]:
+    """取任务 flush 前（previous=True）或当前的 (list_id, is_completed)，不触发加载"""
+    state = inspect(obj)
+    values = []
+    for key in ("list_id", "is_completed"):
+        history = state.attrs[key].history
+        if previous and history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(state.dict.get(key))
+    return values[0], bool(values[1])
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_todo_list_counters(session: Session, flush_context) -> None:
+    """把本次 flush 的任务变化增量写入清单计数，并记录需要清除统计缓存的家庭"""
+    deltas: Dict[int, list] = defaultdict(lambda: [0, 0])
+    list_ids: Set[int] = set()
+    family_ids: Set[int] = set()
+
+    def collect(before, after) -> None:
+        for (list_id, completed), sign in ((before, -1), (after, 1)):
+            if list_id is None:
+                continue
+            deltas[list_id][0] += sign
+            deltas[list_id][1] += sign * completed
+            list_ids.add(list_id)
+
+    for obj in session.new:
+        if isinstance(obj, TodoItem):
+            collect((None, False), _item_state(obj, previous=False))
+    for obj in session.deleted:
+        if isinstance(obj, TodoItem):
+            collect(_item_state(obj, previous=True), (None, False))
+    for obj in session.dirty:
+        if isinstance(obj, TodoItem) and session.is_modified(obj, include_collections=False):
+            collect(_item_state(obj, previous=True), _item_state(obj, previous=False))
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        if isinstance(obj, TodoList) and obj.family_id is not None:
+            family_ids.add(obj.family_id)
+
+    if not list_ids and not family_ids:
+        return
+
+    conn = session.connection()
+    rows = [
+        {"b_list_id": list_id, "b_items": items, "b_completed": completed}
+        for list_id, (items, completed) in deltas.items()
+        if items or completed
+    ]
+    if rows:
+        table = TodoList.__table__
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_list_id"))
+            .values(
+                item_count=table.c.item_count + bindparam("b_items"),
+                completed_count=table.c.completed_count + bindparam("b_completed"),
+            ),
+            rows,
+        )
+
+    # 会话中已加载的清单同步计数；家庭ID优先从已加载的清单取，其余一次查询
+    unresolved = set()
+    for list_id in list_ids:
+        todo_list = session.identity_map.get(Session.identity_key(TodoList, list_id))
+        if todo_list is None:
+            unresolved.add(list_id)
+            continue
+        family_ids.add(todo_list.family_id)
+        items, completed = deltas[list_id]
+        state = inspect(todo_list)
+        if (items or completed) and not state.deleted and "item_count" in state.dict:
+            set_committed_value(todo_list, "item_count", (todo_list.item_count or 0) + items)
+            set_committed_value(todo_list, "completed_count", (todo_list.completed_count or 0) + completed)
+    if unresolved:
+        family_ids.update(conn.execute(
+            select(TodoList.family_id).where(TodoList.id.in_(unresolved))
+        ).scalars())
+
+    session.info.setdefault(_SESSION_KEY, set()).update(family_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_stats(session: Session) -> None:
+    for family_id in session.info.pop(_SESSION_KEY, ()):
+        invalidate_todo_stats(family_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stats_changes(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+# ==================== 任务统计 ====================
+
+async def get_todo_stats(db: AsyncSession, family_id: int, user_id: int) -> dict:
+    """
+    获取家庭任务统计及当前用户的个人指标（一次条件聚合查询，结果按家庭缓存）
+
+    Returns:
+        total_tasks / completed_tasks / pending_tasks / my_completed / my_pending / due_today / completion_rate
+    """
+    now = time.monotonic()
+    today = datetime.utcnow().replace(hour=23, minute=59, second=59)
+    cached = _stats_cache.get(family_id)
+    if cached and cached[0] > now and cached[1] == today.date() and user_id in cached[2]:
+        return dict(cached[2][user_id])
+
+    # 先取代数再查询：查询期间若有写入提交并清除了缓存，本次结果可能已过时，不写入缓存
+    generation = _stats_generation(family_id)
+    pending = TodoItem.is_completed == False
+    result = await db.execute(
+        select(
+            func.count(TodoItem.id),
+            func.sum(case((TodoItem.is_completed == True, 1), else_=0)),
+            func.sum(case((TodoItem.completed_by == user_id, 1), else_=0)),
+            func.sum(case((and_(pending, TodoItem.assignee_id == user_id), 1), else_=0)),
+            func.sum(case((and_(
+                pending,
+                TodoItem.due_date != None,
+                func.datetime(TodoItem.due_date) <= today,
+            ), 1), else_=0)),
+        )
+        .join(TodoList)
+        .where(TodoList.family_id == family_id)
+    )
+    total, completed, my_completed, my_pending, due_today = (int(v or 0) for v in result.one())
+    stats = {
+        "total_tasks": total,
+        "completed_tasks": completed,
+        "pending_tasks": total - completed,
+        "my_completed": my_completed,
+        "my_pending": my_pending,
+        "due_today": due_today,
+        "completion_rate": round(completed / total * 100, 1) if total > 0 else 0,
+    }
+
+    if _stats_generation(family_id) != generation:
+        return dict(stats)
+    cached = _stats_cache.get(family_id)
+    if not cached or cached[0] <= now or cached[1] != today.date():
+        if family_id not in _stats_cache and len(_stats_cache) >= TODO_STATS_MAX_SIZE:
+            _stats_cache.pop(next(iter(_stats_cache)), None)
+        cached = (now + TODO_STATS_TTL, today.date(), {})
+        _stats_cache[family_id] = cached
+    cached[2][user_id] = stats
+    return dict(stats)
@@ -0,0 +1,106 @@
+"""
+小金库 (Golden Nest) - 延迟批量写入的公共部分
+
+- WriteBehindWorker：内存缓冲 + 后台协程的生命周期（start/stop/合并窗口/失败重试），
+  子类只需实现 flush() 与 _has_pending()；游戏会话存储与 AI 调用遥测共用
+- percentile：耗时等统计的分位数（AI 调度器等待时间、AI 调用遥测耗时）
+"""
+import asyncio
+import logging
+from typing import List, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", int, float)
+
+
+def percentile(values: Sequence[T], q: float) -> T:
+    """取 q 分位数（最近秩，不插值）；空序列返回 0"""
+    if not values:
+        return 0
+    ordered: List[T] = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class WriteBehindWorker:
+    """
+    延迟批量写入的后台协程：被唤醒后等待一个 flush_delay 合并窗口再调用 flush()，
+    写入失败时记录日志并在下一个窗口重试；stop 时写完剩余数据
+
+    子类需设置 _task_name / _label，并实现 flush() 与 _has_pending()
+
+    Args:
+        session_maker: 会话工厂，默认使用 app.core.database.async_session_maker
+        flush_delay: 合并窗口（秒）
+    """
+
+    _task_name = "write-behind-flusher"
+    _label = "延迟写入"
+
+    def __init__(self, session_maker=None, flush_delay: float = 2.0):
+        self._session_maker = session_maker
+        self.flush_delay = flush_delay
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _maker(self):
+        if self._session_maker is None:
+            from app.core.database import async_session_maker
+            self._session_maker = async_session_maker
+        return self._session_maker
+
+    def _has_pending(self) -> bool:
+        raise NotImplementedError
+
+    async def flush(self) -> int:
+        raise NotImplementedError
+
+    def _wake(self) -> None:
+        """有新数据待写入时唤醒后台协程（未启动时留待 start 或下次 flush）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ==================== 生命周期 ====================
+
+    @property
+    def running(self) -> bool:
+        return self._flusher is not None and not self._flusher.done()
+
+    def start(self) -> None:
+        """启动后台写入协程（需在事件循环中调用，重复调用无副作用）"""
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        if self._has_pending():
+            self._wakeup.set()
+        self._flusher = asyncio.create_task(self._run(), name=self._task_name)
+
+    async def stop(self) -> None:
+        """停止后台协程并写入剩余数据"""
+        if self.running:
+            self._stopping = True
+            self._wakeup.set()
+            await self._flusher
+        self._flusher = None
+        self._wakeup = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"❌ {self._label}写入失败: {e}", exc_info=True)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            await self._wakeup.wait()
+            if self._stopping:
+                break
+            # 合并窗口：窗口内的多次修改只写入一次
+            await asyncio.sleep(self.flush_delay)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ {self._label}写入失败，稍后重试: {e}", exc_info=True)
+                self._wakeup.set()
+                await asyncio.sleep(self.flush_delay)
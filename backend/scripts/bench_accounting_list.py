@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 记账列表分页基准测试
+
+在临时 SQLite 库中为一个家庭写入大量记账条目（默认 10 万条，部分带照片数据），
+分别测量页码分页（OFFSET）与游标分页在不同深度的响应时间。
+
+用法：
+    cd backend
+    python -m scripts.bench_accounting_list                    # 10 万条
+    python -m scripts.bench_accounting_list --entries 20000    # 指定条目数
+    python -m scripts.bench_accounting_list --db /tmp/bench.db # 复用已生成的库
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import Base
+from app.models.models import (
+    User, Family, FamilyMember, AccountingEntry, AccountingCategory, AccountingEntrySource,
+)
+from app.services.accounting_list import list_accounting_entries
+
+FAMILY_ID = 1
+PAGE_SIZE = 20
+# 模拟照片 Base64 数据（约 60KB）
+FAKE_IMAGE = "data:image/jpeg;base64," + "A" * 60_000
+
+
+async def seed(maker, entries: int) -> None:
+    """写入测试数据：1 个家庭、4 个成员、entries 条记账条目（5% 带照片）"""
+    rng = random.Random(42)
+    categories = list(AccountingCategory)
+    start = datetime(2020, 1, 1)
+    async with maker() as db:
+        db.add(Family(id=FAMILY_ID, name="基准家庭", invite_code="BENCH1"))
+        for uid in range(1, 5):
+            db.add(User(id=uid, username=f"bench{uid}", email=f"bench{uid}@example.com",
+                        hashed_password="x", nickname=f"成员{uid}"))
+        await db.flush()
+        for uid in range(1, 5):
+            db.add(FamilyMember(user_id=uid, family_id=FAMILY_ID, role="member"))
+        await db.commit()
+
+        batch = []
+        for i in range(entries):
+            entry_date = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 6))
+            batch.append({
+                "family_id": FAMILY_ID,
+                "user_id": rng.randint(1, 4),
+                "consumer_id": rng.choice([None, 1, 2, 3, 4]),
+                "amount": round(rng.uniform(1, 2000), 2),
+                "category": rng.choice(categories),
+                "description": f"消费记录 {i}",
+                "entry_date": entry_date,
+                "source": AccountingEntrySource.MANUAL,
+                "image_data": FAKE_IMAGE if rng.random() < 0.05 else None,
+                "is_accounted": False,
+                "created_at": entry_date + timedelta(seconds=rng.randint(0, 3600)),
+            })
+            if len(batch) == 5000:
+                await db.execute(insert(AccountingEntry), batch)
+                batch = []
+        if batch:
+            await db.execute(insert(AccountingEntry), batch)
+        await db.commit()
+
+
+async def timed(coro_factory, repeat: int = 5) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - begin) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+async def run(entries: int, db_path: str) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with maker() as db:
+        existing = (await db.execute(select(func.count(AccountingEntry.id)))).scalar()
+    if not existing:
+        begin = time.perf_counter()
+        await seed(maker, entries)
+        print(f"写入 {entries} 条记账条目: {time.perf_counter() - begin:.1f}s")
+        existing = entries
+
+    conditions = [AccountingEntry.family_id == FAMILY_ID]
+    total_pages = existing // PAGE_SIZE
+
+    async with maker() as db:
+        # 先沿游标走到各个深度，记录该页的游标
+        depths = sorted({1, 10, 100, total_pages // 2, total_pages - 1} - {0})
+        cursors = {1: None}
+        cursor, page = None, 1
+        wanted = set(depths)
+        while page < max(depths):
+            result = await list_accounting_entries(db, conditions, PAGE_SIZE, cursor=cursor, with_total=False)
+            cursor, page = result["next_cursor"], page + 1
+            if page in wanted:
+                cursors[page] = cursor
+
+        print(f"\n{'页码':>8} {'OFFSET(ms)':>12} {'游标(ms)':>10}")
+        for depth in depths:
+            offset_ms = await timed(lambda: list_accounting_entries(
+                db, conditions, PAGE_SIZE, page=depth, with_total=False))
+            cursor_ms = await timed(lambda: list_accounting_entries(
+                db, conditions, PAGE_SIZE, cursor=cursors[depth], with_total=False))
+            print(f"{depth:>8} {offset_ms:>12.2f} {cursor_ms:>10.2f}")
+
+        total_ms = await timed(lambda: list_accounting_entries(db, conditions, PAGE_SIZE))
+        print(f"\n首页（含总数统计）: {total_ms:.2f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="记账列表分页基准测试")
+    parser.add_argument("--entries", type=int, default=100_000, help="写入的记账条目数")
+    parser.add_argument("--db", default=None, help="SQLite 文件路径（默认使用临时文件）")
+    args = parser.parse_args()
+
+    print("=== 记账列表分页基准 ===\n")
+    if args.db:
+        asyncio.run(run(args.entries, args.db))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(run(args.entries, os.path.join(tmp, "bench.db")))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 探险背包属性计算基准测试
+
+构造深层无尽模式的探险会话（满级 8×9 背包、塞满套装散件/附魔物品），按接口的调用方式
+（process_adventure_action + sanitize_adventure_state）连续执行战斗/下一层/整理背包等操作，
+对比两种模式每秒可处理的操作数：
+- 缓存：背包派生数据（套装、属性、连锁、被动、占用位图）只在背包变化时重算
+- 逐回合重算：每次操作前清空派生缓存（等同于每个回合从头计算）
+
+两种模式使用相同随机种子，结束后校验会话状态一致，并校验缓存结果与重新计算的结果一致。
+
+用法：
+    cd backend
+    python -m scripts.bench_adventure_backpack                     # 默认 2000 次操作，从第 200 层开始
+    python -m scripts.bench_adventure_backpack --actions 5000 --floor 500
+"""
+import argparse
+import copy
+import random
+import sys
+import os
+import time
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.games import adventure
+from app.games.adventure import (
+    BACKPACK_ITEMS, ITEM_SETS,
+    create_adventure_session, process_adventure_action, sanitize_adventure_state,
+    _bp_auto_place, _bp_expand, _bp_touch, _bp_enchant,
+    _bp_compute_set_info, _bp_calc_stats, _bp_calc_chain_bonus, _bp_get_passives,
+    _bp_build_set_info, _bp_build_stats, _bp_build_chain_bonus,
+)
+
+
+def build_session(seed: int, floor: int) -> dict:
+    """深层无尽模式会话：背包扩展到满级并塞满物品"""
+    rng = random.Random(seed)
+    random.seed(seed)
+    session = create_adventure_session(pet_level=50, difficulty="endless")
+    session["floor"] = floor
+    session["floors_cleared"] = floor - 1
+    # 足够的生命值保证不会阵亡，专注于测量属性计算开销
+    session["base_max_hp"] = session["max_hp"] = session["hp"] = 10 ** 9
+    bp = session["backpack"]
+    while _bp_expand(bp):
+        pass
+    # 优先放入套装散件（不凑满7件，避免自动合体），再用其它物品填满
+    pieces = []
+    for sdef in ITEM_SETS.values():
+        pieces += sorted(sdef["items"])[:5 if sdef.get("major") else 2]
+    others = sorted(iid for iid, d in BACKPACK_ITEMS.items()
+                    if d.get("type") not in ("set_merged", "ultimate") and not d.get("consumable"))
+    for iid in pieces + [rng.choice(others) for _ in range(60)]:
+        if iid in BACKPACK_ITEMS:
+            _bp_auto_place(bp, iid)
+    for it in bp["items"][::3]:
+        _bp_enchant(bp, it, {"name": "锋利", "icon": "⚔️", "stat": "atk", "value": rng.randint(2, 5)})
+    return session
+
+
+def next_action(session: dict, rng: random.Random) -> dict:
+    """模拟玩家操作：大部分为战斗/下一层，少量整理背包"""
+    bp = session["backpack"]
+    if rng.random() < 0.05 and bp["items"]:
+        it = rng.choice(bp["items"])
+        return {"action": "move_item", "item_uid": it["uid"],
+                "row": rng.randrange(bp["rows"]), "col": rng.randrange(bp["cols"])}
+    if session.get("encounter_resolved"):
+        return {"action": "next_floor"}
+    if session["encounter"]["type"] in ("monster", "boss"):
+        return {"action": "fight"}
+    # 非战斗遭遇（商店/宝箱/陷阱/祝福）直接跳过
+    session["encounter_resolved"] = True
+    return {"action": "next_floor"}
+
+
+def play(session: dict, actions: int, seed: int, recompute: bool) -> float:
+    """执行 actions 次操作，返回每秒操作数"""
+    rng = random.Random(seed)
+    random.seed(seed)
+    begin = time.perf_counter()
+    for _ in range(actions):
+        session["hp"] = session["max_hp"]
+        if recompute:
+            _bp_touch(session["backpack"])
+        process_adventure_action(session, next_action(session, rng))
+        sanitize_adventure_state(session)
+        session["log"] = session["log"][-10:]
+    return actions / (time.perf_counter() - begin)
+
+
+def normalize(session: dict) -> dict:
+    """_prev_active_major 由集合转换而来，比较时忽略顺序"""
+    bp = dict(session["backpack"])
+    bp["_prev_active_major"] = sorted(bp.get("_prev_active_major", []))
+    return {**session, "backpack": bp}
+
+
+def check_cache(bp: dict) -> bool:
+    """缓存中的派生数据与从头计算的结果一致"""
+    set_info = _bp_compute_set_info(bp)
+    fresh = copy.deepcopy(bp)
+    return (
+        set_info == _bp_build_set_info(fresh)
+        and _bp_calc_stats(bp) == _bp_build_stats(fresh)
+        and _bp_calc_stats(bp, exclude_no_scaling=True) == _bp_build_stats(fresh, exclude_no_scaling=True)
+        and _bp_calc_chain_bonus(bp) == _bp_build_chain_bonus(fresh)
+        and _bp_get_passives(bp) == _bp_get_passives(fresh)
+    )
+
+
+def run(actions: int, floor: int, seed: int) -> bool:
+    template = build_session(seed, floor)
+    bp = template["backpack"]
+    print(f"背包 {bp['rows']}×{bp['cols']}，物品 {len(bp['items'])} 件，起始第 {floor} 层，操作 {actions} 次")
+
+    cached = copy.deepcopy(template)
+    recomputed = copy.deepcopy(template)
+    cached_rate = play(cached, actions, seed, recompute=False)
+    recomputed_rate = play(recomputed, actions, seed, recompute=True)
+
+    consistent = normalize(cached) == normalize(recomputed) and check_cache(cached["backpack"])
+    print(f"结束于第 {cached['floor']} 层，结果一致: {'是' if consistent else '否'}")
+    print(f"派生缓存条目: {len(adventure._bp_derived_cache)}")
+    print(f"\n{'模式':<12} {'操作/秒':>10}")
+    print(f"{'逐回合重算':<12} {recomputed_rate:>10.0f}")
+    print(f"{'缓存':<12} {cached_rate:>10.0f}   ({cached_rate / recomputed_rate:.1f}x)")
+    return consistent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="探险背包属性计算基准测试")
+    parser.add_argument("--actions", type=int, default=2000, help="操作次数")
+    parser.add_argument("--floor", type=int, default=200, help="起始楼层（无尽模式）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    print("=== 探险背包属性计算基准测试 ===")
+    ok = run(args.actions, args.floor, args.seed)
+    if not ok:
+        print("\n❌ 缓存结果与重新计算结果不一致")
+        sys.exit(1)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 日历重复事件展开基准测试
+
+构造一批数年前创建的重复事件（每天/每周/每月/每年），对比旧的逐次累加展开
+与 app.services.recurrence 的算术定位展开在月视图、即将到来（前 N 条）两种场景下的耗时，
+并校验两者输出一致（每月/每年事件使用 28 日以内的日期，旧实现在月末会逐月漂移）。
+
+用法：
+    cd backend
+    python -m scripts.bench_calendar_recurrence                 # 默认 200 个事件，起始于 3 年前
+    python -m scripts.bench_calendar_recurrence --events 1000 --years 10
+"""
+import argparse
+import random
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dateutil.relativedelta import relativedelta
+
+from app.models.models import (
+    CalendarEvent, CalendarEventParticipant, CalendarEventCategory, CalendarRepeatType,
+)
+from app.services.recurrence import iter_instances
+
+NOW = datetime(2025, 6, 15, 9, 0)
+REPEAT_TYPES = [
+    CalendarRepeatType.DAILY, CalendarRepeatType.WEEKLY,
+    CalendarRepeatType.MONTHLY, CalendarRepeatType.YEARLY,
+]
+
+
+def legacy_expand(events, start_date, end_date, members_map):
+    """旧实现：每个事件从原始开始时间逐次累加到窗口（仅用于对比）"""
+    expanded = []
+    for event in events:
+        participants = [members_map[p.user_id] for p in event.participants if p.user_id in members_map]
+        base_event = {
+            "id": event.id,
+            "title": event.title,
+            "description": event.description,
+            "category": event.category.value,
+            "is_all_day": event.is_all_day,
+            "repeat_type": event.repeat_type.value,
+            "repeat_until": event.repeat_until,
+            "color": event.color,
+            "location": event.location,
+            "is_system": event.is_system,
+            "source_type": event.source_type,
+            "source_id": event.source_id,
+            "created_by": event.created_by,
+            "created_by_name": members_map.get(event.created_by, {}).get("nickname", "未知"),
+            "created_at": event.created_at,
+            "participants": participants,
+        }
+        current_start = event.start_time
+        event_duration = (event.end_time - event.start_time) if event.end_time else timedelta(hours=1)
+        repeat_end = event.repeat_until or end_date
+        while current_start <= end_date and current_start <= repeat_end:
+            if current_start >= start_date:
+                instance = base_event.copy()
+                instance["start_time"] = current_start
+                instance["end_time"] = current_start + event_duration if event.end_time else None
+                instance["is_recurring_instance"] = True
+                instance["original_id"] = event.id
+                expanded.append(instance)
+            if event.repeat_type == CalendarRepeatType.DAILY:
+                current_start += timedelta(days=1)
+            elif event.repeat_type == CalendarRepeatType.WEEKLY:
+                current_start += timedelta(weeks=1)
+            elif event.repeat_type == CalendarRepeatType.MONTHLY:
+                current_start += relativedelta(months=1)
+            else:
+                current_start += relativedelta(years=1)
+    expanded.sort(key=lambda x: x["start_time"])
+    return expanded
+
+
+def build_events(count: int, years: int):
+    """构造内存中的重复事件（不写数据库）"""
+    rng = random.Random(42)
+    members_map = {uid: {"id": uid, "nickname": f"成员{uid}", "avatar_version": 0} for uid in range(1, 5)}
+    events = []
+    for i in range(count):
+        start = NOW - timedelta(days=rng.randint(years * 300, years * 365))
+        start = start.replace(day=min(start.day, 28), hour=rng.randint(6, 21), minute=0)
+        event = CalendarEvent(
+            id=i + 1, family_id=1, title=f"事件{i}", description=None,
+            category=CalendarEventCategory.FAMILY, start_time=start,
+            end_time=start + timedelta(hours=1) if i % 2 else None,
+            is_all_day=False, repeat_type=REPEAT_TYPES[i % len(REPEAT_TYPES)], repeat_until=None,
+            color="#667eea", location=None, is_system=False, source_type=None, source_id=None,
+            created_by=rng.randint(1, 4), created_at=start,
+        )
+        event.participants = [
+            CalendarEventParticipant(event_id=i + 1, user_id=uid) for uid in rng.sample(range(1, 5), 2)
+        ]
+        events.append(event)
+    return events, members_map
+
+
+def timed(fn, repeat: int) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - begin) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def normalize(instances):
+    return [{**instance, "participants": list(instance["participants"])} for instance in instances]
+
+
+def run(count: int, years: int, repeat: int) -> bool:
+    events, members_map = build_events(count, years)
+    month_start, month_end = datetime(2025, 6, 1), datetime(2025, 6, 30, 23, 59, 59)
+    upcoming_end = NOW + timedelta(days=7)
+
+    old = legacy_expand(events, month_start, month_end, members_map)
+    new = list(iter_instances(events, month_start, month_end, members_map))
+    consistent = normalize(new) == old
+    print(f"事件数: {count}，起始于 {years} 年前；月视图实例数: {len(new)}，结果一致: {'是' if consistent else '否'}")
+
+    scenarios = [
+        ("月视图", lambda: legacy_expand(events, month_start, month_end, members_map),
+         lambda: list(iter_instances(events, month_start, month_end, members_map))),
+        ("即将到来 前10条", lambda: legacy_expand(events, NOW, upcoming_end, members_map)[:10],
+         lambda: list(islice(iter_instances(events, NOW, upcoming_end, members_map), 10))),
+    ]
+    print(f"\n{'场景':<16} {'旧实现(ms)':>12} {'新实现(ms)':>12} {'加速':>8}")
+    for name, old_fn, new_fn in scenarios:
+        old_ms = timed(old_fn, repeat)
+        new_ms = timed(new_fn, repeat)
+        print(f"{name:<16} {old_ms:>12.2f} {new_ms:>12.2f} {old_ms / new_ms:>7.1f}x")
+    return consistent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="日历重复事件展开基准测试")
+    parser.add_argument("--events", type=int, default=200, help="重复事件数")
+    parser.add_argument("--years", type=int, default=3, help="事件大约创建于几年前")
+    parser.add_argument("--repeat", type=int, default=7, help="每个场景重复次数（取中位数）")
+    args = parser.parse_args()
+
+    print("=== 日历重复事件展开基准 ===\n")
+    ok = run(args.events, args.years, args.repeat)
+    sys.exit(0 if ok else 1)
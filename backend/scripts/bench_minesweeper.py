@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 扫雷会话存储基准测试
+
+在地狱难度（16×16）棋盘上按相同种子、相同点击顺序（只点安全格，直到胜利）对比：
+- 旧实现：棋盘/翻开/旗帜/问号为嵌套列表，按 session[...][r][c] 访问
+- 新实现：app.games.minesweeper 的字节数组 + 位集，会话中以 base64 紧凑编码
+
+分别统计会话序列化后的大小，以及每次点击（处理操作 + 脱敏 + 序列化响应与会话）的耗时，
+并校验两者返回给前端的状态一致。
+
+用法：
+    cd backend
+    python -m scripts.bench_minesweeper                 # 默认 20 局
+    python -m scripts.bench_minesweeper --games 100 --difficulty hard
+"""
+import argparse
+import base64
+import json
+import random
+import sys
+import os
+import time
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.games.minesweeper import (
+    MINESWEEPER_DIFFICULTIES, _MINE,
+    create_minesweeper_session, process_minesweeper_action, sanitize_minesweeper_state,
+)
+
+
+# ==================== 旧实现（仅用于对比） ====================
+
+def legacy_create(difficulty: str) -> dict:
+    cfg = MINESWEEPER_DIFFICULTIES[difficulty]
+    rows, cols = cfg["rows"], cfg["cols"]
+    return {
+        "difficulty": difficulty, "rows": rows, "cols": cols, "mine_count": cfg["mines"],
+        "board": [[0] * cols for _ in range(rows)],
+        "revealed": [[False] * cols for _ in range(rows)],
+        "flagged": [[False] * cols for _ in range(rows)],
+        "questioned": [[False] * cols for _ in range(rows)],
+        "first_click": True, "completed": False, "won": False,
+        "cells_revealed": 0, "total_safe": rows * cols - cfg["mines"], "exp_earned": 0,
+    }
+
+
+def legacy_place_mines(session: dict, safe_row: int, safe_col: int):
+    rows, cols = session["rows"], session["cols"]
+    safe_cells = {(safe_row + dr, safe_col + dc) for dr in range(-1, 2) for dc in range(-1, 2)}
+    candidates = [(r, c) for r in range(rows) for c in range(cols) if (r, c) not in safe_cells]
+    mines = random.sample(candidates, session["mine_count"])
+    board = [[0] * cols for _ in range(rows)]
+    for mr, mc in mines:
+        board[mr][mc] = -1
+    for r in range(rows):
+        for c in range(cols):
+            if board[r][c] == -1:
+                continue
+            board[r][c] = sum(
+                1 for dr in range(-1, 2) for dc in range(-1, 2)
+                if (dr or dc) and 0 <= r + dr < rows and 0 <= c + dc < cols and board[r + dr][c + dc] == -1
+            )
+    session["board"] = board
+
+
+def legacy_flood_fill(session: dict, row: int, col: int):
+    rows, cols = session["rows"], session["cols"]
+    stack = [(row, col)]
+    while stack:
+        r, c = stack.pop()
+        if session["revealed"][r][c]:
+            continue
+        session["revealed"][r][c] = True
+        session["cells_revealed"] += 1
+        if session.get("questioned") and session["questioned"][r][c]:
+            session["questioned"][r][c] = False
+        if session["board"][r][c] == 0:
+            for dr in range(-1, 2):
+                for dc in range(-1, 2):
+                    if dr == 0 and dc == 0:
+                        continue
+                    nr, nc = r + dr, c + dc
+                    if 0 <= nr < rows and 0 <= nc < cols and not session["revealed"][nr][nc]:
+                        if not session["flagged"][nr][nc]:
+                            stack.append((nr, nc))
+
+
+def legacy_reveal(session: dict, row: int, col: int):
+    if session["first_click"]:
+        legacy_place_mines(session, row, col)
+        session["first_click"] = False
+    legacy_flood_fill(session, row, col)
+    if session["cells_revealed"] >= session["total_safe"]:
+        session["completed"] = True
+        session["won"] = True
+        session["exp_earned"] = MINESWEEPER_DIFFICULTIES[session["difficulty"]]["exp"]
+
+
+def legacy_sanitize(session: dict) -> dict:
+    rows, cols = session["rows"], session["cols"]
+    completed = session["completed"]
+    return {
+        "difficulty": session["difficulty"], "rows": rows, "cols": cols, "mine_count": session["mine_count"],
+        "board": [[session["board"][r][c] if session["revealed"][r][c] or completed else None
+                   for c in range(cols)] for r in range(rows)],
+        "revealed": session["revealed"], "flagged": session["flagged"], "questioned": session["questioned"],
+        "first_click": session["first_click"], "completed": completed, "won": session["won"],
+        "cells_revealed": session["cells_revealed"], "total_safe": session["total_safe"],
+        "exp_earned": session["exp_earned"] if completed else 0,
+    }
+
+
+# ==================== 基准 ====================
+
+def play(seed: int, difficulty: str, legacy: bool):
+    """按种子对局：先点中心，再按随机顺序点击未翻开的安全格直到胜利；返回 (每次点击耗时, 会话大小, 前端状态)"""
+    cfg = MINESWEEPER_DIFFICULTIES[difficulty]
+    rng = random.Random(seed)
+    random.seed(seed)
+    session = legacy_create(difficulty) if legacy else create_minesweeper_session(difficulty)
+    order = [(r, c) for r in range(cfg["rows"]) for c in range(cfg["cols"])]
+    rng.shuffle(order)
+    click = (cfg["rows"] // 2, cfg["cols"] // 2)
+    timings, sizes, states = [], [], []
+    while True:
+        t0 = time.perf_counter()
+        if legacy:
+            legacy_reveal(session, *click)
+        else:
+            process_minesweeper_action(session, {"action": "reveal", "row": click[0], "col": click[1]})
+        t1 = time.perf_counter()
+        state = legacy_sanitize(session) if legacy else sanitize_minesweeper_state(session)
+        response = json.dumps(state)
+        t2 = time.perf_counter()
+        payload = json.dumps(session, separators=(",", ":"))
+        t3 = time.perf_counter()
+        timings.append((t1 - t0, t2 - t1, t3 - t2))
+        sizes.append(len(payload))
+        states.append(response)
+        if session["completed"]:
+            return timings, sizes, states
+        # 下一次点击：随机一个未翻开的安全格
+        while True:
+            r, c = order.pop()
+            if not state["revealed"][r][c] and not _is_mine(session, r, c, legacy):
+                click = (r, c)
+                break
+
+
+def _is_mine(session: dict, r: int, c: int, legacy: bool) -> bool:
+    if legacy:
+        return session["board"][r][c] == -1
+    return base64.b64decode(session["board"])[r * session["cols"] + c] == _MINE
+
+
+def run(games: int, difficulty: str) -> bool:
+    old_t, new_t, old_s, new_s = [], [], [], []
+    consistent = True
+    for seed in range(games):
+        t1, s1, st1 = play(seed, difficulty, legacy=True)
+        t2, s2, st2 = play(seed, difficulty, legacy=False)
+        consistent &= st1 == st2
+        old_t += t1
+        new_t += t2
+        old_s += s1
+        new_s += s2
+    cfg = MINESWEEPER_DIFFICULTIES[difficulty]
+    print(f"难度: {cfg['label']} ({cfg['rows']}×{cfg['cols']}, {cfg['mines']} 雷)，{games} 局，共 {len(new_t)} 次点击")
+    print(f"前端状态一致: {'是' if consistent else '否'}")
+    print(f"\n{'指标':<20} {'旧实现':>10} {'新实现':>10} {'比例':>8}")
+    old_avg, new_avg = sum(old_s) / len(old_s), sum(new_s) / len(new_s)
+    print(f"{'会话大小(字节)':<20} {old_avg:>10.0f} {new_avg:>10.0f} {new_avg / old_avg:>7.0%}")
+    for i, label in enumerate(("处理操作(μs)", "脱敏+响应(μs)", "序列化会话(μs)")):
+        old_us = sum(t[i] for t in old_t) / len(old_t) * 1e6
+        new_us = sum(t[i] for t in new_t) / len(new_t) * 1e6
+        print(f"{label:<20} {old_us:>10.1f} {new_us:>10.1f} {new_us / old_us:>7.0%}")
+    old_us, new_us = sum(map(sum, old_t)) / len(old_t) * 1e6, sum(map(sum, new_t)) / len(new_t) * 1e6
+    print(f"{'每次点击合计(μs)':<20} {old_us:>10.1f} {new_us:>10.1f} {new_us / old_us:>7.0%}")
+    return consistent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="扫雷会话存储基准测试")
+    parser.add_argument("--games", type=int, default=20, help="对局数")
+    parser.add_argument("--difficulty", choices=list(MINESWEEPER_DIFFICULTIES), default="expert", help="难度")
+    args = parser.parse_args()
+
+    print("=== 扫雷会话存储基准 ===\n")
+    ok = run(args.games, args.difficulty)
+    sys.exit(0 if ok else 1)
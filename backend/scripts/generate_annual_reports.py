@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 年度报告批量预生成脚本
+
+年末为所有家庭生成指定年份的年度报告并写入 annual_reports，
+之后的查看请求直接读取缓存。已缓存且未失效的报告会被跳过。
+
+用法：
+    cd backend
+    python -m scripts.generate_annual_reports                   # 生成上一年度报告
+    python -m scripts.generate_annual_reports --year 2025       # 指定年份
+    python -m scripts.generate_annual_reports --concurrency 8   # 同时生成的家庭数
+    python -m scripts.generate_annual_reports --force           # 忽略缓存全部重新生成
+"""
+import argparse
+import asyncio
+import sys
+import os
+from datetime import datetime
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import init_db
+from app.services.annual_report import pregenerate_annual_reports
+
+
+async def run(year: int, concurrency: int, force: bool) -> int:
+    """预生成报告，返回失败的家庭数"""
+    await init_db()
+    stats = await pregenerate_annual_reports(year, concurrency=concurrency, force=force)
+    print(
+        f"\n完成: 共 {stats['families']} 个家庭, 新生成 {stats['generated']}, "
+        f"已缓存 {stats['cached']}, 失败 {stats['failed']}"
+    )
+    return stats["failed"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="年度报告批量预生成")
+    parser.add_argument("--year", type=int, default=datetime.now().year - 1, help="报告年份（默认上一年）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时生成的最大家庭数")
+    parser.add_argument("--force", action="store_true", help="忽略缓存强制重新生成")
+    args = parser.parse_args()
+
+    print(f"=== {args.year} 年度报告预生成 ===\n")
+    failed = asyncio.run(run(args.year, args.concurrency, args.force))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - Base64 图片迁移到内容寻址存储
+
+将数据库中以 Base64 data URI 保存的图片（用户头像、记账凭证、公告图片）
+写入 uploads/blobs，并把列值替换为 /uploads/blobs/... URL。
+
+按主键分批读取（每批只加载 --batch-size 行），每批单独提交，
+可随时中断后重新执行；已迁移的行不会被再次处理。
+
+用法：
+    cd backend
+    python -m scripts.migrate_images_to_blobs                 # 迁移全部
+    python -m scripts.migrate_images_to_blobs --dry-run       # 仅统计待迁移数据
+    python -m scripts.migrate_images_to_blobs --batch-size 50 # 每批行数
+    python -m scripts.migrate_images_to_blobs --vacuum        # 迁移后 VACUUM 回收空间
+"""
+import argparse
+import asyncio
+import json
+import sys
+import os
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update, and_, bindparam
+
+from app.core.database import init_db, async_session_maker, engine
+from app.models.models import User, AccountingEntry, Announcement
+from app.services.blob_store import is_data_uri, store_data_uri
+
+
+def _inline_image(column):
+    """列值仍是内联图片（data URI 或无前缀的纯 Base64），而不是 URL/路径"""
+    return and_(
+        column.isnot(None),
+        column != "",
+        ~column.like("/%"),
+        ~column.like("http%"),
+    )
+
+
+# (名称, 主键列, 图片列, 是否为 JSON 数组)
+TARGETS = [
+    ("users.avatar", User.id, User.avatar, False),
+    ("accounting_entries.image_data", AccountingEntry.id, AccountingEntry.image_data, False),
+    ("announcements.images", Announcement.id, Announcement.images, True),
+]
+
+
+def _convert(value: str, is_json: bool):
+    """返回 (新值, 转存的图片数)；无需转换时新值为 None"""
+    if not is_json:
+        return store_data_uri(value), 1
+    images = json.loads(value)
+    if not isinstance(images, list) or not any(is_data_uri(img) for img in images):
+        return None, 0
+    converted = [store_data_uri(img) if is_data_uri(img) else img for img in images]
+    return json.dumps(converted, ensure_ascii=False), sum(is_data_uri(img) for img in images)
+
+
+async def migrate_column(name, pk, column, is_json: bool, batch_size: int, dry_run: bool) -> dict:
+    """分批迁移一列，返回统计"""
+    condition = column.like("%data:%") if is_json else _inline_image(column)
+    stats = {"rows": 0, "images": 0, "bytes": 0, "failed": 0}
+    table = pk.class_.__table__
+    stmt = (
+        update(table)
+        .where(table.c[pk.key] == bindparam("row_id"))
+        .values({column.key: bindparam("new_value")})
+    )
+
+    last_id = 0
+    while True:
+        async with async_session_maker() as db:
+            rows = (await db.execute(
+                select(pk, column)
+                .where(condition, pk > last_id)
+                .order_by(pk)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for row_id, value in rows:
+                stats["bytes"] += len(value)
+                if dry_run:
+                    stats["rows"] += 1
+                    continue
+                try:
+                    new_value, count = _convert(value, is_json)
+                except (ValueError, TypeError) as e:
+                    stats["failed"] += 1
+                    print(f"  ⚠️  {name} #{row_id}: 无法解析，已跳过 ({e})")
+                    continue
+                if new_value is not None:
+                    updates.append({"row_id": row_id, "new_value": new_value})
+                    stats["rows"] += 1
+                    stats["images"] += count
+
+            if updates:
+                await (await db.connection()).execute(stmt, updates)
+                await db.commit()
+        print(f"  …  {name}: 已处理至 #{last_id}（{stats['rows']} 行）")
+
+    return stats
+
+
+async def run(batch_size: int, dry_run: bool, vacuum: bool) -> int:
+    """执行迁移，返回失败行数"""
+    await init_db()
+
+    failed = 0
+    for name, pk, column, is_json in TARGETS:
+        stats = await migrate_column(name, pk, column, is_json, batch_size, dry_run)
+        failed += stats["failed"]
+        action = "待迁移" if dry_run else "已迁移"
+        print(
+            f"  ✅  {name}: {action} {stats['rows']} 行, {stats['images']} 张图片, "
+            f"{stats['bytes'] / 1024 / 1024:.1f} MB, 失败 {stats['failed']}"
+        )
+
+    if vacuum and not dry_run:
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            await conn.exec_driver_sql("VACUUM")
+        print("  🧹  VACUUM 完成")
+
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Base64 图片迁移到内容寻址存储")
+    parser.add_argument("--dry-run", action="store_true", help="仅统计，不写入")
+    parser.add_argument("--batch-size", type=int, default=20, help="每批处理的行数")
+    parser.add_argument("--vacuum", action="store_true", help="迁移后 VACUUM 回收数据库空间")
+    args = parser.parse_args()
+
+    print("=== 图片迁移到文件存储 ===\n")
+    failed = asyncio.run(run(args.batch_size, args.dry_run, args.vacuum))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 成就计数器回填/校验脚本
+
+从历史记录（存款、支出、审核、投票、赠送、待办、日历、已解锁成就）
+重新计算每个用户的成就计数器，并报告计数器与历史记录之间的漂移。
+
+用法：
+    cd backend
+    python -m scripts.rebuild_achievement_counters              # 校验全部用户，有漂移或未回填时重建
+    python -m scripts.rebuild_achievement_counters --verify     # 仅校验并报告漂移，不写入
+    python -m scripts.rebuild_achievement_counters --force      # 无论是否漂移均全量重建
+    python -m scripts.rebuild_achievement_counters --user 3     # 仅处理指定用户
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from app.core.database import init_db, async_session_maker
+from app.models.models import User
+from app.services.achievement_counters import verify_user_counters, rebuild_user_counters
+
+
+async def run(verify_only: bool, force: bool, user_id: int = None) -> int:
+    """校验/重建成就计数器，返回存在漂移的用户数"""
+    await init_db()
+
+    async with async_session_maker() as db:
+        query = select(User.id).order_by(User.id)
+        if user_id is not None:
+            query = query.where(User.id == user_id)
+        user_ids = (await db.execute(query)).scalars().all()
+
+    drifted = 0
+    for uid in user_ids:
+        async with async_session_maker() as db:
+            drifts = await verify_user_counters(db, uid)
+            if drifts:
+                drifted += 1
+                print(f"  ⚠️  用户 {uid}: {len(drifts)} 处漂移")
+                for d in drifts:
+                    print(f"      {d['counter']}: 计数器={d['actual']} 历史={d['expected']}")
+            else:
+                print(f"  ✅  用户 {uid}: 一致")
+
+            if not verify_only and (drifts or force):
+                await rebuild_user_counters(db, uid)
+                await db.commit()
+                print(f"  🔧  用户 {uid}: 已重建")
+
+    print(f"\n完成: 共 {len(user_ids)} 个用户, {drifted} 个存在漂移")
+    return drifted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="成就计数器回填/校验")
+    parser.add_argument("--verify", action="store_true", help="仅校验，不写入")
+    parser.add_argument("--force", action="store_true", help="强制全量重建")
+    parser.add_argument("--user", type=int, default=None, help="仅处理指定用户ID")
+    args = parser.parse_args()
+
+    print("=== 成就计数器 ===\n")
+    drifted = asyncio.run(run(args.verify, args.force, args.user))
+    sys.exit(1 if args.verify and drifted else 0)
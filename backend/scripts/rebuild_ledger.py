@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 家庭账本快照重建/校验脚本
+
+从原始流水（Deposit/Transaction/InvestmentPosition/InvestmentIncome/Dividend）
+重新计算每个家庭的账本快照，并报告快照与原始流水之间的漂移。
+
+用法：
+    cd backend
+    python -m scripts.rebuild_ledger              # 校验全部家庭，有漂移时重建
+    python -m scripts.rebuild_ledger --verify     # 仅校验并报告漂移，不写入
+    python -m scripts.rebuild_ledger --force      # 无论是否漂移均全量重建
+    python -m scripts.rebuild_ledger --family 3   # 仅处理指定家庭
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from app.core.database import init_db, async_session_maker
+from app.models.models import Family
+from app.services.ledger import verify_family_ledger, rebuild_family_ledger
+
+
+async def run(verify_only: bool, force: bool, family_id: int = None) -> int:
+    """校验/重建账本快照，返回存在漂移的家庭数"""
+    await init_db()
+
+    async with async_session_maker() as db:
+        query = select(Family.id).order_by(Family.id)
+        if family_id is not None:
+            query = query.where(Family.id == family_id)
+        family_ids = (await db.execute(query)).scalars().all()
+
+    drifted = 0
+    for fid in family_ids:
+        async with async_session_maker() as db:
+            drifts = await verify_family_ledger(fid, db)
+            if drifts:
+                drifted += 1
+                print(f"  ⚠️  家庭 {fid}: {len(drifts)} 处漂移")
+                for d in drifts:
+                    print(f"      {d['field']}[{d['key']}]: 快照={d['actual']} 原始={d['expected']}")
+            else:
+                print(f"  ✅  家庭 {fid}: 一致")
+
+            if not verify_only and (drifts or force):
+                await rebuild_family_ledger(fid, db)
+                await db.commit()
+                print(f"  🔧  家庭 {fid}: 已重建")
+
+    print(f"\n完成: 共 {len(family_ids)} 个家庭, {drifted} 个存在漂移")
+    return drifted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="家庭账本快照重建/校验")
+    parser.add_argument("--verify", action="store_true", help="仅校验，不写入")
+    parser.add_argument("--force", action="store_true", help="强制全量重建")
+    parser.add_argument("--family", type=int, default=None, help="仅处理指定家庭ID")
+    args = parser.parse_args()
+
+    print("=== 家庭账本快照 ===\n")
+    drifted = asyncio.run(run(args.verify, args.force, args.family))
+    sys.exit(1 if args.verify and drifted else 0)
@@ -136,6 +136,22 @@ SKILLS = [
         "parameters": {},
         "sort_order": 30,
     },
+    {
+        "function_key": "batch_category",
+        "name": "消费批量分类",
+        "description": "批量导入时一次判断多条消费记录的分类",
+        "system_prompt": "你是一个消费分类助手，根据每条消费信息返回最合适的分类代码。只返回JSON。",
+        "user_prompt_template": r"""请判断以下 $count 条消费记录的分类（格式：编号. 描述 | 金额）：
+$entries
+
+分类必须从以下选项中选一个（只返回英文代码）：
+food(餐饮), transport(交通), shopping(购物), entertainment(娱乐), healthcare(医疗), education(教育), housing(住房), utilities(水电煤), communication(通讯), clothing(服装鞋帽), beauty(美容美发), pet(宠物), insurance(保险), gift(礼品红包), travel(旅行), fitness(运动健身), appliances(家用电器), maintenance(维修维护), tax(税费), investment(投资理财), income(收入), salary(工资), reimbursement(报销), transfer(转账), refund(退款), subsidy(补贴), bonus(奖金), allowance(津贴), other(其他，无法归类时选择)
+
+请严格按以下 JSON 格式返回，每条记录一项，不要返回其他内容：
+{"results": [{"i": 1, "category": "food"}, {"i": 2, "category": "transport"}]}""",
+        "parameters": {},
+        "sort_order": 35,
+    },
     {
         "function_key": "duplicate_detection",
         "name": "重复记录检测",
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+小金库 (Golden Nest) - 宠物探险数值平衡模拟器
+
+不经过 HTTP/数据库，直接用 create_adventure_session / process_adventure_action 驱动探险引擎：
+脚本化的机器人策略按种子跑成千上万局，多进程并行，汇总到达楼层、获得 EXP、操作次数的分布。
+同一种子的结果与进程数无关，可用于比较平衡性改动前后的分布；同时输出引擎吞吐（楼层/秒、操作/秒）。
+
+策略：
+- aggressive: 永远战斗，HP 低时喝药；拆陷阱；买得起就买；选稀有度最高的祝福
+- cautious:   HP 低时喝药或逃跑；绕过陷阱；保留 EXP 只买药水和防具；优先生存类祝福
+- shopper:    与 aggressive 相同，但商店里尽量多买，并在 EXP 充足时附魔和扩展背包
+
+用法：
+    cd backend
+    python -m scripts.simulate_adventure                                   # 各难度×各策略各 200 局
+    python -m scripts.simulate_adventure --difficulty endless --runs 2000 --max-floor 100
+    python -m scripts.simulate_adventure --policy aggressive --workers 1   # 单进程
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+
+from app.games.adventure import (
+    ADVENTURE_BLESSINGS, ADVENTURE_DIFFICULTIES, BACKPACK_ITEMS, ENCHANT_BASE_COST,
+    create_adventure_session, process_adventure_action, _bp_expand_cost,
+)
+
+RARITY_RANK = {"common": 0, "uncommon": 1, "rare": 2, "epic": 3, "legendary": 4}
+SURVIVAL_BLESSINGS = ("heal", "heal_full", "max_hp", "def", "potions", "lifesteal")
+BLESSING_EFFECTS = {b["id"]: b["effect"] for b in ADVENTURE_BLESSINGS}
+
+
+# ==================== 机器人策略 ====================
+
+def _hp_ratio(session: dict) -> float:
+    return session["hp"] / max(1, session["max_hp"])
+
+
+def _heal_action(session: dict) -> Optional[dict]:
+    """背包中有治疗药水时使用，否则使用旧药水计数"""
+    bp = session.get("backpack") or {"items": []}
+    for it in bp["items"]:
+        effects = BACKPACK_ITEMS.get(it["id"], {}).get("effects", {})
+        if "heal" in effects or "heal_pct" in effects:
+            return {"action": "use_item", "item_uid": it["uid"]}
+    if session["potions"] > 0:
+        return {"action": "use_potion"}
+    return None
+
+
+def _pick_blessing(enc: dict, survival: bool) -> dict:
+    def score(choice):
+        rank = RARITY_RANK.get(choice.get("rarity", "common"), 0)
+        if survival and any(k in BLESSING_EFFECTS.get(choice["id"], {}) for k in SURVIVAL_BLESSINGS):
+            rank += 10
+        return rank
+
+    best = max(enc["choices"], key=score)
+    return {"action": "choose_blessing", "blessing_id": best["id"]}
+
+
+def _pick_shop_item(session: dict, enc: dict, reserve: int, types: Optional[tuple] = None) -> Optional[dict]:
+    budget = session["exp_earned"] - reserve
+    candidates = [
+        (RARITY_RANK.get(BACKPACK_ITEMS[si["item_id"]]["rarity"], 0), -si["price"], idx)
+        for idx, si in enumerate(enc.get("shop_items", []))
+        if si["price"] <= budget and si["item_id"] in BACKPACK_ITEMS
+        and (types is None or BACKPACK_ITEMS[si["item_id"]].get("type") in types)
+    ]
+    if not candidates:
+        return None
+    return {"action": "buy_item", "shop_index": max(candidates)[2]}
+
+
+def _encounter_action(session: dict, rng: random.Random, cautious: bool, shopper: bool) -> dict:
+    enc = session["encounter"]
+    enc_type = enc["type"]
+    if enc_type in ("monster", "boss"):
+        if _hp_ratio(session) < (0.5 if cautious else 0.35):
+            heal = _heal_action(session)
+            if heal:
+                return heal
+            if cautious and enc_type == "monster":
+                return {"action": "flee"}
+        return {"action": "fight"}
+    if enc_type == "trap":
+        return {"action": "bypass" if cautious else "disarm"}
+    if enc_type == "shop":
+        if not enc.get("_sim_done"):
+            if cautious:
+                buy = _pick_shop_item(session, enc, reserve=30, types=("potion", "shield", "armor"))
+            else:
+                buy = _pick_shop_item(session, enc, reserve=0 if shopper else 20)
+            if buy:
+                return buy
+        return {"action": "skip"}
+    if enc_type == "blessing":
+        return _pick_blessing(enc, survival=cautious)
+    return {"action": "open"}  # 宝箱: 任意操作即打开
+
+
+def _between_floors(session: dict, rng: random.Random) -> Optional[dict]:
+    """楼层间整理背包（shopper 策略）：扩展背包、给随机物品附魔"""
+    bp = session.get("backpack")
+    if not bp:
+        return None
+    cost = _bp_expand_cost(bp)
+    if cost is not None and session["exp_earned"] >= cost * 2:
+        return {"action": "expand_backpack"}
+    if session["exp_earned"] >= ENCHANT_BASE_COST * 4 and bp["items"]:
+        it = rng.choice(bp["items"])
+        defn = BACKPACK_ITEMS.get(it["id"], {})
+        if not defn.get("consumable") and len(it.get("enchants", [])) < 1:
+            return {"action": "enchant_item", "item_uid": it["uid"]}
+    return None
+
+
+def aggressive(session: dict, rng: random.Random) -> dict:
+    if session.get("encounter_resolved"):
+        return {"action": "next_floor"}
+    return _encounter_action(session, rng, cautious=False, shopper=False)
+
+
+def cautious(session: dict, rng: random.Random) -> dict:
+    if session.get("encounter_resolved"):
+        if session.get("endless") and _hp_ratio(session) < 0.25 and not _heal_action(session):
+            return {"action": "retreat"}
+        return {"action": "next_floor"}
+    return _encounter_action(session, rng, cautious=True, shopper=False)
+
+
+def shopper(session: dict, rng: random.Random) -> dict:
+    if session.get("encounter_resolved"):
+        return _between_floors(session, rng) or {"action": "next_floor"}
+    return _encounter_action(session, rng, cautious=False, shopper=True)
+
+
+POLICIES: Dict[str, Callable[[dict, random.Random], dict]] = {
+    "aggressive": aggressive,
+    "cautious": cautious,
+    "shopper": shopper,
+}
+
+
+# ==================== 单局模拟 ====================
+
+def simulate_run(seed: int, difficulty: str, policy: str, pet_level: int = 10,
+                 max_floor: int = 100, max_turns: int = 20000) -> dict:
+    """
+    按种子模拟一局探险
+
+    引擎使用全局 random，每局开始时重新播种；策略使用独立的随机数生成器。
+
+    Returns:
+        {"seed", "floor", "exp", "turns", "outcome", "invalid"}
+        outcome: died / cleared / retreated / capped（无尽模式到达 max_floor）/ stuck（超过 max_turns）
+    """
+    random.seed(seed)
+    rng = random.Random(seed ^ 0x5EED)
+    decide = POLICIES[policy]
+    session = create_adventure_session(pet_level, difficulty)
+    turns = invalid = 0
+    outcome = "stuck"
+    while turns < max_turns:
+        if session.get("game_over"):
+            break
+        if session.get("endless") and session.get("encounter_resolved") and session["floor"] >= max_floor:
+            process_adventure_action(session, {"action": "retreat"})
+            outcome = "capped"
+            break
+        action = decide(session, rng)
+        turns += 1
+        try:
+            process_adventure_action(session, action)
+        except HTTPException:
+            # 策略给出的操作不合法（如背包已满买不下）：标记后该商店改为离开
+            invalid += 1
+            if session["encounter"]["type"] == "shop":
+                session["encounter"]["_sim_done"] = True
+        # 日志只保留最近几条，避免长局内存增长
+        if len(session["log"]) > 50:
+            del session["log"][:-10]
+    if outcome != "capped" and session.get("game_over"):
+        if session.get("retreated"):
+            outcome = "retreated"
+        elif session["hp"] <= 0:
+            outcome = "died"
+        else:
+            outcome = "cleared"
+    return {
+        "seed": seed,
+        "floor": session["floor"],
+        "exp": session["exp_earned"],
+        "turns": turns,
+        "outcome": outcome,
+        "invalid": invalid,
+    }
+
+
+def simulate_batch(args: tuple) -> List[dict]:
+    """进程池任务：一批种子"""
+    seeds, difficulty, policy, pet_level, max_floor = args
+    return [simulate_run(seed, difficulty, policy, pet_level, max_floor) for seed in seeds]
+
+
+# ==================== 并行与汇总 ====================
+
+def run_simulations(difficulty: str, policy: str, runs: int, seed: int = 0, pet_level: int = 10,
+                    max_floor: int = 100, workers: int = 1, chunk_size: int = 50,
+                    pool: Optional[ProcessPoolExecutor] = None) -> List[dict]:
+    """跑 runs 局（种子 seed..seed+runs-1），结果按种子顺序返回"""
+    seeds = list(range(seed, seed + runs))
+    tasks = [
+        (seeds[i:i + chunk_size], difficulty, policy, pet_level, max_floor)
+        for i in range(0, len(seeds), chunk_size)
+    ]
+    if pool is None and workers <= 1:
+        batches = map(simulate_batch, tasks)
+    elif pool is not None:
+        batches = pool.map(simulate_batch, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as own_pool:
+            return [r for batch in own_pool.map(simulate_batch, tasks) for r in batch]
+    return [r for batch in batches for r in batch]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位（输入已排序）"""
+    if not sorted_values:
+        return 0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def summarize(results: List[dict]) -> dict:
+    """汇总楼层/EXP/操作次数分布与结局占比"""
+    summary = {"runs": len(results), "outcomes": {}}
+    for r in results:
+        summary["outcomes"][r["outcome"]] = summary["outcomes"].get(r["outcome"], 0) + 1
+    for key in ("floor", "exp", "turns"):
+        values = sorted(r[key] for r in results)
+        summary[key] = {
+            "mean": sum(values) / len(values) if values else 0,
+            "p10": percentile(values, 10),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "max": values[-1] if values else 0,
+        }
+    summary["total_floors"] = sum(r["floor"] for r in results)
+    summary["total_turns"] = sum(r["turns"] for r in results)
+    summary["invalid"] = sum(r["invalid"] for r in results)
+    return summary
+
+
+def floor_histogram(results: List[dict], buckets: int = 10) -> List[tuple]:
+    """到达楼层直方图: [(起始层, 结束层, 局数), ...]"""
+    top = max((r["floor"] for r in results), default=1)
+    width = max(1, -(-top // buckets))
+    counts = [0] * (-(-top // width))
+    for r in results:
+        counts[(r["floor"] - 1) // width] += 1
+    return [(i * width + 1, (i + 1) * width, n) for i, n in enumerate(counts)]
+
+
+def print_summary(difficulty: str, policy: str, results: List[dict], histogram: bool):
+    summary = summarize(results)
+    outcomes = " ".join(f"{k}={v / summary['runs']:.0%}" for k, v in sorted(summary["outcomes"].items()))
+    print(f"\n--- {difficulty} / {policy} ({summary['runs']} 局) ---")
+    print(f"结局: {outcomes}" + (f"  非法操作: {summary['invalid']}" if summary["invalid"] else ""))
+    print(f"{'指标':<8} {'均值':>9} {'P10':>8} {'P50':>8} {'P90':>8} {'最大':>8}")
+    for key, label in (("floor", "楼层"), ("exp", "EXP"), ("turns", "操作数")):
+        s = summary[key]
+        print(f"{label:<8} {s['mean']:>9.1f} {s['p10']:>8} {s['p50']:>8} {s['p90']:>8} {s['max']:>8}")
+    if histogram:
+        print("楼层分布:")
+        hist = floor_histogram(results)
+        peak = max(n for _, _, n in hist) or 1
+        for lo, hi, n in hist:
+            print(f"  {lo:>4}-{hi:<4} {n:>6} {'█' * round(n / peak * 40)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="宠物探险数值平衡模拟器")
+    parser.add_argument("--difficulty", choices=list(ADVENTURE_DIFFICULTIES), action="append",
+                        help="难度（可重复指定，默认全部）")
+    parser.add_argument("--policy", choices=list(POLICIES), action="append", help="策略（可重复指定，默认全部）")
+    parser.add_argument("--runs", type=int, default=200, help="每个难度×策略的局数")
+    parser.add_argument("--seed", type=int, default=0, help="起始种子")
+    parser.add_argument("--pet-level", type=int, default=10, help="宠物等级")
+    parser.add_argument("--max-floor", type=int, default=100, help="无尽模式到达该层即撤退")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数（1 表示单进程）")
+    parser.add_argument("--chunk-size", type=int, default=50, help="每个进程任务包含的局数")
+    parser.add_argument("--histogram", action="store_true", help="输出楼层分布直方图")
+    args = parser.parse_args()
+
+    difficulties = args.difficulty or list(ADVENTURE_DIFFICULTIES)
+    policies = args.policy or list(POLICIES)
+    print("=== 宠物探险数值平衡模拟 ===")
+    print(f"难度: {', '.join(difficulties)}  策略: {', '.join(policies)}  每组 {args.runs} 局  进程数: {args.workers}")
+
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    total_floors = total_turns = 0
+    begin = time.perf_counter()
+    try:
+        for difficulty in difficulties:
+            for policy in policies:
+                results = run_simulations(
+                    difficulty, policy, args.runs, seed=args.seed, pet_level=args.pet_level,
+                    max_floor=args.max_floor, workers=args.workers, chunk_size=args.chunk_size, pool=pool,
+                )
+                print_summary(difficulty, policy, results, args.histogram)
+                total_floors += sum(r["floor"] for r in results)
+                total_turns += sum(r["turns"] for r in results)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - begin
+
+    print("\n=== 吞吐 ===")
+    print(f"模拟楼层: {total_floors}  操作: {total_turns}  耗时: {elapsed:.1f}s")
+    print(f"楼层/秒: {total_floors / elapsed:.0f}  操作/秒: {total_turns / elapsed:.0f}")
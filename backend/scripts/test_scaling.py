@@ -1,29 +1,19 @@
-import math
+"""
+打印若干典型场景下无尽模式的动态难度缩放系数（直接调用引擎中的 _calc_dominance_scaling）。
 
-def _calc_dominance_scaling(floor, player_stats=None):
-    result = {"hp_mult": 1.0, "atk_mult": 1.0, "def_mult": 1.0, "active": False}
-    if not player_stats or floor < 10:
-        return result
-    lagged_dps = player_stats.get("scaling_dps", 0)
-    p_def = player_stats.get("defense", 0)
-    if lagged_dps <= 0:
-        return result
-    enemy_baseline = 4 + floor * 0.7 + (floor ** 0.5) * 2
-    player_power = lagged_dps + p_def * 0.5
-    dominance_ratio = player_power / max(1, enemy_baseline)
-    threshold = 2.5 if floor < 30 else 2.0 if floor < 60 else 1.8
-    if dominance_ratio <= threshold:
-        return result
-    excess = dominance_ratio - threshold
-    k_hp = 0.15 + min(0.30, floor * 0.003)
-    k_atk = 0.10 + min(0.20, floor * 0.002)
-    k_def = 0.08 + min(0.15, floor * 0.0015)
-    log_factor = math.log1p(excess)
-    hp_mult = min(1.0 + k_hp * log_factor, 6.0)
-    atk_mult = min(1.0 + k_atk * log_factor, 3.5)
-    def_mult = min(1.0 + k_def * log_factor, 3.0)
-    result.update({"hp_mult": hp_mult, "atk_mult": atk_mult, "def_mult": def_mult, "active": True})
-    return result
+完整的数值平衡分布请使用 scripts/simulate_adventure.py。
+
+用法：
+    cd backend
+    python -m scripts.test_scaling
+"""
+import sys
+import os
+
+# 将 backend 目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.games.adventure import _calc_dominance_scaling
 
 test_cases = [
     ("F5, low dps", 5, {"scaling_dps": 30, "defense": 5}),
@@ -0,0 +1,89 @@
+"""
+记账条目列表分页测试
+
+验证游标分页与页码分页结果一致（含同一时间戳的条目），
+且昵称、照片标记按批量查询正确填充。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import AccountingCategory, AccountingEntry, Family, User
+from app.services.accounting_list import list_accounting_entries
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'accounting.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as session:
+        session.add_all([
+            Family(id=1, name="F", invite_code="ACC001"),
+            User(id=1, username="a", email="a@example.com", hashed_password="x", nickname="记账人"),
+            User(id=2, username="b", email="b@example.com", hashed_password="x", nickname="消费人"),
+        ])
+        await session.flush()
+        base = datetime(2025, 1, 1)
+        created = datetime(2025, 1, 2)
+        for i in range(23):
+            # 每 5 条共享同一消费日期与创建时间，只能靠 id 区分顺序
+            session.add(AccountingEntry(
+                family_id=1, user_id=1, consumer_id=2 if i % 2 else None,
+                amount=i + 1, category=AccountingCategory.FOOD, description=f"条目{i}",
+                entry_date=base + timedelta(days=i // 5), created_at=created,
+                image_data="data:image/png;base64,AAAA" if i == 0 else None,
+            ))
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_match_offset_pages(db):
+    conditions = [AccountingEntry.family_id == 1]
+
+    by_offset = []
+    for page in range(1, 4):
+        result = await list_accounting_entries(db, conditions, page_size=10, page=page)
+        assert result["total"] == 23
+        by_offset += [e["id"] for e in result["entries"]]
+
+    by_cursor, cursor = [], None
+    while True:
+        result = await list_accounting_entries(db, conditions, page_size=10, cursor=cursor, with_total=False)
+        by_cursor += [e["id"] for e in result["entries"]]
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+
+    assert by_cursor == by_offset
+    assert len(set(by_cursor)) == 23
+
+
+@pytest.mark.asyncio
+async def test_entries_carry_nicknames_and_image_flag(db):
+    result = await list_accounting_entries(db, [AccountingEntry.family_id == 1], page_size=50)
+    entries = {e["description"]: e for e in result["entries"]}
+
+    assert result["next_cursor"] is None
+    assert entries["条目0"]["has_image"] is True
+    assert "image_data" not in entries["条目0"]
+    assert entries["条目1"]["user_nickname"] == "记账人"
+    assert entries["条目1"]["consumer_nickname"] == "消费人"
+    assert entries["条目2"]["consumer_nickname"] is None
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_is_rejected(db):
+    with pytest.raises(ValueError):
+        await list_accounting_entries(db, [AccountingEntry.family_id == 1], cursor="not-a-cursor")
@@ -0,0 +1,106 @@
+"""
+成就计数器增量维护测试
+
+验证 after_flush 维护的计数器与全量重算结果一致，
+并且按事件判定时能正确解锁计数类成就。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import (
+    Achievement, Deposit, Family, FamilyMember, TodoItem, TodoList, TodoPriority, User,
+)
+from app.services.achievement import AchievementService
+from app.services.achievement_counters import load_user_counters, verify_user_counters
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'achievement.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    async with maker() as session:
+        yield session
+    await engine.dispose()
+
+
+async def seed(db):
+    user = User(username="a", email="a@example.com", hashed_password="x", nickname="A")
+    family = Family(name="F", invite_code="ACH001")
+    db.add_all([user, family])
+    await db.flush()
+    db.add(FamilyMember(user_id=user.id, family_id=family.id, role="admin"))
+    return user, family
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_inserts_updates_and_deletes(db):
+    user, family = await seed(db)
+    deposits = [
+        Deposit(user_id=user.id, family_id=family.id, amount=300, deposit_date=datetime.utcnow() - timedelta(days=i))
+        for i in range(3)
+    ]
+    todo_list = TodoList(family_id=family.id, name="家务", created_by=user.id)
+    db.add_all(deposits + [todo_list])
+    await db.flush()
+    items = [TodoItem(list_id=todo_list.id, title=str(i), created_by=user.id) for i in range(3)]
+    db.add_all(items)
+    await db.commit()
+
+    counters = await load_user_counters(db, user.id)
+    assert counters["deposit_count"] == 3
+    assert counters["total_deposit"] == 900
+
+    items[0].is_completed = True
+    items[0].completed_by = user.id
+    items[0].completed_at = datetime.now()
+    items[0].priority = TodoPriority.HIGH
+    deposits[0].amount = 1000
+    await db.delete(deposits[1])
+    await db.commit()
+
+    counters = await load_user_counters(db, user.id)
+    assert counters["deposit_count"] == 2
+    assert counters["total_deposit"] == 1300
+    assert counters["todo_complete_count"] == 1
+    assert counters["todo_high_priority_count"] == 1
+
+    items[0].is_completed = False
+    items[0].completed_by = None
+    await db.commit()
+
+    counters = await load_user_counters(db, user.id)
+    assert counters["todo_complete_count"] == 0
+    assert await verify_user_counters(db, user.id) == []
+
+
+@pytest.mark.asyncio
+async def test_event_scoped_check_unlocks_counter_achievements(db):
+    user, family = await seed(db)
+    await db.commit()
+    service = AchievementService(db)
+    await service.get_definitions()
+
+    db.add(Deposit(user_id=user.id, family_id=family.id, amount=500, deposit_date=datetime.utcnow()))
+    unlocked = await service.check_and_unlock(user.id, context={"action": "deposit", "deposit_amount": 500})
+    await db.commit()
+
+    codes = set(
+        (await db.execute(select(Achievement.code).where(Achievement.id.in_([u.achievement_id for u in unlocked]))))
+        .scalars().all()
+    )
+    assert "first_deposit" in codes
+    # 再次判定不会重复解锁
+    assert await service.check_and_unlock(user.id, context={"action": "deposit", "deposit_amount": 500}) == []
+    assert await verify_user_counters(db, user.id) == []
@@ -0,0 +1,95 @@
+"""
+探险背包派生数据缓存测试
+
+验证背包未变化时属性/套装/连锁/被动直接复用缓存，放置、移动、旋转、附魔、扩展、合成、移除后
+缓存失效且结果与从头计算一致；占用位图与旧的逐格占用判断行为一致。
+"""
+import copy
+import os
+import sys
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.games.adventure import (
+    _bp_auto_place, _bp_build_chain_bonus, _bp_build_set_info, _bp_build_stats,
+    _bp_calc_chain_bonus, _bp_calc_stats, _bp_can_place, _bp_compute_set_info, _bp_derived,
+    _bp_get_passives, _bp_init, _bp_move, _bp_place, _bp_remove, _bp_rotate_item, _bp_sanitize,
+    create_adventure_session, process_adventure_action,
+)
+
+
+def assert_fresh(bp):
+    """缓存结果与对副本从头计算的结果一致"""
+    fresh = copy.deepcopy(bp)
+    assert _bp_compute_set_info(bp) == _bp_build_set_info(fresh)
+    assert _bp_calc_stats(bp) == _bp_build_stats(fresh)
+    assert _bp_calc_stats(bp, exclude_no_scaling=True) == _bp_build_stats(fresh, exclude_no_scaling=True)
+    assert _bp_calc_chain_bonus(bp) == _bp_build_chain_bonus(fresh)
+
+
+def test_derived_stats_are_cached_until_backpack_changes():
+    session = create_adventure_session(pet_level=10, difficulty="endless")
+    bp = session["backpack"]
+    for item_id in ("inferno_blade", "inferno_helm", "inferno_boots", "iron_shield", "iron_shield", "chain_mail"):
+        assert _bp_auto_place(bp, item_id) is not None or item_id == "chain_mail"
+    stats = _bp_calc_stats(bp)
+    assert _bp_compute_set_info(bp)["active_major"] == {"inferno_set"}
+
+    # 未变化时复用缓存；返回副本，调用方修改不影响缓存
+    cached = _bp_derived(bp)
+    stats["atk"] += 100
+    _bp_get_passives(bp)["multi_strike"] = 99
+    assert _bp_derived(bp) is cached and _bp_calc_stats(bp)["atk"] == stats["atk"] - 100
+    assert "multi_strike" not in _bp_get_passives(bp)
+    assert _bp_sanitize(bp)["stats"] == _bp_calc_stats(bp)
+
+    # 经由操作接口修改背包后缓存失效
+    session["encounter_resolved"] = True
+    session["exp_earned"] = 10_000
+    for _ in range(2):
+        process_adventure_action(session, {"action": "expand_backpack"})
+        assert_fresh(bp)
+    shield = next(it for it in bp["items"] if it["id"] == "iron_shield")
+    process_adventure_action(session, {"action": "enchant_item", "item_uid": shield["uid"]})
+    assert _bp_calc_stats(bp) != stats and len(shield["enchants"]) == 1
+    assert_fresh(bp)
+    rotated = bool(shield.get("rotated"))
+    process_adventure_action(session, {"action": "rotate_item", "item_uid": shield["uid"]})
+    assert bool(shield.get("rotated")) is not rotated
+    assert_fresh(bp)
+    uids = [it["uid"] for it in bp["items"] if it["id"] == "iron_shield"]
+    process_adventure_action(session, {"action": "merge_items", "item_uid1": uids[0], "item_uid2": uids[1]})
+    assert "holy_shield" in {it["id"] for it in bp["items"]}
+    assert_fresh(bp)
+    helm = next(it for it in bp["items"] if it["id"] == "inferno_helm")
+    process_adventure_action(session, {"action": "sell_item", "item_uid": helm["uid"]})
+    assert _bp_compute_set_info(bp)["major"]["inferno_set"]["eff_pieces"] == 2
+    assert_fresh(bp)
+    # 背包视图的物品顺序随移动变化
+    first = bp["items"][0]
+    process_adventure_action(session, {"action": "move_item", "item_uid": first["uid"], "row": -1, "col": 0})
+    assert [it["uid"] for it in _bp_sanitize(bp)["items"]] == [it["uid"] for it in bp["items"]]
+    assert _bp_sanitize(bp)["items"][-1]["uid"] == first["uid"]
+
+
+def test_occupancy_bitmask_placement():
+    bp = _bp_init()  # 3×4
+    stick = _bp_place(bp, "wooden_stick", 0, 0)          # 1×2 竖放，占 (0,0)(1,0)
+    assert stick is not None
+    assert not _bp_can_place(bp, "small_potion", 1, 0)
+    assert _bp_can_place(bp, "small_potion", 2, 0)
+    assert not _bp_can_place(bp, "chain_mail", 2, 2)     # 2×2 越界
+    assert _bp_can_place(bp, "chain_mail", 1, 2)
+    shield = _bp_place(bp, "iron_shield", 0, 1)          # 2×1 横放，占 (0,1)(0,2)
+    assert not _bp_can_place(bp, "small_potion", 0, 2)
+
+    # 移动/旋转时忽略物品自身占用的格子
+    assert _bp_move(bp, shield, 0, 2)
+    assert not _bp_move(bp, shield, 0, 0)
+    assert _bp_rotate_item(bp, shield)
+    assert next(it for it in bp["items"] if it["uid"] == shield)["rotated"] is True
+    assert not _bp_can_place(bp, "small_potion", 1, 2)
+    assert _bp_remove(bp, stick) == "wooden_stick"
+    assert _bp_can_place(bp, "small_potion", 1, 0)
+    assert_fresh(bp)
@@ -0,0 +1,42 @@
+"""
+宠物探险平衡模拟器测试
+
+验证各策略都能把探险打到结束、同一种子的结果与进程数/分批方式无关，以及分布汇总。
+"""
+import os
+import sys
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts.simulate_adventure import POLICIES, percentile, run_simulations, simulate_run, summarize
+
+
+def test_policies_finish_runs():
+    for policy in POLICIES:
+        for difficulty in ("easy", "endless"):
+            results = run_simulations(difficulty, policy, runs=5, max_floor=30)
+            assert all(r["outcome"] != "stuck" for r in results)
+            assert all(r["turns"] > 0 and r["floor"] >= 1 for r in results)
+            if difficulty == "endless":
+                assert all(r["floor"] <= 30 for r in results)
+
+
+def test_results_are_seeded_and_independent_of_workers():
+    serial = run_simulations("endless", "shopper", runs=12, seed=7, max_floor=40, chunk_size=5)
+    parallel = run_simulations("endless", "shopper", runs=12, seed=7, max_floor=40, workers=2, chunk_size=4)
+    assert serial == parallel
+    assert serial[3] == simulate_run(10, "endless", "shopper", max_floor=40)
+
+
+def test_summary_distribution():
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 50) == 5
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 90) == 9
+    results = [
+        {"floor": f, "exp": f * 10, "turns": f * 3, "outcome": "died" if f < 5 else "cleared", "invalid": 0}
+        for f in range(1, 11)
+    ]
+    summary = summarize(results)
+    assert summary["outcomes"] == {"died": 4, "cleared": 6}
+    assert summary["floor"]["p50"] == 5 and summary["floor"]["max"] == 10
+    assert summary["exp"]["mean"] == 55 and summary["total_turns"] == 165
@@ -0,0 +1,180 @@
+"""
+AI 回复缓存测试
+
+验证内存/持久化两级命中、TTL 与容量淘汰、并发相同请求只调用一次（发起者被取消时由等待者接手）、配置刷新后失效、
+按功能统计命中率，以及 AIService 仅对开启缓存的调用复用回复。
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.config import clear_active_ai_provider, set_active_ai_provider
+from app.core.database import Base
+from app.models.models import AIResponseCache
+from app.services import ai_service as ai_module
+from app.services.ai_cache import AIResponseCacheStore, make_cache_key
+from app.services.ai_service import AIService
+
+
+@pytest_asyncio.fixture
+async def maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, reply: str, delay: float = 0):
+        async def call():
+            self.calls += 1
+            await asyncio.sleep(delay)
+            return reply
+        return call
+
+
+async def row_count(maker) -> int:
+    async with maker() as db:
+        return (await db.execute(select(func.count()).select_from(AIResponseCache))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_two_tier_hits_and_eviction(maker):
+    counter = Counter()
+    cache = AIResponseCacheStore(session_maker=maker, ttl=60, max_entries=2)
+    key = make_cache_key("auto_category", "https://api.example.com/v1/", "m", [{"role": "user", "content": "星巴克"}], 0.7, 2000)
+    assert key == make_cache_key("auto_category", "https://api.example.com/v1", "m", [{"content": "星巴克", "role": "user"}], 0.7, 2000)
+    assert key != make_cache_key("auto_category", "https://api.example.com/v1", "m2", [{"role": "user", "content": "星巴克"}], 0.7, 2000)
+
+    assert await cache.get_or_call(key, "auto_category", "m", counter("food")) == "food"
+    assert await cache.get_or_call(key, "auto_category", "m", counter("other")) == "food"
+    assert counter.calls == 1
+
+    # 新进程（空内存）从持久化表命中
+    restarted = AIResponseCacheStore(session_maker=maker, ttl=60, max_entries=2)
+    assert await restarted.get_or_call(key, "auto_category", "m", counter("other")) == "food"
+    assert counter.calls == 1
+    stats = {f["function_key"]: f for f in restarted.stats()["functions"]}
+    assert stats["auto_category"]["db_hits"] == 1 and stats["auto_category"]["hit_rate"] == 1.0
+
+    # 过期后重新调用
+    later = datetime.utcnow() + timedelta(seconds=120)
+    assert await restarted.get_or_call(key, "auto_category", "m", counter("shopping"), now=later) == "shopping"
+    assert counter.calls == 2
+
+    # 内存按条目数淘汰最久未使用的
+    for i in range(3):
+        await cache.get_or_call(f"k{i}", "voice_parse", "m", counter(f"r{i}"))
+    assert len(cache._memory) == 2 and "k0" not in cache._memory
+    stats = {f["function_key"]: f for f in cache.stats()["functions"]}
+    assert stats["auto_category"] == {
+        "function_key": "auto_category", "requests": 2, "hits": 1,
+        "memory_hits": 1, "db_hits": 0, "misses": 1, "hit_rate": 0.5,
+    }
+
+    # 持久化表按最近使用时间保留 max_rows 行
+    assert await row_count(maker) == 4
+    cache.max_rows = 2
+    await cache.trim()
+    async with maker() as db:
+        kept = set((await db.execute(select(AIResponseCache.cache_key))).scalars())
+    assert kept == {key, "k2"}  # key 在 later 时刻重新写入，是最近使用的
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_call_and_invalidate(maker):
+    counter = Counter()
+    cache = AIResponseCacheStore(session_maker=maker)
+    results = await asyncio.gather(*[
+        cache.get_or_call("same", "import_parse", "m", counter("[]", delay=0.05)) for _ in range(5)
+    ])
+    assert results == ["[]"] * 5 and counter.calls == 1
+
+    # 失败不缓存，等待者也得到同一异常
+    async def boom():
+        counter.calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("AI 服务调用失败")
+    outcomes = await asyncio.gather(
+        *[cache.get_or_call("bad", "import_parse", "m", boom) for _ in range(2)], return_exceptions=True,
+    )
+    assert all(isinstance(o, ValueError) for o in outcomes) and counter.calls == 2
+    assert await cache.get_or_call("bad", "import_parse", "m", counter("ok")) == "ok"
+
+    await cache.invalidate()
+    assert await row_count(maker) == 0 and not cache._memory
+    assert await cache.get_or_call("same", "import_parse", "m", counter("[1]")) == "[1]"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_owner_hands_call_to_waiters(maker):
+    counter = Counter()
+    cache = AIResponseCacheStore(session_maker=maker)
+    owner = asyncio.create_task(cache.get_or_call("k", "import_parse", "m", counter("first", delay=1)))
+    await asyncio.sleep(0.05)
+    waiters = [
+        asyncio.create_task(cache.get_or_call("k", "import_parse", "m", counter("second", delay=0.05)))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0.01)
+    # 被取消的等待者自身收到取消，不影响其它请求
+    waiters[2].cancel()
+    owner.cancel()
+    results = await asyncio.gather(*waiters[:2])
+    assert results == ["second", "second"] and counter.calls == 2
+    assert owner.cancelled() and waiters[2].cancelled()
+    assert not cache._inflight
+    assert await cache.get_or_call("k", "import_parse", "m", counter("third")) == "second"
+
+
+@pytest.mark.asyncio
+async def test_ai_service_uses_cache_only_when_enabled(maker, monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"reply {len(requests)}"}}]})
+
+    cache = AIResponseCacheStore(session_maker=maker)
+    monkeypatch.setattr(ai_module, "ai_response_cache", cache)
+    monkeypatch.setattr(ai_module, "_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_skill_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_function_model_cache", {})
+    monkeypatch.setattr(ai_module, "_skill_cache", {})
+    set_active_ai_provider("sk-test", "https://llm.example.com/v1", "fake-model")
+    service = AIService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        kwargs = dict(system_prompt="分类", function_key="auto_category", temperature=0.1)
+        assert await service.chat("星巴克 38元", cache=True, **kwargs) == "reply 1"
+        assert await service.chat("星巴克 38元", cache=True, **kwargs) == "reply 1"
+        assert await service.chat("星巴克 38元", cache=True, **{**kwargs, "temperature": 0.5}) == "reply 2"
+        assert await service.chat("星巴克 38元", **kwargs) == "reply 3"
+        assert len(requests) == 3
+
+        # 切换模型后键不同；刷新技能缓存后全部失效
+        set_active_ai_provider("sk-test", "https://llm.example.com/v1", "other-model")
+        assert await service.chat("星巴克 38元", cache=True, **kwargs) == "reply 4"
+        monkeypatch.setattr(ai_module, "load_skill_cache", lambda: asyncio.sleep(0))
+        await ai_module.refresh_skill_cache()
+        assert await service.chat("星巴克 38元", cache=True, **kwargs) == "reply 5"
+        assert cache.stats()["functions"][0]["hits"] == 1
+    finally:
+        await service.close()
+        clear_active_ai_provider()
@@ -0,0 +1,162 @@
+"""
+AI 调用调度测试
+
+验证并发上限内交互请求优先于后台请求、同一优先级按家庭轮转，令牌桶限速与截止时间拒绝，
+429 时暂停整个通道，限额从 AIProvider 表加载，以及 AIService 经调度器发送请求。
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.config import clear_active_ai_provider, set_active_ai_provider
+from app.core.database import Base
+from app.models.models import AIProvider
+from app.services import ai_governor as governor_module
+from app.services import ai_service as ai_module
+from app.services.ai_governor import (
+    AIBusyError, AIGovernor, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, load_provider_limits,
+)
+from app.services.ai_service import AIService
+
+URL = "https://llm.example.com/v1"
+
+
+@pytest.mark.asyncio
+async def test_priority_and_fair_queueing():
+    governor = AIGovernor()
+    governor.configure([(URL + "/", 0, 1)])
+    first = await governor.acquire(URL, "m", owner="family:1")
+    order = []
+
+    async def call(owner, priority, label):
+        permit = await governor.acquire(URL, "m", owner=owner, priority=priority)
+        order.append(label)
+        await asyncio.sleep(0.01)
+        permit.release()
+
+    tasks = [asyncio.create_task(call("family:1", PRIORITY_BACKGROUND, f"A{i}")) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("family:2", PRIORITY_BACKGROUND, "B0")))
+    tasks.append(asyncio.create_task(call("family:1", PRIORITY_INTERACTIVE, "chat")))
+    await asyncio.sleep(0.01)
+
+    lane = governor.stats()["lanes"][0]
+    assert lane["base_url"] == URL and lane["active"] == 1
+    assert lane["queued"] == {"interactive": 1, "background": 4}
+
+    first.release()
+    await asyncio.gather(*tasks)
+    assert order == ["chat", "A0", "B0", "A1", "A2"]
+    lane = governor.stats()["lanes"][0]
+    assert lane["granted"] == 6 and lane["queued"] == {"interactive": 0, "background": 0}
+    assert lane["wait_ms"]["max"] >= lane["wait_ms"]["p50"] > 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_deadlines_and_pause(monkeypatch):
+    monkeypatch.setattr(governor_module, "BURST_SECONDS", 0.05)
+    governor = AIGovernor()
+    governor.configure([(URL, 1200, 0)])  # 每秒 20 次，突发 1 次
+
+    started = time.monotonic()
+    permits = await asyncio.gather(*[governor.acquire(URL, "m", owner=f"family:{i % 2}") for i in range(4)])
+    assert time.monotonic() - started >= 0.12
+    for p in permits:
+        p.release()
+
+    # 家庭 1 排着 6 个请求（约 0.3 秒）：它的下一个 0.1 秒截止的请求立即被拒绝，
+    # 而家庭 2 按轮转只排在 1 个请求之后，可以在截止时间内得到许可
+    waiting = [asyncio.create_task(governor.acquire(URL, "m", owner="family:1")) for _ in range(6)]
+    await asyncio.sleep(0)
+    with pytest.raises(AIBusyError):
+        await governor.acquire(URL, "m", owner="family:1", deadline=time.monotonic() + 0.1)
+    (await governor.acquire(URL, "m", owner="family:2", deadline=time.monotonic() + 0.15)).release()
+    assert sum(t.done() for t in waiting) <= 2
+    for p in await asyncio.gather(*waiting):
+        p.release()
+    lane = governor.stats()["lanes"][0]
+    assert lane["rejected"] == 1 and lane["timeouts"] == 0 and lane["queued"]["interactive"] == 0
+
+    # 只受并发上限约束时无法预估，截止时间内未轮到的请求超时后移出队列
+    governor.configure([(URL, 0, 1)])
+    held = await governor.acquire(URL, "slow")
+    with pytest.raises(AIBusyError):
+        await governor.acquire(URL, "slow", priority=PRIORITY_BACKGROUND, deadline=time.monotonic() + 0.05)
+    held.release()
+    slow = next(l for l in governor.stats()["lanes"] if l["model"] == "slow")
+    assert slow["timeouts"] == 1 and slow["queued"]["background"] == 0 and slow["active"] == 0
+    governor.configure([(URL, 1200, 0)])
+
+    # 429：整个通道暂停
+    await asyncio.sleep(0.06)
+    governor.penalize(URL, "m", 0.15)
+    assert governor.stats()["lanes"][0]["paused_seconds"] > 0
+    started = time.monotonic()
+    (await governor.acquire(URL, "m")).release()
+    assert time.monotonic() - started >= 0.14
+
+    # 其它模型的通道不受影响
+    started = time.monotonic()
+    governor.penalize(URL, "m", 1)
+    (await governor.acquire(URL, "other")).release()
+    assert time.monotonic() - started < 0.05
+
+
+@pytest_asyncio.fixture
+async def maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'governor.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_limits_from_providers_and_service_retry(maker, monkeypatch):
+    governor = AIGovernor()
+    monkeypatch.setattr(governor_module, "ai_governor", governor)
+    monkeypatch.setattr(ai_module, "ai_governor", governor)
+    async with maker() as db:
+        db.add_all([
+            AIProvider(name="a", provider_type="openai", base_url=URL, rate_limit_rpm=600, max_concurrency=4),
+            AIProvider(name="b", provider_type="custom", base_url=URL + "/", rate_limit_rpm=0, max_concurrency=2),
+            AIProvider(name="c", provider_type="custom", base_url="https://off.example.com", is_enabled=False),
+        ])
+        await db.commit()
+    await load_provider_limits(maker)
+    assert governor._limits == {URL: (600, 2)}
+
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append((time.monotonic(), json.loads(request.content)["model"]))
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={"retry-after": "0.2"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    monkeypatch.setattr(ai_module, "_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_skill_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_function_model_cache", {})
+    monkeypatch.setattr(ai_module, "_skill_cache", {})
+    set_active_ai_provider("sk-test", URL, "fake-model")
+    service = AIService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        assert await service.chat("星巴克", function_key="auto_category") == "ok"
+        assert attempts[1][0] - attempts[0][0] >= 0.19
+        lane = governor.stats()["lanes"][0]
+        assert (lane["model"], lane["rate_limit_rpm"], lane["max_concurrency"]) == ("fake-model", 600, 2)
+        assert lane["granted"] == 2 and lane["active"] == 0
+    finally:
+        await service.close()
+        clear_active_ai_provider()
@@ -0,0 +1,167 @@
+"""
+AI 流式回复测试
+
+使用本地模拟的 OpenAI 兼容 SSE 服务，验证 AIService.chat_stream 逐段解析增量文本、
+记录首字节时间与元数据，以及 AI 聊天/宠物聊天的 SSE 接口转发增量并附带 X-AI-* 响应头。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.config import clear_active_ai_provider, set_active_ai_provider
+from app.services import ai_service as ai_module
+from app.services.ai_service import AIService, JSONFieldStreamer, ai_call_metadata
+
+
+class FakeSSEHandler(BaseHTTPRequestHandler):
+    """按 server.chunks 逐段返回 chat/completions 流，每段之间停顿 server.delay 秒"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        if self.server.status != 200:
+            self.send_response(self.server.status)
+            self.end_headers()
+            self.wfile.write(b'{"error": "boom"}')
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(b": keep-alive\n\n")
+        for text in self.server.chunks:
+            time.sleep(self.server.delay)
+            chunk = {"choices": [{"index": 0, "delta": {"content": text}}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b'data: {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}\n\n')
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSSEHandler)
+    server.requests, server.chunks, server.delay, server.status = [], ["你好", "，", "主人"], 0.05, 200
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    set_active_ai_provider("sk-test", f"http://127.0.0.1:{server.server_port}/v1", "fake-model")
+    monkeypatch.setattr(ai_module, "_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_skill_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_function_model_cache", {})
+    monkeypatch.setattr(ai_module, "_skill_cache", {})
+    yield server
+    clear_active_ai_provider()
+    server.shutdown()
+    server.server_close()
+
+
+def parse_events(text: str) -> list:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_yields_deltas(fake_llm):
+    service = AIService()
+    try:
+        stream = await service.chat_stream("在吗", system_prompt="你是助手", function_key="chat_reply")
+        assert ai_call_metadata.get()["model"] == "fake-model"
+        received = []
+        async for delta in stream:
+            received.append((delta, time.perf_counter()))
+        assert [d for d, _ in received] == ["你好", "，", "主人"]
+        # 增量到达即产出，而不是等待整个响应
+        assert received[-1][1] - received[0][1] >= 0.08
+        assert stream.text == "你好，主人"
+        assert 0 < stream.ttfb_ms < stream.total_ms
+        assert fake_llm.requests[0]["stream"] is True
+        assert fake_llm.requests[0]["messages"][-1] == {"role": "user", "content": "在吗"}
+
+        # 上游出错时在建立流之前抛出；非流式调用不带 stream 参数
+        fake_llm.status = 500
+        with pytest.raises(ValueError, match="HTTP 500"):
+            await service.chat_stream("在吗", function_key="chat_reply")
+        with pytest.raises(ValueError, match="HTTP 500"):
+            await service.chat("在吗")
+        assert "stream" not in fake_llm.requests[-1]
+    finally:
+        await service.close()
+
+
+def test_json_field_streamer_handles_split_escapes():
+    raw = '<think>..</think>{"reply": "咕咕\\n我\\"饿\\"了\\u2764", "emotion": "happy"}'
+    for size in (1, 2, 3, 7, len(raw)):
+        streamer = JSONFieldStreamer("reply")
+        out = "".join(streamer.feed(raw[i:i + size]) for i in range(0, len(raw), size))
+        assert out == '咕咕\n我"饿"了❤' and streamer.done
+
+
+def build_app(monkeypatch, service: AIService) -> FastAPI:
+    from app.api import ai_chat, pet
+    from app.api.auth import get_current_user
+    from app.core.database import get_db
+    from app.main import AIMetadataMiddleware
+
+    class NoFamilyDB:
+        async def execute(self, *args, **kwargs):
+            return SimpleNamespace(scalar_one_or_none=lambda: None)
+
+    async def fake_pet_request(request, current_user, db):
+        kwargs = dict(user_prompt=request.message, system_prompt="你是宠物", function_key="pet_chat")
+        return kwargs, SimpleNamespace(name="金金"), {"emoji": "🥚"}
+
+    monkeypatch.setattr(ai_chat, "ai_service", service)
+    monkeypatch.setattr(ai_module, "ai_service", service)
+    monkeypatch.setattr(pet, "_build_pet_chat_request", fake_pet_request)
+    app = FastAPI()
+    app.add_middleware(AIMetadataMiddleware)
+    app.include_router(ai_chat.router, prefix="/api")
+    app.include_router(pet.router, prefix="/api")
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1, nickname="小明")
+    app.dependency_overrides[get_db] = lambda: NoFamilyDB()
+    return app
+
+
+def test_sse_endpoints_forward_tokens(fake_llm, monkeypatch):
+    fake_llm.delay = 0
+    with TestClient(build_app(monkeypatch, AIService())) as client:
+        resp = client.post("/api/ai/chat/stream", json={"message": "在吗", "context_type": "dashboard"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        assert resp.headers["x-ai-model"] == "fake-model"
+        assert resp.headers["x-ai-function"] == "chat_reply"
+        events = parse_events(resp.text)
+        assert events[0] == ("meta", {"function_key": "chat_reply", "function_name": events[0][1]["function_name"],
+                                      "model": "fake-model", "source": "global"})
+        assert [d["text"] for e, d in events if e == "delta"] == ["你好", "，", "主人"]
+        done = events[-1][1]
+        assert events[-1][0] == "done" and done["reply"] == "你好，主人" and done["suggestions"]
+        assert done["ttfb_ms"] > 0
+
+        # 宠物聊天：模型输出 JSON，只转发 reply 字段内容
+        fake_llm.chunks = ['{"re', 'ply": "咕', '咕~ 我饿', '了", "emo', 'tion": "sad"}']
+        events = parse_events(client.post("/api/pet/chat/stream", json={"message": "你好"}).text)
+        assert "".join(d["text"] for e, d in events if e == "delta") == "咕咕~ 我饿了"
+        assert events[-1][0] == "done"
+        assert events[-1][1]["reply"] == "咕咕~ 我饿了" and events[-1][1]["emotion"] == "sad"
+
+        # 上游不可用：AI 聊天返回错误码，宠物聊天返回兜底回复
+        fake_llm.status = 503
+        assert client.post("/api/ai/chat/stream", json={"message": "在吗"}).status_code == 400
+        events = parse_events(client.post("/api/pet/chat/stream", json={"message": "你好"}).text)
+        assert events == [("done", {"reply": "🥚 我有点累了，待会再聊好吗？", "emotion": "neutral", "action": None})]
@@ -0,0 +1,148 @@
+"""
+AI 调用遥测测试
+
+验证 record 只写内存缓冲、后台批量写入、缓冲上限丢弃最旧记录，按 (日期, 功能, 模型) 汇总 p50/p95 耗时与
+token 总量；以及 AIService 的普通、视觉、流式调用记录 usage、429 重试次数与失败状态。
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.config import clear_active_ai_provider, set_active_ai_provider
+from app.core.database import Base
+from app.models.models import AICallTelemetry
+from app.services import ai_service as ai_module
+from app.services.ai_governor import AIGovernor
+from app.services.ai_service import AIService
+from app.services.ai_telemetry import AITelemetryWriter, summarize_telemetry, usage_tokens
+
+URL = "https://llm.example.com/v1"
+
+
+@pytest_asyncio.fixture
+async def maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'telemetry.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def load_rows(maker):
+    async with maker() as db:
+        return (await db.execute(select(AICallTelemetry).order_by(AICallTelemetry.id))).scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_buffered_writes_and_summary(maker):
+    writer = AITelemetryWriter(maker, flush_delay=0.01)
+    for latency in range(10, 110, 10):
+        writer.record("auto_category", model="m1", latency_ms=latency, prompt_tokens=100, completion_tokens=5)
+    writer.record("auto_category", model="m1", status="rate_limited", latency_ms=900, retries=2)
+    writer.record("auto_category", model="m2", latency_ms=40.4)
+    writer.record("", model="m1", latency_ms=5)
+    assert len(writer._buffer) == 13 and writer.running
+    await writer.stop()
+    assert writer.stats["written"] == 13 and not writer._buffer
+
+    # 前一天的记录归入另一天
+    async with maker() as db:
+        db.add(AICallTelemetry(function_key="auto_category", model="m1", latency_ms=7,
+                               created_at=datetime.utcnow() - timedelta(days=1)))
+        await db.commit()
+
+    async with maker() as db:
+        items = await summarize_telemetry(db, days=7)
+        only = await summarize_telemetry(db, days=1, function_key="auto_category")
+    today = datetime.utcnow().date().isoformat()
+    assert [(i["date"] == today, i["function_key"], i["model"]) for i in items] == [
+        (True, "auto_category", "m1"), (True, "auto_category", "m2"), (True, "global", "m1"),
+        (False, "auto_category", "m1"),
+    ]
+    m1 = items[0]
+    assert (m1["calls"], m1["errors"], m1["retries"]) == (11, 1, 2)
+    assert (m1["prompt_tokens"], m1["completion_tokens"], m1["total_tokens"]) == (1000, 50, 1050)
+    # 失败调用不计入耗时分位数
+    assert m1["latency_ms"] == {"p50": 60, "p95": 100, "max": 100}
+    assert items[1]["latency_ms"]["p50"] == 40
+    assert [(i["model"], i["calls"]) for i in only] == [("m1", 11), ("m2", 1)]
+
+    # 缓冲上限：丢弃最旧的记录
+    small = AITelemetryWriter(maker, flush_delay=10, max_buffer=3)
+    for i in range(5):
+        small.record("pet_chat", latency_ms=i)
+    assert [r["latency_ms"] for r in small._buffer] == [2, 3, 4] and small.stats["dropped"] == 2
+    await small.stop()
+    assert usage_tokens({"prompt_tokens": "12", "completion_tokens": None}) == {"prompt_tokens": 12, "completion_tokens": 0}
+    assert usage_tokens("bad") == {"prompt_tokens": 0, "completion_tokens": 0}
+
+
+@pytest.mark.asyncio
+async def test_service_calls_are_recorded(maker, monkeypatch):
+    writer = AITelemetryWriter(maker, flush_delay=10)
+    monkeypatch.setattr(ai_module, "ai_telemetry", writer)
+    monkeypatch.setattr(ai_module, "ai_governor", AIGovernor())
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        prompt = json.dumps(body["messages"], ensure_ascii=False)
+        if "限流" in prompt and len(requests) == 1:
+            return httpx.Response(429, headers={"retry-after": "0.01"})
+        if "坏" in prompt:
+            return httpx.Response(500, text="boom")
+        if body.get("stream"):
+            chunks = [
+                {"choices": [{"delta": {"content": "你"}}]},
+                {"choices": [{"delta": {"content": "好"}}]},
+                {"choices": [], "usage": {"prompt_tokens": 8, "completion_tokens": 2}},
+            ]
+            text = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=text, headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "ok"}}],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 4, "total_tokens": 34},
+        })
+
+    monkeypatch.setattr(ai_module, "_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_skill_cache_loaded", True)
+    monkeypatch.setattr(ai_module, "_function_model_cache", {})
+    monkeypatch.setattr(ai_module, "_skill_cache", {})
+    set_active_ai_provider("sk-test", URL, "fake-model")
+    service = AIService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        assert await service.chat("限流", function_key="auto_category") == "ok"
+        assert await service.chat_with_vision("看图", "aGVsbG8=", function_key="photo_recognize") == "ok"
+        stream = await service.chat_stream("你好", function_key="chat_reply")
+        assert "".join([d async for d in stream]) == "你好"
+        with pytest.raises(ValueError):
+            await service.chat("坏")
+    finally:
+        await service.close()
+        clear_active_ai_provider()
+
+    # 记录在缓冲中，调用本身不等待写入
+    assert len(writer._buffer) == 4
+    await writer.stop()
+    rows = await load_rows(maker)
+    assert [(r.function_key, r.kind, r.status, r.retries, r.prompt_tokens, r.completion_tokens) for r in rows] == [
+        ("auto_category", "chat", "ok", 1, 30, 4),
+        ("photo_recognize", "vision", "ok", 0, 30, 4),
+        ("chat_reply", "stream", "ok", 0, 8, 2),
+        ("global", "chat", "error", 0, 0, 0),
+    ]
+    assert all(r.model == "fake-model" and r.source == "global" for r in rows)
+    assert rows[0].latency_ms >= 10
+    assert requests[3]["stream_options"] == {"include_usage": True}
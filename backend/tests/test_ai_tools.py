@@ -0,0 +1,139 @@
+"""
+AI 工具并发执行与结果缓存测试
+
+验证多个工具并发执行且各自使用独立会话、输出顺序与格式不变，结果按 (家庭, 工具) 缓存，
+相关数据写入提交后家庭数据版本号递增使缓存失效，回滚不递增，个人工具按用户区分缓存。
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import User, Family, FamilyMember, Deposit, Investment, InvestmentIncome, AssetType
+from app.services import ai_tools
+from app.services.ai_tools import execute_tools, get_family_data_version
+
+
+@pytest_asyncio.fixture
+async def maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tools.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        family = Family(name="测试之家", invite_code="TOOLS1")
+        db.add(family)
+        await db.flush()
+        for i, name in enumerate(("小明", "小红"), start=1):
+            db.add(User(id=i, username=f"u{i}", email=f"u{i}@example.com", hashed_password="x", nickname=name))
+            db.add(FamilyMember(family_id=family.id, user_id=i, role="admin" if i == 1 else "member"))
+        db.add(Deposit(family_id=family.id, user_id=1, amount=1000, deposit_date=datetime(2026, 1, 5)))
+        await db.commit()
+    ai_tools.clear_tool_cache()
+    yield maker
+    ai_tools.clear_tool_cache()
+    await engine.dispose()
+
+
+class CountingMaker:
+    """记录打开的会话数与并发峰值"""
+
+    def __init__(self, maker):
+        self.maker = maker
+        self.opened = 0
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self):
+        counter = self
+
+        class _Ctx:
+            async def __aenter__(self):
+                counter.opened += 1
+                counter.active += 1
+                counter.peak = max(counter.peak, counter.active)
+                self.session = counter.maker()
+                db = await self.session.__aenter__()
+                await asyncio.sleep(0.01)
+                return db
+
+            async def __aexit__(self, *exc):
+                counter.active -= 1
+                return await self.session.__aexit__(*exc)
+
+        return _Ctx()
+
+
+async def load_user(maker, user_id: int) -> User:
+    async with maker() as db:
+        return await db.get(User, user_id)
+
+
+@pytest.mark.asyncio
+async def test_tools_run_concurrently_and_cache(maker):
+    counting = CountingMaker(maker)
+    user = await load_user(maker, 1)
+    names = ["get_family_info", "get_my_deposits", "get_family_members", "no_such_tool"]
+
+    text = await execute_tools(names, None, user, 1, session_maker=counting)
+    blocks = text.split("\n\n")
+    assert [b.split("\n", 1)[0] for b in blocks] == [f"【{n}】" for n in names]
+    assert blocks[0].endswith("家庭名称：测试之家")
+    assert "¥1,000.00（共 1 笔）" in blocks[1]
+    assert blocks[3].endswith("[工具 no_such_tool 不存在]")
+    assert counting.opened == 3 and counting.peak == 3
+
+    # 再次执行直接命中缓存，不再打开会话
+    assert await execute_tools(names, None, user, 1, session_maker=counting) == text
+    assert counting.opened == 3
+
+    # 个人工具按用户区分缓存
+    other = await execute_tools(["get_my_deposits"], None, await load_user(maker, 2), 1, session_maker=counting)
+    assert "小红" in other and "¥0.00" in other and counting.opened == 4
+
+
+@pytest.mark.asyncio
+async def test_committed_writes_bump_family_version(maker):
+    counting = CountingMaker(maker)
+    user = await load_user(maker, 1)
+    await execute_tools(["get_family_deposits"], None, user, 1, session_maker=counting)
+    version = get_family_data_version(1)
+
+    # 回滚的写入不递增版本号
+    async with maker() as db:
+        db.add(Deposit(family_id=1, user_id=2, amount=500, deposit_date=datetime(2026, 2, 1)))
+        await db.flush()
+        await db.rollback()
+    assert get_family_data_version(1) == version
+
+    async with maker() as db:
+        db.add(Deposit(family_id=1, user_id=2, amount=500, deposit_date=datetime(2026, 2, 1)))
+        await db.commit()
+    assert get_family_data_version(1) == version + 1
+    text = await execute_tools(["get_family_deposits"], None, user, 1, session_maker=counting)
+    assert "¥1,500.00" in text and counting.opened == 2
+
+    # 理财收益经 investment_id 解析到家庭；成员改昵称也使其所在家庭失效
+    async with maker() as db:
+        inv = Investment(family_id=1, name="定期", investment_type=AssetType.TIME_DEPOSIT,
+                         principal=100, start_date=datetime(2026, 1, 1))
+        db.add(inv)
+        await db.commit()
+    version = get_family_data_version(1)
+    async with maker() as db:
+        db.add(InvestmentIncome(investment_id=inv.id, amount=1, calculated_income=1,
+                                income_date=datetime(2026, 3, 1)))
+        await db.commit()
+    assert get_family_data_version(1) == version + 1
+    async with maker() as db:
+        (await db.get(User, 2)).nickname = "小红红"
+        await db.commit()
+    assert get_family_data_version(1) == version + 2
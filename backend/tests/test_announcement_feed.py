@@ -0,0 +1,129 @@
+"""
+公告信息流测试
+
+验证信息流的查询次数与页大小无关、游标翻页按 (置顶, 发布时间, id) 倒序不重不漏，
+每条公告附带最近 N 条评论，点赞/评论接口在同一事务内维护冗余计数。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.api.announcement import (
+    CommentCreate, add_comment, delete_comment, get_announcement_detail, list_announcements, toggle_like,
+)
+from app.core.database import ANNOUNCEMENT_COUNTERS, Base, _recount, _recount_announcements
+from app.core.principal import Principal, invalidate_principal, load_principal
+from app.models.models import (
+    Announcement, AnnouncementComment, AnnouncementLike, Family, FamilyMember, User,
+)
+from app.schemas.common import TimeRange
+
+ME = Principal(1, "A", 1, "admin", 0)
+
+
+@pytest_asyncio.fixture
+async def setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'feed.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    base = datetime.utcnow() - timedelta(days=1)
+    async with maker() as db:
+        db.add(Family(id=1, name="F", invite_code="FEED01"))
+        for uid in (1, 2, 3):
+            db.add(User(id=uid, username=f"u{uid}", email=f"u{uid}@example.com", hashed_password="x", nickname=f"成员{uid}"))
+        await db.flush()
+        for uid in (1, 2, 3):
+            db.add(FamilyMember(user_id=uid, family_id=1, role="admin" if uid == 1 else "member"))
+        for i in range(1, 31):
+            # 同一时间发布的公告按 id 区分先后
+            db.add(Announcement(id=i, family_id=1, user_id=(i % 3) + 1, content=f"公告{i}",
+                                is_pinned=i in (3, 17), created_at=base + timedelta(minutes=i // 2)))
+        await db.flush()
+        for i in range(1, 31):
+            for uid in range(1, 1 + i % 4):
+                db.add(AnnouncementLike(announcement_id=i, user_id=uid))
+            for n in range(i % 6):
+                db.add(AnnouncementComment(announcement_id=i, user_id=(n % 3) + 1, content=f"评论{i}-{n}",
+                                           created_at=base + timedelta(hours=1, minutes=n)))
+        await db.commit()
+        # 历史数据的冗余计数由启动时的重算回填
+        conn = await db.connection()
+        await conn.run_sync(_recount_announcements)
+        await db.commit()
+    invalidate_principal()
+    async with maker() as db:
+        await load_principal(db, ME.id)
+        statements.clear()
+        yield db, statements
+    invalidate_principal()
+    await engine.dispose()
+
+
+async def feed(db, **kwargs):
+    params = dict(page=1, page_size=20, time_range=TimeRange.ALL, cursor=None, comments_limit=3)
+    params.update(kwargs)
+    return await list_announcements(current_user=ME, db=db, **params)
+
+
+@pytest.mark.asyncio
+async def test_feed_is_batched_and_cursor_paginates(setup):
+    db, statements = setup
+
+    first = await feed(db, page_size=25)
+    assert len(statements) <= 5
+    assert first["total"] == 30 and len(first["items"]) == 25
+
+    item = next(a for a in first["items"] if a["id"] == 29)  # 5 条评论、1 个赞（我）
+    assert (item["likes_count"], item["comments_count"], item["is_liked"]) == (1, 5, True)
+    assert [c["content"] for c in item["comments"]] == ["评论29-2", "评论29-3", "评论29-4"]
+    assert item["comments"][0]["author_name"] == "成员3" and item["author_name"] == "成员3"
+    assert next(a for a in first["items"] if a["id"] == 28)["is_liked"] is False
+
+    # 游标翻页：置顶优先，同一发布时间按 id 倒序，不重不漏
+    page = await feed(db, page_size=7)
+    ids, cursor = [a["id"] for a in page["items"]], page["next_cursor"]
+    while cursor:
+        statements.clear()
+        page = await feed(db, page_size=7, cursor=cursor)
+        assert len(statements) <= 4 and page["total"] is None  # 游标翻页不再统计总数
+        ids += [a["id"] for a in page["items"]]
+        cursor = page["next_cursor"]
+    assert ids == [17, 3] + [i for i in range(30, 0, -1) if i not in (3, 17)]
+
+    with pytest.raises(Exception) as exc:
+        await feed(db, cursor="not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_like_and_comment_keep_counters(setup):
+    db, _ = setup
+    me = await db.get(User, 1)
+
+    result = await toggle_like.__wrapped__(request=None, announcement_id=4, current_user=me, db=db)
+    assert (result["action"], result["likes_count"]) == ("liked", 1)
+    result = await toggle_like.__wrapped__(request=None, announcement_id=5, current_user=me, db=db)
+    assert (result["action"], result["likes_count"]) == ("unliked", 0)
+
+    added = await add_comment(announcement_id=4, data=CommentCreate(content="新评论"), current_user=me, db=db)
+    assert added["comments_count"] == 5
+    await delete_comment(announcement_id=4, comment_id=added["comment"]["id"], current_user=me, db=db)
+
+    detail = await get_announcement_detail(announcement_id=4, current_user=ME, db=db)
+    assert (detail["likes_count"], detail["comments_count"], detail["is_liked"]) == (1, 4, True)
+    assert len(detail["comments"]) == 4
+
+    # 冗余计数与明细一致：重算不校正任何公告
+    conn = await db.connection()
+    assert await conn.run_sync(lambda c: _recount(c, "announcements", ANNOUNCEMENT_COUNTERS)) == 0
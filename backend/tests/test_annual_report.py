@@ -0,0 +1,78 @@
+"""
+年度报告缓存测试
+
+验证报告产物写入 annual_reports 后直接复用，
+并且只有该年份（或更早年份）的流水变动才会使其失效。
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import Deposit, Family, FamilyMember, Transaction, TransactionType, User
+from app.services.annual_report import get_annual_report, pregenerate_annual_reports
+
+
+@pytest_asyncio.fixture
+async def session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'report.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    async with maker() as db:
+        user = User(id=1, username="a", email="a@example.com", hashed_password="x", nickname="A")
+        db.add_all([user, Family(id=1, name="F", invite_code="RPT001"), Family(id=2, name="G", invite_code="RPT002")])
+        await db.flush()
+        db.add(FamilyMember(user_id=1, family_id=1, role="admin"))
+        for day, amount in ((datetime(2024, 3, 5), 1000), (datetime(2025, 6, 1), 500)):
+            db.add(Deposit(user_id=1, family_id=1, amount=amount, deposit_date=day))
+        db.add(Transaction(
+            family_id=1, transaction_type=TransactionType.WITHDRAW, amount=-200,
+            balance_after=800, description="支出", created_at=datetime(2024, 4, 1),
+        ))
+        await db.commit()
+    yield maker
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_report_is_cached_until_its_year_changes(session_maker):
+    async with session_maker() as db:
+        report = await get_annual_report(db, 1, 2024)
+        assert not report["is_cached"]
+        assert report["raw"]["total_deposits"] == 1000
+        assert report["raw"]["total_withdrawals"] == 200
+        assert report["monthly_data"][2]["income"] == 1000
+
+        assert (await get_annual_report(db, 1, 2024))["is_cached"]
+        await get_annual_report(db, 1, 2025)
+
+        # 2025 年的存款不影响 2024 年报告，但 2025 年报告需要重新生成
+        db.add(Deposit(user_id=1, family_id=1, amount=300, deposit_date=datetime(2025, 7, 1)))
+        await db.commit()
+        assert (await get_annual_report(db, 1, 2024))["is_cached"]
+        report = await get_annual_report(db, 1, 2025)
+        assert not report["is_cached"]
+        assert report["raw"]["total_deposits"] == 800
+
+        # 2024 年的变动会使 2024 年及之后的报告失效（年初余额与股权按累计计算）
+        db.add(Deposit(user_id=1, family_id=1, amount=50, deposit_date=datetime(2024, 12, 31)))
+        await db.commit()
+        assert not (await get_annual_report(db, 1, 2024))["is_cached"]
+        assert not (await get_annual_report(db, 1, 2025))["is_cached"]
+
+
+@pytest.mark.asyncio
+async def test_pregenerate_reports_for_all_families(session_maker):
+    stats = await pregenerate_annual_reports(2024, concurrency=2, session_maker=session_maker)
+    assert stats == {"families": 2, "generated": 2, "cached": 0, "failed": 0}
+
+    stats = await pregenerate_annual_reports(2024, concurrency=2, session_maker=session_maker)
+    assert stats["cached"] == 2
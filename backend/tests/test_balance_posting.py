@@ -0,0 +1,97 @@
+"""
+活期余额记账并发压力测试
+
+多个会话同时对同一家庭记账时，最终余额必须等于各笔变动之和，
+且按 id 排列的 balance_after 链每一步都等于上一笔余额加本笔变动（不分叉）。
+"""
+import asyncio
+import os
+import random
+import sys
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import Family, FamilyAccount, Transaction, TransactionType
+from app.services.balance import get_balance, post_transaction
+
+FAMILIES = 3
+POSTS_PER_FAMILY = 40
+
+
+@pytest.mark.asyncio
+async def test_concurrent_posting_keeps_balance_chain(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'balance.db'}",
+        connect_args={"timeout": 30},
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_maker() as db:
+        families = [Family(name=f"家庭{i}", invite_code=f"STRESS{i}") for i in range(FAMILIES)]
+        db.add_all(families)
+        await db.flush()
+        family_ids = [f.id for f in families]
+        # 第一个家庭带有历史流水但没有账户行，验证账户按流水链末端初始化
+        db.add(Transaction(
+            family_id=family_ids[0], transaction_type=TransactionType.DEPOSIT,
+            amount=500.0, balance_after=500.0, description="历史流水",
+        ))
+        await db.commit()
+
+    rng = random.Random(42)
+    deltas = {
+        fid: [round(rng.uniform(-100, 200), 2) for _ in range(POSTS_PER_FAMILY)]
+        for fid in family_ids
+    }
+
+    async def post(family_id: int, delta: float):
+        async with session_maker() as db:
+            await post_transaction(
+                db, family_id, TransactionType.DEPOSIT, delta, "并发记账",
+            )
+            # 让出事件循环，使其他会话在本事务提交前尝试记账
+            await asyncio.sleep(0)
+            await db.commit()
+
+    jobs = [post(fid, d) for fid, ds in deltas.items() for d in ds]
+    rng.shuffle(jobs)
+    await asyncio.gather(*jobs)
+
+    async with session_maker() as db:
+        for fid in family_ids:
+            opening = 500.0 if fid == family_ids[0] else 0.0
+            expected = opening + sum(deltas[fid])
+
+            account = await db.get(FamilyAccount, fid)
+            assert account is not None
+            assert account.balance == pytest.approx(expected)
+            assert await get_balance(db, fid) == pytest.approx(expected)
+
+            result = await db.execute(
+                select(Transaction).where(Transaction.family_id == fid).order_by(Transaction.id)
+            )
+            chain = result.scalars().all()
+            assert len(chain) == POSTS_PER_FAMILY + (1 if fid == family_ids[0] else 0)
+            previous = 0.0
+            for txn in chain:
+                assert txn.balance_after == pytest.approx(previous + txn.amount)
+                previous = txn.balance_after
+            assert account.last_transaction_id == chain[-1].id
+
+    await engine.dispose()
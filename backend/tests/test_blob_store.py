@@ -0,0 +1,70 @@
+"""
+内容寻址图片存储测试
+
+验证去重与分片目录、data URI 解析，以及 /uploads 静态挂载返回的强 ETag。
+"""
+import base64
+import os
+import sys
+
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services import blob_store
+from app.services.blob_store import BlobStaticFiles, blob_path, store_bytes, store_data_uri, externalize
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    monkeypatch.setattr(blob_store, "BLOB_ROOT", str(root / "blobs"))
+    return root
+
+
+def test_identical_content_is_stored_once(uploads):
+    first = store_bytes(PNG, "image/png")
+    second = store_data_uri("data:image/png;base64," + base64.b64encode(PNG).decode())
+
+    assert first == second
+    digest = first.rsplit("/", 1)[-1].split(".")[0]
+    assert first == f"/uploads/blobs/{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert len(list((uploads / "blobs").rglob("*.png"))) == 1
+    with open(blob_path(first), "rb") as f:
+        assert f.read() == PNG
+
+
+def test_externalize_keeps_urls_and_converts_data_uris(uploads):
+    assert externalize("/uploads/receipts/old.jpg") == "/uploads/receipts/old.jpg"
+    assert externalize(None) is None
+    url = externalize("data:image/jpeg;base64," + base64.b64encode(b"jpeg-bytes").decode())
+    assert url.startswith("/uploads/blobs/") and url.endswith(".jpg")
+
+
+def test_static_mount_serves_strong_etag(uploads):
+    url = store_bytes(PNG, "image/png")
+    digest = url.rsplit("/", 1)[-1].split(".")[0]
+    (uploads / "other.txt").write_text("plain")
+
+    app = Starlette()
+    app.mount("/uploads", BlobStaticFiles(directory=str(uploads)))
+    client = TestClient(app)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["etag"] == f'"{digest}"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(url, headers={"If-None-Match": f'"{digest}"'})
+    assert response.status_code == 304
+
+    # 非 blobs 目录下的文件保持默认行为
+    response = client.get("/uploads/other.txt")
+    assert response.status_code == 200
+    assert response.headers["etag"] != f'"{digest}"'
@@ -0,0 +1,86 @@
+"""
+日历重复事件展开测试
+
+验证算术定位与逐次累加结果一致、月末/闰日按当月天数截取，
+以及多事件按开始时间惰性合并。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.models.models import (
+    CalendarEvent, CalendarEventParticipant, CalendarEventCategory, CalendarRepeatType,
+)
+from app.services.recurrence import iter_occurrences, iter_instances
+
+
+def make_event(event_id, start, repeat_type, **kwargs):
+    event = CalendarEvent(
+        id=event_id, family_id=1, title=f"事件{event_id}", category=CalendarEventCategory.FAMILY,
+        start_time=start, end_time=kwargs.pop("end_time", None), is_all_day=False,
+        repeat_type=repeat_type, repeat_until=kwargs.pop("repeat_until", None),
+        color="#667eea", is_system=False, created_by=1, created_at=start,
+    )
+    event.participants = [CalendarEventParticipant(event_id=event_id, user_id=1)]
+    return event
+
+
+def test_fixed_steps_seek_directly_into_window():
+    start = datetime(2022, 3, 1, 8, 30)
+    window = (datetime(2025, 1, 10), datetime(2025, 1, 31, 23, 59))
+
+    for repeat_type, step in ((CalendarRepeatType.DAILY, timedelta(days=1)),
+                              (CalendarRepeatType.WEEKLY, timedelta(weeks=1))):
+        expected, current = [], start
+        while current <= window[1]:
+            if current >= window[0]:
+                expected.append(current)
+            current += step
+        assert list(iter_occurrences(start, repeat_type, *window)) == expected
+
+    until = datetime(2025, 1, 12, 8, 30)
+    assert list(iter_occurrences(start, CalendarRepeatType.DAILY, *window, until=until)) == [
+        datetime(2025, 1, 10, 8, 30), datetime(2025, 1, 11, 8, 30), datetime(2025, 1, 12, 8, 30),
+    ]
+
+
+def test_month_end_and_leap_day_are_clamped_without_drift():
+    monthly = list(iter_occurrences(
+        datetime(2024, 1, 31, 9), CalendarRepeatType.MONTHLY, datetime(2025, 1, 31, 10), datetime(2025, 4, 30, 23),
+    ))
+    assert monthly == [datetime(2025, 2, 28, 9), datetime(2025, 3, 31, 9), datetime(2025, 4, 30, 9)]
+
+    yearly = list(iter_occurrences(
+        datetime(2020, 2, 29), CalendarRepeatType.YEARLY, datetime(2023, 1, 1), datetime(2028, 12, 31),
+    ))
+    assert yearly == [datetime(y, 2, 29 if y % 4 == 0 else 28) for y in range(2023, 2029)]
+
+
+def test_instances_merge_in_start_order_and_share_payload():
+    members_map = {1: {"id": 1, "nickname": "A", "avatar_version": 0}}
+    events = [
+        make_event(1, datetime(2021, 5, 3, 9), CalendarRepeatType.WEEKLY, end_time=datetime(2021, 5, 3, 10)),
+        make_event(2, datetime(2025, 6, 4, 12), CalendarRepeatType.NONE),
+        make_event(3, datetime(2019, 1, 1, 7), CalendarRepeatType.DAILY),
+    ]
+    window = (datetime(2025, 6, 1), datetime(2025, 6, 30))
+
+    instances = list(iter_instances(events, *window, members_map))
+    starts = [i["start_time"] for i in instances]
+    assert starts == sorted(starts)
+    assert len(instances) == 4 + 1 + 29
+
+    weekly = [i for i in instances if i["id"] == 1]
+    assert weekly[0]["end_time"] - weekly[0]["start_time"] == timedelta(hours=1)
+    assert weekly[0]["participants"] is weekly[1]["participants"]
+    assert weekly[0]["original_id"] == 1 and weekly[0]["is_recurring_instance"]
+    assert "is_recurring_instance" not in next(i for i in instances if i["id"] == 2)
+
+    first = list(islice(iter_instances(events, *window, members_map), 3))
+    assert [(i["id"], i["start_time"]) for i in first] == [
+        (3, datetime(2025, 6, 1, 7)), (3, datetime(2025, 6, 2, 7)), (1, datetime(2025, 6, 2, 9)),
+    ]
@@ -0,0 +1,153 @@
+"""
+日历系统事件同步测试
+
+验证全量同步的查询次数与待办数量无关、重复同步不产生变更，
+以及来源变化后按集合比对更新/删除，增量钩子就地更新参与者；
+批量写入后成就计数器与历史记录一致。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import (
+    AssetType, CalendarEvent, CalendarEventCategory, CalendarEventParticipant, EquityGift, EquityGiftStatus,
+    Family, Investment, TodoItem, TodoList, User,
+)
+from app.services.achievement_counters import load_user_counters, rebuild_user_counters, verify_user_counters
+from app.services.calendar import calendar_service, sync_family_system_events
+
+
+@pytest_asyncio.fixture
+async def setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'calendar.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    queries = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    now = datetime.utcnow()
+    async with maker() as db:
+        db.add_all([
+            Family(id=1, name="F", invite_code="CAL001"),
+            User(id=1, username="a", email="a@example.com", hashed_password="x", nickname="A"),
+            User(id=2, username="b", email="b@example.com", hashed_password="x", nickname="B"),
+            TodoList(id=1, family_id=1, name="家务", created_by=1),
+            Investment(id=1, family_id=1, name="理财A", investment_type=AssetType.FUND, principal=10000,
+                       start_date=now - timedelta(days=30), end_date=now + timedelta(days=60)),
+            EquityGift(id=1, family_id=1, from_user_id=1, to_user_id=2, amount=0.05,
+                       status=EquityGiftStatus.PENDING),
+        ])
+        for i in range(40):
+            db.add(TodoItem(list_id=1, title=f"任务{i}", created_by=1, assignee_id=2 if i == 0 else None,
+                            due_date=now + timedelta(days=i + 1)))
+        db.add(TodoItem(list_id=1, title="已过期", created_by=1, due_date=now - timedelta(days=1)))
+        await db.commit()
+        queries.clear()
+        yield db, queries
+    await engine.dispose()
+
+
+async def events_by_source(db, source_type):
+    rows = await db.execute(select(CalendarEvent).where(CalendarEvent.source_type == source_type))
+    return {e.source_id: e for e in rows.scalars().all()}
+
+
+@pytest.mark.asyncio
+async def test_full_sync_is_set_based_and_idempotent(setup):
+    db, queries = setup
+
+    stats = await sync_family_system_events(db, 1, created_by=1)
+    await db.commit()
+    assert stats == {"created": 42, "updated": 0, "deleted": 0}  # 40 个待办 + 理财 + 赠与，已过期的不新建
+    assert len(queries) < 20
+
+    todos = await events_by_source(db, "todo")
+    participants = (await db.execute(
+        select(CalendarEventParticipant.user_id).where(CalendarEventParticipant.event_id == todos[1].id)
+    )).scalars().all()
+    assert participants == [2]
+
+    assert await sync_family_system_events(db, 1, created_by=1) == {"created": 0, "updated": 0, "deleted": 0}
+
+    first, second = (await db.execute(select(TodoItem).where(TodoItem.id.in_([1, 2])).order_by(TodoItem.id))).scalars()
+    first.is_completed = True
+    second.title = "改名"
+    gift = await db.get(EquityGift, 1)
+    gift.status = EquityGiftStatus.ACCEPTED
+    await db.flush()
+    stats = await sync_family_system_events(db, 1, created_by=1)
+    await db.commit()
+    assert stats == {"created": 0, "updated": 2, "deleted": 1}
+
+    todos = await events_by_source(db, "todo")
+    assert 1 not in todos and todos[2].title == "📋 待办截止：改名"
+    assert (await events_by_source(db, "gift"))[1].title == "🎁 股权赠与已接收"
+
+
+@pytest.mark.asyncio
+async def test_hooks_reconcile_single_source(setup):
+    db, _ = setup
+    todo = await db.get(TodoItem, 3)
+
+    await calendar_service.create_todo_reminder(db, 1, todo, created_by=1, assignee_id=1)
+    assert await calendar_service.create_todo_reminder(db, 1, todo, created_by=1, assignee_id=1) == \
+        {"created": 0, "updated": 0, "deleted": 0}
+
+    todo.due_date = todo.due_date + timedelta(days=1)
+    await calendar_service.update_todo_reminder(db, 1, todo, created_by=1, assignee_id=2)
+    await db.commit()
+    event_row = (await events_by_source(db, "todo"))[3]
+    participants = (await db.execute(
+        select(CalendarEventParticipant.user_id).where(CalendarEventParticipant.event_id == event_row.id)
+    )).scalars().all()
+    assert event_row.start_time == todo.due_date
+    assert participants == [2]
+
+    await calendar_service.delete_todo_reminder(db, 1, 3)
+    await db.commit()
+    assert await events_by_source(db, "todo") == {}
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_achievement_counters_consistent(setup):
+    db, _ = setup
+
+    await sync_family_system_events(db, 1, created_by=1)
+    await db.commit()
+    # 先把一个系统事件改成家庭分类再回填计数器，下次同步改回系统分类时需扣减家庭事件数
+    todos = await events_by_source(db, "todo")
+    await db.execute(
+        update(CalendarEvent).where(CalendarEvent.id == todos[3].id).values(category=CalendarEventCategory.FAMILY)
+    )
+    await rebuild_user_counters(db, 1)
+    await db.commit()
+
+    first, second = (await db.execute(select(TodoItem).where(TodoItem.id.in_([1, 2])).order_by(TodoItem.id))).scalars()
+    first.is_completed = True
+    await db.delete(second)
+    await db.delete(await db.get(EquityGift, 1))
+    await db.commit()
+    assert await sync_family_system_events(db, 1, created_by=1) == {"created": 0, "updated": 1, "deleted": 3}
+    await db.commit()
+    assert await verify_user_counters(db, 1) == []
+    counters = await load_user_counters(db, 1)
+    assert counters["calendar_event_count"] == 39
+    assert counters.get("calendar_family_event_count", 0) == 0
+
+    # 新增来源与增量钩子
+    db.add(TodoItem(list_id=1, title="新任务", created_by=1, due_date=datetime.utcnow() + timedelta(days=3)))
+    await db.commit()
+    assert (await sync_family_system_events(db, 1, created_by=1))["created"] == 1
+    await calendar_service.delete_todo_reminder(db, 1, 3)
+    await db.commit()
+    assert await verify_user_counters(db, 1) == []
+    assert (await load_user_counters(db, 1))["calendar_event_count"] == 39
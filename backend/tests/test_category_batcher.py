@@ -0,0 +1,141 @@
+"""
+消费分类微批处理测试
+
+验证时间窗口/条数上限内的分类请求合并为一次批量调用并按顺序分发结果，重复记录去重，
+回复缺项或无效时仅对缺失条目逐条回退，调用失败时归为 other；以及文件导入中未填分类的行
+不调用 AI，只有填写了但无法识别的分类才合并为少量 AI 调用。
+"""
+import asyncio
+import io
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from fastapi import UploadFile
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.api.accounting import import_file_parse
+from app.services import ai_accounting
+from app.services.category_batcher import CategoryBatcher, build_batch_prompt, parse_batch_response
+
+KEYWORDS = {"咖啡": "food", "地铁": "transport", "电影": "entertainment"}
+
+
+def guess(description: str) -> str:
+    return next((c for k, c in KEYWORDS.items() if k in description), "other")
+
+
+class FakeAI:
+    def __init__(self, drop=()):
+        self.batches = []
+        self.singles = []
+        self.drop = set(drop)
+
+    async def call_batch(self, entries):
+        self.batches.append(entries)
+        await asyncio.sleep(0.01)
+        return {"results": [
+            {"i": i, "category": guess(d)}
+            for i, (d, _) in enumerate(entries, start=1) if d not in self.drop
+        ]}
+
+    async def fallback(self, description, amount):
+        self.singles.append(description)
+        return guess(description)
+
+
+@pytest.mark.asyncio
+async def test_requests_are_batched_and_deduplicated():
+    ai = FakeAI()
+    batcher = CategoryBatcher(max_batch=10, window=0.02, call_batch=ai.call_batch, fallback=ai.fallback)
+    entries = [(f"{k}#{i % 12}", float(i % 12)) for i, k in enumerate(["咖啡", "地铁", "电影"] * 10)]
+    results = await batcher.classify_many(entries)
+    assert results == [guess(d) for d, _ in entries]
+    # 30 条中只有 12 个不同的 (描述, 金额)：一批满 10 条立即发送，剩余 2 条在窗口结束后发送
+    assert [len(b) for b in ai.batches] == [10, 2] and not ai.singles
+
+    # 各自独立发起、落在同一时间窗口内的请求也合并
+    ai.batches.clear()
+    outs = await asyncio.gather(batcher.classify("咖啡 A", 30), batcher.classify("地铁 B", 4))
+    assert outs == ["food", "transport"] and len(ai.batches) == 1
+
+    # 窗口内只有一条时直接走单条分类
+    assert await batcher.classify("电影票", 60) == "entertainment"
+    assert ai.singles == ["电影票"] and len(ai.batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_per_item_fallback_and_failures():
+    ai = FakeAI(drop={"地铁 2"})
+    batcher = CategoryBatcher(window=0.01, call_batch=ai.call_batch, fallback=ai.fallback)
+    assert await batcher.classify_many([("咖啡 1", 1), ("地铁 2", 2), ("电影 3", 3)]) == [
+        "food", "transport", "entertainment",
+    ]
+    assert ai.singles == ["地铁 2"] and batcher.stats["fallbacks"] == 1
+
+    assert parse_batch_response({"results": [
+        {"i": 1, "category": "FOOD"}, {"i": 2, "category": "snacks"}, {"i": 9, "category": "pet"}, "x",
+    ]}, 3) == {0: "food"}
+    assert parse_batch_response(None, 3) == {}
+    assert "1. 咖啡 | 12.5元\n2. 地铁 | 未知元" in build_batch_prompt([("咖啡", 12.5), ("地铁", None)])
+
+    async def broken(entries):
+        raise ValueError("AI 服务调用失败: HTTP 503")
+    down = CategoryBatcher(window=0.01, call_batch=broken, fallback=ai.fallback)
+    assert await down.classify_many([("咖啡", 1), ("地铁", 2)]) == ["other", "other"]
+    assert ai.singles == ["地铁 2"]
+
+
+@pytest.mark.asyncio
+async def test_csv_import_batches_only_unrecognised_categories(monkeypatch):
+    ai = FakeAI()
+    monkeypatch.setattr(ai_accounting, "category_batcher",
+                        CategoryBatcher(call_batch=ai.call_batch, fallback=ai.fallback))
+    rows = ["日期,金额,备注,分类"]
+    for i in range(200):
+        kind = ["咖啡", "地铁", "电影", "房租"][i % 4]
+        if kind == "房租":
+            category = "住房"
+        elif i == 101:
+            category = "其他"
+        else:
+            category = "" if i < 100 else "日常开销"
+        rows.append(f"2026-03-{i % 28 + 1:02d},{i + 1}.5,{kind}{i},{category}")
+    items = await ai_accounting.parse_import_file("\n".join(rows).encode("utf-8"), "bill.csv")
+
+    assert len(items) == 200
+    # 未填分类的行与以往一样归为 other，不调用 AI
+    assert [it.category for it in items[:4]] == ["other", "other", "other", "housing"]
+    assert [it.category for it in items[100:104]] == ["food", "other", "entertainment", "housing"]
+    # 50 行可识别（房租→住房）、75 行未填、1 行明确为“其他”，其余 74 行无法识别的分类按 40 条一批共 2 次调用
+    assert [len(b) for b in ai.batches] == [40, 34] and not ai.singles
+
+
+@pytest.mark.asyncio
+async def test_excel_file_import_endpoint(monkeypatch):
+    import openpyxl
+
+    ai = FakeAI()
+    monkeypatch.setattr(ai_accounting, "category_batcher",
+                        CategoryBatcher(window=0.01, call_batch=ai.call_batch, fallback=ai.fallback))
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["日期", "金额", "备注", "分类"])
+    sheet.append(["2026-03-01", 12.5, "咖啡", None])
+    sheet.append(["2026-03-02", 4, "地铁", "通勤杂费"])
+    sheet.append(["2026-03-03", 60, "电影", "娱乐"])
+    sheet.append(["2026-03-04", 30, "咖啡豆", "日常开销"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    result = await import_file_parse(
+        file=UploadFile(file=io.BytesIO(buffer.getvalue()), filename="bill.xlsx"),
+        current_user=SimpleNamespace(id=1),
+    )
+    assert result["count"] == 4
+    assert [it["category"] for it in result["items"]] == ["other", "transport", "entertainment", "food"]
+    # 只有两条无法识别的分类进入同一批次
+    assert ai.batches == [[("地铁", 4.0), ("咖啡豆", 30.0)]] and not ai.singles
@@ -0,0 +1,226 @@
+"""
+宠物小游戏会话存储测试
+
+验证每个家庭成员每种游戏独立一行、活跃会话命中缓存时不访问会话表，
+延迟写入合并多次操作，会话修改随请求事务提交后才进入缓存（回滚时丢弃），
+以及旧版 family_pets.game_sessions 中会话的迁移。
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import app.api.pet as pet_api
+from app.api.pet import GameActionRequest, GameStartRequest, game_action, start_game
+from app.core.database import Base
+from app.core.principal import invalidate_principal
+from app.models.models import Family, FamilyMember, FamilyPet, PetGameSession, User
+from app.services.game_sessions import GameSessionStore
+
+
+@pytest_asyncio.fixture
+async def setup(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'games.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Family(id=1, name="F", invite_code="GAME01"))
+        for uid in (1, 2):
+            db.add(User(id=uid, username=f"u{uid}", email=f"u{uid}@example.com", hashed_password="x", nickname=f"成员{uid}"))
+        await db.flush()
+        for uid in (1, 2):
+            db.add(FamilyMember(user_id=uid, family_id=1, role="admin" if uid == 1 else "member"))
+        db.add(FamilyPet(family_id=1, name="金金"))
+        await db.commit()
+    store = GameSessionStore(session_maker=maker, flush_delay=0.05)
+    monkeypatch.setattr(pet_api, "game_sessions", store)
+    invalidate_principal()
+    yield maker, store, statements
+    await store.stop()
+    invalidate_principal()
+    await engine.dispose()
+
+
+async def rows(maker):
+    async with maker() as db:
+        result = await db.execute(select(PetGameSession.user_id, PetGameSession.game_type, PetGameSession.state))
+        return {(uid, game): json.loads(state) for uid, game, state in result.all()}
+
+
+@pytest.mark.asyncio
+async def test_members_play_independently_and_actions_skip_session_table(setup):
+    maker, store, statements = setup
+    async with maker() as db:
+        users = [await db.get(User, uid) for uid in (1, 2)]
+        for user in users:
+            await start_game(GameStartRequest(game_type="memory"), current_user=user, db=db)
+        await start_game(GameStartRequest(game_type="minesweeper"), current_user=users[0], db=db)
+
+        statements.clear()
+        for user, position in ((users[0], 0), (users[1], 1), (users[0], 2)):
+            await game_action(GameActionRequest(game_type="memory", action={"position": position}),
+                              current_user=user, db=db)
+        assert not any("pet_game_sessions" in s for s in statements)
+        assert json.loads((await db.get(FamilyPet, 1)).game_sessions or "{}") == {}
+
+    # 只写入一次：三个会话合并为一条 upsert
+    statements.clear()
+    assert await store.flush() == 3
+    assert sum("pet_game_sessions" in s for s in statements) == 1
+    saved = await rows(maker)
+    assert set(saved) == {(1, "memory"), (2, "memory"), (1, "minesweeper")}
+    assert saved[(2, "memory")]["first_flip"] == 1 and saved[(1, "memory")]["first_flip"] != 1
+
+    # 新的存储实例（如进程重启后）从会话表恢复
+    fresh = GameSessionStore(session_maker=maker)
+    async with maker() as db:
+        state = await fresh.get(db, 1, 2, "memory")
+    assert state == saved[(2, "memory")]
+
+    # 放弃游戏后删除会话
+    async with maker() as db:
+        user = await db.get(User, 2)
+        result = await game_action(GameActionRequest(game_type="memory", action={"action": "abandon"}),
+                                   current_user=user, db=db)
+    assert result["result"]["completed"] is True
+    await store.flush()
+    assert (2, "memory") not in await rows(maker)
+
+
+@pytest.mark.asyncio
+async def test_write_behind_debounces_and_expires(setup):
+    maker, store, _ = setup
+    store.start()
+    async with maker() as db:
+        for step in range(20):
+            store.put(db, 1, 1, "stock", {"step": step})
+            await db.commit()
+    await asyncio.sleep(0.2)
+    assert store.stats["flushes"] == 1
+    assert (await rows(maker))[(1, "stock")] == {"step": 19}
+
+    # 超过空闲超时的会话视为已结束
+    async with maker() as db:
+        store.put(db, 1, 1, "memory", {"step": 0}, now=datetime.utcnow() - timedelta(hours=1))
+        await db.commit()
+        assert await store.get(db, 1, 1, "memory") is None
+        assert await store.get(db, 1, 1, "stock") == {"step": 19}
+        await db.commit()
+    await store.stop()
+    assert set(await rows(maker)) == {(1, "stock")}
+
+
+@pytest.mark.asyncio
+async def test_changes_follow_the_request_transaction(setup):
+    maker, store, _ = setup
+    async with maker() as db:
+        store.put(db, 1, 1, "stock", {"step": 1})
+        await db.commit()
+    await store.flush()
+
+    # 缓存命中时各请求拿到同一个状态对象（对象上的派生缓存跨请求有效）
+    async with maker() as db:
+        first = await store.get(db, 1, 1, "stock")
+        await db.commit()
+    async with maker() as db:
+        assert await store.get(db, 1, 1, "stock") is first
+        await db.commit()
+
+    # 同一请求内可读到暂存的修改；回滚后淘汰被就地修改的缓存会话，从会话表重新加载
+    async with maker() as db:
+        state = await store.get(db, 1, 1, "stock")
+        state["step"] = 2
+        store.put(db, 1, 1, "stock", state)
+        assert await store.get(db, 1, 1, "stock") == {"step": 2}
+        store.discard(db, 1, 2, "stock")
+        assert await store.active_games(db, 1, 1, ["stock"]) == {"stock"}
+        await db.rollback()
+    assert (1, 1, "stock") not in store._live and (1, 2, "stock") not in store._live
+    misses = store.stats["misses"]
+    async with maker() as db:
+        assert await store.get(db, 1, 1, "stock") == {"step": 1}
+        await db.commit()
+    assert store.stats["misses"] == misses + 1 and not store._dirty
+
+    # 仍有未写入修改的会话回滚时先写入再淘汰
+    async with maker() as db:
+        store.put(db, 1, 1, "stock", {"step": 3})
+        await db.commit()
+    async with maker() as db:
+        await store.get(db, 1, 1, "stock")
+        await db.rollback()
+    assert (1, 1, "stock") in store._live and store._stale == {(1, 1, "stock")}
+    await store.flush()
+    assert (1, 1, "stock") not in store._live and not store._stale
+    assert (await rows(maker))[(1, "stock")] == {"step": 3}
+
+    # 请求中途失败回滚：就地修改的状态不会留在缓存中
+    async with maker() as db:
+        user = await db.get(User, 1)
+        await start_game(GameStartRequest(game_type="memory"), current_user=user, db=db)
+    await store.flush()
+    async with maker() as db:
+        before = json.loads(json.dumps(await store.get(db, 1, 1, "memory")))
+        await db.commit()
+    async with maker() as db:
+        session = await pet_api.get_active_session(db, await db.get(FamilyPet, 1), 1, "memory")
+        pet_api.process_memory_action(session, {"position": 0})
+        store.put(db, 1, 1, "memory", session)
+        await db.rollback()
+    async with maker() as db:
+        assert await store.get(db, 1, 1, "memory") == before
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_does_not_overwrite_newer_state(setup):
+    maker, store, _ = setup
+    async with maker() as db:
+        store.put(db, 1, 1, "stock", {"step": 1})
+        await db.commit()
+    await store.flush()
+    store._live.clear()
+
+    # 未命中查询会话表期间，另一个请求提交了新状态
+    async with maker() as db:
+        execute = db.execute
+
+        async def racing_execute(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            async with maker() as other:
+                store.put(other, 1, 1, "stock", {"step": 2})
+                await other.commit()
+            return result
+
+        db.execute = racing_execute
+        assert await store.get(db, 1, 1, "stock") == {"step": 2}
+    await store.flush()
+    assert (await rows(maker))[(1, "stock")] == {"step": 2}
+
+
+@pytest.mark.asyncio
+async def test_legacy_family_session_is_migrated(setup):
+    maker, store, _ = setup
+    legacy = {"board": [1, 1], "started_at": datetime.utcnow().isoformat()}
+    async with maker() as db:
+        pet = await db.get(FamilyPet, 1)
+        pet.game_sessions = json.dumps({"stock": legacy, "_records": {"endless_best_floor": 7}})
+        await db.commit()
+
+        assert await pet_api.get_active_session(db, pet, 2, "stock") == legacy
+        await db.commit()
+        assert json.loads(pet.game_sessions) == {"_records": {"endless_best_floor": 7}}
+        assert pet_api.get_game_records(pet) == {"endless_best_floor": 7}
+    await store.flush()
+    assert (await rows(maker))[(2, "stock")] == legacy
@@ -0,0 +1,174 @@
+"""
+家庭账本快照测试
+
+验证经 ORM 写入存入、流水、持仓、收益、分红与领取后，增量维护的快照与全量重建结果一致；
+回滚的写入不改变快照；人为改坏快照后 verify_family_ledger 报告漂移，重建后恢复一致。
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import (
+    AssetType, Deposit, Dividend, DividendClaim, DividendClaimStatus, DividendStatus, DividendType,
+    Family, FamilyLedgerInvestment, FamilyLedgerMember, Investment, InvestmentIncome, InvestmentPosition,
+    PositionOperationType, Transaction, TransactionType, User,
+)
+from app.services.ledger import (
+    compute_family_ledger, load_family_ledger, rebuild_family_ledger, verify_family_ledger,
+)
+
+NOW = datetime(2026, 3, 1)
+
+
+@pytest_asyncio.fixture
+async def maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ledger.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Family(id=1, name="测试之家", invite_code="LEDGER1"))
+        for i in (1, 2):
+            db.add(User(id=i, username=f"u{i}", email=f"u{i}@example.com", hashed_password="x", nickname=f"U{i}"))
+        db.add(Deposit(family_id=1, user_id=1, amount=1000, deposit_date=NOW))
+        db.add(Transaction(family_id=1, user_id=1, transaction_type=TransactionType.DEPOSIT,
+                           amount=1000, balance_after=1000, description="存入"))
+        await db.commit()
+        # 构建快照，此后的写入走增量路径
+        await rebuild_family_ledger(1, db)
+        await db.commit()
+    yield maker
+    await engine.dispose()
+
+
+async def assert_snapshot_matches_rebuild(maker):
+    async with maker() as db:
+        snapshot = await load_family_ledger(1, db)
+        assert await verify_family_ledger(1, db) == []
+        expected = await compute_family_ledger(1, db)
+    assert snapshot["free_cash"] == pytest.approx(expected["free_cash"])
+    assert snapshot["frozen_amount"] == pytest.approx(expected["frozen_amount"])
+    # 存入全部删除的成员在快照中保留 0 值行，全量计算中不出现
+    assert {k: v for k, v in snapshot["members"].items() if v} == pytest.approx(expected["members"])
+    assert snapshot["investments"].keys() == expected["investments"].keys()
+    for investment_id, values in expected["investments"].items():
+        assert snapshot["investments"][investment_id] == pytest.approx(values)
+    return snapshot
+
+
+def position(investment_id, operation_type, amount, before, after):
+    return InvestmentPosition(
+        investment_id=investment_id, operation_type=operation_type, amount=amount,
+        principal_before=before, principal_after=after, operation_date=NOW,
+    )
+
+
+@pytest.mark.asyncio
+async def test_incremental_snapshot_matches_rebuild(maker):
+    async with maker() as db:
+        inv = Investment(family_id=1, name="定期", investment_type=AssetType.TIME_DEPOSIT,
+                         principal=500, start_date=NOW)
+        db.add(inv)
+        await db.flush()
+        db.add_all([
+            Deposit(family_id=1, user_id=2, amount=300, deposit_date=NOW),
+            position(inv.id, PositionOperationType.CREATE, 500, 0, 500),
+            position(inv.id, PositionOperationType.INCREASE, 200, 500, 700),
+            position(inv.id, PositionOperationType.DECREASE, 100, 700, 600),
+            InvestmentIncome(investment_id=inv.id, amount=12, income_date=NOW),
+            InvestmentIncome(investment_id=inv.id, amount=0, calculated_income=8, current_value=608, income_date=NOW),
+            Transaction(family_id=1, user_id=2, transaction_type=TransactionType.DEPOSIT,
+                        amount=300, balance_after=1300, description="存入"),
+        ])
+        await db.commit()
+    snapshot = await assert_snapshot_matches_rebuild(maker)
+    assert snapshot["members"] == {1: 1000, 2: 300}
+    assert snapshot["investments"][inv.id] == {"current_principal": 600, "total_return": 20}
+    assert snapshot["free_cash"] == 1300
+
+    # 分红：投票中冻结全额，批准后只冻结未处理的领取
+    async with maker() as db:
+        dividend = Dividend(family_id=1, type=DividendType.CASH, total_amount=400, proposal_id=1, created_by=1)
+        db.add(dividend)
+        await db.commit()
+    assert (await assert_snapshot_matches_rebuild(maker))["frozen_amount"] == 400
+
+    async with maker() as db:
+        dividend = await db.get(Dividend, dividend.id)
+        dividend.status = DividendStatus.APPROVED
+        db.add_all([
+            DividendClaim(dividend_id=dividend.id, user_id=1, amount=250, equity_ratio=0.625),
+            DividendClaim(dividend_id=dividend.id, user_id=2, amount=150, equity_ratio=0.375),
+        ])
+        await db.commit()
+    assert (await assert_snapshot_matches_rebuild(maker))["frozen_amount"] == 400
+
+    async with maker() as db:
+        claim = (await db.execute(select(DividendClaim).where(DividendClaim.user_id == 1))).scalar_one()
+        claim.status = DividendClaimStatus.WITHDRAWN
+        await db.commit()
+    assert (await assert_snapshot_matches_rebuild(maker))["frozen_amount"] == 150
+
+    # 删除存入、收益与流水：按负增量回退，自由资金按流水链重新取末端余额
+    async with maker() as db:
+        await db.delete(await db.get(Deposit, 1))
+        income = await db.get(InvestmentIncome, 1)
+        await db.delete(income)
+        await db.delete(await db.get(Transaction, 2))
+        await db.commit()
+    snapshot = await assert_snapshot_matches_rebuild(maker)
+    assert snapshot["members"][1] == 0 and snapshot["free_cash"] == 1000
+    assert snapshot["investments"][inv.id]["total_return"] == 8
+
+    # 回滚的写入不改变快照
+    async with maker() as db:
+        db.add(Deposit(family_id=1, user_id=2, amount=999, deposit_date=NOW))
+        await db.flush()
+        await db.rollback()
+    assert (await assert_snapshot_matches_rebuild(maker))["members"][2] == 300
+
+
+@pytest.mark.asyncio
+async def test_verify_reports_drift_and_rebuild_repairs(maker):
+    async with maker() as db:
+        inv = Investment(family_id=1, name="基金", investment_type=AssetType.FUND, principal=100, start_date=NOW)
+        db.add(inv)
+        await db.flush()
+        db.add(position(inv.id, PositionOperationType.CREATE, 100, 0, 100))
+        await db.commit()
+    await assert_snapshot_matches_rebuild(maker)
+
+    # 绕过 ORM 直接改坏快照
+    async with maker() as db:
+        await db.execute(update(FamilyLedgerMember).where(FamilyLedgerMember.user_id == 1).values(total_deposit=1))
+        await db.execute(
+            update(FamilyLedgerInvestment)
+            .where(FamilyLedgerInvestment.investment_id == inv.id)
+            .values(current_principal=0)
+        )
+        await db.commit()
+        drifts = await verify_family_ledger(1, db)
+    assert sorted((d["field"], d["key"], d["expected"], d["actual"]) for d in drifts) == [
+        ("current_principal", inv.id, 100, 0),
+        ("total_deposit", 1, 1000, 1),
+    ]
+
+    async with maker() as db:
+        await rebuild_family_ledger(1, db)
+        await db.commit()
+    await assert_snapshot_matches_rebuild(maker)
+
+    # 未构建快照的家庭
+    async with maker() as db:
+        assert await verify_family_ledger(2, db) == [
+            {"field": "ledger", "key": 2, "expected": "built", "actual": None}
+        ]
@@ -0,0 +1,140 @@
+"""
+扫雷紧凑棋盘存储测试
+
+验证会话中的棋盘以 base64 字节/位集保存且体积远小于嵌套列表，旧版嵌套列表会话可继续游戏并在
+操作后迁移为新格式，脱敏状态与旧格式一致；以及标记循环、和弦、胜负判定。
+"""
+import copy
+import json
+import os
+import random
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.games.minesweeper import (
+    _board_cache, create_minesweeper_session, process_minesweeper_action, sanitize_minesweeper_state,
+)
+
+
+def act(session, action, row, col):
+    return process_minesweeper_action(session, {"action": action, "row": row, "col": col})
+
+
+def legacy_session(state: dict) -> dict:
+    """按脱敏状态和完整棋盘构造旧版嵌套列表格式的会话"""
+    return {
+        **{k: v for k, v in state.items() if k not in ("board", "revealed", "flagged", "questioned")},
+        "started_at": "2026-01-01T00:00:00",
+        "board": copy.deepcopy(state["full_board"]),
+        "revealed": copy.deepcopy(state["revealed"]),
+        "flagged": copy.deepcopy(state["flagged"]),
+        "questioned": copy.deepcopy(state["questioned"]),
+    }
+
+
+def full_board(session: dict) -> list:
+    """游戏结束视角下的完整棋盘（地雷为 -1）"""
+    return sanitize_minesweeper_state({**session, "completed": True})["board"]
+
+
+def test_compact_session_roundtrip():
+    random.seed(3)
+    session = create_minesweeper_session("expert")
+    act(session, "reveal", 8, 8)
+    for key in ("board", "revealed", "flagged", "questioned"):
+        assert isinstance(session[key], str)
+    payload = json.dumps(session, separators=(",", ":"))
+    assert len(payload) < 1000
+
+    # 序列化往返（新的会话对象，不命中解码缓存）后状态与后续操作一致
+    restored = json.loads(payload)
+    assert sanitize_minesweeper_state(restored) == sanitize_minesweeper_state(session)
+    state = sanitize_minesweeper_state(session)
+    board = full_board(session)
+    target = next((r, c) for r in range(16) for c in range(16)
+                  if not state["revealed"][r][c] and board[r][c] != -1)
+    assert act(restored, "reveal", *target) == act(session, "reveal", *target)
+    assert restored == session
+    assert state["cells_revealed"] == sum(map(sum, state["revealed"])) > 0
+    assert all(v is None for r, row in enumerate(state["board"]) for c, v in enumerate(row)
+               if not state["revealed"][r][c])
+
+
+def test_legacy_list_session_migrates():
+    random.seed(5)
+    session = create_minesweeper_session("hard")
+    act(session, "reveal", 0, 0)
+    act(session, "flag", 11, 11)
+    state = sanitize_minesweeper_state(session)
+    legacy = legacy_session({**state, "full_board": full_board(session)})
+    assert isinstance(legacy["board"][0], list)
+
+    assert sanitize_minesweeper_state(legacy) == state
+    # 旧格式会话继续游戏，操作后写回紧凑格式
+    act(legacy, "flag", 11, 11)
+    act(session, "flag", 11, 11)
+    assert isinstance(legacy["board"], str) and isinstance(legacy["questioned"], str)
+    assert sanitize_minesweeper_state(legacy) == sanitize_minesweeper_state(session)
+
+
+def test_flag_cycle_chord_and_outcomes():
+    random.seed(11)
+    session = create_minesweeper_session("medium")
+    act(session, "flag", 4, 4)
+    assert sanitize_minesweeper_state(session)["flagged"][4][4]
+    with pytest.raises(HTTPException):
+        act(session, "reveal", 4, 4)
+    act(session, "flag", 4, 4)
+    state = sanitize_minesweeper_state(session)
+    assert not state["flagged"][4][4] and state["questioned"][4][4]
+    act(session, "flag", 4, 4)
+    assert not sanitize_minesweeper_state(session)["questioned"][4][4]
+
+    act(session, "reveal", 4, 4)
+    board = full_board(session)
+    assert sum(v == -1 for row in board for v in row) == 12
+    assert all(board[r][c] != -1 for r in range(3, 6) for c in range(3, 6))
+
+    # 找一个已翻开且周围雷都未标记的数字格：标记周围所有雷后和弦
+    state = sanitize_minesweeper_state(session)
+    for r in range(9):
+        for c in range(9):
+            if state["revealed"][r][c] and (board[r][c] or 0) > 0:
+                around = [(nr, nc) for nr in range(r - 1, r + 2) for nc in range(c - 1, c + 2)
+                          if 0 <= nr < 9 and 0 <= nc < 9 and (nr, nc) != (r, c)]
+                if any(not state["revealed"][nr][nc] and board[nr][nc] != -1 for nr, nc in around):
+                    break
+        else:
+            continue
+        break
+    for nr, nc in around:
+        if board[nr][nc] == -1 and not sanitize_minesweeper_state(session)["flagged"][nr][nc]:
+            act(session, "flag", nr, nc)
+    act(session, "chord", r, c)
+    state = sanitize_minesweeper_state(session)
+    assert all(state["revealed"][nr][nc] for nr, nc in around if board[nr][nc] != -1)
+
+    # 翻开剩余安全格获胜
+    for rr in range(9):
+        for cc in range(9):
+            if board[rr][cc] != -1 and not sanitize_minesweeper_state(session)["revealed"][rr][cc]:
+                if sanitize_minesweeper_state(session)["flagged"][rr][cc]:
+                    act(session, "flag", rr, cc)
+                    act(session, "flag", rr, cc)
+                result = act(session, "reveal", rr, cc)
+    assert result == {"completed": True, "exp_earned": 50, "won": True}
+    assert sanitize_minesweeper_state(session)["board"] == board
+
+    # 踩雷失败
+    random.seed(11)
+    lost = create_minesweeper_session("medium")
+    act(lost, "reveal", 4, 4)
+    mine = next((r, c) for r in range(9) for c in range(9) if board[r][c] == -1)
+    assert act(lost, "reveal", *mine) == {"completed": True, "exp_earned": 0, "won": False}
+    assert sanitize_minesweeper_state(lost)["revealed"][mine[0]][mine[1]]
+    assert id(lost) in _board_cache
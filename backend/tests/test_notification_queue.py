@@ -0,0 +1,305 @@
+"""
+通知发件箱投递队列测试
+
+使用本地桩 Webhook 服务器（标准库 http.server）验证：
+重试退避、去重、同一家庭按顺序投递、超过最大次数后放弃；
+消息随业务事务提交（回滚则丢弃、提交后才唤醒），多个工作进程按租约认领不重复投递；
+业务数据的 flush 错误不被通知吞掉，写入发件箱失败不影响业务提交。
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import Family, NotificationOutbox
+from app.services import notification_queue as queue_module
+from app.services.notification import (
+    NotificationChannel, NotificationContext, NotificationService, NotificationType, WeChatWorkChannel,
+)
+from app.services.notification_queue import NotificationQueue
+
+
+class StubWebhook:
+    """本地桩 Webhook：记录收到的消息，可指定某些消息先失败若干次"""
+
+    def __init__(self):
+        self.received = []
+        self.failures = {}  # content -> 剩余失败次数
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                content = body["markdown"]["content"]
+                with stub.lock:
+                    remaining = stub.failures.get(content, 0)
+                    if remaining:
+                        stub.failures[content] = remaining - 1
+                    else:
+                        stub.received.append(content)
+                if remaining:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                data = json.dumps({"errcode": 0, "errmsg": "ok"}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubChannel(WeChatWorkChannel):
+    """允许指向本地地址的企业微信渠道"""
+
+    def is_configured(self, config):
+        return bool(config.get("wechat_work_webhook_url"))
+
+
+def payload(text: str):
+    return {"msgtype": "markdown", "markdown": {"content": text}}
+
+
+@pytest.fixture
+def stub():
+    server = StubWebhook()
+    yield server
+    server.close()
+
+
+@pytest_asyncio.fixture
+async def session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add_all([Family(id=1, name="A", invite_code="QA"), Family(id=2, name="B", invite_code="QB")])
+        await db.commit()
+    yield maker
+    await engine.dispose()
+
+
+def make_queue(session_maker, stub, **kwargs):
+    async def config_loader(family_id):
+        return {"wechat_work_webhook_url": stub.url, "notification_enabled": True}
+
+    options = dict(backoff_base=0.02, backoff_max=0.1, poll_interval=0.05, max_attempts=3)
+    options.update(kwargs)
+    return NotificationQueue(
+        session_maker=session_maker,
+        channels={"wechat_work": StubChannel()},
+        config_loader=config_loader,
+        **options,
+    )
+
+
+async def enqueue_all(session_maker, queue, items, notification_type="approval_created"):
+    """在一个业务事务中写入多条消息并提交"""
+    async with session_maker() as db:
+        for family_id, text in items:
+            await queue.enqueue(db, family_id, "wechat_work", notification_type, payload(text))
+        await db.commit()
+
+
+async def drain(queue, expected: int, timeout: float = 10.0):
+    """等待已处理（送达 + 放弃）的消息数达到 expected"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while queue.stats["sent"] + queue.stats["dead"] < expected:
+        assert loop.time() < deadline, f"queue did not drain: {queue.stats}"
+        await asyncio.sleep(0.02)
+
+
+@pytest.mark.asyncio
+async def test_retries_keep_per_family_order(session_maker, stub):
+    queue = make_queue(session_maker, stub)
+    # 家庭1 的第一条消息先失败两次，后续消息必须等它送达后才投递
+    stub.failures["A-1"] = 2
+    await enqueue_all(session_maker, queue, [(1, "A-1"), (1, "A-2"), (1, "A-3"), (2, "B-1"), (2, "B-2")])
+
+    await drain(queue, 5)
+    await queue.stop()
+
+    assert [c for c in stub.received if c.startswith("A")] == ["A-1", "A-2", "A-3"]
+    assert [c for c in stub.received if c.startswith("B")] == ["B-1", "B-2"]
+    assert queue.stats["retried"] == 2
+
+    async with session_maker() as db:
+        rows = (await db.execute(select(NotificationOutbox).order_by(NotificationOutbox.id))).scalars().all()
+    assert [r.status for r in rows] == ["sent"] * 5
+    assert rows[0].attempts == 3 and all(r.locked_until is None for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_messages_are_sent_once(session_maker, stub):
+    queue = make_queue(session_maker, stub)
+    # 同一事务内重复写入
+    await enqueue_all(session_maker, queue, [(1, "催办"), (1, "催办")], "approval_reminder")
+    await drain(queue, 1)
+
+    # 已送达后再次提交同一内容，仍在去重窗口内
+    await enqueue_all(session_maker, queue, [(1, "催办")], "approval_reminder")
+    await asyncio.sleep(0.2)
+    await queue.stop()
+
+    assert stub.received == ["催办"]
+    assert queue.stats["deduped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts_without_blocking_family(session_maker, stub):
+    queue = make_queue(session_maker, stub)
+    stub.failures["坏消息"] = 100
+    await enqueue_all(session_maker, queue, [(1, "坏消息"), (1, "好消息")], "bet_created")
+
+    await drain(queue, 2)
+    await queue.stop()
+
+    assert stub.received == ["好消息"]
+    async with session_maker() as db:
+        rows = (await db.execute(select(NotificationOutbox).order_by(NotificationOutbox.id))).scalars().all()
+    assert [(r.status, r.attempts) for r in rows] == [("dead", 3), ("sent", 1)]
+    assert rows[0].last_error
+
+
+@pytest.mark.asyncio
+async def test_messages_follow_the_business_transaction(session_maker, stub):
+    queue = make_queue(session_maker, stub)
+    async with session_maker() as db:
+        assert await queue.enqueue(db, 1, "wechat_work", "gift_sent", payload("回滚"))
+        # 提交前不唤醒投递
+        assert not queue.running
+        await db.rollback()
+    async with session_maker() as db:
+        assert (await db.execute(select(NotificationOutbox))).scalars().all() == []
+
+    async with session_maker() as db:
+        db.add(Family(id=3, name="C", invite_code="QC"))
+        await queue.enqueue(db, 3, "wechat_work", "gift_sent", payload("提交"))
+        await db.commit()
+    assert queue.running
+    await drain(queue, 1)
+    await queue.stop()
+    assert stub.received == ["提交"]
+
+
+@pytest.mark.asyncio
+async def test_workers_claim_messages_with_a_lease(session_maker, stub):
+    first = make_queue(session_maker, stub)
+    second = make_queue(session_maker, stub)
+    second.start()
+    await enqueue_all(session_maker, first, [(family_id, f"{family_id}-{i}") for i in range(5) for family_id in (1, 2)])
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + 10
+    while first.stats["sent"] + second.stats["sent"] < 10:
+        assert loop.time() < deadline, (first.stats, second.stats)
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(0.1)
+    await first.stop()
+    await second.stop()
+    assert sorted(stub.received) == sorted(f"{f}-{i}" for i in range(5) for f in (1, 2))
+    for family_id in (1, 2):
+        assert [c for c in stub.received if c.startswith(f"{family_id}-")] == [f"{family_id}-{i}" for i in range(5)]
+
+    # 其它进程持有未过期租约的消息不投递，租约到期后接手
+    async with session_maker() as db:
+        await first.enqueue(db, 1, "wechat_work", "approval_created", payload("租约"))
+        await db.commit()
+        await db.execute(
+            NotificationOutbox.__table__.update()
+            .where(NotificationOutbox.status == "pending")
+            .values(locked_until=datetime.utcnow() + timedelta(seconds=0.3))
+        )
+        await db.commit()
+    await asyncio.sleep(0.15)
+    assert "租约" not in stub.received
+    sent = first.stats["sent"]
+    await drain(first, sent + 1)
+    await first.stop()
+    assert stub.received[-1] == "租约"
+
+
+@pytest.mark.asyncio
+async def test_business_errors_are_not_swallowed(session_maker, stub, monkeypatch):
+    queue = make_queue(session_maker, stub)
+    monkeypatch.setattr(queue_module, "notification_queue", queue)
+
+    def service(db):
+        svc = NotificationService(db)
+        svc.channels = {"wechat_work": StubChannel()}
+
+        async def config(family_id):
+            return {"wechat_work_webhook_url": stub.url, "notification_enabled": True}
+        svc.get_family_notification_config = config
+        return svc
+
+    context = NotificationContext(
+        notification_type=NotificationType.GIFT_SENT, family_id=1, family_name="A", title="赠与", content="",
+    )
+
+    # 写入发件箱不触发业务会话的自动 flush
+    async with session_maker() as db:
+        family = Family(id=3, name="C", invite_code="QC")
+        db.add(family)
+        assert await queue.enqueue(db, 1, "wechat_work", "gift_sent", payload("不 flush"))
+        assert family in db.new
+        await db.rollback()
+
+    # 业务数据 flush 失败原样抛给调用方，而不是被通知的异常处理吞掉
+    async with session_maker() as db:
+        db.add(Family(id=4, name="D", invite_code="QA"))
+        with pytest.raises(IntegrityError):
+            await service(db)._send_to_all_channels(context)
+        await db.rollback()
+
+    # 写入发件箱失败只丢掉通知，业务数据照常提交
+    async def broken(*args, **kwargs):
+        raise RuntimeError("outbox unavailable")
+    async with session_maker() as db:
+        db.add(Family(id=5, name="E", invite_code="QE"))
+        monkeypatch.setattr(queue, "enqueue", broken)
+        await service(db)._send_to_all_channels(context)
+        await db.commit()
+    async with session_maker() as db:
+        assert await db.get(Family, 5) is not None
+        assert (await db.execute(select(NotificationOutbox))).scalars().all() == []
+
+
+def test_channels_must_implement_delivery():
+    class Incomplete(NotificationChannel):
+        async def send(self, context, config):
+            return True
+
+        def is_configured(self, config):
+            return True
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,81 @@
+"""
+登录主体缓存测试
+
+验证命中缓存时不访问数据库，以及昵称、成员关系变化在提交后使缓存失效。
+"""
+import os
+import sys
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core import principal as principal_module
+from app.core.database import Base
+from app.core.principal import Principal, invalidate_principal, load_principal
+from app.models.models import Family, FamilyMember, User
+
+
+@pytest_asyncio.fixture
+async def setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'principal.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    queries = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add_all([
+            User(id=1, username="a", email="a@example.com", hashed_password="x", nickname="A"),
+            Family(id=1, name="F", invite_code="PRI001"),
+        ])
+        await db.commit()
+    invalidate_principal()
+    yield maker, queries
+    invalidate_principal()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_needs_no_queries(setup):
+    maker, queries = setup
+    async with maker() as db:
+        assert await load_principal(db, 1) == Principal(1, "A", None, None, 0)
+        queries.clear()
+        assert (await load_principal(db, 1)).nickname == "A"
+        assert queries == []
+        assert await load_principal(db, 99) is None
+
+
+@pytest.mark.asyncio
+async def test_committed_changes_invalidate(setup):
+    maker, _ = setup
+    async with maker() as db:
+        assert (await load_principal(db, 1)).family_id is None
+
+        db.add(FamilyMember(user_id=1, family_id=1, role="admin"))
+        await db.flush()
+        # 提交前仍返回缓存内容
+        assert (await load_principal(db, 1)).family_id is None
+        await db.commit()
+        assert (await load_principal(db, 1))[2:4] == (1, "admin")
+
+        user = await db.get(User, 1)
+        user.nickname = "B"
+        await db.commit()
+        assert (await load_principal(db, 1)).nickname == "B"
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl(setup, monkeypatch):
+    maker, queries = setup
+    monkeypatch.setattr(principal_module, "PRINCIPAL_CACHE_TTL", -1)
+    async with maker() as db:
+        await load_principal(db, 1)
+        queries.clear()
+        await load_principal(db, 1)
+        assert len(queries) == 1
@@ -0,0 +1,107 @@
+"""
+提案列表与投票统计测试
+
+验证提案列表的查询次数与提案数量无关、读取时不写库，
+投票写入后统计缓存即时更新，过期提案由批量任务持久化。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.api.vote import check_proposal_result, list_proposals
+from app.core.database import Base
+from app.core.principal import Principal, invalidate_principal
+from app.models.models import Family, FamilyMember, Proposal, ProposalStatus, User, Vote
+from app.schemas.common import TimeRange
+from app.services.proposal import expire_overdue_proposals, invalidate_tally
+
+ME = Principal(1, "A", 1, "admin", 0)
+
+
+@pytest_asyncio.fixture
+async def setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'vote.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    now = datetime.utcnow()
+    async with maker() as db:
+        db.add(Family(id=1, name="F", invite_code="VOTE01"))
+        for uid in (1, 2, 3):
+            db.add(User(id=uid, username=f"u{uid}", email=f"u{uid}@example.com", hashed_password="x", nickname=f"成员{uid}"))
+        await db.flush()
+        for uid in (1, 2, 3):
+            db.add(FamilyMember(user_id=uid, family_id=1, role="admin" if uid == 1 else "member"))
+        for i in range(1, 61):
+            db.add(Proposal(
+                id=i, family_id=1, creator_id=(i % 3) + 1, title=f"提案{i}", description="", options='["同意", "不同意"]',
+                status=ProposalStatus.VOTING, created_at=now - timedelta(days=i),
+                deadline=now - timedelta(hours=1) if i == 60 else now + timedelta(days=7),
+            ))
+        await db.flush()
+        for i in range(1, 61):
+            db.add(Vote(proposal_id=i, user_id=2, option_index=i % 2, weight=0.25))
+        db.add(Vote(proposal_id=1, user_id=1, option_index=0, weight=0.5))
+        await db.commit()
+    invalidate_principal()
+    invalidate_tally()
+    statements.clear()
+    async with maker() as db:
+        yield db, statements
+    invalidate_principal()
+    invalidate_tally()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_list_uses_constant_queries_without_writes(setup):
+    db, statements = setup
+
+    proposals = await list_proposals(status=None, time_range=TimeRange.ALL, current_user=ME, db=db)
+    assert len(proposals) == 60
+    assert len(statements) <= 6
+    assert not any(s.lstrip().upper().startswith("UPDATE") for s in statements)
+
+    first = next(p for p in proposals if p["id"] == 1)
+    assert first["voted_count"] == 2 and first["my_vote"] == 0
+    assert first["votes_summary"][0] == {"option": "同意", "count": 1, "weight_percent": 50.0}
+    assert first["creator_name"] == "成员2"
+    assert next(p for p in proposals if p["id"] == 60)["status"] == "expired"
+
+    expired = await list_proposals(status="expired", time_range=TimeRange.ALL, current_user=ME, db=db)
+    assert [p["id"] for p in expired] == [60]
+
+    # 统计已缓存：再次读取不再执行 GROUP BY
+    statements.clear()
+    await list_proposals(status=None, time_range=TimeRange.ALL, current_user=ME, db=db)
+    assert not any("GROUP BY" in s for s in statements)
+
+
+@pytest.mark.asyncio
+async def test_vote_write_refreshes_tally_and_expiry_is_persisted(setup):
+    db, _ = setup
+    await list_proposals(status=None, time_range=TimeRange.ALL, current_user=ME, db=db)
+
+    proposal = await db.get(Proposal, 1)
+    db.add(Vote(proposal_id=1, user_id=3, option_index=0, weight=0.25))
+    await db.commit()
+    await check_proposal_result(db, proposal, 1)
+
+    proposals = await list_proposals(status=None, time_range=TimeRange.ALL, current_user=ME, db=db)
+    first = next(p for p in proposals if p["id"] == 1)
+    assert first["voted_count"] == 3
+    assert first["status"] == "rejected"  # 成员2 投了不同意
+
+    assert await expire_overdue_proposals(db) == 1
+    await db.commit()
+    assert (await db.get(Proposal, 60)).status == ProposalStatus.EXPIRED
@@ -0,0 +1,214 @@
+"""
+热点查询的执行计划回归测试
+
+对家庭维度的高频查询运行 EXPLAIN QUERY PLAN，
+一旦某条查询退化为全表扫描（SCAN <table>）即失败。
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select, func, and_, or_, desc, inspect, text, tuple_
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base, _auto_migrate_indexes
+from app.models.models import (
+    Transaction, Deposit, AccountingEntry, CalendarEvent, CalendarRepeatType,
+    InvestmentIncome, InvestmentPosition, Vote, Proposal, TodoItem, FamilyMember,
+)
+
+SINCE = datetime(2025, 1, 1)
+UNTIL = datetime(2025, 12, 31, 23, 59, 59)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    eng = create_engine("sqlite://")
+    Base.metadata.create_all(eng)
+    yield eng
+    eng.dispose()
+
+
+def explain(engine, stmt):
+    """返回查询计划每一步的 detail 文本"""
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+# (名称, 被检查的表, 查询, 是否要求无需额外排序)
+HOT_QUERIES = [
+    (
+        "latest_balance",
+        "transactions",
+        select(Transaction.balance_after)
+        .where(Transaction.family_id == 1)
+        .order_by(Transaction.created_at.desc())
+        .limit(1),
+        True,
+    ),
+    (
+        "transaction_list_since",
+        "transactions",
+        select(Transaction)
+        .where(Transaction.family_id == 1, Transaction.created_at >= SINCE)
+        .order_by(Transaction.created_at.desc()),
+        True,
+    ),
+    (
+        "member_deposit_sum",
+        "deposits",
+        select(func.sum(Deposit.amount))
+        .where(Deposit.family_id == 1, Deposit.user_id == 2),
+        False,
+    ),
+    (
+        "deposits_in_year",
+        "deposits",
+        select(func.sum(Deposit.amount))
+        .where(Deposit.family_id == 1, Deposit.deposit_date >= SINCE, Deposit.deposit_date <= UNTIL),
+        False,
+    ),
+    (
+        "accounting_entry_list",
+        "accounting_entries",
+        select(AccountingEntry)
+        .where(and_(
+            AccountingEntry.family_id == 1,
+            AccountingEntry.entry_date >= SINCE,
+            AccountingEntry.entry_date <= UNTIL,
+        ))
+        .order_by(desc(AccountingEntry.entry_date), desc(AccountingEntry.created_at))
+        .limit(20),
+        False,
+    ),
+    (
+        "accounting_entry_keyset",
+        "accounting_entries",
+        select(AccountingEntry.id)
+        .where(
+            AccountingEntry.family_id == 1,
+            tuple_(AccountingEntry.entry_date, AccountingEntry.created_at, AccountingEntry.id)
+            < tuple_(SINCE, SINCE, 100),
+        )
+        .order_by(desc(AccountingEntry.entry_date), desc(AccountingEntry.created_at), desc(AccountingEntry.id))
+        .limit(21),
+        True,
+    ),
+    (
+        "calendar_range",
+        "calendar_events",
+        select(CalendarEvent)
+        .where(CalendarEvent.family_id == 1)
+        .where(or_(
+            and_(
+                CalendarEvent.repeat_type == CalendarRepeatType.NONE,
+                CalendarEvent.start_time >= SINCE,
+                CalendarEvent.start_time <= UNTIL,
+            ),
+            and_(
+                CalendarEvent.repeat_type != CalendarRepeatType.NONE,
+                CalendarEvent.start_time <= UNTIL,
+            ),
+        ))
+        .order_by(CalendarEvent.start_time),
+        True,
+    ),
+    (
+        "investment_incomes",
+        "investment_incomes",
+        select(InvestmentIncome)
+        .where(InvestmentIncome.investment_id == 1)
+        .order_by(InvestmentIncome.income_date.desc()),
+        True,
+    ),
+    (
+        "investment_positions",
+        "investment_positions",
+        select(InvestmentPosition)
+        .where(InvestmentPosition.investment_id == 1)
+        .order_by(InvestmentPosition.operation_date),
+        True,
+    ),
+    (
+        "my_vote",
+        "votes",
+        select(Vote.option_index).where(Vote.proposal_id == 1, Vote.user_id == 2),
+        False,
+    ),
+    (
+        "vote_tally",
+        "votes",
+        select(Vote.option_index, func.sum(Vote.weight))
+        .where(Vote.proposal_id == 1)
+        .group_by(Vote.option_index),
+        False,
+    ),
+    (
+        "proposal_list",
+        "proposals",
+        select(Proposal)
+        .where(Proposal.family_id == 1, Proposal.created_at >= SINCE)
+        .order_by(Proposal.created_at.desc()),
+        True,
+    ),
+    (
+        "open_todo_items",
+        "todo_items",
+        select(TodoItem).where(TodoItem.list_id == 1, TodoItem.is_completed == False),
+        False,
+    ),
+    (
+        "user_membership",
+        "family_members",
+        select(FamilyMember.family_id).where(FamilyMember.user_id == 1),
+        False,
+    ),
+    (
+        "family_members",
+        "family_members",
+        select(func.count(FamilyMember.id)).where(FamilyMember.family_id == 1),
+        False,
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "table,stmt,ordered",
+    [(table, stmt, ordered) for _, table, stmt, ordered in HOT_QUERIES],
+    ids=[name for name, *_ in HOT_QUERIES],
+)
+def test_hot_query_uses_index(engine, table, stmt, ordered):
+    plan = explain(engine, stmt)
+
+    scans = [step for step in plan if step.startswith(f"SCAN {table}")]
+    assert not scans, f"{table} 全表扫描: {plan}"
+    assert any(step.startswith(f"SEARCH {table}") for step in plan), plan
+    if ordered:
+        assert not any("TEMP B-TREE" in step for step in plan), f"需要额外排序: {plan}"
+
+
+def test_auto_migrate_creates_missing_indexes():
+    eng = create_engine("sqlite://")
+    Base.metadata.create_all(eng)
+    with eng.begin() as conn:
+        # 模拟旧库：表已存在但没有复合索引
+        conn.execute(text("DROP INDEX ix_transactions_family_created"))
+        conn.execute(text("DROP INDEX ix_accounting_entries_family_keyset"))
+        # 旧库中已被复合索引覆盖的窄索引
+        conn.execute(text("CREATE INDEX ix_accounting_entries_family_date ON accounting_entries (family_id, entry_date)"))
+
+        _auto_migrate_indexes(conn)
+
+        names = {idx["name"] for idx in inspect(conn).get_indexes("transactions")}
+        assert "ix_transactions_family_created" in names
+        names = {idx["name"] for idx in inspect(conn).get_indexes("accounting_entries")}
+        assert "ix_accounting_entries_family_keyset" in names
+        assert "ix_accounting_entries_family_date" not in names
+
+        # 再次执行应为幂等
+        _auto_migrate_indexes(conn)
+    eng.dispose()
@@ -0,0 +1,121 @@
+"""
+后台任务调度测试
+
+验证多个 worker 竞争同一任务时只有一个执行、运行统计与下次运行时间被持久化，
+以及赌注截止任务按投票人数转换状态。
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.database import Base
+from app.models.models import (
+    Bet, BetOption, BetParticipant, BetStatus, Family, ScheduledJob, User,
+)
+from app.services.jobs import bet_deadlines_job
+from app.services.scheduler import JobScheduler
+
+
+@pytest_asyncio.fixture
+async def maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def make_due(maker, name):
+    async with maker() as db:
+        await db.execute(update(ScheduledJob).where(ScheduledJob.name == name)
+                         .values(next_run_at=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+
+
+async def drain(*schedulers):
+    tasks = [t for s in schedulers for t in s._tasks]
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_runs_a_due_job(maker):
+    calls = []
+
+    async def job(db):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"done": len(calls)}
+
+    workers = [JobScheduler(session_maker=maker, worker_id=f"w{i}") for i in range(3)]
+    for worker in workers:
+        worker.register("demo", job, interval=60, jitter=0.1)
+    await workers[0]._ensure_rows()
+    await make_due(maker, "demo")
+
+    started = await asyncio.gather(*(w.run_due_jobs() for w in workers))
+    await drain(*workers)
+    assert sum(len(names) for names in started) == 1
+    assert len(calls) == 1
+
+    async with maker() as db:
+        row = await db.get(ScheduledJob, "demo")
+    assert row.lease_owner is None and row.last_status == "success"
+    assert row.run_count == 1 and row.last_result == '{"done": 1}'
+    assert timedelta(seconds=53) < row.next_run_at - row.last_finished_at < timedelta(seconds=67)
+
+    # 未到期时不会再次运行
+    assert await workers[1].run_due_jobs() == []
+
+
+@pytest.mark.asyncio
+async def test_failures_are_recorded_and_lease_released(maker):
+    async def broken(db):
+        raise RuntimeError("boom")
+
+    worker = JobScheduler(session_maker=maker, worker_id="w")
+    worker.register("broken", broken, interval=10)
+    await worker._ensure_rows()
+    await make_due(maker, "broken")
+    await worker.run_due_jobs()
+    await drain(worker)
+
+    async with maker() as db:
+        row = await db.get(ScheduledJob, "broken")
+    assert (row.last_status, row.failure_count, row.lease_owner) == ("failed", 1, None)
+    assert "boom" in row.last_error
+    assert worker.stats["broken"]["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_bet_deadlines_job(maker):
+    now = datetime.utcnow()
+    async with maker() as db:
+        db.add_all([
+            Family(id=1, name="F", invite_code="JOB001"),
+            *(User(id=i, username=f"u{i}", email=f"u{i}@example.com", hashed_password="x", nickname=f"U{i}")
+              for i in (1, 2)),
+        ])
+        for bet_id, end in ((1, now - timedelta(hours=1)), (2, now - timedelta(hours=1)), (3, now + timedelta(days=1))):
+            db.add(Bet(id=bet_id, family_id=1, creator_id=1, title=f"赌注{bet_id}", description="",
+                       status=BetStatus.ACTIVE, start_date=now - timedelta(days=2), end_date=end))
+            db.add(BetOption(id=bet_id, bet_id=bet_id, option_text="A"))
+        await db.flush()
+        for bet_id, voters in ((1, (1,)), (2, (1, 2)), (3, (1, 2))):
+            for uid in voters:
+                db.add(BetParticipant(bet_id=bet_id, user_id=uid, selected_option_id=bet_id, stake_amount=0))
+        await db.commit()
+
+        assert await bet_deadlines_job(db) == {"cancelled": 1, "awaiting_result": 1}
+        await db.commit()
+        statuses = [(await db.get(Bet, i, populate_existing=True)).status for i in (1, 2, 3)]
+    assert statuses == [BetStatus.CANCELLED, BetStatus.AWAITING_RESULT, BetStatus.ACTIVE]
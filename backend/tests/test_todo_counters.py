@@ -0,0 +1,168 @@
+"""
+家庭清单计数与统计测试
+
+验证清单任务计数随任务新增/完成/取消完成/移动/删除增量维护，
+清单列表与统计的查询次数与清单数量无关，统计缓存在任务写入提交后失效，
+查询期间提交的写入不会留下过时的缓存。
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+# Ensure backend/ is on sys.path so `app` package can be imported during tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.api.todo import get_lists, get_stats
+from app.core.database import Base, _recount_todo_lists
+from app.core.principal import Principal, invalidate_principal, load_principal
+from app.models.models import Family, FamilyMember, TodoItem, TodoList, User
+from app.services.todo import get_todo_stats, invalidate_todo_stats
+
+ME = Principal(1, "A", 1, "admin", 0)
+
+
+@pytest_asyncio.fixture
+async def setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'todo.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as db:
+        db.add(Family(id=1, name="F", invite_code="TODO01"))
+        for uid in (1, 2):
+            db.add(User(id=uid, username=f"u{uid}", email=f"u{uid}@example.com", hashed_password="x", nickname=f"成员{uid}"))
+        await db.flush()
+        for uid in (1, 2):
+            db.add(FamilyMember(user_id=uid, family_id=1, role="admin" if uid == 1 else "member"))
+        for list_id in range(1, 21):
+            db.add(TodoList(id=list_id, family_id=1, name=f"清单{list_id}", created_by=1, sort_order=list_id))
+        await db.commit()
+    invalidate_principal()
+    invalidate_todo_stats()
+    async with maker() as db:
+        await load_principal(db, ME.id)
+        statements.clear()
+        yield maker, db, statements
+    invalidate_principal()
+    invalidate_todo_stats()
+    await engine.dispose()
+
+
+async def counts(db):
+    lists = await get_lists(current_user=ME, db=db)
+    return {lst.id: (lst.item_count, lst.completed_count) for lst in lists if lst.item_count}
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_item_writes(setup):
+    maker, db, statements = setup
+    now = datetime.utcnow()
+    items = [TodoItem(list_id=1 + i % 3, title=f"任务{i}", created_by=1) for i in range(6)]
+    db.add_all(items)
+    await db.commit()
+    assert await counts(db) == {1: (2, 0), 2: (2, 0), 3: (2, 0)}
+
+    items[0].is_completed, items[0].completed_by, items[0].completed_at = True, 1, now
+    items[1].is_completed, items[1].completed_by, items[1].completed_at = True, 2, now
+    await db.commit()
+    items[1].is_completed = False
+    items[2].list_id = 1  # 移动到清单1
+    await db.delete(items[3])
+    await db.commit()
+    assert await counts(db) == {1: (2, 1), 2: (2, 0), 3: (1, 0)}
+
+    # 删除清单时级联删除的任务不影响其它清单
+    await db.delete(await db.get(TodoList, 3))
+    await db.commit()
+    assert await counts(db) == {1: (2, 1), 2: (2, 0)}
+
+    # 按任务重算后结果不变，且列表只需一次查询
+    async with maker() as other:
+        conn = await other.connection()
+        await conn.run_sync(_recount_todo_lists)
+        await other.commit()
+    statements.clear()
+    async with maker() as fresh:
+        await load_principal(fresh, ME.id)
+        assert await counts(fresh) == {1: (2, 1), 2: (2, 0)}
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_single_query_and_invalidation(setup):
+    maker, db, statements = setup
+    now = datetime.utcnow()
+    db.add_all([
+        TodoItem(list_id=1, title="已完成", created_by=1, is_completed=True, completed_by=1, completed_at=now),
+        TodoItem(list_id=2, title="指派给我", created_by=2, assignee_id=1, due_date=now - timedelta(days=1)),
+        TodoItem(list_id=3, title="指派给成员2", created_by=1, assignee_id=2, due_date=now + timedelta(days=3)),
+    ])
+    await db.commit()
+    statements.clear()
+
+    stats = await get_stats(current_user=ME, db=db)
+    assert stats == {
+        "total_tasks": 3, "completed_tasks": 1, "pending_tasks": 2,
+        "my_completed": 1, "my_pending": 1, "due_today": 1, "completion_rate": 33.3,
+    }
+    assert len(statements) == 1
+
+    statements.clear()
+    assert await get_stats(current_user=ME, db=db) == stats
+    assert statements == []
+
+    # 任务写入提交后缓存失效
+    async with maker() as other:
+        item = (await other.execute(select(TodoItem).where(TodoItem.title == "指派给我"))).scalar_one()
+        item.is_completed = True
+        other.add(TodoItem(list_id=4, title="新任务", created_by=2))
+        await other.commit()
+    stats = await get_stats(current_user=ME, db=db)
+    assert (stats["total_tasks"], stats["completed_tasks"], stats["my_pending"]) == (4, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_stats_computed_during_a_write_are_not_cached(setup):
+    maker, db, _ = setup
+    db.add(TodoItem(list_id=1, title="任务", created_by=1))
+    await db.commit()
+
+    # 统计查询执行后、写入缓存前，另一个请求提交了任务写入
+    async with maker() as reader:
+        execute = reader.execute
+
+        async def racing_execute(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            async with maker() as writer:
+                writer.add(TodoItem(list_id=2, title="并发新增", created_by=2))
+                await writer.commit()
+            return result
+
+        reader.execute = racing_execute
+        assert (await get_todo_stats(reader, 1, 1))["total_tasks"] == 1
+
+    assert (await get_todo_stats(db, 1, 1))["total_tasks"] == 2
+
+
+@pytest.mark.asyncio
+async def test_recount_repairs_drift(setup):
+    maker, db, _ = setup
+    db.add_all([TodoItem(list_id=5, title=f"任务{i}", created_by=1) for i in range(3)])
+    await db.commit()
+    await db.execute(update(TodoList).where(TodoList.id == 5).values(item_count=9, completed_count=4))
+    await db.commit()
+
+    async with maker() as other:
+        conn = await other.connection()
+        await conn.run_sync(_recount_todo_lists)
+        await other.commit()
+    db.expire_all()
+    todo_list = await db.get(TodoList, 5)
+    assert (todo_list.item_count, todo_list.completed_count) == (3, 0)